@@ -0,0 +1,17 @@
+"""基准测试与检索评估"""
+
+from .corpus import BenchQuery, SyntheticCorpus
+from .evaluation import compare_results, latency_summary, peak_rss_mb, redundancy, retrieval_quality
+from .suite import BENCH_MODES, run_bench
+
+__all__ = [
+    "BenchQuery",
+    "SyntheticCorpus",
+    "compare_results",
+    "latency_summary",
+    "peak_rss_mb",
+    "redundancy",
+    "retrieval_quality",
+    "BENCH_MODES",
+    "run_bench",
+]
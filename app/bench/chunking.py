@@ -0,0 +1,132 @@
+"""
+分块策略基准
+
+对 ChunkingStrategyFactory 中注册的每种策略，在同一语料上测量：
+分块耗时和吞吐（字符/秒）、峰值内存（tracemalloc）、文本块数量与长度分布，
+以及用伪嵌入建索引后的下游检索效果（稠密 / 稀疏 recall@k 和 MRR）。
+"""
+
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain.docstore.document import Document
+from langchain.embeddings.base import Embeddings
+from langchain_community.vectorstores.faiss import FAISS
+
+from app.bench.corpus import BenchQuery
+from app.bench.evaluation import first_relevant_rank, retrieval_quality
+from app.services.chunking_strategies import ChunkingStrategyFactory
+from app.services.retrievers.dense import DenseRetriever
+from app.services.retrievers.sparse import SparseRetriever
+
+
+def size_distribution(chunks: Sequence[Document]) -> Dict[str, float]:
+    """文本块长度（字符数）分布"""
+    if not chunks:
+        return {"mean": 0.0, "std": 0.0, "min": 0, "p50": 0.0, "p95": 0.0, "max": 0}
+    sizes = np.asarray([len(chunk.page_content) for chunk in chunks], dtype=np.float64)
+    p50, p95 = np.percentile(sizes, [50, 95])
+    return {
+        "mean": float(sizes.mean()),
+        "std": float(sizes.std()),
+        "min": int(sizes.min()),
+        "p50": float(p50),
+        "p95": float(p95),
+        "max": int(sizes.max()),
+    }
+
+
+def _evaluate(search: Callable[[str], List[Document]], queries: Sequence[BenchQuery],
+              ks: Sequence[int]) -> Dict[str, float]:
+    ranks = [first_relevant_rank(query, search(query.text)) for query in queries]
+    return retrieval_quality(ranks, ks)
+
+
+def bench_strategy(
+    strategy_name: str,
+    documents: List[Document],
+    queries: Sequence[BenchQuery],
+    embeddings: Embeddings,
+    chunk_size: int,
+    chunk_overlap: int,
+    length_unit: str = "chars",
+    ks: Sequence[int] = (1, 5),
+    repeat: int = 1,
+) -> Dict[str, Any]:
+    """
+    测量单个分块策略
+
+    计时和内存分两轮测量，避免 tracemalloc 的开销计入耗时；计时取 repeat 次中最快的一次。
+    策略初始化（如加载 spaCy 模型）的耗时单独记为 setup_seconds。
+    """
+    kwargs = {"chunk_size": chunk_size, "chunk_overlap": chunk_overlap, "length_unit": length_unit}
+    total_chars = sum(len(doc.page_content) for doc in documents)
+
+    start = time.perf_counter()
+    strategy = ChunkingStrategyFactory.get_strategy(strategy_name)
+    # 预热一次，触发模型加载等惰性初始化
+    strategy.split_documents(documents[:1], **kwargs)
+    setup_seconds = time.perf_counter() - start
+
+    best = float("inf")
+    chunks: List[Document] = []
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        chunks = strategy.split_documents(documents, **kwargs)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        strategy.split_documents(documents, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    result: Dict[str, Any] = {
+        "strategy": strategy_name,
+        "setup_seconds": setup_seconds,
+        "seconds": best,
+        "chars_per_sec": total_chars / best if best > 0 else 0.0,
+        "peak_memory_mb": peak / (1024 * 1024),
+        "chunks": len(chunks),
+        "chunk_chars": size_distribution(chunks),
+    }
+    if chunks and queries:
+        k = max(ks)
+        vector_store = FAISS.from_documents(chunks, embeddings)
+        result["dense"] = _evaluate(DenseRetriever(vector_store, k=k).invoke, queries, ks)
+        result["sparse"] = _evaluate(SparseRetriever(chunks, k=k).invoke, queries, ks)
+    return result
+
+
+def bench_chunking(
+    documents: List[Document],
+    queries: Sequence[BenchQuery],
+    embeddings: Embeddings,
+    chunk_size: int,
+    chunk_overlap: int,
+    length_unit: str = "chars",
+    ks: Sequence[int] = (1, 5),
+    strategies: Optional[Sequence[str]] = None,
+    repeat: int = 1,
+    on_strategy: Optional[Callable[[str], None]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    依次测量各分块策略（默认全部已注册策略）
+
+    某个策略不可用（如缺少 spaCy 模型）时记录错误信息并继续测量其他策略。
+    返回：
+        List[Dict]: 每个策略一条结果，失败的策略只有 strategy 和 error 字段
+    """
+    results = []
+    for name in strategies or ChunkingStrategyFactory.get_strategy_names():
+        if on_strategy:
+            on_strategy(name)
+        try:
+            results.append(bench_strategy(name, documents, queries, embeddings, chunk_size, chunk_overlap,
+                                          length_unit, ks, repeat))
+        except Exception as e:
+            results.append({"strategy": name, "error": str(e)})
+    return results
@@ -0,0 +1,227 @@
+"""
+合成语料
+
+生成确定性的合成文档和带标准答案的查询集，用于基准测试和召回率评估。
+
+每篇文档属于一个主题，由若干段落组成；每个段落包含若干填充句（主题词 + 常用词）
+和一条“事实句”。事实句由一组只出现在这条事实中的稀有词组成，查询从其中抽取
+部分词语并混入主题词。检索结果中某个文本块包含该事实的大部分稀有词，即视为命中，
+因此同一查询集可以评估任意分块策略下的检索效果。
+"""
+
+import math
+import random
+import re
+from typing import Dict, List, Sequence, Set
+
+from langchain.docstore.document import Document
+
+# 生成伪词的音节
+_CONSONANTS = "bcdfghjklmnprstvz"
+_VOWELS = "aeiou"
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> Set[str]:
+    """与相关性判定一致的分词（小写单词集合）"""
+    return set(_WORD_RE.findall(text.lower()))
+
+
+class BenchQuery:
+    """一条查询及其标准答案"""
+
+    def __init__(self, text: str, fact_terms: List[str], source: str, min_terms: int):
+        self.text = text
+        self.fact_terms = fact_terms
+        self.source = source
+        self.min_terms = min_terms
+
+    def is_relevant(self, text: str) -> bool:
+        """文本块包含至少 min_terms 个事实词即视为相关"""
+        tokens = tokenize(text)
+        return sum(term in tokens for term in self.fact_terms) >= self.min_terms
+
+    def to_dict(self) -> Dict:
+        return {"text": self.text, "fact_terms": self.fact_terms, "source": self.source}
+
+
+def sample_queries(
+    documents: Sequence[Document],
+    n_queries: int,
+    seed: int = 42,
+    window: int = 24,
+    fact_terms: int = 8,
+    query_terms: int = 4,
+    relevance_ratio: float = 0.75,
+) -> List[BenchQuery]:
+    """
+    从任意文档中自动生成查询集（没有人工标注时使用）
+
+    随机截取一段连续文本，取其中 fact_terms 个不同的词（长度至少 3）作为“事实”，
+    再从中抽取 query_terms 个词组成查询；文本块包含这段文本的大部分词即视为相关。
+    中文文本按连续汉字串分词，粒度较粗，召回率只适合在不同分块策略之间横向比较。
+    参数：
+        documents: 文档列表
+        n_queries: 查询数量
+        seed: 随机种子
+        window: 截取的连续词数
+        fact_terms: 每条查询对应的事实词数
+        query_terms: 查询中的词数
+        relevance_ratio: 判定相关时文本块至少需要包含的事实词比例
+    返回：
+        List[BenchQuery]: 查询列表（文档太短时可能少于 n_queries）
+    """
+    rng = random.Random(seed)
+    tokenized = [(doc, _WORD_RE.findall(doc.page_content.lower())) for doc in documents]
+    tokenized = [(doc, words) for doc, words in tokenized if len(words) >= window]
+    if not tokenized:
+        return []
+    weights = [len(words) for _, words in tokenized]
+    queries: List[BenchQuery] = []
+    for _ in range(n_queries * 5):
+        if len(queries) >= n_queries:
+            break
+        doc, words = rng.choices(tokenized, weights=weights)[0]
+        start = rng.randrange(len(words) - window + 1)
+        terms = list(dict.fromkeys(w for w in words[start:start + window] if len(w) >= 3))[:fact_terms]
+        if len(terms) < query_terms:
+            continue
+        min_terms = max(1, math.ceil(len(terms) * relevance_ratio))
+        queries.append(BenchQuery(" ".join(rng.sample(terms, query_terms)), terms,
+                                  doc.metadata.get("source", ""), min_terms))
+    return queries
+
+
+class SyntheticCorpus:
+    """
+    确定性合成语料
+
+    相同参数和种子总是生成完全相同的文档和查询。
+    """
+
+    def __init__(
+        self,
+        n_docs: int = 200,
+        paragraphs_per_doc: int = 8,
+        sentences_per_paragraph: int = 6,
+        n_topics: int = 20,
+        fact_terms: int = 8,
+        query_terms: int = 4,
+        relevance_ratio: float = 0.75,
+        seed: int = 42,
+    ):
+        """
+        参数：
+            n_docs: 文档数量
+            paragraphs_per_doc: 每篇文档的段落数（每段一条事实）
+            sentences_per_paragraph: 每段的填充句数量
+            n_topics: 主题数量
+            fact_terms: 每条事实句的稀有词数量
+            query_terms: 查询中取自事实句的词数
+            relevance_ratio: 判定相关时文本块至少需要包含的事实稀有词比例
+            seed: 随机种子
+        """
+        self.n_docs = n_docs
+        self.paragraphs_per_doc = paragraphs_per_doc
+        self.sentences_per_paragraph = sentences_per_paragraph
+        self.n_topics = n_topics
+        self.fact_terms = fact_terms
+        self.query_terms = min(query_terms, fact_terms)
+        self.min_terms = max(1, math.ceil(fact_terms * relevance_ratio))
+        self.seed = seed
+
+        rng = random.Random(seed)
+        n_facts = n_docs * paragraphs_per_doc
+        vocabulary = self._make_vocabulary(300 + n_topics * 40 + n_facts * fact_terms, rng)
+        self._common = vocabulary[:300]
+        topic_words = vocabulary[300:300 + n_topics * 40]
+        self._topics = [topic_words[i * 40:(i + 1) * 40] for i in range(n_topics)]
+        # 稀有词按事实划分，每个稀有词只属于一条事实
+        self._rare = vocabulary[300 + n_topics * 40:]
+        # 常用词按 Zipf 分布抽样
+        self._common_weights = [1.0 / (rank + 1) for rank in range(len(self._common))]
+
+        self.documents: List[Document] = []
+        self._facts: List[Dict] = []
+        self._build(rng)
+
+    @staticmethod
+    def _make_vocabulary(size: int, rng: random.Random) -> List[str]:
+        words: List[str] = []
+        seen: Set[str] = set()
+        while len(words) < size:
+            n_syllables = rng.randint(2, 4)
+            word = "".join(rng.choice(_CONSONANTS) + rng.choice(_VOWELS) for _ in range(n_syllables))
+            if word not in seen:
+                seen.add(word)
+                words.append(word)
+        return words
+
+    def _sentence(self, rng: random.Random, topic: List[str]) -> str:
+        n_words = rng.randint(8, 16)
+        words = [
+            rng.choice(topic) if rng.random() < 0.35
+            else rng.choices(self._common, weights=self._common_weights)[0]
+            for _ in range(n_words)
+        ]
+        return " ".join(words).capitalize() + "."
+
+    def _build(self, rng: random.Random) -> None:
+        fact_index = 0
+        for doc_index in range(self.n_docs):
+            topic_index = doc_index % self.n_topics
+            topic = self._topics[topic_index]
+            source = f"synthetic/doc{doc_index:05d}.md"
+            lines = [f"# {topic[0].capitalize()} {topic[1]} {doc_index}", ""]
+            for paragraph_index in range(self.paragraphs_per_doc):
+                start = fact_index * self.fact_terms
+                fact = self._rare[start:start + self.fact_terms]
+                fact_index += 1
+                self._facts.append({"terms": fact, "topic": topic_index, "source": source})
+
+                sentences = [self._sentence(rng, topic) for _ in range(self.sentences_per_paragraph)]
+                # 事实句以常用词结尾，避免稀有词紧挨句号
+                fact_sentence = " ".join(fact).capitalize() + " " + rng.choice(self._common[:20]) + "."
+                sentences.insert(rng.randint(0, len(sentences)), fact_sentence)
+                if paragraph_index % 3 == 0:
+                    lines += [f"## {rng.choice(topic).capitalize()} {paragraph_index}", ""]
+                lines += [" ".join(sentences), ""]
+            self.documents.append(
+                Document(page_content="\n".join(lines), metadata={"source": source, "topic": f"t{topic_index}"})
+            )
+
+    def queries(self, n_queries: int, seed: int = None) -> List[BenchQuery]:
+        """
+        生成查询集：随机选取事实，取其中 query_terms 个稀有词并混入两个主题词
+        参数：
+            n_queries: 查询数量（不超过事实总数）
+            seed: 随机种子，默认与语料相同
+        返回：
+            List[BenchQuery]: 查询列表
+        """
+        rng = random.Random(self.seed + 1 if seed is None else seed)
+        facts = rng.sample(self._facts, min(n_queries, len(self._facts)))
+        queries = []
+        for fact in facts:
+            words = rng.sample(fact["terms"], self.query_terms) + rng.sample(self._topics[fact["topic"]], 2)
+            rng.shuffle(words)
+            queries.append(BenchQuery(" ".join(words), list(fact["terms"]), fact["source"], self.min_terms))
+        return queries
+
+    @property
+    def total_chars(self) -> int:
+        return sum(len(doc.page_content) for doc in self.documents)
+
+    def describe(self) -> Dict:
+        return {
+            "n_docs": self.n_docs,
+            "paragraphs_per_doc": self.paragraphs_per_doc,
+            "sentences_per_paragraph": self.sentences_per_paragraph,
+            "n_topics": self.n_topics,
+            "fact_terms": self.fact_terms,
+            "query_terms": self.query_terms,
+            "min_relevant_terms": self.min_terms,
+            "seed": self.seed,
+            "total_chars": self.total_chars,
+        }
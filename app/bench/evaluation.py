@@ -0,0 +1,93 @@
+"""
+评估指标
+
+检索质量（recall@k、MRR）、结果冗余度、延迟分位数和进程峰值内存。
+"""
+
+import sys
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain.docstore.document import Document
+
+from app.bench.corpus import BenchQuery
+from app.services.context_packing import overlap_length
+
+
+def first_relevant_rank(query: BenchQuery, docs: Sequence[Document]) -> Optional[int]:
+    """第一个相关文本块的排名（从 1 开始），没有相关结果时返回 None"""
+    for rank, doc in enumerate(docs, 1):
+        if query.is_relevant(doc.page_content):
+            return rank
+    return None
+
+
+def retrieval_quality(ranks: Sequence[Optional[int]], ks: Sequence[int]) -> Dict[str, float]:
+    """
+    根据每条查询第一个相关结果的排名计算检索质量
+
+    每条查询只有一条标准事实，因此 recall@k 即前 k 个结果中至少命中一次的查询比例。
+    返回：
+        {"recall@1": ..., "recall@5": ..., "mrr": ...}
+    """
+    n = max(1, len(ranks))
+    quality = {f"recall@{k}": sum(1 for r in ranks if r is not None and r <= k) / n for k in ks}
+    quality["mrr"] = sum(1.0 / r for r in ranks if r is not None) / n
+    return quality
+
+
+def redundancy(docs: Sequence[Document]) -> float:
+    """
+    检索结果的冗余度：与排名更靠前的某个文本块重复、互相包含或首尾重叠的文本块所占比例
+    """
+    if len(docs) <= 1:
+        return 0.0
+    texts = [doc.page_content for doc in docs]
+    redundant = 0
+    for i, text in enumerate(texts[1:], 1):
+        if any(text in other or other in text or overlap_length(other, text) or overlap_length(text, other)
+               for other in texts[:i]):
+            redundant += 1
+    return redundant / len(texts)
+
+
+def latency_summary(seconds: Sequence[float]) -> Dict[str, float]:
+    """延迟统计（毫秒）：平均值与 p50/p95/p99"""
+    if not seconds:
+        return {"mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0}
+    values = np.asarray(seconds, dtype=np.float64) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"mean": float(values.mean()), "p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+
+def peak_rss_mb() -> Optional[float]:
+    """进程启动以来的峰值常驻内存（MB），不支持的平台返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def compare_results(current: Dict, baseline: Dict) -> List[Dict]:
+    """
+    对比两次基准结果中各检索模式的指标
+    返回：
+        [{"mode", "metric", "baseline", "current", "delta"}, ...]
+    """
+    rows = []
+    for mode, result in current.get("retrieval", {}).items():
+        previous = baseline.get("retrieval", {}).get(mode)
+        if previous is None:
+            continue
+        metrics = [(name, result["quality"][name], previous["quality"].get(name))
+                   for name in result["quality"]]
+        metrics += [(f"latency_{name}_ms", result["latency_ms"][name], previous["latency_ms"].get(name))
+                    for name in ("p50", "p95", "p99")]
+        metrics.append(("qps", result["qps"], previous.get("qps")))
+        for name, value, old in metrics:
+            if old is not None:
+                rows.append({"mode": mode, "metric": name, "baseline": old, "current": value, "delta": value - old})
+    return rows
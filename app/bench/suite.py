@@ -0,0 +1,424 @@
+"""
+检索基准
+
+在合成语料上依次运行：流式摄入（分块 + 嵌入 + 建索引），以及稠密、稀疏、混合、
+混合 + 重排序、混合 + MMR 五种检索模式，报告吞吐、延迟分位数、峰值内存、recall@k/MRR
+和结果冗余度；可选地对比不同向量量化方式的每块内存和稠密检索质量。
+"""
+
+import os
+import platform
+import tempfile
+import time
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from langchain.docstore.document import Document
+from langchain.embeddings.base import Embeddings
+
+from app.bench.corpus import BenchQuery, SyntheticCorpus
+from app.bench.evaluation import first_relevant_rank, latency_summary, peak_rss_mb, redundancy, retrieval_quality
+from app.core.metrics import METRICS, summarize_spans
+from app.services.context_compression import ExtractiveCompressor
+from app.services.context_packing import CONTEXT_SEPARATOR, ContextPacker
+from app.services.fusion import simple_fusion
+from app.services.ingest_pipeline import StreamingIngestPipeline
+from app.core.config import BINARY_SHORTLIST_FACTOR
+from app.services.quantization import build_binary_index, memory_per_vector, quantized_copy
+from app.services.retrievers.dense import DenseRetriever
+from app.services.retrievers.hybrid import HybridRetriever
+from app.services.retrievers.mmr import MMRRetriever
+from app.services.retrievers.sparse import SparseRetriever
+from app.services.vector_store_service import VectorStore, iter_stored_documents
+
+# 支持的检索模式
+BENCH_MODES = ("dense", "sparse", "hybrid", "rerank", "mmr")
+
+
+def environment_info() -> Dict[str, Any]:
+    """运行环境信息，写入结果文件便于对比"""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run_ingest(
+    corpus: SyntheticCorpus,
+    embeddings: Embeddings,
+    workdir: Path,
+    strategy_name: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    batch_size: int = 64,
+    dedup_mode: str = "off",
+) -> Dict[str, Any]:
+    """
+    用流式摄入流水线把合成语料写入临时目录中的索引
+    返回：
+        {"vector_store": 向量库, "report": 摄入指标}
+    """
+    pipeline = StreamingIngestPipeline(
+        embeddings,
+        strategy_name,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        n_workers=1,
+        batch_size=batch_size,
+        checkpoint_dir=workdir / "checkpoint",
+        resume=False,
+        dedup_mode=dedup_mode,
+        index_path=str(workdir / "index"),
+    )
+    start = time.perf_counter()
+    vector_store = pipeline.run(iter(corpus.documents))
+    elapsed = time.perf_counter() - start
+    stats = pipeline.stats
+    return {
+        "vector_store": vector_store,
+        "report": {
+            "strategy": strategy_name,
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "dedup_mode": dedup_mode,
+            "seconds": elapsed,
+            "chunks": stats.chunks,
+            "chunks_per_sec": stats.chunks / elapsed if elapsed > 0 else 0.0,
+            "chars_per_sec": corpus.total_chars / elapsed if elapsed > 0 else 0.0,
+            "peak_rss_mb": peak_rss_mb(),
+        },
+    }
+
+
+def build_searchers(
+    vector_store: VectorStore,
+    k: int,
+    modes: Sequence[str] = BENCH_MODES,
+    reranker: Any = None,
+    rerank_candidates: int = 20,
+    mmr_lambda: float = 0.5,
+) -> Dict[str, Callable[[str], List[Document]]]:
+    """
+    为每种检索模式创建 query -> 文本块列表 的函数
+
+    稀疏检索的语料取自向量库中保存的文本块；rerank 和 mmr 模式先用混合检索召回
+    rerank_candidates 个候选，再由重排序器或 MMR（λ = mmr_lambda）取前 k 个。
+    """
+    searchers: Dict[str, Callable[[str], List[Document]]] = {}
+    corpus = list(iter_stored_documents(vector_store)) if set(modes) - {"dense"} else []
+    sparse = SparseRetriever(corpus, k=k) if corpus else None
+
+    if "dense" in modes:
+        searchers["dense"] = DenseRetriever(vector_store, k=k).invoke
+    if "sparse" in modes:
+        searchers["sparse"] = sparse.invoke
+    if "hybrid" in modes:
+        hybrid = HybridRetriever(DenseRetriever(vector_store, k=k), sparse, partial(simple_fusion, top_k=k))
+        searchers["hybrid"] = hybrid.invoke
+    if "rerank" in modes or "mmr" in modes:
+        candidates = HybridRetriever(
+            DenseRetriever(vector_store, k=rerank_candidates),
+            SparseRetriever(corpus, k=rerank_candidates),
+            partial(simple_fusion, top_k=rerank_candidates),
+        )
+    if "rerank" in modes:
+        if reranker is None:
+            raise ValueError("rerank 模式需要提供重排序器")
+        searchers["rerank"] = lambda query: reranker.rerank(query, candidates.invoke(query), top_k=k)
+    if "mmr" in modes:
+        searchers["mmr"] = MMRRetriever(candidates, vector_store, k=k, lambda_mult=mmr_lambda).invoke
+    return searchers
+
+
+def run_queries(
+    search: Callable[[str], List[Document]],
+    queries: Sequence[BenchQuery],
+    ks: Sequence[int],
+    warmup: int = 3,
+    packer: Optional[ContextPacker] = None,
+    compressor: Optional[ExtractiveCompressor] = None,
+) -> Dict[str, Any]:
+    """
+    逐条执行查询，统计延迟、吞吐、检索质量、结果冗余度和各阶段平均耗时
+
+    提供 packer 时还会按 token 预算打包每次的检索结果（不计入检索延迟），
+    统计上下文 token 数和打包后仍包含相关文本的比例；同时提供 compressor 时
+    另外统计先压缩再打包的结果。
+    """
+    for query in queries[:warmup]:
+        search(query.text)
+
+    latencies: List[float] = []
+    ranks: List[Optional[int]] = []
+    stage_totals: Dict[str, float] = {}
+    retrieved: List[List[Document]] = []
+    start = time.perf_counter()
+    for query in queries:
+        with METRICS.collect() as spans:
+            query_start = time.perf_counter()
+            docs = search(query.text)
+            latencies.append(time.perf_counter() - query_start)
+        for stage, seconds in summarize_spans(spans).items():
+            stage_totals[stage] = stage_totals.get(stage, 0.0) + seconds
+        ranks.append(first_relevant_rank(query, docs))
+        retrieved.append(docs)
+    elapsed = time.perf_counter() - start
+
+    n = max(1, len(queries))
+    result = {
+        "queries": len(queries),
+        "qps": len(queries) / elapsed if elapsed > 0 else 0.0,
+        "latency_ms": latency_summary(latencies),
+        "quality": retrieval_quality(ranks, ks),
+        "redundancy": sum(redundancy(docs) for docs in retrieved) / n,
+        "stages_mean_ms": {stage: total * 1000 / n for stage, total in stage_totals.items()},
+    }
+    if packer is not None:
+        result["context"] = run_packing(packer, retrieved, queries, ks, compressor)
+    return result
+
+
+def run_packing(
+    packer: ContextPacker,
+    retrieved: Sequence[List[Document]],
+    queries: Sequence[BenchQuery],
+    ks: Sequence[int],
+    compressor: Optional[ExtractiveCompressor] = None,
+) -> Dict[str, Any]:
+    """
+    打包每条查询的检索结果，统计打包前后的上下文 token 数、打包耗时和检索质量
+
+    提供 compressor 时，compressed 字段为先压缩再打包的 token 数、压缩耗时和检索质量
+    （压缩后仍包含事实句即视为命中）。
+    """
+    unpacked_tokens, packed_tokens, seconds, ranks = [], [], [], []
+    dropped = 0
+    for query, docs in zip(queries, retrieved):
+        unpacked_tokens.append(packer.count_tokens(CONTEXT_SEPARATOR.join(doc.page_content for doc in docs)))
+        pack_start = time.perf_counter()
+        packed = packer.pack(docs)
+        seconds.append(time.perf_counter() - pack_start)
+        packed_tokens.append(packed.tokens)
+        dropped += packed.dropped
+        ranks.append(first_relevant_rank(query, packed.documents))
+    n = max(1, len(queries))
+    result = {
+        "budget": packer.token_budget,
+        "tokens_before_mean": sum(unpacked_tokens) / n,
+        "tokens_mean": sum(packed_tokens) / n,
+        "tokens_max": max(packed_tokens, default=0),
+        "dropped_mean": dropped / n,
+        "pack_ms": latency_summary(seconds),
+        "quality": retrieval_quality(ranks, ks),
+        "redundancy": sum(redundancy(docs) for docs in retrieved) / n,
+    }
+    if compressor is not None:
+        compressed_tokens, seconds, ranks = [], [], []
+        for query, docs in zip(queries, retrieved):
+            compress_start = time.perf_counter()
+            compressed = compressor.compress(query.text, docs)
+            seconds.append(time.perf_counter() - compress_start)
+            packed = packer.pack(compressed)
+            compressed_tokens.append(packed.tokens)
+            ranks.append(first_relevant_rank(query, packed.documents))
+        mean_tokens = sum(compressed_tokens) / n
+        result["compressed"] = {
+            "method": compressor.method,
+            "budget": compressor.token_budget,
+            "tokens_mean": mean_tokens,
+            "tokens_max": max(compressed_tokens, default=0),
+            "reduction": 1 - mean_tokens / result["tokens_mean"] if result["tokens_mean"] else 0.0,
+            "compress_ms": latency_summary(seconds),
+            "quality": retrieval_quality(ranks, ks),
+        "redundancy": sum(redundancy(docs) for docs in retrieved) / n,
+        }
+    return result
+
+
+def run_generation(
+    llm: Any,
+    search: Callable[[str], List[Document]],
+    queries: Sequence[BenchQuery],
+    packer: ContextPacker,
+    compressor: Optional[ExtractiveCompressor] = None,
+) -> Dict[str, Any]:
+    """
+    调用大语言模型测量生成延迟和提示词 token 数
+
+    提供 compressor 时，每条查询分别用未压缩和压缩后的上下文各调用一次（交替先后顺序，
+    减少缓存和网络波动带来的偏差），对比两者的提示词 token 数和延迟。
+    """
+    from langchain.chains.retrieval_qa.prompt import PROMPT
+
+    variants = {"baseline": None}
+    if compressor is not None:
+        variants["compressed"] = compressor
+    tokens: Dict[str, List[int]] = {name: [] for name in variants}
+    latencies: Dict[str, List[float]] = {name: [] for name in variants}
+    for index, query in enumerate(queries):
+        docs = search(query.text)
+        names = list(variants) if index % 2 == 0 else list(reversed(variants))
+        for name in names:
+            variant_docs = variants[name].compress(query.text, docs) if variants[name] else docs
+            packed = packer.pack(variant_docs)
+            prompt = PROMPT.format(context=packed.text, question=query.text)
+            tokens[name].append(packer.count_tokens(prompt))
+            start = time.perf_counter()
+            llm.invoke(prompt)
+            latencies[name].append(time.perf_counter() - start)
+    n = max(1, len(queries))
+    return {
+        name: {"prompt_tokens_mean": sum(tokens[name]) / n, "latency_ms": latency_summary(latencies[name])}
+        for name in variants
+    }
+
+
+def run_quantization(
+    vector_store: VectorStore,
+    queries: Sequence[BenchQuery],
+    ks: Sequence[int],
+    kinds: Sequence[str],
+    rescore_factor: int = 4,
+    shortlist_factor: int = BINARY_SHORTLIST_FACTOR,
+) -> Dict[str, Any]:
+    """
+    对比不同量化方式：同一批文档只替换索引，统计每个文本块的索引内存和稠密检索的延迟、质量
+
+    每种量化方式测量两次：只用量化索引，以及取 k × rescore_factor 个候选后用原始向量精确重算
+    （原始向量在磁盘上，计入 disk_bytes_per_chunk）。binary 只测量两阶段检索：在二值索引中按汉明距离
+    取 k × shortlist_factor 个候选，再用 float 向量重算（与 none 对比即为相对平坦索引的延迟和召回）。
+    返回：
+        {变体名: {"kind", "rescore_factor", "bytes_per_chunk", "disk_bytes_per_chunk", "latency_ms", "quality"}}
+    """
+    results = {}
+    for kind in kinds:
+        if kind == "binary":
+            store = build_binary_index(quantized_copy(vector_store, "none", rescore_factor=0))
+            retriever = DenseRetriever(store, k=max(ks), search_mode="binary", shortlist_factor=shortlist_factor)
+            result = run_queries(retriever.invoke, queries, ks)
+            results["binary+rescore"] = {
+                "kind": kind,
+                "rescore_factor": shortlist_factor,
+                # 二值编码每维 1 位
+                "bytes_per_chunk": (store.index.d + 7) // 8,
+                "disk_bytes_per_chunk": 4 * store.index.d,
+                "latency_ms": result["latency_ms"],
+                "quality": result["quality"],
+            }
+            continue
+        variants = [(kind, 0)]
+        if kind != "none" and rescore_factor > 0:
+            variants.append((f"{kind}+rescore", rescore_factor))
+        for name, factor in variants:
+            store = quantized_copy(vector_store, kind, rescore_factor=factor)
+            result = run_queries(DenseRetriever(store, k=max(ks)).invoke, queries, ks)
+            results[name] = {
+                "kind": kind,
+                "rescore_factor": factor,
+                "bytes_per_chunk": memory_per_vector(store),
+                "disk_bytes_per_chunk": 4 * store.index.d if factor else 0,
+                "latency_ms": result["latency_ms"],
+                "quality": result["quality"],
+            }
+    return results
+
+
+def run_bench(
+    corpus: SyntheticCorpus,
+    queries: Sequence[BenchQuery],
+    embeddings: Embeddings,
+    strategy_name: str = "递归分块",
+    chunk_size: int = 500,
+    chunk_overlap: int = 50,
+    ks: Sequence[int] = (1, 5, 10),
+    modes: Sequence[str] = BENCH_MODES,
+    reranker: Any = None,
+    rerank_candidates: int = 20,
+    dedup_mode: str = "off",
+    workdir: Optional[Path] = None,
+    on_stage: Optional[Callable[[str], None]] = None,
+    packer: Optional[ContextPacker] = None,
+    compressor: Optional[ExtractiveCompressor] = None,
+    llm: Any = None,
+    llm_queries: int = 20,
+    llm_mode: str = "hybrid",
+    mmr_lambda: float = 0.5,
+    quantization: Sequence[str] = (),
+    rescore_factor: int = 4,
+    shortlist_factor: int = BINARY_SHORTLIST_FACTOR,
+) -> Dict[str, Any]:
+    """
+    运行完整基准：摄入 + 各检索模式（+ 可选的生成延迟）
+
+    参数：
+        corpus: 合成语料
+        queries: 查询集
+        embeddings: 嵌入模型（通常为 HashingEmbeddings）
+        strategy_name: 分块策略
+        chunk_size, chunk_overlap: 分块参数
+        ks: 计算 recall@k 的 k 值，检索返回 max(ks) 个结果
+        modes: 要运行的检索模式
+        reranker: rerank 模式使用的重排序器
+        rerank_candidates: rerank 和 mmr 模式的召回候选数
+        dedup_mode: 摄入时的去重模式
+        workdir: 索引和检查点的临时目录，None 时自动创建并在结束后删除
+        on_stage: 每个阶段开始时的回调（用于打印进度）
+        packer: 上下文打包器，提供时统计各检索模式打包后的上下文 token 数
+        compressor: 上下文压缩器，提供时同时统计压缩后的 token 数和检索质量
+        llm: 大语言模型，提供时用 llm_mode 模式的前 llm_queries 条查询测量生成延迟
+        llm_queries: 测量生成延迟的查询数
+        llm_mode: 测量生成延迟使用的检索模式
+        mmr_lambda: mmr 模式的 λ
+        quantization: 要对比的量化方式（none/fp16/int8/pq/binary），为空时不对比
+        rescore_factor: 量化对比中精确重算的候选倍数
+        shortlist_factor: 二值检索的候选倍数
+    返回：
+        Dict: 可直接写入 JSON 的结果
+    """
+    notify = on_stage or (lambda stage: None)
+    unknown = set(modes) - set(BENCH_MODES)
+    if unknown:
+        raise ValueError(f"未知检索模式: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory(prefix="rag-bench-") as tmp:
+        workdir = Path(workdir or tmp)
+        notify("ingest")
+        ingest = run_ingest(corpus, embeddings, workdir, strategy_name, chunk_size, chunk_overlap,
+                            dedup_mode=dedup_mode)
+
+        searchers = build_searchers(ingest["vector_store"], max(ks), modes, reranker, rerank_candidates,
+                                    mmr_lambda=mmr_lambda)
+        retrieval = {}
+        for mode, search in searchers.items():
+            notify(mode)
+            retrieval[mode] = run_queries(search, queries, ks, packer=packer, compressor=compressor)
+
+        quantized = None
+        if quantization:
+            notify("quantization")
+            quantized = run_quantization(ingest["vector_store"], queries, ks, quantization, rescore_factor,
+                                         shortlist_factor=shortlist_factor)
+
+        generation = None
+        if llm is not None and searchers:
+            mode = llm_mode if llm_mode in searchers else next(iter(searchers))
+            notify(f"generation ({mode})")
+            subset = queries[:llm_queries]
+            generation = {
+                "mode": mode,
+                "queries": len(subset),
+                "variants": run_generation(llm, searchers[mode], subset, packer or ContextPacker(), compressor),
+            }
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": environment_info(),
+        "corpus": corpus.describe(),
+        "ingest": ingest["report"],
+        "retrieval": retrieval,
+        "quantization": quantized,
+        "generation": generation,
+        "peak_rss_mb": peak_rss_mb(),
+    }
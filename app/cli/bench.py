@@ -0,0 +1,301 @@
+import json
+import logging
+import time
+from pathlib import Path
+
+import click
+
+from app.core.config import (
+    BENCH_RESULTS_DIR, BINARY_SHORTLIST_FACTOR, CONTEXT_COMPRESSION_BUDGET, CONTEXT_TOKEN_BUDGET, DEFAULT_CHUNK_OVERLAP,
+    DEFAULT_CHUNK_SIZE, LLM_MODEL_NAME,
+)
+
+
+def _parse_ks(value: str):
+    try:
+        ks = sorted({int(k) for k in value.split(",") if k.strip()})
+    except ValueError:
+        raise click.BadParameter("应为逗号分隔的正整数，例如 1,5,10")
+    if not ks or ks[0] <= 0:
+        raise click.BadParameter("应为逗号分隔的正整数，例如 1,5,10")
+    return ks
+
+
+def _display_pad(text: str, width: int, align: str = "<") -> str:
+    """按终端显示宽度补齐（中日韩字符占两列）"""
+    display_width = sum(2 if ord(ch) > 0x2E80 else 1 for ch in text)
+    padding = " " * max(width - display_width, 1 if align == "<" else 0)
+    return text + padding if align == "<" else padding + text
+
+
+def _write_results(results: dict, output: str, prefix: str) -> Path:
+    """写入结果 JSON；未指定路径时写到 BENCH_RESULTS_DIR 下带时间戳的文件"""
+    if output:
+        path = Path(output)
+    else:
+        path = BENCH_RESULTS_DIR / f"{prefix}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    return path
+
+
+@click.command(name="bench", help="在确定性的合成语料上运行摄入和检索基准，输出吞吐、延迟分位数、峰值内存和 recall@k/MRR。")
+@click.option("--docs", "n_docs", default=200, show_default=True, type=click.IntRange(min=1), help="合成文档数量。")
+@click.option("--paragraphs", default=8, show_default=True, type=click.IntRange(min=1),
+              help="每篇文档的段落数（每段一条可被查询的事实）。")
+@click.option("--queries", "n_queries", default=200, show_default=True, type=click.IntRange(min=1), help="查询数量。")
+@click.option("--seed", default=42, show_default=True, type=int, help="随机种子，相同种子生成相同的语料和查询。")
+@click.option("--strategy", default="递归分块", show_default=True, help="分块策略名称（见 ChunkingStrategyFactory）。")
+@click.option("--chunk-size", default=DEFAULT_CHUNK_SIZE, show_default=True, type=click.IntRange(min=1), help="文本块大小。")
+@click.option("--chunk-overlap", default=DEFAULT_CHUNK_OVERLAP, show_default=True, type=click.IntRange(min=0),
+              help="文本块重叠大小。")
+@click.option("--modes", default="dense,sparse,hybrid,rerank,mmr", show_default=True,
+              help="要运行的检索模式，逗号分隔。")
+@click.option("--ks", default="1,5,10", show_default=True, help="计算 recall@k 的 k 值，逗号分隔。")
+@click.option("--reranker", type=click.Choice(["keyword", "bge"]), default="keyword", show_default=True,
+              help="rerank 模式使用的重排序器：关键词覆盖率（无需模型）或本地 BGE 模型。")
+@click.option("--mmr-lambda", default=0.5, show_default=True, type=click.FloatRange(0, 1),
+              help="mmr 模式的 λ（1 只看相关性，越小越偏向多样性）。")
+@click.option("--quantization", default="", show_default=True,
+              help="对比的向量量化方式，逗号分隔（如 none,fp16,int8,pq,binary），报告每块内存和稠密检索的 recall@k；"
+                   "binary 为二值索引粗筛 + float 向量重算的两阶段检索。")
+@click.option("--rescore-factor", default=4, show_default=True, type=click.IntRange(min=0),
+              help="量化对比中，取 k × 该倍数的候选后用原始向量精确重算；0 表示不测量重算。")
+@click.option("--binary-shortlist", default=BINARY_SHORTLIST_FACTOR, show_default=True, type=click.IntRange(min=1),
+              help="binary 两阶段检索中，按汉明距离取 k × 该倍数的候选。")
+@click.option("--dedup", type=click.Choice(["off", "exact", "minhash"]), default="off", show_default=True,
+              help="摄入时的去重模式。")
+@click.option("--context-budget", default=CONTEXT_TOKEN_BUDGET, show_default=True, type=click.IntRange(min=-1),
+              help="按该 token 预算打包每次的检索结果并统计上下文 token 数，0 表示不限制，-1 表示不统计。")
+@click.option("--compress", type=click.Choice(["off", "bm25", "embedding"]), default="off", show_default=True,
+              help="同时统计抽取式上下文压缩后的 token 数和检索质量（embedding 方式使用伪嵌入）。")
+@click.option("--compress-budget", default=CONTEXT_COMPRESSION_BUDGET, show_default=True, type=click.IntRange(min=0),
+              help="压缩后保留句子的 token 预算。")
+@click.option("--llm", "llm_provider", default=None,
+              help="用该模型提供者（如 tongyi、ollama、fake）测量生成延迟和提示词 token 数，默认不调用模型。")
+@click.option("--llm-queries", default=20, show_default=True, type=click.IntRange(min=1),
+              help="测量生成延迟的查询数（使用混合检索的结果）。")
+@click.option("--output", default=None, help="结果 JSON 路径，默认写入 bench_results/ 目录。")
+@click.option("--baseline", type=click.Path(exists=True, dir_okay=False), default=None,
+              help="与之前的结果 JSON 对比并显示差异。")
+def bench(n_docs, paragraphs, n_queries, seed, strategy, chunk_size, chunk_overlap, modes, ks, reranker, mmr_lambda,
+          quantization, rescore_factor, binary_shortlist, dedup,
+          context_budget, compress, compress_budget, llm_provider, llm_queries, output, baseline):
+    """
+    运行检索基准。嵌入使用本地哈希伪嵌入，不需要 Ollama 或任何 API 密钥。
+    """
+    from app.bench import SyntheticCorpus, compare_results, run_bench
+    from app.models.fake_embeddings import HashingEmbeddings
+    from app.services.context_compression import create_compressor
+    from app.services.context_packing import ContextPacker
+
+    ks = _parse_ks(ks)
+    modes = [mode.strip() for mode in modes.split(",") if mode.strip()]
+    quantization = [kind.strip() for kind in quantization.split(",") if kind.strip()]
+    unknown = set(quantization) - {"none", "fp16", "int8", "pq", "binary"}
+    if unknown:
+        click.secho(f"未知量化方式: {', '.join(sorted(unknown))}，可选值: none, fp16, int8, pq, binary", fg="red")
+        return
+    packer = ContextPacker(token_budget=context_budget) if context_budget >= 0 else None
+    compressor = create_compressor(compress, embeddings=HashingEmbeddings(), token_budget=compress_budget)
+    if compressor is not None and packer is None:
+        packer = ContextPacker(token_budget=0)
+
+    llm = None
+    if llm_provider:
+        from app.core.exceptions import ServiceError
+        from app.services.container import ServiceContainer
+        try:
+            llm = ServiceContainer(llm_provider_name=llm_provider, llm_model_name=LLM_MODEL_NAME).llm()
+        except ServiceError as e:
+            click.secho(str(e), fg="red")
+            return
+
+    reranker_instance = None
+    if "rerank" in modes:
+        if reranker == "bge":
+            from app.services.rerankers.local_bge_reranker import LocalBGEReranker
+            reranker_instance = LocalBGEReranker()
+        else:
+            from app.services.rerankers.keyword_reranker import KeywordReranker
+            reranker_instance = KeywordReranker()
+
+    click.secho(f"正在生成合成语料（{n_docs} 篇文档，种子 {seed}）...", fg="blue")
+    corpus = SyntheticCorpus(n_docs=n_docs, paragraphs_per_doc=paragraphs, seed=seed)
+    queries = corpus.queries(n_queries)
+
+    try:
+        results = run_bench(
+            corpus, queries, HashingEmbeddings(),
+            strategy_name=strategy, chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+            ks=ks, modes=modes, reranker=reranker_instance, dedup_mode=dedup,
+            on_stage=lambda stage: click.secho(f"正在运行: {stage}", fg="blue"), packer=packer,
+            compressor=compressor, llm=llm, llm_queries=llm_queries, mmr_lambda=mmr_lambda,
+            quantization=quantization, rescore_factor=rescore_factor, shortlist_factor=binary_shortlist,
+        )
+    except ValueError as e:
+        click.secho(str(e), fg="red")
+        return
+    results["config"] = {"reranker": reranker if "rerank" in modes else None, "queries": len(queries),
+                         "mmr_lambda": mmr_lambda if "mmr" in modes else None}
+
+    ingest = results["ingest"]
+    click.secho("\n📥 摄入", fg="green", bold=True)
+    click.echo(f"{ingest['chunks']} 个文本块，耗时 {ingest['seconds']:.2f}s，"
+               f"{ingest['chunks_per_sec']:.0f} 块/秒，{ingest['chars_per_sec'] / 1e6:.2f} M 字符/秒")
+
+    click.secho("\n🔎 检索", fg="green", bold=True)
+    quality_names = [f"recall@{k}" for k in ks] + ["mrr"]
+    header = f"{'模式':<8}{'QPS':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}" + "".join(f"{n:>11}" for n in quality_names)
+    click.echo(header + _display_pad("冗余", 8, ">"))
+    for mode, result in results["retrieval"].items():
+        latency = result["latency_ms"]
+        row = f"{mode:<10}{result['qps']:>9.0f}{latency['p50']:>9.2f}{latency['p95']:>9.2f}{latency['p99']:>9.2f}"
+        row += "".join(f"{result['quality'][n]:>11.3f}" for n in quality_names)
+        click.echo(row + f"{result['redundancy']:>8.0%}")
+    if packer is not None:
+        budget = f"{context_budget} tokens" if context_budget else "不限"
+        click.secho(f"\n📦 上下文打包（预算 {budget}）", fg="green", bold=True)
+        columns = [("打包前", 9), ("打包后", 9), ("最大", 8), ("丢弃块", 8), ("打包 ms", 9)]
+        click.echo(f"{'模式':<8}" + "".join(_display_pad(title, width, ">") for title, width in columns)
+                   + "".join(f"{n:>11}" for n in quality_names))
+        for mode, result in results["retrieval"].items():
+            context = result["context"]
+            row = (f"{mode:<10}{context['tokens_before_mean']:>9.0f}{context['tokens_mean']:>9.0f}"
+                   f"{context['tokens_max']:>8}{context['dropped_mean']:>8.2f}{context['pack_ms']['mean']:>9.2f}")
+            row += "".join(f"{context['quality'][n]:>11.3f}" for n in quality_names)
+            click.echo(row)
+    if compressor is not None:
+        click.secho(f"\n✂️ 上下文压缩（{compress}，保留 {compress_budget} tokens）", fg="green", bold=True)
+        columns = [("压缩后", 9), ("最大", 8), ("减少", 8), ("压缩 ms", 9)]
+        click.echo(f"{'模式':<8}" + "".join(_display_pad(title, width, ">") for title, width in columns)
+                   + "".join(f"{n:>11}" for n in quality_names))
+        for mode, result in results["retrieval"].items():
+            compressed = result["context"]["compressed"]
+            row = (f"{mode:<10}{compressed['tokens_mean']:>9.0f}{compressed['tokens_max']:>8}"
+                   f"{compressed['reduction']:>8.0%}{compressed['compress_ms']['mean']:>9.2f}")
+            row += "".join(f"{compressed['quality'][n]:>11.3f}" for n in quality_names)
+            click.echo(row)
+    quantized = results.get("quantization")
+    if quantized:
+        click.secho(f"\n🗜️ 向量量化（稠密检索）", fg="green", bold=True)
+        columns = [("字节/块", 10), ("磁盘/块", 10), ("p50 ms", 9)]
+        click.echo(f"{'存储':<14}" + "".join(_display_pad(title, width, ">") for title, width in columns)
+                   + "".join(f"{n:>11}" for n in quality_names))
+        for name, variant in quantized.items():
+            row = (f"{name:<16}{variant['bytes_per_chunk']:>10.0f}{variant['disk_bytes_per_chunk']:>10}"
+                   f"{variant['latency_ms']['p50']:>9.2f}")
+            row += "".join(f"{variant['quality'][n]:>11.3f}" for n in quality_names)
+            click.echo(row)
+    generation = results.get("generation")
+    if generation:
+        click.secho(f"\n🤖 生成（{llm_provider}，{generation['mode']} 检索，{generation['queries']} 条查询）",
+                    fg="green", bold=True)
+        click.echo(f"{'上下文':<10}{'提示词':>10}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+        for name, variant in generation["variants"].items():
+            latency = variant["latency_ms"]
+            click.echo(f"{name:<12}{variant['prompt_tokens_mean']:>11.0f}{latency['p50']:>10.1f}"
+                       f"{latency['p95']:>10.1f}{latency['mean']:>10.1f}")
+    if results["peak_rss_mb"] is not None:
+        click.echo(f"\n峰值内存: {results['peak_rss_mb']:.0f} MB")
+
+    if baseline:
+        previous = json.loads(Path(baseline).read_text(encoding="utf-8"))
+        click.secho(f"\n📊 与 {baseline} 对比", fg="green", bold=True)
+        for row in compare_results(results, previous):
+            color = None
+            if row["metric"].startswith(("recall", "mrr", "qps")) and row["delta"] < 0:
+                color = "red"
+            elif row["metric"].startswith("latency") and row["delta"] > 0:
+                color = "red"
+            click.secho(f"{row['mode']:<8}{row['metric']:<18}{row['baseline']:>12.4f} -> {row['current']:>12.4f}"
+                        f"  ({row['delta']:+.4f})", fg=color)
+
+    path = _write_results(results, output, "bench")
+    click.secho(f"\n✅ 结果已写入 {path}", fg="green")
+
+
+@click.command(name="bench-chunking", help="在同一语料上对比所有已注册的分块策略：耗时、吞吐、峰值内存、文本块长度分布和检索召回率。")
+@click.option("--docs-dir", type=click.Path(exists=True, file_okay=False), default=None,
+              help="使用该目录中的 PDF/Markdown 文档（自动生成查询）；默认使用合成语料。")
+@click.option("--docs", "n_docs", default=100, show_default=True, type=click.IntRange(min=1),
+              help="合成文档数量（未指定 --docs-dir 时）。")
+@click.option("--queries", "n_queries", default=200, show_default=True, type=click.IntRange(min=1), help="查询数量。")
+@click.option("--seed", default=42, show_default=True, type=int, help="随机种子。")
+@click.option("--strategy", "strategies", multiple=True, help="只测量指定策略，可重复使用；默认测量全部策略。")
+@click.option("--chunk-size", default=DEFAULT_CHUNK_SIZE, show_default=True, type=click.IntRange(min=1), help="文本块大小。")
+@click.option("--chunk-overlap", default=DEFAULT_CHUNK_OVERLAP, show_default=True, type=click.IntRange(min=0),
+              help="文本块重叠大小。")
+@click.option("--length-unit", type=click.Choice(["chars", "tokens"]), default="chars", show_default=True,
+              help="文本块大小的计量单位。")
+@click.option("--ks", default="1,5", show_default=True, help="计算 recall@k 的 k 值，逗号分隔。")
+@click.option("--repeat", default=1, show_default=True, type=click.IntRange(min=1), help="计时重复次数，取最快一次。")
+@click.option("--output", default=None, help="结果 JSON 路径，默认写入 bench_results/ 目录。")
+def bench_chunking(docs_dir, n_docs, n_queries, seed, strategies, chunk_size, chunk_overlap, length_unit, ks, repeat,
+                   output):
+    """
+    对比所有已注册的分块策略。检索召回率使用本地哈希伪嵌入和 BM25 计算。
+    """
+    from app.bench import SyntheticCorpus
+    from app.bench.chunking import bench_chunking as run_chunking_bench
+    from app.bench.corpus import sample_queries
+    from app.bench.suite import environment_info
+    from app.models.fake_embeddings import HashingEmbeddings
+
+    ks = _parse_ks(ks)
+    # 固定大小分块找不到分隔符时会对每个超长文本块打印警告，基准中不需要
+    logging.getLogger("langchain_text_splitters.base").setLevel(logging.ERROR)
+    if docs_dir:
+        from app.services.document_service import iter_documents
+        click.secho(f"正在加载 {docs_dir} 中的文档...", fg="blue")
+        documents = list(iter_documents(Path(docs_dir)))
+        if not documents:
+            click.secho(f"在 {docs_dir} 未找到 PDF 或 Markdown 文件。", fg="red")
+            return
+        queries = sample_queries(documents, n_queries, seed=seed)
+        corpus_info = {"docs_dir": str(docs_dir), "documents": len(documents)}
+    else:
+        click.secho(f"正在生成合成语料（{n_docs} 篇文档，种子 {seed}）...", fg="blue")
+        corpus = SyntheticCorpus(n_docs=n_docs, seed=seed)
+        documents = corpus.documents
+        queries = corpus.queries(n_queries)
+        corpus_info = corpus.describe()
+    corpus_info["total_chars"] = sum(len(doc.page_content) for doc in documents)
+    corpus_info["queries"] = len(queries)
+
+    results = run_chunking_bench(
+        documents, queries, HashingEmbeddings(), chunk_size, chunk_overlap,
+        length_unit=length_unit, ks=ks, strategies=list(strategies) or None, repeat=repeat,
+        on_strategy=lambda name: click.secho(f"正在测量: {name}", fg="blue"),
+    )
+
+    k = max(ks)
+    click.secho(f"\n📏 分块策略对比（chunk_size={chunk_size} {length_unit}，chunk_overlap={chunk_overlap}）",
+                fg="green", bold=True)
+    columns = [("耗时 s", 9), ("M字符/s", 9), ("峰值MB", 9), ("块数", 8), ("平均长度", 9), ("p95长度", 9),
+               (f"稠密R@{k}", 10), ("稠密MRR", 9), (f"BM25 R@{k}", 10)]
+    click.echo(_display_pad("策略", 16) + "".join(_display_pad(title, width, ">") for title, width in columns))
+    for result in results:
+        name = _display_pad(result["strategy"], 16)
+        if "error" in result:
+            error = result["error"].splitlines()[0] if result["error"] else ""
+            click.secho(f"{name}失败：{error[:100]}", fg="yellow")
+            continue
+        dense = result.get("dense", {})
+        sparse = result.get("sparse", {})
+        click.echo(
+            f"{name}{result['seconds']:>9.3f}{result['chars_per_sec'] / 1e6:>9.2f}"
+            f"{result['peak_memory_mb']:>9.1f}{result['chunks']:>8}{result['chunk_chars']['mean']:>9.0f}"
+            f"{result['chunk_chars']['p95']:>9.0f}{dense.get(f'recall@{k}', 0):>10.3f}{dense.get('mrr', 0):>9.3f}"
+            f"{sparse.get(f'recall@{k}', 0):>10.3f}"
+        )
+
+    path = _write_results({
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": environment_info(),
+        "corpus": corpus_info,
+        "config": {"chunk_size": chunk_size, "chunk_overlap": chunk_overlap, "length_unit": length_unit,
+                   "ks": ks, "repeat": repeat},
+        "strategies": results,
+    }, output, "bench-chunking")
+    click.secho(f"\n✅ 结果已写入 {path}", fg="green")
@@ -1,23 +1,65 @@
+import math
+
 import click
-import questionary
-from langchain.text_splitter import (
-    RecursiveCharacterTextSplitter,
-    CharacterTextSplitter,
+
+from app.core.config import (
+    DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP, DOCS_DIR, INGEST_BATCH_SIZE, CHUNKING_WORKERS,
+    DEDUP_MODE, DEDUP_THRESHOLD, VECTOR_STORE_SHARDS, VECTOR_STORE_SHARD_BY, VECTOR_STORE_QUANTIZATION,
+    VECTOR_STORE_BINARY_INDEX,
 )
+from app.core.exceptions import ServiceError
 
-from app.core.config import DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP, DOCS_DIR
-from app.services import document_service, vector_store_service, qa_service
-import os
+# 分块过程中写入的元数据，不能被标签覆盖
+RESERVED_METADATA_KEYS = ("source", "page", "start_index", "end_index", "header_path", "duplicate_sources")
 
 
-@click.command(name="ingest", help="从 'docs' 目录摄入 PDF 文档到向量库。")
-def ingest():
+@click.command(name="ingest", help="从 'docs' 目录摄入 PDF 和 Markdown 文档到向量库。")
+@click.option("--resume/--no-resume", default=True, show_default=True,
+              help="是否从上次中断的检查点继续摄入。")
+@click.option("--batch-size", type=click.IntRange(min=1), default=INGEST_BATCH_SIZE, show_default=True,
+              help="每批送入嵌入模型的文本块数量。")
+@click.option("--workers", type=click.IntRange(min=1), default=CHUNKING_WORKERS, show_default=True,
+              help="并行分块的工作进程数。")
+@click.option("--length-unit", type=click.Choice(["chars", "tokens"]), default="chars", show_default=True,
+              help="文本块大小的计量单位：字符数或 token 数（按嵌入模型的分词器计算，见 EMBEDDING_TOKENIZER）。")
+@click.option("--dedup", type=click.Choice(["off", "exact", "minhash"]), default=DEDUP_MODE, show_default=True,
+              help="嵌入前的文本块去重：不去重、只去除完全重复、同时去除近似重复（minhash，需显式开启）。")
+@click.option("--dedup-threshold", type=click.FloatRange(min=0.0, max=1.0, min_open=True), default=DEDUP_THRESHOLD,
+              show_default=True, help="近似重复的 Jaccard 相似度阈值（仅 minhash 模式）。")
+@click.option("--tag", "tag_expressions", multiple=True, metavar="KEY=VALUE",
+              help="写入每个文本块元数据的标签，可重复使用；查询时可用 --filter KEY=VALUE 过滤。")
+@click.option("--shards", type=click.IntRange(min=1), default=VECTOR_STORE_SHARDS, show_default=True,
+              help="向量库分片数，大于 1 时各分片独立保存并在检索时并发搜索。")
+@click.option("--shard-by", type=click.Choice(["source", "batch"]), default=VECTOR_STORE_SHARD_BY, show_default=True,
+              help="分片方式：按来源文件哈希或按摄入批次轮转。")
+@click.option("--quantize", type=click.Choice(["none", "fp16", "int8", "pq"]), default=VECTOR_STORE_QUANTIZATION,
+              show_default=True, help="向量索引的量化方式，减少每个文本块占用的内存。")
+@click.option("--binary-index/--no-binary-index", default=VECTOR_STORE_BINARY_INDEX, show_default=True,
+              help="同时建立二值索引（每维 1 位），查询时可用 --search-mode binary 先按汉明距离粗筛再精确重算。")
+def ingest(resume, batch_size, workers, length_unit, dedup, dedup_threshold, tag_expressions, shards, shard_by,
+           quantize, binary_index):
     """
-    从 'docs' 目录摄入 PDF 文档到向量库。
+    从 'docs' 目录摄入 PDF 和 Markdown 文档到向量库。
     """
-    if not any(f.endswith('.pdf') for f in os.listdir(DOCS_DIR)):
-        click.secho(f"在 {DOCS_DIR} 未找到 PDF 文件。请添加一些 PDF 文件后再试。", fg="red")
-        return
+    # 分块、嵌入和向量库相关的依赖较重，只在执行命令时导入，保证 --help 等操作快速启动
+    import questionary
+    from app.services import document_service, qa_service
+    from app.services.ingest_pipeline import StreamingIngestPipeline
+    from app.services.metadata_filter import parse_value
+
+    tags = {}
+    for expression in tag_expressions:
+        key, sep, value = expression.partition("=")
+        key = key.strip()
+        if not sep or not key:
+            raise click.BadParameter(f"无法解析标签: {expression}，应为 KEY=VALUE 形式", param_hint="--tag")
+        if key in RESERVED_METADATA_KEYS:
+            raise click.BadParameter(f"标签名 {key} 与内置元数据冲突，请换一个名称。", param_hint="--tag")
+        # 与 query --filter 使用相同的类型解析，数值标签按数值写入
+        tags[key] = parse_value(value.strip())
+
+    if not document_service.list_document_files():
+        raise click.ClickException(f"在 {DOCS_DIR} 未找到 PDF 或 Markdown 文件。请添加一些文档后再试。")
 
     # 获取可用的分块策略
     available_strategies = document_service.get_available_chunking_strategies()
@@ -35,7 +77,7 @@ def ingest():
 
     if not selected_strategy:
         click.echo("未选择分割器，操作中止。")
-        return
+        raise click.Abort()
     
     # 提取策略名称
     strategy_name = selected_strategy.split(" - ")[0]
@@ -48,7 +90,7 @@ def ingest():
 
     if not chunk_size:
         click.echo("未输入文本块大小，操作中止。")
-        return
+        raise click.Abort()
 
     chunk_overlap = questionary.text(
         "请输入文本块重叠大小:",
@@ -58,27 +100,64 @@ def ingest():
 
     if not chunk_overlap:
         click.echo("未输入文本块重叠大小，操作中止。")
-        return
+        raise click.Abort()
 
     chunk_size = int(chunk_size)
     chunk_overlap = int(chunk_overlap)
 
-    click.secho("正在加载文档...", fg="blue")
-    docs = document_service.load_documents()
+    click.secho("正在加载嵌入模型...", fg="blue")
+    embeddings = qa_service.load_embedding_model()
+    # 按 token 计长时使用与嵌入模型一致的分词器
+    encoding_name = qa_service.get_container().embedding_model_provider().token_encoding()
+    if length_unit == "tokens":
+        click.secho(f"文本块按 token 计长，编码：{encoding_name}", fg="blue")
+
+    def report(stats):
+        click.echo(f"  已写入 {stats.batches} 批，共 {stats.chunks} 个文本块（已读取 {stats.pages} 页）")
 
-    click.secho(f"正在使用 {strategy_name} 分割文档...", fg="blue")
-    chunks = document_service.split_documents_with_strategy_name(
-        docs,
+    pipeline = StreamingIngestPipeline(
+        embeddings,
         strategy_name=strategy_name,
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap,
+        length_unit=length_unit,
+        encoding_name=encoding_name,
+        n_workers=workers,
+        batch_size=batch_size,
+        resume=resume,
+        fingerprint_extra={"corpus": document_service.get_corpus_signature()},
+        on_batch=report,
+        dedup_mode=dedup,
+        dedup_threshold=dedup_threshold,
+        tags=tags,
+        n_shards=shards,
+        shard_by=shard_by,
+        quantization=quantize,
+        binary_index=binary_index,
     )
-    click.secho(f"已创建 {len(chunks)} 个文本块。", fg="green")
-
-    click.secho("正在加载嵌入模型...", fg="blue")
-    embeddings = qa_service.load_embedding_model()
 
-    click.secho("正在创建并保存向量库...", fg="blue")
-    vector_store_service.create_and_save_vector_store(chunks, embeddings)
+    click.secho(f"正在使用 {strategy_name} 流式分割、嵌入并写入向量库...", fg="blue")
+    try:
+        vector_store = pipeline.run(document_service.iter_documents())
+    except ServiceError as e:
+        # 以非零状态退出，脚本可以据此判断摄入失败
+        raise click.ClickException(str(e)) from e
 
-    click.secho("数据摄入完成！", fg="green") 
\ No newline at end of file
+    if pipeline.stats.skipped_batches:
+        click.secho(f"已从检查点恢复，跳过 {pipeline.stats.skipped_batches} 个已提交的批次。", fg="cyan")
+    click.secho(f"已创建 {pipeline.stats.chunks} 个文本块。", fg="green")
+    stats = pipeline.stats
+    removed = stats.exact_duplicates + stats.near_duplicates
+    if removed:
+        batches_without_dedup = math.ceil((stats.embedded_chunks + removed) / batch_size)
+        click.secho(
+            f"去重移除 {removed} 个文本块（完全重复 {stats.exact_duplicates}，近似重复 {stats.near_duplicates}），"
+            f"节省 {removed} 次文本嵌入、{batches_without_dedup - stats.embedding_batches} 次批量嵌入调用。",
+            fg="cyan",
+        )
+    if quantize != "none":
+        from app.services.quantization import memory_per_vector
+        click.secho(f"向量索引已量化为 {quantize}，每个文本块约 {memory_per_vector(vector_store):.0f} 字节。", fg="cyan")
+    if binary_index:
+        click.secho("已建立二值索引，查询时使用 --search-mode binary 启用两阶段检索。", fg="cyan")
+    click.secho("数据摄入完成！", fg="green")
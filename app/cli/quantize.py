@@ -0,0 +1,38 @@
+import click
+
+from app.core.config import FAISS_INDEX_PATH, VECTOR_STORE_RESCORE_FACTOR
+from app.core.exceptions import ServiceError
+
+
+@click.command(name="quantize", help="把已有向量库转换为量化存储（fp16/int8/pq），无需重新摄入；none 恢复为 float32 索引。")
+@click.argument("kind", type=click.Choice(["none", "fp16", "int8", "pq"]))
+@click.option("--rescore-factor", default=VECTOR_STORE_RESCORE_FACTOR, show_default=True, type=click.IntRange(min=0),
+              help="检索时先取 k × 该倍数的候选，再用保存的 float32 原始向量精确重算分数；0 表示不保存原始向量。")
+def quantize(kind, rescore_factor):
+    """
+    量化向量库索引并保存到原目录。
+    """
+    from app.services.container import get_container
+    from app.services.quantization import memory_per_vector, quantize_vector_store
+    from app.services.vector_store_service import save_vector_store
+
+    try:
+        click.secho("正在加载向量库...", fg="blue")
+        vector_store = get_container().vector_store()
+    except ServiceError as e:
+        click.secho(str(e), fg="red")
+        return
+    if not vector_store:
+        click.secho("未找到向量库。请先运行 'python main.py ingest'。", fg="red")
+        return
+
+    before = memory_per_vector(vector_store)
+    click.secho(f"正在转换为 {kind}...", fg="blue")
+    try:
+        quantize_vector_store(vector_store, kind, rescore_factor=rescore_factor)
+    except ValueError as e:
+        click.secho(str(e), fg="red")
+        return
+    save_vector_store(vector_store, FAISS_INDEX_PATH)
+    click.secho(f"✅ 每个文本块 {before:.0f} -> {memory_per_vector(vector_store):.0f} 字节，已保存到 {FAISS_INDEX_PATH}",
+                fg="green")
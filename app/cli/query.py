@@ -1,19 +1,43 @@
 import click
-import questionary
-from app.services import qa_service, vector_store_service
+from app.core.config import CONTEXT_COMPRESSION, DENSE_SEARCH_MODE, MMR_LAMBDA
 from app.core.exceptions import ServiceError
 
 @click.command(name="query", help="使用用户提供的问题查询向量库。")
-def query():
+@click.option("--filter", "filters", multiple=True, metavar="KEY=VALUE",
+              help="按元数据预过滤检索范围，可重复使用。支持 source=a.pdf、source=a.pdf,b.pdf、"
+                   "page=3..7、key!=value 等写法；source 按文件名或相对路径（如 docs/a.pdf）匹配。")
+@click.option("--timings", is_flag=True, default=False,
+              help="每次回答后显示各阶段耗时（嵌入、向量检索、BM25、融合、重排序、模型调用）。")
+@click.option("--compress", type=click.Choice(["off", "bm25", "embedding"]), default=CONTEXT_COMPRESSION,
+              show_default=True, help="抽取式上下文压缩：只把与问题相关的句子发送给大语言模型。")
+@click.option("--mmr-lambda", default=MMR_LAMBDA, show_default=True, type=click.FloatRange(0, 1),
+              help="MMR 多样化的 λ（1 只看相关性，越小越偏向多样性），0 表示不启用。")
+@click.option("--search-mode", type=click.Choice(["flat", "binary"]), default=DENSE_SEARCH_MODE, show_default=True,
+              help="稠密检索方式：flat 直接检索 float 索引；binary 先用二值索引按汉明距离粗筛，再用 float 向量重算"
+                   "（需摄入时 --binary-index）。")
+def query(filters, timings, compress, mmr_lambda, search_mode):
     """
     使用用户提供的问题查询向量库。
     """
+    # 模型和向量库相关的依赖较重，只在执行命令时导入
+    import questionary
+    from app.services import qa_service
+    from app.services.container import get_container
+    from app.services.metadata_filter import MetadataFilter
+
+    try:
+        metadata_filter = MetadataFilter.from_expressions(filters)
+    except ValueError as e:
+        click.secho(str(e), fg="red")
+        return
     try:
+        # 嵌入模型、向量库、大语言模型和重排序器由进程级容器创建一次，问答链直接复用
+        container = get_container()
         click.secho("正在加载嵌入模型...", fg="blue")
-        embeddings = qa_service.load_embedding_model()
+        container.embeddings()
 
         click.secho("正在加载向量库...", fg="blue")
-        vector_store = vector_store_service.load_vector_store(embeddings)
+        vector_store = container.vector_store()
 
         if not vector_store:
             click.secho(
@@ -46,17 +70,21 @@ def query():
 
         click.secho(f"已选择检索模式: {retrieval_mode}", fg="cyan")
         click.secho(f"重排序功能: {'已启用' if use_rerank else '未启用'}", fg="cyan")
+        if metadata_filter is not None:
+            click.secho(f"元数据过滤: {', '.join(filters)}", fg="cyan")
 
         click.secho("正在加载大语言模型...", fg="blue")
         try:
-            llm = qa_service.load_llm()
+            container.llm()
         except Exception as e:
             click.secho("加载大语言模型失败... 错误信息:"+str(e), fg="red")
             return
 
         click.secho("正在创建问答链...", fg="blue")
         try:
-            qa_chain = qa_service.create_qa_chain(vector_store, retrieval_mode=retrieval_mode, use_rerank=use_rerank)
+            qa_chain = qa_service.create_qa_chain(vector_store, retrieval_mode=retrieval_mode, use_rerank=use_rerank,
+                                                  metadata_filter=metadata_filter, compression=compress,
+                                                  mmr_lambda=mmr_lambda, search_mode=search_mode)
         except Exception as e:
             click.secho("创建问答链失败... 错误信息:"+str(e), fg="red")
             return
@@ -107,8 +135,20 @@ def query():
                                 "page": doc.metadata.get("page", "N/A"),
                             }
                             click.echo(f"{i}. 来源: {source_info['source']}, 页码: {source_info['page']}")
+                            for duplicate in doc.metadata.get("duplicate_sources", []):
+                                click.echo(f"   同见于: {duplicate.get('source', 'N/A')}, 页码: {duplicate.get('page', 'N/A')}")
                     else:
                         click.secho("\n⚠️ 未找到相关来源文档", fg="yellow")
+
+                    usage = result.get("usage")
+                    if usage:
+                        click.secho(f"\n📏 提示词 {usage['prompt_tokens']} tokens"
+                                    f"（上下文 {usage['context_tokens']} tokens）", fg="blue")
+
+                    if timings and result.get("timings"):
+                        click.secho("\n⏱️ 各阶段耗时:", fg="blue", bold=True)
+                        for stage, seconds in result["timings"].items():
+                            click.echo(f"{stage:<24}{seconds * 1000:>10.1f} ms")
                         
                     click.echo("-" * 50)
                 except ServiceError as e:
@@ -0,0 +1,121 @@
+import click
+
+from app.core.config import (
+    CONTEXT_COMPRESSION,
+    CONTEXT_TOKEN_BUDGET,
+    DENSE_SEARCH_MODE,
+    EMBEDDING_PROVIDER,
+    LLM_MODEL_NAME,
+    LLM_PROVIDER,
+    MMR_LAMBDA,
+    SERVER_HOST,
+    SERVER_MAX_CONCURRENCY,
+    SERVER_MAX_QUEUE,
+    SERVER_PORT,
+    SERVER_QUEUE_TIMEOUT,
+)
+from app.core.exceptions import ServiceError
+
+
+@click.command(name="serve", help="启动常驻内存的检索问答 HTTP 服务。")
+@click.option("--host", default=SERVER_HOST, show_default=True, help="监听地址。")
+@click.option("--port", default=SERVER_PORT, show_default=True, type=int, help="监听端口。")
+@click.option("--retrieval-mode", type=click.Choice(["dense", "sparse", "hybrid"]), default="dense",
+              show_default=True, help="检索模式。")
+@click.option("--rerank/--no-rerank", default=False, show_default=True, help="是否启用重排序。")
+@click.option("--k", "k", default=4, show_default=True, type=click.IntRange(min=1),
+              help="稠密检索返回的文本块数量（请求中可用 k 覆盖最终返回数量）。")
+@click.option("--max-concurrency", default=SERVER_MAX_CONCURRENCY, show_default=True, type=click.IntRange(min=1),
+              help="同时处理的请求数上限。")
+@click.option("--max-queue", default=SERVER_MAX_QUEUE, show_default=True, type=click.IntRange(min=0),
+              help="排队请求数上限，超过后返回 503。")
+@click.option("--queue-timeout", default=SERVER_QUEUE_TIMEOUT, show_default=True, type=float,
+              help="请求排队的最长等待时间（秒）。")
+@click.option("--context-budget", default=CONTEXT_TOKEN_BUDGET, show_default=True, type=click.IntRange(min=0),
+              help="送入大语言模型的上下文 token 预算，0 表示不限制。")
+@click.option("--compress", type=click.Choice(["off", "bm25", "embedding"]), default=CONTEXT_COMPRESSION,
+              show_default=True, help="抽取式上下文压缩：只把与问题相关的句子发送给大语言模型。")
+@click.option("--mmr-lambda", default=MMR_LAMBDA, show_default=True, type=click.FloatRange(0, 1),
+              help="MMR 多样化的 λ（1 只看相关性，越小越偏向多样性），0 表示不启用。")
+@click.option("--search-mode", type=click.Choice(["flat", "binary"]), default=DENSE_SEARCH_MODE, show_default=True,
+              help="稠密检索方式：flat 直接检索 float 索引；binary 先用二值索引按汉明距离粗筛，再用 float 向量重算"
+                   "（需摄入时 --binary-index）。")
+@click.option("--no-llm", is_flag=True, default=False, help="不加载大语言模型，只提供 /retrieve 接口。")
+@click.option("--fake", is_flag=True, default=False,
+              help="使用本地哈希伪嵌入和伪大语言模型（离线测试用，需用同样的伪嵌入摄入数据）。")
+def serve(host, port, retrieval_mode, rerank, k, max_concurrency, max_queue, queue_timeout, context_budget, compress,
+          mmr_lambda, search_mode, no_llm, fake):
+    """
+    启动检索问答 HTTP 服务。嵌入模型、向量库、检索器、重排序器和大语言模型只在启动时加载一次。
+    """
+    from aiohttp import web
+
+    from app.server import RAGService, create_app
+    from app.services.container import ServiceContainer, reset_container
+    from app.services.context_packing import ContextPacker
+
+    provider_name = "fake" if fake else LLM_PROVIDER
+    container = ServiceContainer(
+        llm_provider_name=provider_name,
+        llm_model_name=LLM_MODEL_NAME,
+        embedding_provider="fake" if fake else EMBEDDING_PROVIDER,
+    )
+    reset_container(container)
+    try:
+        click.secho("正在加载嵌入模型...", fg="blue")
+        container.embeddings()
+
+        click.secho("正在加载向量库...", fg="blue")
+        vector_store = container.vector_store()
+        if not vector_store:
+            click.secho("未找到向量库。请先运行 'python main.py ingest'。", fg="red")
+            return
+
+        # 稀疏检索的语料直接取自向量库中保存的文本块
+        click.secho(f"正在创建检索器（{retrieval_mode}）...", fg="blue")
+        retriever = container.retriever(retrieval_mode, k=k, mmr_lambda=mmr_lambda, search_mode=search_mode)
+
+        reranker = None
+        if rerank:
+            click.secho("正在加载重排序模型...", fg="blue")
+            reranker = container.reranker("bge")
+
+        compressor = container.compressor(compress)
+
+        llm = None
+        if no_llm:
+            provider_name = None
+        else:
+            click.secho(f"正在加载大语言模型（{provider_name}）...", fg="blue")
+            llm = container.llm()
+    except ServiceError as e:
+        click.secho(f"服务启动失败：{e}", fg="red")
+        return
+
+    service = RAGService(
+        retriever,
+        llm=llm,
+        reranker=reranker,
+        info={
+            "retrieval_mode": retrieval_mode,
+            "rerank": reranker is not None,
+            "documents": vector_store.index.ntotal if hasattr(vector_store, "index") else vector_store.ntotal,
+            "llm": provider_name,
+            "context_budget": context_budget,
+            "compression": compress,
+            "mmr_lambda": mmr_lambda,
+            "search_mode": search_mode,
+        },
+        packer=ContextPacker(token_budget=context_budget),
+        compressor=compressor,
+    )
+    app = create_app(service, max_concurrency=max_concurrency, max_queue=max_queue, queue_timeout=queue_timeout)
+
+    async def close_container(app: web.Application) -> None:
+        # 关闭分片向量库的线程池和模型客户端的连接池
+        reset_container()
+
+    app.on_cleanup.append(close_container)
+    click.secho(f"✅ 服务已就绪：http://{host}:{port}（POST /query、POST /retrieve、GET /health、GET /metrics）",
+                fg="green")
+    web.run_app(app, host=host, port=port, print=None)
@@ -7,23 +7,114 @@ BASE_DIR = Path(__file__).resolve().parent.parent.parent
 # 文档目录
 DOCS_DIR = BASE_DIR / "docs"
 
+# 支持摄入的文档类型
+SUPPORTED_DOC_EXTENSIONS = (".pdf", ".md")
+
 # 向量数据库存储目录
 VECTOR_STORE_DIR = BASE_DIR / "vector_store"
-VECTOR_STORE_DIR.mkdir(parents=True, exist_ok=True)
 
 # FAISS 索引文件路径
 FAISS_INDEX_PATH = str(VECTOR_STORE_DIR / "faiss_index")
 
+# 向量库分片数，1 表示使用单个 FAISS 索引
+VECTOR_STORE_SHARDS = 1
+
+# 分片方式："source" 按来源文件哈希分片，"batch" 按摄入批次轮转分片
+VECTOR_STORE_SHARD_BY = "source"
+
+# 分片检索的线程数，0 表示与分片数相同
+VECTOR_STORE_SEARCH_THREADS = 0
+
+# 向量索引的存储方式：none（float32）、fp16（半精度）、int8（标量量化）、pq（乘积量化）
+VECTOR_STORE_QUANTIZATION = os.getenv("VECTOR_STORE_QUANTIZATION", "none")
+
+# PQ 的子向量数（须整除向量维度），0 表示自动选择（每个子向量约 8 维）
+VECTOR_STORE_PQ_M = 0
+
+# PQ 每个子向量的编码位数（训练向量少于 2^nbits 时自动降低）
+VECTOR_STORE_PQ_NBITS = 8
+
+# 量化索引检索时先取 k × 该倍数的候选，再用内存映射的 float32 原始向量精确重算分数；
+# 0 表示不重算，也不保存原始向量
+VECTOR_STORE_RESCORE_FACTOR = 4
+
+# 摄入时是否同时建立二值索引（每维 1 位，按符号二值化）
+VECTOR_STORE_BINARY_INDEX = os.getenv("VECTOR_STORE_BINARY_INDEX", "false").lower() == "true"
+
+# 稠密检索方式：flat 直接检索 float 索引；binary 先在二值索引中按汉明距离取候选，再用 float 向量精确重算
+# （向量库没有二值索引时退回 flat）
+DENSE_SEARCH_MODE = os.getenv("DENSE_SEARCH_MODE", "flat")
+
+# 二值检索的候选数为 k × 该倍数
+BINARY_SHORTLIST_FACTOR = 10
+
 # --- 模型配置 ---
 # Ollama 服务地址
 OLLAMA_BASE_URL = "http://localhost:11434"
 
+# 模型在 Ollama 中的驻留时间（如 "30m"，"-1" 表示常驻）。每个请求都会带上，稀疏会话之间模型不会被卸载
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+
+# Ollama 的上下文窗口 token 数和推理线程数，0 表示使用 Ollama 的默认值
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "0"))
+OLLAMA_NUM_THREAD = int(os.getenv("OLLAMA_NUM_THREAD", "0"))
+
+# 共享 HTTP 连接池的连接数上限（keep-alive 复用）
+OLLAMA_MAX_CONNECTIONS = 8
+
+# 建立连接和等待响应的超时（秒），响应超时包括模型加载和生成时间
+OLLAMA_CONNECT_TIMEOUT = 5.0
+OLLAMA_REQUEST_TIMEOUT = float(os.getenv("OLLAMA_REQUEST_TIMEOUT", "120"))
+
+# 每个 /api/embed 请求的文本数
+OLLAMA_EMBED_BATCH_SIZE = 64
+
 # 嵌入模型 (Ollama)
 EMBEDDING_MODEL_NAME = "nomic-embed-text:latest"
 
+# 嵌入模型提供者: ollama（HTTP 调用 Ollama 服务）、local（进程内 sentence-transformers CPU 推理），
+# 或 fake（本地哈希伪嵌入，用于离线测试和基准）。更换提供者后向量维度不同，需要重新摄入
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "ollama")
+
+# 进程内嵌入模型（local）：HuggingFace Hub 名称或本地路径
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "BAAI/bge-small-zh-v1.5")
+
+# 进程内嵌入的推理后端：torch，或 onnx（onnxruntime，需要 optimum[onnxruntime]）
+LOCAL_EMBEDDING_BACKEND = os.getenv("LOCAL_EMBEDDING_BACKEND", "torch")
+
+# onnx 后端加载的模型文件（如预先导出的 int8 模型 onnx/model_qint8_avx2.onnx），为空时使用默认的 onnx/model.onnx
+LOCAL_EMBEDDING_ONNX_FILE = os.getenv("LOCAL_EMBEDDING_ONNX_FILE", "")
+
+# torch 后端是否对线性层做 int8 动态量化（CPU 上通常快 1.5~2 倍，向量略有偏差，需与摄入时一致）
+LOCAL_EMBEDDING_QUANTIZE = os.getenv("LOCAL_EMBEDDING_QUANTIZE", "false").lower() == "true"
+
+# 推理线程数，0 表示使用全部 CPU 核
+LOCAL_EMBEDDING_THREADS = int(os.getenv("LOCAL_EMBEDDING_THREADS", "0"))
+
+# 每次前向计算的文本数：文本先按长度排序再分批，同一批内长度接近，padding 最少
+LOCAL_EMBEDDING_BATCH_SIZE = 32
+
+# 单个文本的最大 token 数，超出部分截断
+LOCAL_EMBEDDING_MAX_LENGTH = 512
+
+# 伪嵌入的向量维度
+FAKE_EMBEDDING_DIM = 256
+
+# 首次创建嵌入模型时是否调用一次 embed_query 预热（同时检查 Ollama 服务和模型是否可用），
+# 设为 0 可跳过，首个查询会承担模型加载耗时
+EMBEDDING_WARMUP = os.getenv("EMBEDDING_WARMUP", "1") != "0"
+
 # 大语言模型配置
-# 模型类型: tongyi, doubao, ollama
-LLM_PROVIDER = "tongyi"
+# 模型类型: tongyi, doubao, ollama, fake（本地伪模型，用于离线测试）
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "tongyi")
+
+# 豆包（火山方舟 Ark，OpenAI 兼容接口）服务地址；模型名称填写推理接入点 ID（ep-...）或模型 ID
+DOUBAO_BASE_URL = os.getenv("DOUBAO_BASE_URL", "https://ark.cn-beijing.volces.com/api/v3")
+
+# 豆包 HTTP 连接池的连接数上限，以及建立连接、等待响应的超时（秒）
+DOUBAO_MAX_CONNECTIONS = 16
+DOUBAO_CONNECT_TIMEOUT = 5.0
+DOUBAO_REQUEST_TIMEOUT = float(os.getenv("DOUBAO_REQUEST_TIMEOUT", "60"))
 
 # 大语言模型名称 (根据提供者类型)
 LLM_MODEL_NAME = "qwen-turbo"  # 通义千问
@@ -32,4 +123,124 @@ LLM_MODEL_NAME = "qwen-turbo"  # 通义千问
 
 # --- 文本块配置 ---
 DEFAULT_CHUNK_SIZE = 256
-DEFAULT_CHUNK_OVERLAP = 32 
\ No newline at end of file
+DEFAULT_CHUNK_OVERLAP = 32
+
+# --- Token 计数配置 ---
+# 默认的 tiktoken 编码：嵌入模型没有对应的分词器时，分块按 token 计长退回使用它（只是近似）
+TOKENIZER_ENCODING = "cl100k_base"
+
+# 分块按 token 计长时使用的编码，为空时由嵌入模型提供者决定（EmbeddingProvider.token_encoding）。
+# 可以是 tiktoken 编码名，或 hf:<HuggingFace 模型名或本地路径> 表示该模型的分词器
+EMBEDDING_TOKENIZER = os.getenv("EMBEDDING_TOKENIZER", "")
+
+# Ollama 嵌入模型对应的 HuggingFace 分词器（按去掉 :tag 后的模型名查找），未列出的模型退回 TOKENIZER_ENCODING
+OLLAMA_EMBEDDING_TOKENIZERS = {
+    "nomic-embed-text": "hf:nomic-ai/nomic-embed-text-v1.5",
+    "mxbai-embed-large": "hf:mixedbread-ai/mxbai-embed-large-v1",
+    "bge-m3": "hf:BAAI/bge-m3",
+    "all-minilm": "hf:sentence-transformers/all-MiniLM-L6-v2",
+}
+
+# --- 上下文打包配置 ---
+# 送入大语言模型的上下文 token 预算：检索到的文本块按相关性依次放入，超出预算的丢弃或截断，0 表示不限制
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+
+# 剩余预算不少于该 token 数时，放不下的文本块会截断后放入，否则直接丢弃
+CONTEXT_MIN_CHUNK_TOKENS = 64
+
+# 同一来源、同一页的文本块首尾重叠至少该字符数时，视为相邻文本块并合并（去掉 chunk_overlap 留下的重复文本）
+CONTEXT_MIN_OVERLAP_CHARS = 16
+
+# --- 上下文压缩配置 ---
+# 抽取式压缩方式：off 不压缩，bm25 按查询词重叠为句子打分，embedding 按句子嵌入与查询的相似度打分
+CONTEXT_COMPRESSION = os.getenv("CONTEXT_COMPRESSION", "off")
+
+# 压缩后保留句子的 token 预算（所有文本块合计）
+CONTEXT_COMPRESSION_BUDGET = int(os.getenv("CONTEXT_COMPRESSION_BUDGET", "800"))
+
+# 句子嵌入缓存的最大条目数（embedding 方式）
+CONTEXT_COMPRESSION_CACHE_SIZE = 20000
+
+# --- spaCy 语义分块配置 ---
+# 快速模式：只保留句子切分组件（senter/sentencizer），跳过 tagger、parser、NER
+SPACY_FAST_MODE = True
+
+# nlp.pipe 的批大小和进程数（并行分块 --workers > 1 时工作进程内固定为 1）
+SPACY_BATCH_SIZE = 64
+SPACY_N_PROCESS = 1
+
+# 单次送入 spaCy 的最大字符数，超长页面按换行切段处理
+SPACY_MAX_LENGTH = 100000
+
+# --- NLTK 语义分块配置 ---
+# 预置的 NLTK 数据目录（离线环境中预先放置 punkt/punkt_tab），为空时使用 NLTK 默认搜索路径
+NLTK_DATA_DIR = os.getenv("NLTK_DATA_DIR", "")
+
+# 资源缺失时是否允许联网下载（隔离网络环境请保持关闭）
+NLTK_ALLOW_DOWNLOAD = os.getenv("NLTK_ALLOW_DOWNLOAD", "false").lower() == "true"
+
+# 资源缺失时的处理方式："regex" 回退到内置正则句子切分器，"error" 立即报错
+NLTK_MISSING_POLICY = os.getenv("NLTK_MISSING_POLICY", "regex")
+
+# --- 并行分块配置 ---
+# 分块工作进程数，1 表示在当前进程中串行分块
+CHUNKING_WORKERS = 1
+
+# --- 流式摄入配置 ---
+# 每批送入嵌入模型的文本块数量
+INGEST_BATCH_SIZE = 64
+
+# 流水线各阶段之间的队列容量，队列写满时上游阶段阻塞（背压）
+INGEST_QUEUE_SIZE = 4
+
+# 每提交多少批保存一次检查点
+INGEST_CHECKPOINT_EVERY = 10
+
+# 摄入检查点目录，中断后可从最近一次提交的批次继续
+INGEST_CHECKPOINT_DIR = VECTOR_STORE_DIR / "ingest_checkpoint"
+
+# --- 文本块去重配置 ---
+# 去重模式："off" 不去重，"exact" 只去除完全重复，"minhash" 同时去除近似重复
+# 默认只去除完全重复；近似重复去除会按阈值丢弃内容相近但不同的文本块，需要通过 --dedup minhash 显式开启
+DEDUP_MODE = os.getenv("DEDUP_MODE", "exact")
+
+# 近似重复的 Jaccard 相似度阈值
+DEDUP_THRESHOLD = 0.9
+
+# MinHash 签名长度（哈希函数个数）
+DEDUP_NUM_PERM = 64
+
+# 字符 shingle 长度
+DEDUP_SHINGLE_SIZE = 5
+
+# --- 元数据过滤配置 ---
+# 过滤后的候选向量不超过该数量时，直接取出候选向量精确计算相似度，不再遍历整个索引
+DENSE_FILTER_DIRECT_SEARCH_MAX = 4096
+
+# --- MMR 多样化配置 ---
+# 最大边际相关性（MMR）的 λ：1 只看相关性，越小越偏向多样性；0 表示不启用 MMR
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0"))
+
+# 启用 MMR 时底层检索器返回的候选数，MMR 从中选出最终的 k 个文本块
+MMR_FETCH_K = 20
+
+# --- 指标配置 ---
+# 是否记录各阶段耗时（METRICS_ENABLED=0 关闭，关闭后计时几乎没有开销）
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+
+# --- 基准测试配置（bench 命令） ---
+# 基准结果 JSON 的默认输出目录
+BENCH_RESULTS_DIR = BASE_DIR / "bench_results"
+
+# --- 服务配置（serve 命令） ---
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8000
+
+# 同时处理的请求数上限
+SERVER_MAX_CONCURRENCY = 4
+
+# 排队等待的请求数上限，超过后直接返回 503
+SERVER_MAX_QUEUE = 64
+
+# 请求排队的最长等待时间（秒），超时返回 503
+SERVER_QUEUE_TIMEOUT = 30.0
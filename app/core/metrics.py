@@ -0,0 +1,240 @@
+"""
+指标模块
+
+进程内的延迟直方图和计数器，按阶段（如 dense.search、rerank、llm）记录耗时，
+可导出为 Prometheus 文本格式或 JSON（含 p50/p95/p99）。所有操作都是线程安全的。
+
+在代码中用 span 标记一个阶段：
+
+    with METRICS.span("dense.search"):
+        ...
+
+关闭指标（METRICS_ENABLED=0）后 span 返回共享的空上下文，几乎没有额外开销。
+用 collect 可以收集一次调用内产生的全部 span，用于展示单次请求的耗时明细：
+
+    with METRICS.collect() as spans:
+        chain.invoke(...)
+    # spans == [("dense.embed", 0.012), ("dense.search", 0.001), ...]
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.core.config import METRICS_ENABLED
+
+# 直方图桶上界（秒），覆盖 1ms ~ 60s
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+# 导出的分位数
+QUANTILES = (0.5, 0.95, 0.99)
+
+# 关闭指标时所有 span 共用的空上下文
+_NULL_SPAN = nullcontext()
+
+# 当前调用链上正在收集的 span 列表（见 MetricsRegistry.collect）
+_COLLECTED: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    "collected_spans", default=None
+)
+
+
+class LatencyHistogram:
+    """固定桶的延迟直方图"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # 最后一个桶为 +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        """记录一次耗时"""
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += seconds
+            self._count += 1
+
+    def snapshot(self) -> Dict:
+        """
+        当前统计值
+        返回：
+            {"count", "sum", "buckets": [(上界, 累计次数), ...]}，最后一个上界为 +Inf
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative = []
+        running = 0
+        for bound, bucket_count in zip(list(self.buckets) + [float("inf")], counts):
+            running += bucket_count
+            cumulative.append((bound, running))
+        return {"count": count, "sum": total, "buckets": cumulative}
+
+    def quantile(self, q: float) -> float:
+        """
+        按桶线性插值估计分位数（与 Prometheus histogram_quantile 的算法一致）
+        落在 +Inf 桶中时返回最大的有限上界。
+        """
+        snapshot = self.snapshot()
+        count = snapshot["count"]
+        if count == 0:
+            return 0.0
+        rank = q * count
+        lower, previous = 0.0, 0
+        for bound, cumulative in snapshot["buckets"]:
+            if cumulative >= rank:
+                if bound == float("inf"):
+                    return lower
+                in_bucket = cumulative - previous
+                return lower + (bound - lower) * (rank - previous) / in_bucket
+            lower, previous = bound, cumulative
+        return lower
+
+
+class _Span:
+    """记录一个阶段耗时的上下文管理器"""
+
+    __slots__ = ("registry", "stage", "start")
+
+    def __init__(self, registry: "MetricsRegistry", stage: str):
+        self.registry = registry
+        self.stage = stage
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        elapsed = time.perf_counter() - self.start
+        self.registry.histogram(self.stage).observe(elapsed)
+        collected = _COLLECTED.get()
+        if collected is not None:
+            collected.append((self.stage, elapsed))
+
+
+class MetricsRegistry:
+    """按阶段名称管理延迟直方图"""
+
+    def __init__(self, prefix: str = "rag", enabled: bool = True):
+        self.prefix = prefix
+        self.enabled = enabled
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, stage: str) -> LatencyHistogram:
+        """获取（必要时创建）阶段的直方图"""
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(stage, LatencyHistogram())
+        return histogram
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """记录阶段耗时"""
+        if self.enabled:
+            self.histogram(stage).observe(seconds)
+
+    def span(self, stage: str):
+        """阶段计时上下文管理器：with metrics.span("dense.search"): ..."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, stage)
+
+    def increment(self, name: str, value: float = 1) -> None:
+        """累加计数器（如重试次数、重试等待秒数）"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    @contextmanager
+    def collect(self) -> Iterator[List[Tuple[str, float]]]:
+        """收集当前线程（上下文）内结束的全部 span，产出 [(阶段, 秒), ...]"""
+        spans: List[Tuple[str, float]] = []
+        token = _COLLECTED.set(spans)
+        try:
+            yield spans
+        finally:
+            _COLLECTED.reset(token)
+
+    def stages(self) -> List[str]:
+        return sorted(self._histograms)
+
+    def counters(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(sorted(self._counters.items()))
+
+    def to_dict(self) -> Dict[str, Dict]:
+        """导出为 JSON 友好的字典：{"stages": {阶段: 统计值}, "counters": {名称: 值}}"""
+        stages = {}
+        for stage in self.stages():
+            histogram = self._histograms[stage]
+            snapshot = histogram.snapshot()
+            snapshot["buckets"] = [
+                ["+Inf" if bound == float("inf") else bound, count] for bound, count in snapshot["buckets"]
+            ]
+            for q in QUANTILES:
+                snapshot[f"p{int(q * 100)}"] = histogram.quantile(q)
+            stages[stage] = snapshot
+        return {"stages": stages, "counters": self.counters()}
+
+    def to_prometheus(self) -> str:
+        """导出为 Prometheus 文本格式"""
+        name = f"{self.prefix}_stage_latency_seconds"
+        lines = [
+            f"# HELP {name} 各阶段耗时（秒）",
+            f"# TYPE {name} histogram",
+        ]
+        for stage in self.stages():
+            snapshot = self._histograms[stage].snapshot()
+            for bound, count in snapshot["buckets"]:
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {snapshot["sum"]}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {snapshot["count"]}')
+
+        quantile_name = f"{self.prefix}_stage_latency_quantile_seconds"
+        lines += [
+            f"# HELP {quantile_name} 各阶段耗时分位数估计值（秒）",
+            f"# TYPE {quantile_name} gauge",
+        ]
+        for stage in self.stages():
+            histogram = self._histograms[stage]
+            for q in QUANTILES:
+                lines.append(f'{quantile_name}{{stage="{stage}",quantile="{q}"}} {histogram.quantile(q)}')
+
+        counter_name = f"{self.prefix}_events_total"
+        lines += [
+            f"# HELP {counter_name} 事件计数（如重试次数、重试等待秒数）",
+            f"# TYPE {counter_name} counter",
+        ]
+        for event, value in self.counters().items():
+            lines.append(f'{counter_name}{{event="{event}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        """清空所有直方图"""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+def summarize_spans(spans: Sequence[Tuple[str, float]]) -> Dict[str, float]:
+    """按阶段累加 collect 收集到的 span 耗时（保持阶段首次出现的顺序）"""
+    totals: Dict[str, float] = {}
+    for stage, seconds in spans:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    return totals
+
+
+# 进程级默认指标注册表
+METRICS = MetricsRegistry(enabled=METRICS_ENABLED)
@@ -1,15 +1,23 @@
 """模型模块"""
 
-from .base import LLMProvider
-from .factory import LLMFactory
+from .base import EmbeddingProvider, LLMProvider
+from .factory import EmbeddingFactory, LLMFactory
 from .providers.tongyi import TongyiProvider
 from .providers.doubao import DoubaoProvider
-from .providers.ollama import OllamaProvider
+from .providers.ollama import OllamaEmbeddingProvider, OllamaProvider
+from .providers.fake import FakeEmbeddingProvider, FakeProvider
+from .providers.local import LocalEmbeddingProvider
 
 __all__ = [
     "LLMProvider",
     "LLMFactory", 
     "TongyiProvider",
     "DoubaoProvider",
-    "OllamaProvider"
+    "OllamaProvider",
+    "FakeProvider",
+    "EmbeddingProvider",
+    "EmbeddingFactory",
+    "OllamaEmbeddingProvider",
+    "LocalEmbeddingProvider",
+    "FakeEmbeddingProvider",
 ] 
\ No newline at end of file
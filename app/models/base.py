@@ -1,8 +1,12 @@
 """模型基类定义"""
 
 from abc import ABC, abstractmethod
+from typing import Callable
+from langchain_core.embeddings import Embeddings
 from langchain_core.language_models import BaseLLM
 
+from app.core.config import EMBEDDING_TOKENIZER, TOKENIZER_ENCODING
+
 
 class LLMProvider(ABC):
     """大语言模型提供者抽象基类"""
@@ -15,4 +19,42 @@ class LLMProvider(ABC):
     @abstractmethod
     def get_provider_name(self) -> str:
         """获取提供者名称"""
-        pass 
\ No newline at end of file
+        pass
+
+
+class EmbeddingProvider(ABC):
+    """嵌入模型提供者抽象基类"""
+
+    @abstractmethod
+    def create_embeddings(self) -> Embeddings:
+        """创建嵌入模型实例"""
+        pass
+
+    @abstractmethod
+    def get_provider_name(self) -> str:
+        """获取提供者名称"""
+        pass
+
+    def warmup_hint(self) -> str:
+        """预热失败时附加的排查提示"""
+        return ""
+
+    def token_encoding(self) -> str:
+        """
+        分块按 token 计长时使用的编码名称（见 app.services.tokenization），
+        设置了 EMBEDDING_TOKENIZER 时以其为准
+        """
+        return EMBEDDING_TOKENIZER or self.default_token_encoding()
+
+    def default_token_encoding(self) -> str:
+        """
+        与嵌入模型分词器一致的编码名称，子类按模型覆盖；
+        默认的 tiktoken 编码与多数嵌入模型的词表不同，token 数只是近似
+        """
+        return TOKENIZER_ENCODING
+
+    def token_counter(self) -> Callable[[str], int]:
+        """按嵌入模型的分词器计算 token 数的函数"""
+        from app.services.tokenization import get_token_counter
+
+        return get_token_counter(self.token_encoding())
@@ -0,0 +1,350 @@
+"""
+豆包（火山方舟 Ark）HTTP 客户端
+
+方舟提供 OpenAI 兼容的 /chat/completions 接口：
+- 同步调用使用共享的 httpx.Client，异步调用使用按事件循环共享的 httpx.AsyncClient，均为带 keep-alive 的连接池
+- 流式输出解析 SSE（server-sent events）的 "data: {...}" 行，直到 "data: [DONE]"
+- 非流式响应和流式最后一个片段（stream_options.include_usage）中的 usage 记录为 token 用量
+- HTTP 错误转换为 ServiceError，消息中带状态码和方舟错误码（如 429 RateLimitExceeded），
+  RobustLLMWrapper 按关键词判断是否重试
+
+服务地址可以指向本地桩服务器，便于离线测试（见 benchmarks/doubao_client.py）。
+"""
+
+import asyncio
+import json
+import threading
+import weakref
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseLLM
+from langchain_core.outputs import Generation, GenerationChunk, LLMResult
+from pydantic import PrivateAttr
+
+from app.core.config import DOUBAO_BASE_URL, DOUBAO_CONNECT_TIMEOUT, DOUBAO_MAX_CONNECTIONS, DOUBAO_REQUEST_TIMEOUT
+from app.core.exceptions import ServiceError
+from app.core.metrics import METRICS
+
+# 方舟 SSE 流的结束标记
+_SSE_DONE = "[DONE]"
+
+
+class DoubaoClient:
+    """带连接池的方舟 Chat Completions 客户端（同步调用线程安全，异步调用按事件循环共享连接池）"""
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = DOUBAO_BASE_URL,
+        max_connections: int = DOUBAO_MAX_CONNECTIONS,
+        connect_timeout: float = DOUBAO_CONNECT_TIMEOUT,
+        request_timeout: float = DOUBAO_REQUEST_TIMEOUT,
+    ):
+        """
+        参数：
+            api_key: 方舟 API 密钥
+            base_url: 服务地址（到 /api/v3 为止）
+            max_connections: 连接池大小
+            connect_timeout: 建立连接的超时（秒）
+            request_timeout: 等待响应的超时（秒），流式输出时为两个片段之间的最长间隔
+        """
+        import httpx
+
+        self.base_url = base_url.rstrip("/")
+        self._headers = {"Authorization": f"Bearer {api_key}"}
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._timeout = httpx.Timeout(request_timeout, connect=connect_timeout)
+        self._http = httpx.Client(base_url=self.base_url, headers=self._headers,
+                                  limits=self._limits, timeout=self._timeout)
+        # 事件循环 -> AsyncClient（AsyncClient 的连接不能跨事件循环使用）
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _async_http(self) -> Any:
+        import httpx
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = httpx.AsyncClient(base_url=self.base_url, headers=self._headers,
+                                           limits=self._limits, timeout=self._timeout)
+                self._async_clients[loop] = client
+            return client
+
+    # --- 同步接口 ---
+
+    def complete(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """非流式调用，返回完整响应"""
+        import httpx
+
+        METRICS.increment("doubao.requests")
+        try:
+            response = self._http.post("/chat/completions", json=dict(payload, stream=False))
+        except httpx.TimeoutException as e:
+            raise ServiceError(f"豆包 API 请求超时：{e}") from e
+        except httpx.TransportError as e:
+            raise ServiceError(f"豆包 API 连接失败（{self.base_url}）：{e}") from e
+        if response.status_code != 200:
+            raise _api_error(response.status_code, response.text)
+        return response.json()
+
+    def stream(self, payload: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """流式调用，逐个返回 SSE 片段（已解析的 JSON）"""
+        import httpx
+
+        METRICS.increment("doubao.requests")
+        try:
+            with self._http.stream("POST", "/chat/completions", json=_stream_payload(payload)) as response:
+                if response.status_code != 200:
+                    raise _api_error(response.status_code, response.read().decode("utf-8", "replace"))
+                for line in response.iter_lines():
+                    event = _parse_sse_line(line)
+                    if event is _DONE:
+                        return
+                    if event is not None:
+                        yield event
+        except httpx.TimeoutException as e:
+            raise ServiceError(f"豆包 API 请求超时：{e}") from e
+        except httpx.TransportError as e:
+            raise ServiceError(f"豆包 API 连接失败（{self.base_url}）：{e}") from e
+
+    # --- 异步接口 ---
+
+    async def acomplete(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """非流式异步调用，返回完整响应"""
+        import httpx
+
+        METRICS.increment("doubao.requests")
+        try:
+            response = await self._async_http().post("/chat/completions", json=dict(payload, stream=False))
+        except httpx.TimeoutException as e:
+            raise ServiceError(f"豆包 API 请求超时：{e}") from e
+        except httpx.TransportError as e:
+            raise ServiceError(f"豆包 API 连接失败（{self.base_url}）：{e}") from e
+        if response.status_code != 200:
+            raise _api_error(response.status_code, response.text)
+        return response.json()
+
+    async def astream(self, payload: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """流式异步调用，逐个返回 SSE 片段"""
+        import httpx
+
+        METRICS.increment("doubao.requests")
+        try:
+            async with self._async_http().stream("POST", "/chat/completions",
+                                                 json=_stream_payload(payload)) as response:
+                if response.status_code != 200:
+                    body = (await response.aread()).decode("utf-8", "replace")
+                    raise _api_error(response.status_code, body)
+                async for line in response.aiter_lines():
+                    event = _parse_sse_line(line)
+                    if event is _DONE:
+                        return
+                    if event is not None:
+                        yield event
+        except httpx.TimeoutException as e:
+            raise ServiceError(f"豆包 API 请求超时：{e}") from e
+        except httpx.TransportError as e:
+            raise ServiceError(f"豆包 API 连接失败（{self.base_url}）：{e}") from e
+
+    def close(self) -> None:
+        """关闭同步连接池（异步连接池随事件循环回收）"""
+        self._http.close()
+
+    async def aclose(self) -> None:
+        """关闭当前事件循环的异步连接池"""
+        with self._lock:
+            client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+_DONE = object()
+
+
+def _stream_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    # 要求在最后一个片段中返回 token 用量
+    return dict(payload, stream=True, stream_options={"include_usage": True})
+
+
+def _parse_sse_line(line: str) -> Any:
+    """解析一行 SSE：data 行返回 JSON（结束标记返回 _DONE），注释、空行和其他字段返回 None"""
+    if not line.startswith("data:"):
+        return None
+    data = line[len("data:"):].strip()
+    if data == _SSE_DONE:
+        return _DONE
+    return json.loads(data) if data else None
+
+
+def _api_error(status_code: int, body: str) -> ServiceError:
+    """把方舟的错误响应（{"error": {"code", "message"}}）转换为 ServiceError"""
+    code, message = "", body[:500]
+    try:
+        error = json.loads(body).get("error") or {}
+        code = error.get("code") or error.get("type") or ""
+        message = error.get("message") or message
+    except (ValueError, AttributeError):
+        pass
+    detail = f"HTTP {status_code}，{code}" if code else f"HTTP {status_code}"
+    return ServiceError(f"豆包 API 请求失败（{detail}）：{message}")
+
+
+def usage_of(response: Dict[str, Any]) -> Dict[str, int]:
+    """响应或流式片段中的 token 用量（prompt_tokens、completion_tokens、total_tokens），没有时返回空字典"""
+    usage = response.get("usage") or {}
+    return {key: int(usage[key]) for key in ("prompt_tokens", "completion_tokens", "total_tokens") if key in usage}
+
+
+def _record_usage(usage: Dict[str, int]) -> None:
+    for key, value in usage.items():
+        METRICS.increment(f"llm.usage.{key}", value)
+
+
+class DoubaoLLM(BaseLLM):
+    """
+    豆包大语言模型（方舟 Chat Completions 接口），支持同步、异步和流式调用
+
+    token 用量写入 LLMResult.llm_output["token_usage"]，同时累计到 METRICS 的 llm.usage.* 计数器；
+    最近一次调用的用量也保存在 last_usage 中。
+    """
+
+    model_name: str
+    api_key: str
+    base_url: str = DOUBAO_BASE_URL
+    temperature: float = 0.1
+    max_tokens: Optional[int] = None
+    request_timeout: float = DOUBAO_REQUEST_TIMEOUT
+    _client: Optional[DoubaoClient] = PrivateAttr(default=None)
+    _last_usage: Dict[str, int] = PrivateAttr(default_factory=dict)
+
+    @property
+    def _llm_type(self) -> str:
+        return "doubao"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model_name": self.model_name, "base_url": self.base_url, "temperature": self.temperature}
+
+    @property
+    def client(self) -> DoubaoClient:
+        """连接池客户端（首次使用时创建，之后所有调用共享）"""
+        if self._client is None:
+            self._client = DoubaoClient(self.api_key, base_url=self.base_url, request_timeout=self.request_timeout)
+        return self._client
+
+    def close(self) -> None:
+        """关闭连接池客户端，之后再调用时重新创建"""
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    @property
+    def last_usage(self) -> Dict[str, int]:
+        """最近一次调用的 token 用量"""
+        return dict(self._last_usage)
+
+    def _payload(self, prompt: str, stop: Optional[List[str]]) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {
+            "model": self.model_name,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": self.temperature,
+        }
+        if self.max_tokens:
+            payload["max_tokens"] = self.max_tokens
+        if stop:
+            payload["stop"] = stop
+        return payload
+
+    def _result(self, responses: List[Tuple[str, Dict[str, Any]]]) -> LLMResult:
+        """由各个提示词的 (文本, 响应) 组成 LLMResult，并汇总 token 用量"""
+        total: Dict[str, int] = {}
+        generations = []
+        for text, response in responses:
+            usage = usage_of(response)
+            for key, value in usage.items():
+                total[key] = total.get(key, 0) + value
+            choice = (response.get("choices") or [{}])[0]
+            generations.append([Generation(text=text, generation_info={"finish_reason": choice.get("finish_reason")})])
+        self._last_usage = total
+        _record_usage(total)
+        return LLMResult(generations=generations, llm_output={"token_usage": total, "model_name": self.model_name})
+
+    @staticmethod
+    def _text_of(response: Dict[str, Any]) -> str:
+        choices = response.get("choices") or []
+        if not choices:
+            raise ServiceError(f"豆包 API 返回的响应中没有 choices：{str(response)[:200]}")
+        return (choices[0].get("message") or {}).get("content") or ""
+
+    def _generate(
+        self,
+        prompts: List[str],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> LLMResult:
+        responses = []
+        for prompt in prompts:
+            response = self.client.complete(self._payload(prompt, stop))
+            responses.append((self._text_of(response), response))
+        return self._result(responses)
+
+    async def _agenerate(
+        self,
+        prompts: List[str],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> LLMResult:
+        # 多个提示词并发请求，共享同一个连接池
+        results = await asyncio.gather(*(self.client.acomplete(self._payload(prompt, stop)) for prompt in prompts))
+        return self._result([(self._text_of(response), response) for response in results])
+
+    def _chunk(self, event: Dict[str, Any]) -> Optional[GenerationChunk]:
+        """把 SSE 片段转换为 GenerationChunk；只有用量的最后一个片段记录用量后返回 None"""
+        usage = usage_of(event)
+        if usage:
+            self._last_usage = usage
+            _record_usage(usage)
+        choices = event.get("choices") or []
+        if not choices:
+            return None
+        content = (choices[0].get("delta") or {}).get("content") or ""
+        finish_reason = choices[0].get("finish_reason")
+        if not content and not finish_reason:
+            return None
+        return GenerationChunk(text=content,
+                               generation_info={"finish_reason": finish_reason} if finish_reason else None)
+
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        for event in self.client.stream(self._payload(prompt, stop)):
+            chunk = self._chunk(event)
+            if chunk is None:
+                continue
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[GenerationChunk]:
+        async for event in self.client.astream(self._payload(prompt, stop)):
+            chunk = self._chunk(event)
+            if chunk is None:
+                continue
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
@@ -1,11 +1,13 @@
 """模型工厂类"""
 
 from typing import Dict, Type
-from .base import LLMProvider
+from .base import EmbeddingProvider, LLMProvider
 from .providers.tongyi import TongyiProvider
 from .providers.doubao import DoubaoProvider
-from .providers.ollama import OllamaProvider
-from app.core.exceptions import LLMProviderError
+from .providers.ollama import OllamaEmbeddingProvider, OllamaProvider
+from .providers.fake import FakeEmbeddingProvider, FakeProvider
+from .providers.local import LocalEmbeddingProvider
+from app.core.exceptions import ConfigurationError, LLMProviderError
 
 
 class LLMFactory:
@@ -15,6 +17,7 @@ class LLMFactory:
         "tongyi": TongyiProvider,
         "doubao": DoubaoProvider,
         "ollama": OllamaProvider,
+        "fake": FakeProvider,
     }
     
     @classmethod
@@ -34,4 +37,35 @@ class LLMFactory:
     @classmethod
     def get_available_providers(cls) -> list:
         """获取所有可用的模型提供者"""
-        return list(cls._providers.keys()) 
\ No newline at end of file
+        return list(cls._providers.keys())
+
+
+class EmbeddingFactory:
+    """嵌入模型工厂类"""
+
+    _providers: Dict[str, Type[EmbeddingProvider]] = {
+        "ollama": OllamaEmbeddingProvider,
+        "local": LocalEmbeddingProvider,
+        "fake": FakeEmbeddingProvider,
+    }
+
+    @classmethod
+    def register_provider(cls, name: str, provider_class: Type[EmbeddingProvider]):
+        """注册新的嵌入模型提供者"""
+        cls._providers[name] = provider_class
+
+    @classmethod
+    def create_provider(cls, provider_name: str, **kwargs) -> EmbeddingProvider:
+        """创建嵌入模型提供者实例"""
+        if provider_name not in cls._providers:
+            raise ConfigurationError(
+                f"不支持的嵌入模型提供者: {provider_name}，可选值: {', '.join(cls._providers)}"
+            )
+
+        provider_class = cls._providers[provider_name]
+        return provider_class(**kwargs)
+
+    @classmethod
+    def get_available_providers(cls) -> list:
+        """获取所有可用的嵌入模型提供者"""
+        return list(cls._providers.keys())
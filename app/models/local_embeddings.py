@@ -0,0 +1,136 @@
+"""进程内 CPU 嵌入模型（sentence-transformers，torch 或 ONNX Runtime 后端）"""
+
+import os
+import threading
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+from app.core.config import (
+    LOCAL_EMBEDDING_BACKEND,
+    LOCAL_EMBEDDING_BATCH_SIZE,
+    LOCAL_EMBEDDING_MAX_LENGTH,
+    LOCAL_EMBEDDING_MODEL,
+    LOCAL_EMBEDDING_ONNX_FILE,
+    LOCAL_EMBEDDING_QUANTIZE,
+    LOCAL_EMBEDDING_THREADS,
+)
+from app.core.exceptions import ConfigurationError
+from app.core.metrics import METRICS
+
+# 支持的推理后端
+LOCAL_EMBEDDING_BACKENDS = ("torch", "onnx")
+
+
+class LocalEmbeddings(Embeddings):
+    """
+    在当前进程中用 sentence-transformers 计算嵌入，不经过 HTTP 和 JSON 序列化
+
+    - 文本按长度排序后分批，同一批内长度接近，padding 最少；结果按原顺序返回
+    - 推理线程数固定（torch.set_num_threads 或 ONNX Runtime 的 intra_op 线程数），避免与分块进程争抢 CPU
+    - torch 后端可对线性层做 int8 动态量化；onnx 后端可加载预先导出的量化模型文件
+    - 向量按 L2 归一化
+
+    模型在第一次计算嵌入时加载（sentence-transformers 和 torch 导入较慢）。
+    """
+
+    def __init__(
+        self,
+        model_name: str = LOCAL_EMBEDDING_MODEL,
+        backend: str = LOCAL_EMBEDDING_BACKEND,
+        batch_size: int = LOCAL_EMBEDDING_BATCH_SIZE,
+        threads: int = LOCAL_EMBEDDING_THREADS,
+        quantize: bool = LOCAL_EMBEDDING_QUANTIZE,
+        max_length: int = LOCAL_EMBEDDING_MAX_LENGTH,
+        onnx_file: str = LOCAL_EMBEDDING_ONNX_FILE,
+    ):
+        """
+        参数：
+            model_name: HuggingFace Hub 模型名或本地路径
+            backend: 推理后端（torch/onnx）
+            batch_size: 每次前向计算的文本数
+            threads: 推理线程数，0 表示使用全部 CPU 核
+            quantize: torch 后端是否做 int8 动态量化
+            max_length: 单个文本的最大 token 数
+            onnx_file: onnx 后端加载的模型文件，为空时使用默认文件
+        """
+        if backend not in LOCAL_EMBEDDING_BACKENDS:
+            raise ConfigurationError(f"未知嵌入推理后端: {backend}，可选值: {', '.join(LOCAL_EMBEDDING_BACKENDS)}")
+        if quantize and backend != "torch":
+            raise ConfigurationError(
+                "int8 动态量化只支持 torch 后端；onnx 后端请通过 LOCAL_EMBEDDING_ONNX_FILE 指定预先量化的模型文件。"
+            )
+        if batch_size <= 0:
+            raise ValueError("batch_size 必须为正整数")
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = batch_size
+        self.threads = threads or os.cpu_count() or 1
+        self.quantize = quantize
+        self.max_length = max_length
+        self.onnx_file = onnx_file
+        self._model: Optional[Any] = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self) -> Any:
+        """sentence-transformers 模型（首次访问时加载）"""
+        with self._lock:
+            if self._model is None:
+                with METRICS.span("embed.load"):
+                    self._model = self._load_model()
+            return self._model
+
+    def _load_model(self) -> Any:
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        torch.set_num_threads(self.threads)
+        if self.backend == "onnx":
+            import onnxruntime
+
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = self.threads
+            options.inter_op_num_threads = 1
+            model_kwargs = {"provider": "CPUExecutionProvider", "session_options": options}
+            if self.onnx_file:
+                model_kwargs["file_name"] = self.onnx_file
+            model = SentenceTransformer(self.model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+        else:
+            model = SentenceTransformer(self.model_name, device="cpu")
+            model.eval()
+            if self.quantize:
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        model.max_seq_length = min(self.max_length, model.max_seq_length or self.max_length)
+        return model
+
+    @property
+    def dimension(self) -> int:
+        """向量维度"""
+        return int(self.model.get_sentence_embedding_dimension())
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        model = self.model
+        # 按长度排序后分批（字符数近似 token 数），再按原顺序放回
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        vectors = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for start in range(0, len(texts), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            METRICS.increment("embed.batches")
+            vectors[batch] = model.encode(
+                [texts[i] for i in batch],
+                batch_size=len(batch),
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
@@ -0,0 +1,267 @@
+"""
+Ollama HTTP 客户端
+
+嵌入模型和大语言模型共用同一个客户端（每个服务地址一个）：
+- 基于 httpx.Client 的连接池，HTTP keep-alive 复用连接，避免每次调用重新建立 TCP 连接
+- 嵌入使用批量接口 /api/embed，每个请求最多 OLLAMA_EMBED_BATCH_SIZE 个文本
+- 每个请求都带上 keep_alive（模型在 Ollama 中的驻留时间）和 num_ctx、num_thread 等选项，
+  稀疏会话之间模型不会被卸载，下一次调用不必承担重新加载模型的耗时
+- 连接超时和读取超时分开设置
+
+服务地址可以指向本地桩服务器，便于离线测试（见 benchmarks/ollama_client.py）。
+"""
+
+import json
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+from app.core.config import (
+    OLLAMA_BASE_URL,
+    OLLAMA_CONNECT_TIMEOUT,
+    OLLAMA_EMBED_BATCH_SIZE,
+    OLLAMA_KEEP_ALIVE,
+    OLLAMA_MAX_CONNECTIONS,
+    OLLAMA_NUM_CTX,
+    OLLAMA_NUM_THREAD,
+    OLLAMA_REQUEST_TIMEOUT,
+)
+from app.core.exceptions import ServiceError
+from app.core.metrics import METRICS
+
+
+class OllamaClient:
+    """带连接池的 Ollama 客户端（线程安全）"""
+
+    def __init__(
+        self,
+        base_url: str = OLLAMA_BASE_URL,
+        keep_alive: Union[str, int] = OLLAMA_KEEP_ALIVE,
+        num_ctx: int = OLLAMA_NUM_CTX,
+        num_thread: int = OLLAMA_NUM_THREAD,
+        max_connections: int = OLLAMA_MAX_CONNECTIONS,
+        connect_timeout: float = OLLAMA_CONNECT_TIMEOUT,
+        request_timeout: float = OLLAMA_REQUEST_TIMEOUT,
+        embed_batch_size: int = OLLAMA_EMBED_BATCH_SIZE,
+    ):
+        """
+        参数：
+            base_url: Ollama 服务地址
+            keep_alive: 模型驻留时间（如 "30m"），-1 表示常驻
+            num_ctx: 上下文窗口 token 数，0 表示使用模型默认值
+            num_thread: Ollama 推理线程数，0 表示由 Ollama 决定
+            max_connections: 连接池大小
+            connect_timeout: 建立连接的超时（秒）
+            request_timeout: 等待响应的超时（秒），包括模型加载和生成时间
+            embed_batch_size: 每个 /api/embed 请求的文本数
+        """
+        import httpx
+
+        if embed_batch_size <= 0:
+            raise ValueError("embed_batch_size 必须为正整数")
+        self.base_url = base_url.rstrip("/")
+        self.keep_alive = _parse_keep_alive(keep_alive)
+        self.num_ctx = num_ctx
+        self.num_thread = num_thread
+        self.embed_batch_size = embed_batch_size
+        self._http = httpx.Client(
+            base_url=self.base_url,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(request_timeout, connect=connect_timeout),
+        )
+
+    def options(self, **overrides: Any) -> Dict[str, Any]:
+        """请求的 options 字段：配置的 num_ctx、num_thread 加上调用方指定的选项（值为 None 的忽略）"""
+        options: Dict[str, Any] = {}
+        if self.num_ctx:
+            options["num_ctx"] = self.num_ctx
+        if self.num_thread:
+            options["num_thread"] = self.num_thread
+        options.update({key: value for key, value in overrides.items() if value is not None})
+        return options
+
+    def _post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        import httpx
+
+        try:
+            response = self._http.post(path, json=payload)
+        except httpx.TimeoutException as e:
+            raise ServiceError(f"Ollama 请求超时（{path}）：{e}") from e
+        except httpx.TransportError as e:
+            raise ServiceError(f"Ollama 连接失败（{self.base_url}）：{e}") from e
+        if response.status_code != 200:
+            raise ServiceError(f"Ollama 请求失败（{path}，HTTP {response.status_code}）：{_error_message(response)}")
+        return response.json()
+
+    def embed(self, model: str, texts: List[str]) -> List[List[float]]:
+        """批量计算嵌入，按 embed_batch_size 拆分为多个 /api/embed 请求"""
+        vectors: List[List[float]] = []
+        for start in range(0, len(texts), self.embed_batch_size):
+            batch = texts[start:start + self.embed_batch_size]
+            METRICS.increment("ollama.embed_requests")
+            data = self._post("/api/embed", {
+                "model": model,
+                "input": batch,
+                "truncate": True,
+                "keep_alive": self.keep_alive,
+                "options": self.options(),
+            })
+            embeddings = data.get("embeddings") or []
+            if len(embeddings) != len(batch):
+                raise ServiceError(f"Ollama 返回的嵌入数量不一致：请求 {len(batch)} 个，返回 {len(embeddings)} 个")
+            vectors.extend(embeddings)
+        return vectors
+
+    def generate(self, model: str, prompt: str, **options: Any) -> Dict[str, Any]:
+        """
+        非流式生成
+        返回：
+            /api/generate 的响应，response 为生成的文本，prompt_eval_count/eval_count 为输入/输出 token 数
+        """
+        METRICS.increment("ollama.generate_requests")
+        return self._post("/api/generate", {
+            "model": model,
+            "prompt": prompt,
+            "stream": False,
+            "keep_alive": self.keep_alive,
+            "options": self.options(**options),
+        })
+
+    def generate_stream(self, model: str, prompt: str, **options: Any) -> Iterator[Dict[str, Any]]:
+        """流式生成，逐行返回 /api/generate 的 NDJSON 响应"""
+        import httpx
+
+        METRICS.increment("ollama.generate_requests")
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": True,
+            "keep_alive": self.keep_alive,
+            "options": self.options(**options),
+        }
+        try:
+            with self._http.stream("POST", "/api/generate", json=payload) as response:
+                if response.status_code != 200:
+                    response.read()
+                    raise ServiceError(
+                        f"Ollama 请求失败（/api/generate，HTTP {response.status_code}）：{_error_message(response)}"
+                    )
+                for line in response.iter_lines():
+                    if line:
+                        yield json.loads(line)
+        except httpx.TimeoutException as e:
+            raise ServiceError(f"Ollama 请求超时（/api/generate）：{e}") from e
+        except httpx.TransportError as e:
+            raise ServiceError(f"Ollama 连接失败（{self.base_url}）：{e}") from e
+
+    def close(self) -> None:
+        """关闭连接池"""
+        self._http.close()
+
+
+def _parse_keep_alive(value: Union[str, int]) -> Union[str, int]:
+    """纯数字按秒传给 Ollama（-1 表示常驻），其余按时长字符串（如 "30m"）原样传递"""
+    if isinstance(value, str) and value.lstrip("-").isdigit():
+        return int(value)
+    return value
+
+
+def _error_message(response: Any) -> str:
+    try:
+        return str(response.json().get("error") or response.text)
+    except ValueError:
+        return response.text[:200]
+
+
+_clients: Dict[str, OllamaClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_ollama_client(base_url: str = OLLAMA_BASE_URL) -> OllamaClient:
+    """进程内共享的 Ollama 客户端（每个服务地址一个，按配置创建）"""
+    key = base_url.rstrip("/")
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = OllamaClient(key)
+            _clients[key] = client
+        return client
+
+
+def close_ollama_clients() -> None:
+    """关闭所有共享客户端，下次使用时重新创建"""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+
+class OllamaClientEmbeddings(Embeddings):
+    """基于共享 OllamaClient 的嵌入模型"""
+
+    def __init__(self, model: str, base_url: str = OLLAMA_BASE_URL, client: Optional[OllamaClient] = None):
+        self.model = model
+        self.base_url = base_url
+        self._client = client
+
+    @property
+    def client(self) -> OllamaClient:
+        return self._client or get_ollama_client(self.base_url)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.client.embed(self.model, list(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.client.embed(self.model, [text])[0]
+
+
+class OllamaClientLLM(LLM):
+    """基于共享 OllamaClient 的大语言模型，支持流式输出"""
+
+    model: str
+    base_url: str = OLLAMA_BASE_URL
+    temperature: Optional[float] = None
+    num_predict: Optional[int] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "ollama-client"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model": self.model, "base_url": self.base_url, "temperature": self.temperature}
+
+    def _options(self, stop: Optional[List[str]]) -> Dict[str, Any]:
+        return {"temperature": self.temperature, "num_predict": self.num_predict, "stop": stop}
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        data = get_ollama_client(self.base_url).generate(self.model, prompt, **self._options(stop))
+        METRICS.increment("ollama.prompt_tokens", data.get("prompt_eval_count") or 0)
+        METRICS.increment("ollama.completion_tokens", data.get("eval_count") or 0)
+        return data.get("response", "")
+
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        for data in get_ollama_client(self.base_url).generate_stream(self.model, prompt, **self._options(stop)):
+            if data.get("done"):
+                METRICS.increment("ollama.prompt_tokens", data.get("prompt_eval_count") or 0)
+                METRICS.increment("ollama.completion_tokens", data.get("eval_count") or 0)
+            chunk = GenerationChunk(text=data.get("response", ""))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
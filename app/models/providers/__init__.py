@@ -2,10 +2,16 @@
 
 from .tongyi import TongyiProvider
 from .doubao import DoubaoProvider
-from .ollama import OllamaProvider
+from .ollama import OllamaEmbeddingProvider, OllamaProvider
+from .fake import FakeEmbeddingProvider, FakeProvider
+from .local import LocalEmbeddingProvider
 
 __all__ = [
     "TongyiProvider",
     "DoubaoProvider", 
-    "OllamaProvider"
+    "OllamaProvider",
+    "FakeProvider",
+    "OllamaEmbeddingProvider",
+    "LocalEmbeddingProvider",
+    "FakeEmbeddingProvider",
 ] 
\ No newline at end of file
@@ -3,27 +3,18 @@
 import os
 from langchain_core.language_models import BaseLLM
 from ..base import LLMProvider
+from app.core.config import DOUBAO_BASE_URL
 from app.core.exceptions import ConfigurationError, ServiceError
 from app.models.wrappers import create_robust_wrapper
 
 
-class MockDoubaoLLM(BaseLLM):
-    """模拟的豆包LLM实现"""
-    
-    def _llm_type(self) -> str:
-        return "mock_doubao"
-    
-    def _call(self, prompt: str, **kwargs) -> str:
-        # 模拟豆包API调用
-        return f"豆包模型回复: {prompt}"
-
-
 class DoubaoProvider(LLMProvider):
     """豆包模型提供者"""
     
-    def __init__(self, model_name: str = "doubao-pro", temperature: float = 0.1):
+    def __init__(self, model_name: str = "doubao-pro", temperature: float = 0.1, base_url: str = DOUBAO_BASE_URL):
         self.model_name = model_name
         self.temperature = temperature
+        self.base_url = base_url
         self._api_key = self._get_api_key()
     
     def _get_api_key(self) -> str:
@@ -40,9 +31,16 @@ class DoubaoProvider(LLMProvider):
     def create_llm(self) -> BaseLLM:
         """创建豆包模型实例"""
         try:
-            # 创建基础的Doubao实例（使用模拟实现）
-            # 注意：当langchain_community支持豆包时，可以替换为真实实现
-            base_llm = MockDoubaoLLM()
+            # 导入时会加载 httpx，只在真正创建模型时导入
+            from app.models.doubao_client import DoubaoLLM
+
+            # 创建基础的豆包实例（方舟 OpenAI 兼容接口，共享连接池）
+            base_llm = DoubaoLLM(
+                model_name=self.model_name,
+                api_key=self._api_key,
+                base_url=self.base_url,
+                temperature=self.temperature,
+            )
             
             # 使用通用包装器包装
             return create_robust_wrapper(
@@ -61,27 +59,28 @@ class DoubaoProvider(LLMProvider):
     
     def _get_doubao_error_patterns(self):
         """获取豆包特定的错误模式"""
+        # 按顺序匹配：限流（HTTP 429）要排在配额之前，否则会被 "limit" 关键词误判为不可重试的配额错误
         return {
+            "rate_limit_error": {
+                "keywords": ["http 429", "ratelimitexceeded", "serveroverloaded", "rate_limit", "rate limit", "频率限制", "请求过于频繁"],
+                "message": "请求频率超限，已重试 {retry_count} 次。\n请稍后重试。",
+                "retry": True
+            },
             "quota_error": {
                 "keywords": ["quota", "limit", "account", "rate", "balance", "credit", "欠费", "余额不足", "insufficient"],
                 "message": "豆包API调用失败：账户余额不足或配额超限。\n请检查您的账户余额或联系客服。",
                 "retry": False
             },
             "network_error": {
-                "keywords": ["timeout", "connection", "network", "网络", "连接"],
+                "keywords": ["timeout", "超时", "connection", "network", "网络", "连接"],
                 "message": "网络连接失败，已重试 {retry_count} 次。\n请检查网络连接或稍后重试。",
                 "retry": True
             },
             "auth_error": {
-                "keywords": ["invalid", "auth", "unauthorized", "认证", "授权", "api_key"],
+                "keywords": ["http 401", "http 403", "invalid", "auth", "unauthorized", "认证", "授权", "api_key"],
                 "message": "API认证失败：请检查您的API密钥是否正确。",
                 "retry": False
             },
-            "rate_limit_error": {
-                "keywords": ["rate_limit", "rate limit", "频率限制", "请求过于频繁"],
-                "message": "请求频率超限，已重试 {retry_count} 次。\n请稍后重试。",
-                "retry": True
-            },
             "unknown_error": {
                 "keywords": [],
                 "message": "豆包API调用失败：{error}\n请稍后重试或联系技术支持。",
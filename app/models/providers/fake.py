@@ -0,0 +1,72 @@
+"""本地伪模型提供者（离线测试和基准使用）"""
+
+import re
+import time
+from typing import Any, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseLLM
+from langchain_core.language_models.llms import LLM
+from ..base import EmbeddingProvider, LLMProvider
+
+
+class FakeLLM(LLM):
+    """
+    确定性的伪大语言模型
+
+    不调用任何外部服务，根据提示词中的问题和上下文生成固定格式的回答，
+    可以设置固定延迟以模拟模型生成耗时。
+    """
+
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        if self.latency > 0:
+            time.sleep(self.latency)
+        match = re.search(r"Question:\s*(.+?)\s*(?:Helpful Answer:|$)", prompt, re.S)
+        question = match.group(1).strip() if match else prompt.strip()[-200:]
+        return f"（伪模型回答）问题：{question}；提示词长度 {len(prompt)} 字符。"
+
+
+class FakeProvider(LLMProvider):
+    """本地伪模型提供者"""
+
+    def __init__(self, model_name: str = "fake", temperature: float = 0.0, latency: float = 0.0):
+        self.model_name = model_name
+        self.temperature = temperature
+        self.latency = latency
+
+    def create_llm(self) -> BaseLLM:
+        """创建伪模型实例"""
+        return FakeLLM(latency=self.latency)
+
+    def get_provider_name(self) -> str:
+        return "伪模型"
+
+
+class FakeEmbeddingProvider(EmbeddingProvider):
+    """本地哈希伪嵌入提供者"""
+
+    def __init__(self, model_name: str = "fake"):
+        self.model_name = model_name
+
+    def create_embeddings(self) -> Embeddings:
+        """创建哈希伪嵌入实例"""
+        from app.models.fake_embeddings import HashingEmbeddings
+
+        print("正在使用本地哈希伪嵌入（EMBEDDING_PROVIDER=fake）")
+        return HashingEmbeddings()
+
+    def get_provider_name(self) -> str:
+        return "伪嵌入"
@@ -0,0 +1,37 @@
+"""进程内嵌入模型提供者（sentence-transformers，CPU 推理）"""
+
+from langchain_core.embeddings import Embeddings
+from ..base import EmbeddingProvider
+from app.core.config import LOCAL_EMBEDDING_BACKEND, LOCAL_EMBEDDING_MODEL, LOCAL_EMBEDDING_QUANTIZE
+from app.services.tokenization import HF_TOKENIZER_PREFIX
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """进程内嵌入模型提供者，不依赖 Ollama 服务"""
+
+    def __init__(self, model_name: str = LOCAL_EMBEDDING_MODEL, backend: str = LOCAL_EMBEDDING_BACKEND,
+                 quantize: bool = LOCAL_EMBEDDING_QUANTIZE, **kwargs):
+        self.model_name = model_name
+        self.backend = backend
+        self.quantize = quantize
+        # 其余参数（batch_size、threads、max_length、onnx_file）直接传给 LocalEmbeddings
+        self.options = kwargs
+
+    def create_embeddings(self) -> Embeddings:
+        """创建进程内嵌入模型实例（模型在首次计算嵌入时加载）"""
+        from app.models.local_embeddings import LocalEmbeddings
+
+        suffix = "，int8 动态量化" if self.quantize else ""
+        print(f"正在加载进程内嵌入模型: {self.model_name}（{self.backend}{suffix}）")
+        return LocalEmbeddings(self.model_name, backend=self.backend, quantize=self.quantize, **self.options)
+
+    def get_provider_name(self) -> str:
+        return "本地"
+
+    def default_token_encoding(self) -> str:
+        # sentence-transformers 模型目录中带有分词器，与推理时使用的完全一致
+        return f"{HF_TOKENIZER_PREFIX}{self.model_name}"
+
+    def warmup_hint(self) -> str:
+        return (f"请确认已安装 sentence-transformers（onnx 后端还需要 optimum[onnxruntime]），"
+                f"并且模型 {self.model_name} 已下载或可以从 HuggingFace Hub 获取。")
@@ -1,9 +1,9 @@
-"""Ollama 本地模型提供者"""
+"""Ollama 本地模型提供者（大语言模型和嵌入模型共用带连接池的 OllamaClient）"""
 
-from langchain_community.llms import Ollama
+from langchain_core.embeddings import Embeddings
 from langchain_core.language_models import BaseLLM
-from ..base import LLMProvider
-from app.core.config import OLLAMA_BASE_URL
+from ..base import EmbeddingProvider, LLMProvider
+from app.core.config import EMBEDDING_MODEL_NAME, OLLAMA_BASE_URL, OLLAMA_EMBEDDING_TOKENIZERS, TOKENIZER_ENCODING
 
 
 class OllamaProvider(LLMProvider):
@@ -16,11 +16,38 @@ class OllamaProvider(LLMProvider):
     
     def create_llm(self) -> BaseLLM:
         """创建 Ollama 模型实例"""
-        return Ollama(
+        from app.models.ollama_client import OllamaClientLLM
+
+        return OllamaClientLLM(
             model=self.model_name,
             base_url=self.base_url,
             temperature=self.temperature,
         )
     
     def get_provider_name(self) -> str:
-        return "Ollama" 
\ No newline at end of file
+        return "Ollama"
+
+
+class OllamaEmbeddingProvider(EmbeddingProvider):
+    """Ollama 嵌入模型提供者（通过共享连接池批量调用 /api/embed）"""
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME):
+        self.model_name = model_name
+        self.base_url = OLLAMA_BASE_URL
+
+    def create_embeddings(self) -> Embeddings:
+        """创建 Ollama 嵌入模型实例"""
+        from app.models.ollama_client import OllamaClientEmbeddings
+
+        print(f"正在从 Ollama 加载嵌入模型: {self.model_name}")
+        return OllamaClientEmbeddings(model=self.model_name, base_url=self.base_url)
+
+    def get_provider_name(self) -> str:
+        return "Ollama"
+
+    def default_token_encoding(self) -> str:
+        # Ollama 不提供分词接口，按模型名查找对应的 HuggingFace 分词器
+        return OLLAMA_EMBEDDING_TOKENIZERS.get(self.model_name.split(":")[0], TOKENIZER_ENCODING)
+
+    def warmup_hint(self) -> str:
+        return f"请确保 Ollama 服务正在运行，并且模型 {self.model_name} 已安装。"
@@ -1,7 +1,6 @@
 """通义千问模型提供者"""
 
 import os
-from langchain_community.llms import Tongyi
 from langchain_core.language_models import BaseLLM
 from ..base import LLMProvider
 from app.core.exceptions import ConfigurationError, ServiceError
@@ -30,6 +29,9 @@ class TongyiProvider(LLMProvider):
     def create_llm(self) -> BaseLLM:
         """创建通义千问模型实例"""
         try:
+            # 导入时会加载 dashscope，只在真正创建模型时导入
+            from langchain_community.llms import Tongyi
+
             # 创建基础的Tongyi实例
             base_llm = Tongyi(
                 model_name=self.model_name,
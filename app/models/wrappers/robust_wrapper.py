@@ -1,11 +1,13 @@
 """通用模型包装器，提供错误处理和重试机制"""
 
+import asyncio
 import time
-from typing import Optional, Dict, Any, Callable
+from typing import Optional, Dict, Any, AsyncIterator, Callable, Iterator
 from langchain_core.language_models import BaseLLM
-from langchain_core.callbacks import CallbackManagerForLLMRun
-from langchain_core.outputs import LLMResult
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.outputs import Generation, GenerationChunk, LLMResult
 from app.core.exceptions import ServiceError
+from app.core.metrics import METRICS
 from pydantic import PrivateAttr
 
 
@@ -42,6 +44,12 @@ class RobustLLMWrapper(BaseLLM):
         # 设置默认错误模式
         self._error_patterns = error_patterns or self._get_default_error_patterns()
     
+    def close(self) -> None:
+        """关闭被包装的LLM持有的资源（如连接池）"""
+        close = getattr(self._llm, "close", None)
+        if callable(close):
+            close()
+
     def _get_default_error_patterns(self) -> Dict[str, Dict[str, Any]]:
         """获取默认的错误模式配置"""
         return {
@@ -97,50 +105,135 @@ class RobustLLMWrapper(BaseLLM):
         **kwargs,
     ) -> str:
         """重写调用方法，添加重试机制和错误处理"""
-        last_error = None
-        
+        # llm 为包含重试等待在内的总耗时，llm.attempt 为每次调用底层模型的耗时
+        with METRICS.span("llm"):
+            return self._call_with_retry(prompt, stop, **kwargs)
+
+    def _call_with_retry(self, prompt: str, stop: Optional[list] = None, **kwargs) -> str:
         for attempt in range(self._max_retries):
             try:
                 # 尝试调用底层的LLM实例
-                if hasattr(self._llm, 'invoke'):
-                    return self._llm.invoke(prompt, stop=stop, **kwargs)
-                elif hasattr(self._llm, '_call'):
-                    return self._llm._call(prompt, stop=stop, **kwargs)
-                else:
-                    raise ServiceError(f"不支持的LLM实例类型：{type(self._llm)}")
+                with METRICS.span("llm.attempt"):
+                    if hasattr(self._llm, 'invoke'):
+                        return self._llm.invoke(prompt, stop=stop, **kwargs)
+                    elif hasattr(self._llm, '_call'):
+                        return self._llm._call(prompt, stop=stop, **kwargs)
+                    else:
+                        raise ServiceError(f"不支持的LLM实例类型：{type(self._llm)}")
                     
             except Exception as e:
-                last_error = e
-                error_msg = str(e).lower()
-                
-                # 分析错误类型
-                error_type = self._analyze_error(error_msg)
-                error_config = self._error_patterns.get(error_type, self._error_patterns["unknown_error"])
-                
-                # 如果不需要重试，直接抛出错误
-                if not error_config.get("retry", True):
-                    message = error_config["message"].format(
-                        error=str(e),
-                        retry_count=self._max_retries
-                    )
-                    raise ServiceError(f"错误详情：{e}\n{message}")
-                
-                # 如果需要重试且还有重试机会
-                if attempt < self._max_retries - 1:
-                    retry_message = f"{error_type.replace('_', ' ').title()}错误，正在重试 ({attempt + 1}/{self._max_retries})..."
-                    print(retry_message)
-                    time.sleep(self._retry_delay * (attempt + 1))
-                    continue
-                else:
-                    # 最后一次重试失败
-                    message = error_config["message"].format(
-                        error=str(e),
-                        retry_count=self._max_retries
-                    )
-                    raise ServiceError(f"错误详情：{e}\n{message}")
-        
-        # 如果所有重试都失败了
-        raise ServiceError(f"{self._provider_name}API调用失败，已重试 {self._max_retries} 次：{last_error}")
+                time.sleep(self._retry_delay_for(e, attempt))
+
+        # max_retries 不为正时一次也不会调用
+        raise ServiceError(f"{self._provider_name}API调用失败，已重试 {self._max_retries} 次")
+
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[list] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs,
+    ) -> str:
+        """异步调用，重试等待不阻塞事件循环"""
+        with METRICS.span("llm"):
+            for attempt in range(self._max_retries):
+                try:
+                    with METRICS.span("llm.attempt"):
+                        return await self._llm.ainvoke(prompt, stop=stop, **kwargs)
+                except Exception as e:
+                    await asyncio.sleep(self._retry_delay_for(e, attempt))
+        raise ServiceError(f"{self._provider_name}API调用失败，已重试 {self._max_retries} 次")
+
+    async def _agenerate(
+        self,
+        prompts: list[str],
+        stop: Optional[list] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs,
+    ) -> LLMResult:
+        """异步批量调用，多个提示词并发执行"""
+        results = await asyncio.gather(*(self._acall(prompt, stop, run_manager, **kwargs) for prompt in prompts))
+        return LLMResult(generations=[[Generation(text=result)] for result in results])
+
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[list] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs,
+    ) -> Iterator[GenerationChunk]:
+        """
+        流式调用底层模型
+
+        只在收到第一个片段之前重试：已经输出的片段无法撤回，之后的错误直接抛出
+        """
+        with METRICS.span("llm"):
+            for attempt in range(self._max_retries):
+                started = False
+                try:
+                    for text in self._llm.stream(prompt, stop=stop, **kwargs):
+                        started = True
+                        chunk = GenerationChunk(text=text)
+                        if run_manager:
+                            run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                        yield chunk
+                    return
+                except Exception as e:
+                    if started:
+                        METRICS.increment("llm.errors.stream_interrupted")
+                        raise ServiceError(f"{self._provider_name}流式输出中断：{e}") from e
+                    time.sleep(self._retry_delay_for(e, attempt))
+
+    async def _astream(
+        self,
+        prompt: str,
+        stop: Optional[list] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs,
+    ) -> AsyncIterator[GenerationChunk]:
+        """异步流式调用，重试规则与 _stream 相同"""
+        with METRICS.span("llm"):
+            for attempt in range(self._max_retries):
+                started = False
+                try:
+                    async for text in self._llm.astream(prompt, stop=stop, **kwargs):
+                        started = True
+                        chunk = GenerationChunk(text=text)
+                        if run_manager:
+                            await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                        yield chunk
+                    return
+                except Exception as e:
+                    if started:
+                        METRICS.increment("llm.errors.stream_interrupted")
+                        raise ServiceError(f"{self._provider_name}流式输出中断：{e}") from e
+                    await asyncio.sleep(self._retry_delay_for(e, attempt))
+
+    def _retry_delay_for(self, error: Exception, attempt: int) -> float:
+        """
+        处理第 attempt 次调用的错误：不可重试或重试次数用尽时抛出 ServiceError，否则返回重试前的等待时间（秒）
+        """
+        error_msg = str(error).lower()
+
+        # 分析错误类型
+        error_type = self._analyze_error(error_msg)
+        METRICS.increment(f"llm.errors.{error_type}")
+        error_config = self._error_patterns.get(error_type, self._error_patterns["unknown_error"])
+
+        # 不需要重试或最后一次重试失败，直接抛出错误
+        if not error_config.get("retry", True) or attempt >= self._max_retries - 1:
+            message = error_config["message"].format(
+                error=str(error),
+                retry_count=self._max_retries
+            )
+            raise ServiceError(f"错误详情：{error}\n{message}") from error
+
+        retry_message = f"{error_type.replace('_', ' ').title()}错误，正在重试 ({attempt + 1}/{self._max_retries})..."
+        print(retry_message)
+        delay = self._retry_delay * (attempt + 1)
+        METRICS.increment("llm.retries")
+        METRICS.increment("llm.retry_sleep_seconds", delay)
+        return delay
     
     def _analyze_error(self, error_msg: str) -> str:
         """分析错误类型"""
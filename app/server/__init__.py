@@ -0,0 +1,11 @@
+"""检索问答 HTTP 服务"""
+
+from .service import RAGService
+from .app import create_app, RequestLimiter, ServerBusyError
+
+__all__ = [
+    "RAGService",
+    "create_app",
+    "RequestLimiter",
+    "ServerBusyError",
+]
@@ -0,0 +1,200 @@
+"""
+HTTP 服务
+
+基于 aiohttp 的 asyncio 服务，提供以下接口：
+
+    POST /query      检索并生成回答   {"query": "...", "k": 4, "filter": {...}}
+    POST /retrieve   只检索文本块     {"query": "...", "k": 4, "filter": {...}}
+    GET  /health     健康检查
+    GET  /metrics    各阶段延迟直方图（Prometheus 文本格式，?format=json 返回 JSON）
+
+检索、重排序和生成都是阻塞调用，在固定大小的线程池中执行；同时处理的请求数
+受 max_concurrency 限制，其余请求排队等待，排队数超过 max_queue 或等待超时时
+直接返回 503，避免请求无限堆积。
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+from aiohttp import web
+from langchain.docstore.document import Document
+
+from app.core.config import SERVER_MAX_CONCURRENCY, SERVER_MAX_QUEUE, SERVER_QUEUE_TIMEOUT
+from app.core.exceptions import ServiceError
+from app.server.service import RAGService
+
+SERVICE_KEY = web.AppKey("service", RAGService)
+EXECUTOR_KEY = web.AppKey("executor", ThreadPoolExecutor)
+
+
+class ServerBusyError(Exception):
+    """排队请求过多或等待超时"""
+    pass
+
+
+class RequestLimiter:
+    """并发上限 + 有界排队"""
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.queued = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[float]:
+        """
+        获取一个处理名额，产出排队耗时（秒）
+
+        没有空闲名额时排队等待；排队数已满或等待超时抛出 ServerBusyError。
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        start = time.perf_counter()
+        if not self._semaphore.locked():
+            # 有空闲名额时直接获取（不会让出事件循环），保证后续请求看到的占用状态准确
+            await self._semaphore.acquire()
+        else:
+            if self.queued >= self.max_queue:
+                raise ServerBusyError(f"排队请求已达上限 {self.max_queue}")
+            self.queued += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise ServerBusyError(f"排队等待超过 {self.queue_timeout} 秒")
+            finally:
+                self.queued -= 1
+
+        self.in_flight += 1
+        try:
+            yield time.perf_counter() - start
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+
+LIMITER_KEY = web.AppKey("limiter", RequestLimiter)
+
+
+def _serialize_document(doc: Document) -> Dict[str, Any]:
+    return {"content": doc.page_content, "metadata": doc.metadata}
+
+
+async def _parse_request(request: web.Request) -> Dict[str, Any]:
+    """解析并校验请求体"""
+    try:
+        body = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text="请求体必须是 JSON")
+    if not isinstance(body, dict) or not isinstance(body.get("query"), str) or not body["query"].strip():
+        raise web.HTTPBadRequest(text="缺少 query 字段")
+    k = body.get("k")
+    if k is not None and (not isinstance(k, int) or k <= 0):
+        raise web.HTTPBadRequest(text="k 必须为正整数")
+    metadata_filter = body.get("filter")
+    if metadata_filter is not None and not isinstance(metadata_filter, dict):
+        raise web.HTTPBadRequest(text="filter 必须是 JSON 对象")
+    return {"query": body["query"], "k": k, "metadata_filter": metadata_filter}
+
+
+async def _run(request: web.Request, func, *args) -> Any:
+    """在限流名额内把阻塞调用交给线程池执行"""
+    app = request.app
+    service = app[SERVICE_KEY]
+    try:
+        async with app[LIMITER_KEY].slot() as queue_time:
+            service.metrics.observe("queue", queue_time)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(app[EXECUTOR_KEY], func, *args)
+    except ServerBusyError as e:
+        raise web.HTTPServiceUnavailable(text=f"服务繁忙：{e}", headers={"Retry-After": "1"})
+    except ValueError as e:
+        raise web.HTTPBadRequest(text=str(e))
+    except ServiceError as e:
+        raise web.HTTPInternalServerError(text=str(e))
+
+
+async def handle_query(request: web.Request) -> web.Response:
+    params = await _parse_request(request)
+    service = request.app[SERVICE_KEY]
+    start = time.perf_counter()
+    result = await _run(request, service.answer, params["query"], params["k"], params["metadata_filter"])
+    total = time.perf_counter() - start
+    service.metrics.observe("total_query", total)
+    return web.json_response({
+        "answer": result["result"],
+        "sources": [_serialize_document(doc) for doc in result["source_documents"]],
+        "timings": dict(result["timings"], total=total),
+        "usage": result["usage"],
+    })
+
+
+async def handle_retrieve(request: web.Request) -> web.Response:
+    params = await _parse_request(request)
+    service = request.app[SERVICE_KEY]
+    start = time.perf_counter()
+    docs, timings = await _run(request, service.retrieve, params["query"], params["k"], params["metadata_filter"])
+    total = time.perf_counter() - start
+    service.metrics.observe("total_retrieve", total)
+    return web.json_response({
+        "documents": [_serialize_document(doc) for doc in docs],
+        "timings": dict(timings, total=total),
+    })
+
+
+async def handle_health(request: web.Request) -> web.Response:
+    limiter = request.app[LIMITER_KEY]
+    return web.json_response({
+        "status": "ok",
+        "in_flight": limiter.in_flight,
+        "queued": limiter.queued,
+        "max_concurrency": limiter.max_concurrency,
+        "max_queue": limiter.max_queue,
+        **request.app[SERVICE_KEY].info,
+    })
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    metrics = request.app[SERVICE_KEY].metrics
+    if request.query.get("format") == "json":
+        return web.json_response(metrics.to_dict())
+    return web.Response(text=metrics.to_prometheus(), content_type="text/plain", charset="utf-8")
+
+
+def create_app(
+    service: RAGService,
+    max_concurrency: int = SERVER_MAX_CONCURRENCY,
+    max_queue: int = SERVER_MAX_QUEUE,
+    queue_timeout: float = SERVER_QUEUE_TIMEOUT,
+) -> web.Application:
+    """
+    创建 aiohttp 应用
+
+    参数：
+        service: 已加载好全部组件的检索问答服务
+        max_concurrency: 同时处理的请求数上限（也是工作线程数）
+        max_queue: 排队请求数上限
+        queue_timeout: 排队等待的最长时间（秒）
+    返回：
+        web.Application: 可交给 web.run_app 或 aiohttp 测试客户端使用的应用
+    """
+    app = web.Application()
+    app[SERVICE_KEY] = service
+    app[LIMITER_KEY] = RequestLimiter(max_concurrency, max_queue, queue_timeout)
+    app[EXECUTOR_KEY] = ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="rag-worker")
+
+    async def shutdown_executor(app: web.Application) -> None:
+        app[EXECUTOR_KEY].shutdown(wait=False)
+
+    app.on_cleanup.append(shutdown_executor)
+    app.router.add_post("/query", handle_query)
+    app.router.add_post("/retrieve", handle_retrieve)
+    app.router.add_get("/health", handle_health)
+    app.router.add_get("/metrics", handle_metrics)
+    return app
@@ -0,0 +1,120 @@
+"""
+检索问答服务
+
+持有常驻内存的检索器、重排序器和大语言模型，按阶段执行检索问答并记录各阶段耗时
+（检索器、重排序器和模型包装器内部的 span 也会汇总到每次请求的 timings 中）。
+所有组件只在服务启动时创建一次，请求之间共享。
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain.chains.retrieval_qa.prompt import PROMPT
+from langchain.docstore.document import Document
+from langchain_core.language_models import BaseLLM
+from langchain_core.prompts import BasePromptTemplate
+from langchain_core.retrievers import BaseRetriever
+
+from app.core.exceptions import ServiceError
+from app.core.metrics import METRICS, MetricsRegistry, summarize_spans
+from app.services.context_compression import ExtractiveCompressor
+from app.services.context_packing import CONTEXT_SEPARATOR, ContextPacker
+from app.services.metadata_filter import MetadataFilter
+
+
+class RAGService:
+    """检索问答服务（线程安全，可被多个请求并发调用）"""
+
+    def __init__(
+        self,
+        retriever: BaseRetriever,
+        llm: Optional[BaseLLM] = None,
+        reranker: Any = None,
+        prompt: BasePromptTemplate = PROMPT,
+        metrics: MetricsRegistry = METRICS,
+        info: Optional[Dict[str, Any]] = None,
+        packer: Optional[ContextPacker] = None,
+        compressor: Optional[ExtractiveCompressor] = None,
+    ):
+        """
+        参数：
+            retriever: 检索器（dense/sparse/hybrid）
+            llm: 大语言模型，为 None 时只能调用 retrieve
+            reranker: 重排序器，为 None 时不重排序
+            prompt: 问答提示词模板，需包含 context 和 question 变量（默认与 RetrievalQA 相同）
+            metrics: 记录各阶段耗时的指标注册表
+            info: 健康检查中展示的附加信息（如检索模式、文档数量）
+            packer: 上下文打包器，为 None 时按配置的 token 预算创建
+            compressor: 抽取式上下文压缩器，为 None 时不压缩
+        """
+        self.retriever = retriever
+        self.llm = llm
+        self.reranker = reranker
+        self.prompt = prompt
+        self.metrics = metrics
+        self.info = dict(info or {})
+        self.packer = packer or ContextPacker()
+        self.compressor = compressor
+
+    def retrieve(
+        self,
+        query: str,
+        k: Optional[int] = None,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[List[Document], Dict[str, float]]:
+        """
+        检索（并按需重排序）相关文本块
+
+        参数：
+            query: 查询文本
+            k: 返回的文本块数量，None 表示使用检索器/重排序器的默认值
+            metadata_filter: 元数据过滤条件
+        返回：
+            (文本块列表, 各阶段耗时)
+        """
+        with self.metrics.collect() as spans:
+            docs = self._retrieve(query, k, MetadataFilter.coerce(metadata_filter))
+        return docs, summarize_spans(spans)
+
+    def _retrieve(self, query: str, k: Optional[int], metadata_filter: Optional[MetadataFilter]) -> List[Document]:
+        with self.metrics.span("retrieve"):
+            docs = self.retriever.invoke(query, metadata_filter=metadata_filter)
+        # 重排序耗时由重排序器内部的 rerank span 记录
+        if self.reranker is not None and docs:
+            docs = self.reranker.rerank(query, docs, top_k=k or len(docs))
+        if k is not None:
+            docs = docs[:k]
+        return docs
+
+    def answer(
+        self,
+        query: str,
+        k: Optional[int] = None,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        检索并生成回答
+
+        返回：
+            {"result": 回答, "source_documents": 放入上下文的文本段, "timings": 各阶段耗时,
+             "usage": 上下文打包情况和提示词 token 数}
+        """
+        if self.llm is None:
+            raise ServiceError("服务未加载大语言模型，只能调用检索接口。")
+        with self.metrics.collect() as spans:
+            docs = self._retrieve(query, k, MetadataFilter.coerce(metadata_filter))
+            retrieved_tokens = None
+            if self.compressor is not None:
+                retrieved_tokens = self.packer.count_tokens(CONTEXT_SEPARATOR.join(doc.page_content for doc in docs))
+                docs = self.compressor.compress(query, docs)
+            packed = self.packer.pack(docs)
+            prompt = self.prompt.format(context=packed.text, question=query)
+            with self.metrics.span("generate"):
+                result = self.llm.invoke(prompt)
+
+        usage = packed.to_dict()
+        usage["prompt_tokens"] = self.packer.count_tokens(prompt)
+        if retrieved_tokens is not None:
+            usage["retrieved_tokens"] = retrieved_tokens
+        self.metrics.increment("llm.prompt_tokens", usage["prompt_tokens"])
+        return {"result": result, "source_documents": packed.documents, "timings": summarize_spans(spans),
+                "usage": usage}
@@ -6,25 +6,79 @@
 - 重叠分块  
 - 递归分块
 - 语义分块（基于spaCy和NLTK）
+
+所有策略都可以通过 ParallelChunkingExecutor 在多进程中并行执行。
 """
 
-from typing import List, Type, Optional, Dict, Any
+import bisect
+import functools
+import math
+import multiprocessing
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Type, Optional, Dict, Any, Iterable, Iterator, Tuple
 from abc import ABC, abstractmethod
 from langchain.docstore.document import Document
 from langchain.text_splitter import (
     RecursiveCharacterTextSplitter,
     CharacterTextSplitter,
-    TokenTextSplitter,
-    MarkdownHeaderTextSplitter,
 )
 
+from app.services.sentence_packing import locate_sentences, pack_document, regex_sentence_spans
+from app.services.tokenization import get_length_function, token_windows_batch
+from app.core.config import (
+    TOKENIZER_ENCODING,
+    SPACY_FAST_MODE,
+    SPACY_BATCH_SIZE,
+    SPACY_N_PROCESS,
+    SPACY_MAX_LENGTH,
+    NLTK_DATA_DIR,
+    NLTK_ALLOW_DOWNLOAD,
+    NLTK_MISSING_POLICY,
+)
+from app.core.exceptions import ConfigurationError
+
+# 递归分块使用的分隔符，优先在段落、换行、中文句末标点处分割
+RECURSIVE_SEPARATORS = ["\n\n", "\n", "。", "！", "？", " ", ""]
+
+
+@functools.lru_cache(maxsize=32)
+def _character_splitter(chunk_size: int, chunk_overlap: int, length_unit: str,
+                        encoding_name: str = TOKENIZER_ENCODING) -> CharacterTextSplitter:
+    """按参数缓存的按换行分割器，避免每次调用都重新构造"""
+    return CharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separator="\n",
+        length_function=get_length_function(length_unit, encoding_name),
+    )
+
+
+@functools.lru_cache(maxsize=32)
+def _recursive_splitter(chunk_size: int, chunk_overlap: int, length_unit: str,
+                        encoding_name: str = TOKENIZER_ENCODING) -> RecursiveCharacterTextSplitter:
+    """按参数缓存的递归分割器，避免每次调用都重新构造"""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=get_length_function(length_unit, encoding_name),
+        separators=RECURSIVE_SEPARATORS,
+    )
+
 
 class ChunkingStrategy(ABC):
     """文本分块策略基类"""
     
     @abstractmethod
     def split_documents(self, documents: List[Document], **kwargs) -> List[Document]:
-        """分割文档"""
+        """
+        分割文档
+        
+        通用参数：chunk_size、chunk_overlap，以及 length_unit（"chars" 按字符数、
+        "tokens" 按 token 数计算长度，默认 "chars"）和 encoding_name（按 token 计长时
+        使用的编码，应与嵌入模型的分词器一致，见 EmbeddingProvider.token_encoding）
+        """
         pass
     
     @abstractmethod
@@ -39,12 +93,10 @@ class FixedSizeChunking(ChunkingStrategy):
     def split_documents(self, documents: List[Document], **kwargs) -> List[Document]:
         chunk_size = kwargs.get('chunk_size', 500)
         chunk_overlap = kwargs.get('chunk_overlap', 0)
+        length_unit = kwargs.get('length_unit', 'chars')
+        encoding_name = kwargs.get('encoding_name', TOKENIZER_ENCODING)
         
-        text_splitter = CharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            separator="\n"
-        )
+        text_splitter = _character_splitter(chunk_size, chunk_overlap, length_unit, encoding_name)
         return text_splitter.split_documents(documents)
     
     def get_description(self) -> str:
@@ -57,12 +109,10 @@ class OverlappingChunking(ChunkingStrategy):
     def split_documents(self, documents: List[Document], **kwargs) -> List[Document]:
         chunk_size = kwargs.get('chunk_size', 500)
         chunk_overlap = kwargs.get('chunk_overlap', 50)
+        length_unit = kwargs.get('length_unit', 'chars')
+        encoding_name = kwargs.get('encoding_name', TOKENIZER_ENCODING)
         
-        text_splitter = CharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            separator="\n"
-        )
+        text_splitter = _character_splitter(chunk_size, chunk_overlap, length_unit, encoding_name)
         return text_splitter.split_documents(documents)
     
     def get_description(self) -> str:
@@ -75,13 +125,10 @@ class RecursiveChunking(ChunkingStrategy):
     def split_documents(self, documents: List[Document], **kwargs) -> List[Document]:
         chunk_size = kwargs.get('chunk_size', 500)
         chunk_overlap = kwargs.get('chunk_overlap', 50)
+        length_unit = kwargs.get('length_unit', 'chars')
+        encoding_name = kwargs.get('encoding_name', TOKENIZER_ENCODING)
         
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            length_function=len,
-            separators=["\n\n", "\n", "。", "！", "？", " ", ""]
-        )
+        text_splitter = _recursive_splitter(chunk_size, chunk_overlap, length_unit, encoding_name)
         return text_splitter.split_documents(documents)
     
     def get_description(self) -> str:
@@ -94,12 +141,28 @@ class TokenBasedChunking(ChunkingStrategy):
     def split_documents(self, documents: List[Document], **kwargs) -> List[Document]:
         chunk_size = kwargs.get('chunk_size', 100)
         chunk_overlap = kwargs.get('chunk_overlap', 20)
+        encoding_name = kwargs.get('encoding_name', TOKENIZER_ENCODING)
         
-        text_splitter = TokenTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap
+        # 所有文档一次性批量编码，再按 token 窗口在原文中切片
+        all_windows = token_windows_batch(
+            [doc.page_content for doc in documents],
+            chunk_size,
+            chunk_overlap,
+            encoding_name,
         )
-        return text_splitter.split_documents(documents)
+        
+        all_chunks = []
+        for doc, windows in zip(documents, all_windows):
+            for start, end in windows:
+                metadata = dict(doc.metadata)
+                metadata["start_index"] = start
+                metadata["end_index"] = end
+                all_chunks.append(Document(
+                    page_content=doc.page_content[start:end],
+                    metadata=metadata
+                ))
+        
+        return all_chunks
     
     def get_description(self) -> str:
         return "Token分块：基于语言模型的token进行分割，更适合LLM处理"
@@ -108,41 +171,109 @@ class TokenBasedChunking(ChunkingStrategy):
 class MarkdownChunking(ChunkingStrategy):
     """Markdown文档分块策略"""
     
+    # 参与分割的标题层级及其元数据键
+    HEADER_KEYS = {1: "标题1", 2: "标题2", 3: "标题3", 4: "标题4"}
+    
+    _HEADER_RE = re.compile(r"^(#{1,6})[ \t]+(.+?)[ \t#]*$")
+    _FENCE_RE = re.compile(r"^[ \t]*(```|~~~)")
+    
+    @staticmethod
+    def _group_by_source(documents: List[Document]) -> Iterator[List[Document]]:
+        """把连续的、来源相同的页面合并为一组，同一文件的标题可以跨页延续"""
+        group: List[Document] = []
+        for doc in documents:
+            if group and doc.metadata.get("source") != group[-1].metadata.get("source"):
+                yield group
+                group = []
+            group.append(doc)
+        if group:
+            yield group
+    
+    @staticmethod
+    def _join_pages(pages: List[Document]) -> Tuple[str, List[int]]:
+        """拼接同一文件的页面，返回全文和每页在全文中的起始偏移"""
+        page_starts = []
+        position = 0
+        for page in pages:
+            page_starts.append(position)
+            position += len(page.page_content) + 1
+        return "\n".join(page.page_content for page in pages), page_starts
+    
+    def _iter_sections(self, text: str) -> Iterator[Tuple[int, int, List[Tuple[int, str]]]]:
+        """
+        单遍扫描全文，按标题切分章节（代码块中的 # 不视为标题）
+        返回：
+            (正文起始偏移, 正文结束偏移, 标题栈) 的迭代器，标题栈为 [(层级, 标题), ...]
+        """
+        stack: List[Tuple[int, str]] = []
+        section_start = 0
+        position = 0
+        fence = None
+        for line in text.splitlines(keepends=True):
+            line_start = position
+            position += len(line)
+            content = line.rstrip("\r\n")
+            
+            fence_match = self._FENCE_RE.match(content)
+            if fence_match:
+                if fence is None:
+                    fence = fence_match.group(1)
+                elif fence_match.group(1) == fence:
+                    fence = None
+                continue
+            if fence is not None:
+                continue
+            
+            header_match = self._HEADER_RE.match(content)
+            if not header_match or len(header_match.group(1)) not in self.HEADER_KEYS:
+                continue
+            if line_start > section_start:
+                yield section_start, line_start, list(stack)
+            level = len(header_match.group(1))
+            while stack and stack[-1][0] >= level:
+                stack.pop()
+            stack.append((level, header_match.group(2).strip()))
+            section_start = position
+        
+        if position > section_start:
+            yield section_start, position, list(stack)
+    
     def split_documents(self, documents: List[Document], **kwargs) -> List[Document]:
         chunk_size = kwargs.get('chunk_size', 500)
         chunk_overlap = kwargs.get('chunk_overlap', 50)
+        length_unit = kwargs.get('length_unit', 'chars')
+        encoding_name = kwargs.get('encoding_name', TOKENIZER_ENCODING)
         
-        # 先按Markdown标题分割
-        headers_to_split_on = [
-            ("#", "标题1"),
-            ("##", "标题2"),
-            ("###", "标题3"),
-            ("####", "标题4"),
-        ]
-        
-        markdown_splitter = MarkdownHeaderTextSplitter(
-            headers_to_split_on=headers_to_split_on
-        )
-        
-        # 然后对每个部分进行递归分割
-        recursive_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            separators=["\n\n", "\n", "。", "！", "？", " ", ""]
-        )
+        # 章节内容超过 chunk_size 时再递归分割（分割器按参数缓存复用）
+        recursive_splitter = _recursive_splitter(chunk_size, chunk_overlap, length_unit, encoding_name)
         
         all_chunks = []
-        for doc in documents:
-            # 先按标题分割
-            header_splits = markdown_splitter.split_text(doc.page_content)
-            # 再递归分割
-            for split in header_splits:
-                chunks = recursive_splitter.split_text(split.page_content)
-                for chunk in chunks:
-                    all_chunks.append(Document(
-                        page_content=chunk,
-                        metadata=doc.metadata
-                    ))
+        for pages in self._group_by_source(documents):
+            text, page_starts = self._join_pages(pages)
+            for section_start, section_end, headers in self._iter_sections(text):
+                section = text[section_start:section_end]
+                if not section.strip():
+                    continue
+                
+                header_metadata = {self.HEADER_KEYS[level]: title for level, title in headers}
+                header_metadata["header_path"] = " > ".join(title for _, title in headers)
+                
+                search_from = 0
+                for chunk in recursive_splitter.split_text(section):
+                    index = section.find(chunk, search_from)
+                    if index < 0:
+                        index = section.find(chunk)
+                    # 下一个文本块至多与当前文本块重叠 chunk_overlap 个字符
+                    overlap_chars = chunk_overlap if length_unit == "chars" else len(chunk)
+                    search_from = max(index + 1, index + len(chunk) - overlap_chars)
+                    
+                    # 根据文本块在全文中的位置确定其所在页面
+                    start = section_start + max(index, 0)
+                    page_index = bisect.bisect_right(page_starts, start) - 1
+                    metadata = dict(pages[page_index].metadata)
+                    metadata.update(header_metadata)
+                    metadata["start_index"] = start - page_starts[page_index]
+                    all_chunks.append(Document(page_content=chunk, metadata=metadata))
         
         return all_chunks
     
@@ -153,8 +284,34 @@ class MarkdownChunking(ChunkingStrategy):
 class SemanticChunking(ChunkingStrategy):
     """语义分块策略（基于spaCy）"""
     
-    def __init__(self):
+    # 按优先级尝试加载的 spaCy 模型
+    MODEL_CANDIDATES = ["zh_core_web_sm", "en_core_web_sm", "xx_ent_wiki_sm"]
+    
+    # 快速模式下排除的组件：句子切分用不到词性、依存和实体信息
+    FAST_MODE_EXCLUDE = [
+        "tagger", "parser", "ner", "lemmatizer", "attribute_ruler",
+        "morphologizer", "entity_ruler", "entity_linker", "trainable_lemmatizer",
+    ]
+    
+    def __init__(
+        self,
+        fast_mode: bool = SPACY_FAST_MODE,
+        batch_size: int = SPACY_BATCH_SIZE,
+        n_process: int = SPACY_N_PROCESS,
+        max_length: int = SPACY_MAX_LENGTH,
+    ):
+        """
+        参数：
+            fast_mode: 快速模式，只保留 senter/sentencizer，跳过 tagger、parser、NER
+            batch_size: nlp.pipe 的批大小
+            n_process: nlp.pipe 的进程数（与 ParallelChunkingExecutor 二选一即可）
+            max_length: 单次送入 spaCy 的最大字符数，超长页面会被切段处理
+        """
         self.spacy_model = None
+        self.fast_mode = fast_mode
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self.max_length = max_length
         # 不在初始化时加载模型，改为延迟加载
     
     def _load_spacy(self):
@@ -164,21 +321,92 @@ class SemanticChunking(ChunkingStrategy):
             
         try:
             import spacy
-            # 尝试加载中文模型，如果没有则使用英文模型
-            try:
-                self.spacy_model = spacy.load("zh_core_web_sm")
-            except OSError:
-                try:
-                    self.spacy_model = spacy.load("en_core_web_sm")
-                except OSError:
-                    # 如果都没有，使用默认模型
-                    try:
-                        self.spacy_model = spacy.load("xx_ent_wiki_sm")
-                    except OSError:
-                        # 如果所有模型都不可用，设置为None
-                        self.spacy_model = None
         except ImportError:
             self.spacy_model = None
+            return
+        
+        load_kwargs = {"exclude": self.FAST_MODE_EXCLUDE} if self.fast_mode else {}
+        # 尝试加载中文模型，如果没有则依次尝试英文模型和多语言模型
+        for model_name in self.MODEL_CANDIDATES:
+            try:
+                self.spacy_model = spacy.load(model_name, **load_kwargs)
+                break
+            except OSError:
+                continue
+        
+        if self.spacy_model is None:
+            if not self.fast_mode:
+                # 如果所有模型都不可用，设置为None
+                return
+            # 快速模式只需要句子边界，空白中文管道（按字切分）配合 sentencizer 即可，
+            # 同时支持中英文标点
+            self.spacy_model = spacy.blank("zh")
+        
+        if self.fast_mode:
+            self._trim_pipeline()
+        # 真正送入模型的文本长度由 _segments 控制，这里只需保证不小于切段长度
+        self.spacy_model.max_length = max(self.spacy_model.max_length, self.max_length)
+    
+    def _trim_pipeline(self):
+        """只保留句子切分所需的组件"""
+        nlp = self.spacy_model
+        if "senter" in nlp.disabled:
+            nlp.enable_pipe("senter")
+        if "senter" not in nlp.pipe_names and "sentencizer" not in nlp.pipe_names:
+            nlp.add_pipe("sentencizer")
+        # 没有组件依赖 tok2vec 时将其禁用
+        if "tok2vec" in nlp.pipe_names:
+            listeners = getattr(nlp.get_pipe("tok2vec"), "listening_components", [])
+            if not any(name in nlp.pipe_names for name in listeners):
+                nlp.disable_pipe("tok2vec")
+    
+    def _segments(self, text: str):
+        """
+        将超长文本切分为不超过 max_length 的片段，尽量在换行处切分
+        返回：
+            (片段起始偏移, 片段文本) 的列表
+        """
+        if len(text) <= self.max_length:
+            return [(0, text)]
+        segments = []
+        start = 0
+        while start < len(text):
+            end = min(start + self.max_length, len(text))
+            if end < len(text):
+                newline = text.rfind("\n", start, end)
+                if newline > start:
+                    end = newline + 1
+            segments.append((start, text[start:end]))
+            start = end
+        return segments
+    
+    def sentence_spans(self, texts: List[str]) -> List[List[tuple]]:
+        """
+        批量计算每段文本中句子的字符区间
+        
+        参数：
+            texts: 文本列表
+        返回：
+            与 texts 一一对应的 [(start, end), ...] 列表，偏移相对于原文本
+        """
+        self._load_spacy()
+        spans = [[] for _ in texts]
+        inputs = (
+            (segment, (doc_index, offset))
+            for doc_index, text in enumerate(texts)
+            for offset, segment in self._segments(text)
+        )
+        pipe = self.spacy_model.pipe(
+            inputs,
+            as_tuples=True,
+            batch_size=self.batch_size,
+            n_process=self.n_process,
+        )
+        for spacy_doc, (doc_index, offset) in pipe:
+            for sent in spacy_doc.sents:
+                if sent.text.strip():
+                    spans[doc_index].append((offset + sent.start_char, offset + sent.end_char))
+        return spans
     
     def split_documents(self, documents: List[Document], **kwargs) -> List[Document]:
         # 延迟加载spaCy模型
@@ -191,36 +419,17 @@ class SemanticChunking(ChunkingStrategy):
         
         chunk_size = kwargs.get('chunk_size', 500)
         chunk_overlap = kwargs.get('chunk_overlap', 50)
+        overlap_unit = kwargs.get('overlap_unit', 'chars')
+        length_unit = kwargs.get('length_unit', 'chars')
+        encoding_name = kwargs.get('encoding_name', TOKENIZER_ENCODING)
         
         all_chunks = []
+        all_spans = self.sentence_spans([doc.page_content for doc in documents])
         
-        for doc in documents:
-            # 使用spaCy进行语义分析
-            spacy_doc = self.spacy_model(doc.page_content)
-            
-            # 按句子分割
-            sentences = [sent.text.strip() for sent in spacy_doc.sents if sent.text.strip()]
-            
-            current_chunk = ""
-            chunks = []
-            
-            for sentence in sentences:
-                if len(current_chunk) + len(sentence) <= chunk_size:
-                    current_chunk += sentence + " "
-                else:
-                    if current_chunk:
-                        chunks.append(current_chunk.strip())
-                    current_chunk = sentence + " "
-            
-            if current_chunk:
-                chunks.append(current_chunk.strip())
-            
-            # 创建Document对象
-            for chunk in chunks:
-                all_chunks.append(Document(
-                    page_content=chunk,
-                    metadata=doc.metadata
-                ))
+        for doc, spans in zip(documents, all_spans):
+            all_chunks.extend(pack_document(
+                doc, spans, chunk_size, chunk_overlap, overlap_unit, length_unit, encoding_name
+            ))
         
         return all_chunks
     
@@ -228,76 +437,106 @@ class SemanticChunking(ChunkingStrategy):
         return "语义分块：使用spaCy进行语义分析，按句子和语义边界分割"
 
 
+@functools.lru_cache(maxsize=None)
+def check_nltk_punkt(data_dir: str = "", allow_download: bool = False) -> bool:
+    """
+    检查 NLTK 的 punkt 句子切分资源是否可用（每个进程只检查一次）
+
+    NLTK 3.8.2 起 sent_tokenize 使用 punkt_tab，更早的版本使用 punkt，
+    因此直接用一次真实的切分调用来判断资源是否就绪。
+
+    参数：
+        data_dir: 预置的 NLTK 数据目录，会被加入 nltk.data.path 最前面
+        allow_download: 资源缺失时是否尝试联网下载
+    返回：
+        bool: 资源可用时为 True；未安装 NLTK 或资源缺失时为 False
+    """
+    try:
+        import nltk
+        from nltk.tokenize import sent_tokenize
+    except ImportError:
+        return False
+
+    if data_dir and data_dir not in nltk.data.path:
+        nltk.data.path.insert(0, data_dir)
+
+    def probe() -> bool:
+        try:
+            sent_tokenize("Probe sentence. Another one.")
+            return True
+        except LookupError:
+            return False
+
+    if probe():
+        return True
+    if allow_download:
+        for package in ("punkt_tab", "punkt"):
+            nltk.download(package, download_dir=data_dir or None, quiet=True, raise_on_error=False)
+        return probe()
+    return False
+
+
 class NLTKSemanticChunking(ChunkingStrategy):
     """基于NLTK的语义分块策略"""
     
-    def __init__(self):
-        self.nltk_available = False
+    def __init__(
+        self,
+        data_dir: str = NLTK_DATA_DIR,
+        allow_download: bool = NLTK_ALLOW_DOWNLOAD,
+        missing_policy: str = NLTK_MISSING_POLICY,
+    ):
+        """
+        参数：
+            data_dir: 预置的 NLTK 数据目录
+            allow_download: 资源缺失时是否允许联网下载
+            missing_policy: 资源缺失时的处理方式，"regex" 回退到内置正则切分器，"error" 立即报错
+        """
+        if missing_policy not in ("regex", "error"):
+            raise ValueError(f"未知的 NLTK 资源缺失处理方式: {missing_policy}")
+        self.data_dir = data_dir
+        self.allow_download = allow_download
+        self.missing_policy = missing_policy
+        self.nltk_available = None
         # 不在初始化时设置NLTK，改为延迟加载
     
     def _setup_nltk(self):
-        """设置NLTK"""
-        if self.nltk_available:
+        """检查NLTK资源，缺失时按 missing_policy 处理"""
+        if self.nltk_available is not None:
             return
-            
-        try:
-            import nltk
-            # 下载必要的NLTK数据
-            try:
-                nltk.data.find('tokenizers/punkt')
-            except LookupError:
-                nltk.download('punkt')
-            
-            try:
-                nltk.data.find('tokenizers/average_perceptron_tagger')
-            except LookupError:
-                nltk.download('averaged_perceptron_tagger')
-            
-            self.nltk_available = True
-        except ImportError:
-            self.nltk_available = False
+        
+        self.nltk_available = check_nltk_punkt(self.data_dir, self.allow_download)
+        if not self.nltk_available and self.missing_policy == "error":
+            raise ConfigurationError(
+                "NLTK 或其 punkt 句子切分资源不可用。\n"
+                "请在可联网的机器上执行 `python -m nltk.downloader -d <目录> punkt punkt_tab`，"
+                "将目录拷贝到本机后设置环境变量 NLTK_DATA_DIR=<目录>；\n"
+                "或设置 NLTK_MISSING_POLICY=regex 使用内置的正则句子切分器。"
+            )
+    
+    def _sentence_spans(self, text: str) -> List[tuple]:
+        """计算句子区间：优先使用 NLTK，不可用时使用内置正则切分器"""
+        if not self.nltk_available:
+            return regex_sentence_spans(text)
+        from nltk.tokenize import sent_tokenize
+        return locate_sentences(text, sent_tokenize(text))
     
     def split_documents(self, documents: List[Document], **kwargs) -> List[Document]:
         # 延迟设置NLTK
         self._setup_nltk()
         
-        if not self.nltk_available:
-            # 如果NLTK不可用，回退到递归分块
-            fallback = RecursiveChunking()
-            return fallback.split_documents(documents, **kwargs)
-        
-        import nltk
-        from nltk.tokenize import sent_tokenize
-        
         chunk_size = kwargs.get('chunk_size', 500)
         chunk_overlap = kwargs.get('chunk_overlap', 50)
+        overlap_unit = kwargs.get('overlap_unit', 'chars')
+        length_unit = kwargs.get('length_unit', 'chars')
+        encoding_name = kwargs.get('encoding_name', TOKENIZER_ENCODING)
         
         all_chunks = []
         
         for doc in documents:
-            # 使用NLTK进行句子分割
-            sentences = sent_tokenize(doc.page_content)
-            
-            current_chunk = ""
-            chunks = []
-            
-            for sentence in sentences:
-                if len(current_chunk) + len(sentence) <= chunk_size:
-                    current_chunk += sentence + " "
-                else:
-                    if current_chunk:
-                        chunks.append(current_chunk.strip())
-                    current_chunk = sentence + " "
-            
-            if current_chunk:
-                chunks.append(current_chunk.strip())
-            
-            # 创建Document对象
-            for chunk in chunks:
-                all_chunks.append(Document(
-                    page_content=chunk,
-                    metadata=doc.metadata
-                ))
+            spans = self._sentence_spans(doc.page_content)
+            all_chunks.extend(pack_document(
+                doc, spans, chunk_size, chunk_overlap, overlap_unit, length_unit, encoding_name
+            ))
         
         return all_chunks
     
@@ -319,12 +558,21 @@ class ChunkingStrategyFactory:
     }
     
     @classmethod
-    def get_strategy(cls, strategy_name: str) -> ChunkingStrategy:
-        """获取指定的分块策略"""
+    def register_strategy(cls, strategy_name: str, strategy_class: Type[ChunkingStrategy]):
+        """注册新的分块策略"""
+        cls._strategies[strategy_name] = strategy_class
+    
+    @classmethod
+    def get_strategy_class(cls, strategy_name: str) -> Type[ChunkingStrategy]:
+        """获取指定分块策略的类"""
         if strategy_name not in cls._strategies:
             raise ValueError(f"未知的分块策略: {strategy_name}")
-        
-        strategy_class = cls._strategies[strategy_name]
+        return cls._strategies[strategy_name]
+    
+    @classmethod
+    def get_strategy(cls, strategy_name: str) -> ChunkingStrategy:
+        """获取指定的分块策略"""
+        strategy_class = cls.get_strategy_class(strategy_name)
         return strategy_class()
     
     @classmethod
@@ -342,9 +590,131 @@ class ChunkingStrategyFactory:
         return list(cls._strategies.keys())
 
 
+# 工作进程内的分块策略实例：每个进程只创建一次，模型也随之只加载一次
+_worker_strategy: Optional[ChunkingStrategy] = None
+
+
+def _init_chunking_worker(strategy_class: Type[ChunkingStrategy]) -> None:
+    """工作进程初始化函数"""
+    global _worker_strategy
+    _worker_strategy = strategy_class()
+    # 进程池的工作进程是守护进程，不能再创建子进程（spaCy nlp.pipe 的 n_process > 1 会失败），
+    # 并行已由进程池提供
+    if getattr(_worker_strategy, "n_process", 1) != 1:
+        _worker_strategy.n_process = 1
+
+
+def _pool_context() -> multiprocessing.context.BaseContext:
+    """
+    进程池的启动方式：forkserver，不支持时（Windows）使用 spawn
+
+    进程池可能在摄入流水线的分块线程中创建，此时读取和嵌入线程持有 PDF 解析、HTTP 连接池
+    等锁，直接 fork 会把这些锁的状态复制到子进程中，可能导致死锁。
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
+
+
+def _split_in_worker(documents: List[Document], kwargs: Dict[str, Any]) -> List[Document]:
+    """在工作进程中分割一组文档"""
+    return _worker_strategy.split_documents(documents, **kwargs)
+
+
+class ParallelChunkingExecutor:
+    """
+    并行分块执行器
+
+    将文档分片后交给进程池中的多个工作进程分割。每个工作进程在初始化时
+    创建一次策略实例，因此 spaCy 等模型在每个进程中只加载一次。结果按照
+    输入顺序返回，与串行分块的输出完全一致。
+
+    n_workers <= 1 时不创建进程池，直接在当前进程中串行执行。
+    """
+
+    def __init__(self, strategy_name: str, n_workers: int = 1, max_pending: Optional[int] = None):
+        """
+        参数：
+            strategy_name: 分块策略名称
+            n_workers: 工作进程数
+            max_pending: 同时提交给进程池的最大任务数，默认 n_workers 的 2 倍
+        """
+        strategy_class = ChunkingStrategyFactory.get_strategy_class(strategy_name)
+        self.n_workers = max(1, n_workers)
+        self.max_pending = max_pending or self.n_workers * 2
+        self._strategy: Optional[ChunkingStrategy] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        if self.n_workers == 1:
+            self._strategy = strategy_class()
+        else:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.n_workers,
+                mp_context=_pool_context(),
+                initializer=_init_chunking_worker,
+                initargs=(strategy_class,),
+            )
+
+    def map_groups(self, groups: Iterable[List[Document]], **kwargs) -> Iterator[List[Document]]:
+        """
+        按输入顺序逐组产出分块结果
+
+        最多同时有 max_pending 个分组在进程池中处理，因此可以用于流式输入。
+
+        参数：
+            groups: 文档分组的可迭代对象，每组作为一个任务整体分割
+            **kwargs: 传递给分块策略的参数
+        返回：
+            每组文档对应的文档块列表
+        """
+        if self._pool is None:
+            for group in groups:
+                yield self._strategy.split_documents(group, **kwargs)
+            return
+
+        pending = deque()
+        for group in groups:
+            pending.append(self._pool.submit(_split_in_worker, group, kwargs))
+            if len(pending) >= self.max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def split_documents(self, documents: List[Document], **kwargs) -> List[Document]:
+        """
+        分割文档列表，文档会被均匀切分为若干连续分片
+
+        参数：
+            documents: 要分割的文档列表
+            **kwargs: 传递给分块策略的参数
+        返回：
+            分割后的文档块列表
+        """
+        if not documents:
+            return []
+        # 分片数取工作进程数的 4 倍，平衡负载的同时控制进程间通信开销
+        shard_size = max(1, math.ceil(len(documents) / (self.n_workers * 4)))
+        shards = [documents[i:i + shard_size] for i in range(0, len(documents), shard_size)]
+        all_chunks = []
+        for chunks in self.map_groups(shards, **kwargs):
+            all_chunks.extend(chunks)
+        return all_chunks
+
+    def close(self) -> None:
+        """关闭进程池"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
 def split_documents_with_strategy(
     documents: List[Document],
     strategy_name: str,
+    n_workers: int = 1,
     **kwargs
 ) -> List[Document]:
     """
@@ -353,10 +723,14 @@ def split_documents_with_strategy(
     参数：
         documents: 要分割的文档列表
         strategy_name: 分块策略名称
+        n_workers: 并行分块的工作进程数，1 表示串行
         **kwargs: 传递给分块策略的参数
     
     返回：
         分割后的文档块列表
     """
-    strategy = ChunkingStrategyFactory.get_strategy(strategy_name)
-    return strategy.split_documents(documents, **kwargs) 
\ No newline at end of file
+    if n_workers <= 1:
+        strategy = ChunkingStrategyFactory.get_strategy(strategy_name)
+        return strategy.split_documents(documents, **kwargs)
+    with ParallelChunkingExecutor(strategy_name, n_workers=n_workers) as executor:
+        return executor.split_documents(documents, **kwargs) 
\ No newline at end of file
@@ -0,0 +1,360 @@
+"""
+服务容器
+
+进程内共享的嵌入模型、大语言模型、向量库、检索器、重排序器和上下文压缩器。每个组件在第一次使用时
+创建并缓存，之后的调用直接复用；嵌入模型最多预热一次。close() 关闭所有组件持有的资源
+（分片向量库的检索线程池、模型客户端的 HTTP 连接池）并释放组件，下次使用时重新创建。
+
+CLI 和问答服务默认使用 get_container() 返回的进程级容器；测试或需要不同配置时
+可以直接创建 ServiceContainer。
+"""
+
+from __future__ import annotations
+
+import logging
+import sys
+import threading
+from functools import partial
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from app.core.config import (
+    CONTEXT_COMPRESSION,
+    DENSE_SEARCH_MODE,
+    EMBEDDING_PROVIDER,
+    EMBEDDING_WARMUP,
+    LLM_MODEL_NAME,
+    LLM_PROVIDER,
+    MMR_FETCH_K,
+)
+from app.core.exceptions import ServiceError
+from app.models.base import EmbeddingProvider, LLMProvider
+from app.models.factory import EmbeddingFactory, LLMFactory
+
+if TYPE_CHECKING:
+    from langchain.docstore.document import Document
+    from langchain.embeddings.base import Embeddings
+    from langchain_core.language_models import BaseLLM
+    from langchain_core.retrievers import BaseRetriever
+
+    from app.services.context_compression import ExtractiveCompressor
+    from app.services.retrievers.sparse import SparseRetriever
+    from app.services.vector_store_service import VectorStore
+
+logger = logging.getLogger(__name__)
+
+# 支持的检索模式
+RETRIEVAL_MODES = ("dense", "sparse", "hybrid")
+
+# 支持的重排序器
+RERANKERS = ("bge", "keyword")
+
+
+class ServiceContainer:
+    """共享模型和检索组件的服务容器（线程安全）"""
+
+    def __init__(
+        self,
+        llm_provider: Optional[LLMProvider] = None,
+        llm_provider_name: str = LLM_PROVIDER,
+        llm_model_name: str = LLM_MODEL_NAME,
+        embedding_provider: str = EMBEDDING_PROVIDER,
+        warmup: bool = EMBEDDING_WARMUP,
+        embedding_model_provider: Optional[EmbeddingProvider] = None,
+    ):
+        """
+        参数：
+            llm_provider: 大语言模型提供者，为 None 时按 llm_provider_name 创建
+            llm_provider_name: 模型提供者名称（tongyi/doubao/ollama/fake）
+            llm_model_name: 模型名称
+            embedding_provider: 嵌入模型提供者名称（ollama/local/fake，见 EmbeddingFactory）
+            warmup: 首次创建嵌入模型时是否预热
+            embedding_model_provider: 嵌入模型提供者，为 None 时按 embedding_provider 创建
+        """
+        self.llm_provider_name = llm_provider_name
+        self.llm_model_name = llm_model_name
+        self.embedding_provider = embedding_provider
+        self.warmup_enabled = warmup
+        self._lock = threading.RLock()
+        self._llm_provider = llm_provider
+        self._embedding_provider = embedding_model_provider
+        self._embeddings: Optional[Embeddings] = None
+        self._warmed_up = False
+        self._llm: Optional[BaseLLM] = None
+        self._vector_store: Optional[VectorStore] = None
+        # 以向量库 id 为键，同时保存向量库本身，避免对象回收后 id 被复用
+        self._corpora: Dict[int, Tuple[Any, List[Document]]] = {}
+        self._sparse: Dict[int, Tuple[Any, SparseRetriever]] = {}
+        self._rerankers: Dict[str, Any] = {}
+        self._compressors: Dict[str, Any] = {}
+
+    def embeddings(self) -> Embeddings:
+        """嵌入模型（首次调用时创建，并按配置预热一次）"""
+        with self._lock:
+            if self._embeddings is None:
+                self._embeddings = self._create_embeddings()
+                if self.warmup_enabled:
+                    try:
+                        self.warmup()
+                    except ServiceError:
+                        # 预热失败说明模型不可用，下次调用时重新创建
+                        self._embeddings = None
+                        raise
+            return self._embeddings
+
+    def embedding_model_provider(self) -> EmbeddingProvider:
+        """嵌入模型提供者"""
+        with self._lock:
+            if self._embedding_provider is None:
+                try:
+                    self._embedding_provider = EmbeddingFactory.create_provider(self.embedding_provider)
+                except Exception as e:
+                    raise ServiceError(
+                        f"创建嵌入模型提供者失败：{e}\n"
+                        f"请检查配置文件中的 EMBEDDING_PROVIDER 设置。"
+                    )
+            return self._embedding_provider
+
+    def _create_embeddings(self) -> Embeddings:
+        provider = self.embedding_model_provider()
+        try:
+            return provider.create_embeddings()
+        except Exception as e:
+            raise ServiceError(f"加载嵌入模型失败：{e}\n{provider.warmup_hint()}".rstrip())
+
+    def warmup(self) -> bool:
+        """
+        调用一次 embed_query 预热嵌入模型（进程内模型此时加载权重），并检查模型是否可用
+
+        伪嵌入无需预热。整个容器生命周期内最多预热一次。
+        返回：
+            bool: 本次是否实际执行了预热
+        """
+        with self._lock:
+            if self._warmed_up or self.embedding_provider == "fake":
+                return False
+            embeddings = self._embeddings or self._create_embeddings()
+            self._embeddings = embeddings
+            try:
+                embeddings.embed_query("测试")
+            except Exception as e:
+                hint = self.embedding_model_provider().warmup_hint()
+                raise ServiceError(f"加载嵌入模型失败：{e}\n{hint}".rstrip())
+            self._warmed_up = True
+            return True
+
+    def llm_provider(self) -> LLMProvider:
+        """大语言模型提供者"""
+        with self._lock:
+            if self._llm_provider is None:
+                try:
+                    self._llm_provider = LLMFactory.create_provider(
+                        self.llm_provider_name, model_name=self.llm_model_name
+                    )
+                except Exception as e:
+                    raise ServiceError(
+                        f"创建模型提供者失败：{e}\n"
+                        f"请检查配置文件中的 LLM_PROVIDER 和 LLM_MODEL_NAME 设置。"
+                    )
+            return self._llm_provider
+
+    def llm(self) -> BaseLLM:
+        """大语言模型（首次调用时创建）"""
+        with self._lock:
+            if self._llm is None:
+                provider = self.llm_provider()
+                try:
+                    print(f"正在加载 {provider.get_provider_name()} 模型...")
+                    self._llm = provider.create_llm()
+                except Exception as e:
+                    raise ServiceError(
+                        f"加载大语言模型失败：{e}\n"
+                        f"请检查API密钥配置和网络连接。"
+                    )
+            return self._llm
+
+    def vector_store(self) -> Optional[VectorStore]:
+        """向量库（首次调用时从磁盘加载），尚未摄入时返回 None 且不缓存"""
+        with self._lock:
+            if self._vector_store is None:
+                from app.services.vector_store_service import load_vector_store
+                self._vector_store = load_vector_store(self.embeddings())
+            return self._vector_store
+
+    def set_vector_store(self, vector_store: Optional[VectorStore]) -> None:
+        """替换向量库（如重新摄入后），并丢弃基于旧向量库的稀疏检索索引"""
+        with self._lock:
+            self._vector_store = vector_store
+            self._corpora.clear()
+            self._sparse.clear()
+
+    def _resolve_vector_store(self, vector_store: Optional[VectorStore]) -> VectorStore:
+        vector_store = vector_store if vector_store is not None else self.vector_store()
+        if vector_store is None:
+            raise ServiceError("未找到向量库。请先运行 'python main.py ingest'。")
+        return vector_store
+
+    def corpus(self, vector_store: Optional[VectorStore] = None) -> List[Document]:
+        """稀疏检索语料：向量库中保存的文本块（与稠密检索使用同一批文本块）"""
+        with self._lock:
+            vector_store = self._resolve_vector_store(vector_store)
+            cached = self._corpora.get(id(vector_store))
+            if cached is None:
+                from app.services.vector_store_service import iter_stored_documents
+                cached = (vector_store, list(iter_stored_documents(vector_store)))
+                self._corpora[id(vector_store)] = cached
+            return cached[1]
+
+    def sparse_retriever(self, vector_store: Optional[VectorStore] = None) -> SparseRetriever:
+        """基于向量库文本块的 BM25 检索器（每个向量库只建一次索引）"""
+        with self._lock:
+            vector_store = self._resolve_vector_store(vector_store)
+            cached = self._sparse.get(id(vector_store))
+            if cached is None:
+                from app.services.retrievers.sparse import SparseRetriever
+                corpus = self.corpus(vector_store)
+                if not corpus:
+                    raise ServiceError("向量库中没有文本块，无法创建稀疏检索器。")
+                cached = (vector_store, SparseRetriever(corpus))
+                self._sparse[id(vector_store)] = cached
+            return cached[1]
+
+    def retriever(
+        self,
+        retrieval_mode: str = "dense",
+        k: int = 4,
+        metadata_filter: Any = None,
+        vector_store: Optional[VectorStore] = None,
+        mmr_lambda: float = 0.0,
+        fetch_k: int = MMR_FETCH_K,
+        search_mode: str = DENSE_SEARCH_MODE,
+    ) -> BaseRetriever:
+        """
+        创建检索器，稀疏检索的 BM25 索引在容器内共享
+        参数：
+            retrieval_mode: 检索模式（dense/sparse/hybrid）
+            k: 稠密检索返回的文本块数量（启用 MMR 时为最终返回的文本块数量）
+            metadata_filter: 默认元数据过滤条件
+            vector_store: 向量库，为 None 时使用容器加载的向量库
+            mmr_lambda: MMR 的 λ，大于 0 时先取 fetch_k 个候选，再用 MMR 选出 k 个
+            fetch_k: 启用 MMR 时底层检索器返回的候选数
+            search_mode: 稠密检索方式（flat/binary）
+        返回：
+            检索器实例
+        """
+        if retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"未知检索模式: {retrieval_mode}")
+        from app.services.retrievers.dense import DenseRetriever
+
+        vector_store = self._resolve_vector_store(vector_store)
+        use_mmr = mmr_lambda > 0
+        candidates = max(k, fetch_k) if use_mmr else k
+        if retrieval_mode == "dense":
+            retriever = DenseRetriever(vector_store, k=candidates, metadata_filter=metadata_filter,
+                                       search_mode=search_mode)
+        else:
+            # 每次返回新的检索器实例（调用方可能包装其方法），BM25 索引仍然共享
+            sparse = self.sparse_retriever(vector_store).with_metadata_filter(
+                metadata_filter, k=candidates if use_mmr else None
+            )
+            if retrieval_mode == "sparse":
+                retriever = sparse
+            else:
+                from app.services.fusion import simple_fusion
+                from app.services.retrievers.hybrid import HybridRetriever
+                dense = DenseRetriever(vector_store, k=candidates, metadata_filter=metadata_filter,
+                                       search_mode=search_mode)
+                fusion = partial(simple_fusion, top_k=candidates) if use_mmr else simple_fusion
+                retriever = HybridRetriever(dense, sparse, fusion)
+        if not use_mmr:
+            return retriever
+
+        from app.services.retrievers.mmr import MMRRetriever
+        return MMRRetriever(retriever, vector_store, k=k, lambda_mult=mmr_lambda)
+
+    def reranker(self, name: str = "bge") -> Any:
+        """重排序器（bge: 本地 BGE 模型，keyword: 关键词覆盖率），每种只创建一次"""
+        if name not in RERANKERS:
+            raise ValueError(f"未知重排序器: {name}")
+        with self._lock:
+            if name not in self._rerankers:
+                if name == "bge":
+                    from app.services.rerankers.local_bge_reranker import LocalBGEReranker
+                    self._rerankers[name] = LocalBGEReranker()
+                else:
+                    from app.services.rerankers.keyword_reranker import KeywordReranker
+                    self._rerankers[name] = KeywordReranker()
+            return self._rerankers[name]
+
+    def compressor(self, method: str = CONTEXT_COMPRESSION) -> Optional[ExtractiveCompressor]:
+        """上下文压缩器（off 时返回 None），每种方式只创建一次，句子嵌入缓存在查询之间共享"""
+        from app.services.context_compression import create_compressor
+        with self._lock:
+            if method not in self._compressors:
+                embeddings = self.embeddings() if method == "embedding" else None
+                self._compressors[method] = create_compressor(method, embeddings=embeddings)
+            return self._compressors[method]
+
+    def close(self) -> None:
+        """关闭所有组件持有的资源并释放组件，下次使用时重新创建"""
+        with self._lock:
+            resources = [self._vector_store, self._embeddings, self._llm]
+            resources += [store for store, _ in self._corpora.values()]
+            resources += [store for store, _ in self._sparse.values()]
+            resources += list(self._rerankers.values()) + list(self._compressors.values())
+            closed = set()
+            for resource in resources:
+                if resource is not None and id(resource) not in closed:
+                    closed.add(id(resource))
+                    _close_resource(resource)
+            # Ollama 嵌入模型和大语言模型共用进程内的连接池客户端（模块未导入说明从未使用）
+            ollama_client = sys.modules.get("app.models.ollama_client")
+            if ollama_client is not None:
+                _close_resource(ollama_client, "close_ollama_clients")
+
+            self._embeddings = None
+            self._warmed_up = False
+            self._llm = None
+            self._vector_store = None
+            self._corpora.clear()
+            self._sparse.clear()
+            self._rerankers.clear()
+            self._compressors.clear()
+
+    def __enter__(self) -> "ServiceContainer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def _close_resource(resource: Any, method: str = "close") -> None:
+    """调用资源的关闭方法（没有该方法时跳过），出错只记录日志，不影响其他资源的关闭"""
+    close = getattr(resource, method, None)
+    if not callable(close):
+        return
+    try:
+        close()
+    except Exception as e:
+        logger.warning("关闭 %s 失败：%s", type(resource).__name__, e)
+
+
+_container: Optional[ServiceContainer] = None
+_container_lock = threading.Lock()
+
+
+def get_container() -> ServiceContainer:
+    """进程级服务容器（首次调用时按配置创建）"""
+    global _container
+    with _container_lock:
+        if _container is None:
+            _container = ServiceContainer()
+        return _container
+
+
+def reset_container(container: Optional[ServiceContainer] = None) -> None:
+    """关闭当前进程级容器，并替换为 container（为 None 时下次使用重新创建）"""
+    global _container
+    with _container_lock:
+        if _container is not None and _container is not container:
+            _container.close()
+        _container = container
@@ -0,0 +1,222 @@
+"""
+抽取式上下文压缩
+
+检索到的文本块中通常只有少数句子与问题相关。压缩阶段位于检索（及重排序）之后、
+上下文打包之前：把每个文本块切分为句子，按与查询的相关性为句子打分，在 token 预算内
+保留得分最高的句子，其余句子不再发送给大语言模型。
+
+打分方式：
+- bm25: 以本次检索到的所有句子为语料计算 BM25（词和相邻汉字二元组），不需要任何模型
+- embedding: 句子嵌入与查询嵌入的余弦相似度，句子嵌入按文本缓存，同一文本块再次被检索到时不重复计算
+
+保留的句子按原文顺序拼接，不相邻的句子之间用省略号分隔。
+"""
+
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+from langchain.embeddings.base import Embeddings
+
+from app.core.config import CONTEXT_COMPRESSION_BUDGET, CONTEXT_COMPRESSION_CACHE_SIZE
+from app.core.metrics import METRICS
+from app.services.sentence_packing import regex_sentence_spans, strip_spans
+from app.services.tokenization import get_token_counter
+
+# 支持的压缩方式
+COMPRESSION_METHODS = ("off", "bm25", "embedding")
+
+# 不相邻句子之间的分隔
+GAP_MARKER = " … "
+
+# 英文单词、数字，或连续的中日韩字符
+_TERM_RE = re.compile(r"[a-z0-9]+|[㐀-鿿]+")
+
+
+def sentence_terms(text: str) -> List[str]:
+    """句子打分使用的词项：英文单词和数字，中文按相邻汉字二元组（单字词保留单字）"""
+    terms = []
+    for token in _TERM_RE.findall(text.lower()):
+        if token[0] < "㐀" or len(token) == 1:
+            terms.append(token)
+        else:
+            terms.extend(token[i:i + 2] for i in range(len(token) - 1))
+    return terms
+
+
+def bm25_scores(query: str, sentences: Sequence[str], k1: float = 1.5, b: float = 0.75) -> np.ndarray:
+    """
+    以 sentences 为语料，计算每个句子对查询的 BM25 分数
+    """
+    query_terms = list(dict.fromkeys(sentence_terms(query)))
+    if not sentences or not query_terms:
+        return np.zeros(len(sentences))
+    counts = [Counter(sentence_terms(sentence)) for sentence in sentences]
+    tf = np.array([[count.get(term, 0) for term in query_terms] for count in counts], dtype=np.float64)
+    lengths = np.array([sum(count.values()) for count in counts], dtype=np.float64)
+    df = (tf > 0).sum(axis=0)
+    idf = np.log((len(sentences) - df + 0.5) / (df + 0.5) + 1.0)
+    norm = k1 * (1 - b + b * lengths / max(lengths.mean(), 1.0))
+    return (idf * tf * (k1 + 1) / (tf + norm[:, None])).sum(axis=1)
+
+
+class ExtractiveCompressor:
+    """按查询相关性保留文本块中的句子"""
+
+    def __init__(
+        self,
+        method: str = "bm25",
+        embeddings: Optional[Embeddings] = None,
+        token_budget: int = CONTEXT_COMPRESSION_BUDGET,
+        cache_size: int = CONTEXT_COMPRESSION_CACHE_SIZE,
+        token_counter: Optional[Callable[[str], int]] = None,
+    ):
+        """
+        参数：
+            method: 打分方式，bm25 或 embedding
+            embeddings: 嵌入模型（embedding 方式必需）
+            token_budget: 保留句子的 token 预算（所有文本块合计），0 表示只丢弃与查询无关（得分为 0）的句子
+            cache_size: 句子嵌入缓存的最大条目数
+            token_counter: token 计数函数，默认使用 tiktoken（不可用时粗略估计）
+        """
+        if method not in ("bm25", "embedding"):
+            raise ValueError(f"未知压缩方式: {method}，可选值: bm25, embedding")
+        if method == "embedding" and embeddings is None:
+            raise ValueError("embedding 压缩方式需要提供嵌入模型")
+        self.method = method
+        self.embeddings = embeddings
+        self.token_budget = max(0, token_budget)
+        self.cache_size = cache_size
+        self._token_counter = token_counter
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def count_tokens(self, text: str) -> int:
+        if self._token_counter is None:
+            self._token_counter = get_token_counter()
+        return self._token_counter(text)
+
+    def compress(self, query: str, docs: Sequence[Document]) -> List[Document]:
+        """
+        压缩检索结果
+        参数：
+            query: 用户问题
+            docs: 按相关性排列的文本块
+        返回：
+            List[Document]: 只保留相关句子的文本块（顺序不变，没有保留任何句子的文本块被去掉），
+                元数据中 sentences/kept_sentences 记录句子总数和保留数
+        """
+        if not docs:
+            return []
+        with METRICS.span("compress"):
+            spans = [strip_spans(doc.page_content, regex_sentence_spans(doc.page_content)) for doc in docs]
+            owners = [(i, j) for i, doc_spans in enumerate(spans) for j in range(len(doc_spans))]
+            sentences = [docs[i].page_content[slice(*spans[i][j])] for i, j in owners]
+            if not sentences:
+                return list(docs)
+            with METRICS.span("compress.score"):
+                scores = self._score(query, sentences)
+            kept = self._select(sentences, scores)
+            return self._assemble(docs, spans, owners, kept)
+
+    def _score(self, query: str, sentences: List[str]) -> np.ndarray:
+        if self.method == "bm25":
+            return bm25_scores(query, sentences)
+        vectors = self._sentence_vectors(sentences)
+        query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        norm = float(np.linalg.norm(query_vector))
+        if norm > 0:
+            query_vector /= norm
+        # 只保留与查询正相关的句子
+        return np.clip(vectors @ query_vector, 0.0, None)
+
+    def _sentence_vectors(self, sentences: List[str]) -> np.ndarray:
+        """句子嵌入（已归一化），未缓存的句子合并为一次 embed_documents 调用"""
+        with self._cache_lock:
+            missing = [s for s in dict.fromkeys(sentences) if s not in self._cache]
+        if missing:
+            vectors = np.asarray(self.embeddings.embed_documents(missing), dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.where(norms > 0, norms, 1.0)
+            with self._cache_lock:
+                for sentence, vector in zip(missing, vectors):
+                    self._cache[sentence] = vector
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        with self._cache_lock:
+            result = []
+            for sentence in sentences:
+                vector = self._cache.get(sentence)
+                if vector is None:
+                    # 缓存容量小于本次句子数时，被淘汰的句子重新计算
+                    vector = np.asarray(self.embeddings.embed_query(sentence), dtype=np.float32)
+                    vector /= max(float(np.linalg.norm(vector)), 1e-12)
+                else:
+                    self._cache.move_to_end(sentence)
+                result.append(vector)
+        return np.vstack(result)
+
+    def _select(self, sentences: List[str], scores: np.ndarray) -> set:
+        """按分数从高到低在预算内选择句子，返回句子下标集合；至少保留得分最高的一句"""
+        order = np.argsort(-scores, kind="stable")
+        kept = {int(order[0])}
+        used = self.count_tokens(sentences[order[0]])
+        for index in order[1:]:
+            if scores[index] <= 0:
+                break
+            if self.token_budget:
+                cost = self.count_tokens(sentences[index])
+                if used + cost > self.token_budget:
+                    continue
+                used += cost
+            kept.add(int(index))
+        return kept
+
+    @staticmethod
+    def _assemble(docs: Sequence[Document], spans: List[List[Tuple[int, int]]],
+                  owners: List[Tuple[int, int]], kept: set) -> List[Document]:
+        kept_by_doc: Dict[int, List[int]] = {}
+        for position, (doc_index, sentence_index) in enumerate(owners):
+            if position in kept:
+                kept_by_doc.setdefault(doc_index, []).append(sentence_index)
+
+        compressed = []
+        for doc_index, doc in enumerate(docs):
+            indices = kept_by_doc.get(doc_index)
+            if not indices:
+                continue
+            text = doc.page_content
+            doc_spans = spans[doc_index]
+            parts = []
+            for previous, current in zip([None] + indices, indices):
+                start, end = doc_spans[current]
+                if previous is not None:
+                    # 相邻句子保留原文中的分隔，不相邻的句子之间加省略号
+                    parts.append(text[doc_spans[previous][1]:start] if current == previous + 1 else GAP_MARKER)
+                parts.append(text[start:end])
+            metadata = dict(doc.metadata or {})
+            metadata["sentences"] = len(doc_spans)
+            metadata["kept_sentences"] = len(indices)
+            compressed.append(Document(page_content="".join(parts), metadata=metadata))
+        return compressed
+
+
+def create_compressor(method: str, embeddings: Optional[Embeddings] = None,
+                      token_budget: int = CONTEXT_COMPRESSION_BUDGET) -> Optional[ExtractiveCompressor]:
+    """
+    按名称创建压缩器
+    参数：
+        method: off/bm25/embedding
+        embeddings: 嵌入模型（embedding 方式必需）
+        token_budget: 保留句子的 token 预算
+    返回：
+        压缩器，off 时返回 None
+    """
+    if method not in COMPRESSION_METHODS:
+        raise ValueError(f"未知压缩方式: {method}，可选值: {', '.join(COMPRESSION_METHODS)}")
+    if method == "off":
+        return None
+    return ExtractiveCompressor(method, embeddings=embeddings, token_budget=token_budget)
@@ -0,0 +1,265 @@
+"""
+上下文打包
+
+把检索到的文本块装入固定的 token 预算，作为 "stuff" 问答链的上下文：
+
+1. 按相关性顺序（检索器 / 重排序器返回的顺序）依次放入文本块，放不下的丢弃；
+   剩余预算不少于 min_chunk_tokens 时截断后放入，总量不超过预算
+2. 同一来源、同一页中首尾重叠或紧邻的文本块合并为一段，去掉 chunk_overlap 留下的
+   重复文本，重复部分不占用预算
+3. 统计上下文和完整提示词的 token 数，便于观察每次查询的成本
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain.docstore.document import Document
+
+from app.core.config import CONTEXT_MIN_CHUNK_TOKENS, CONTEXT_MIN_OVERLAP_CHARS, CONTEXT_TOKEN_BUDGET
+from app.core.metrics import METRICS
+from app.services.tokenization import get_token_counter
+
+# "stuff" 问答链拼接文本块使用的分隔符
+CONTEXT_SEPARATOR = "\n\n"
+
+
+def overlap_length(left: str, right: str, min_overlap: int = CONTEXT_MIN_OVERLAP_CHARS) -> int:
+    """
+    left 的结尾与 right 的开头重叠的最大字符数，小于 min_overlap 时返回 0
+    """
+    max_length = min(len(left), len(right))
+    if min_overlap <= 0 or max_length < min_overlap:
+        return 0
+    head = right[:min_overlap]
+    # 越靠前的匹配位置重叠越长，找到的第一个完整匹配即为最大重叠
+    index = left.find(head, len(left) - max_length)
+    while index != -1:
+        if right.startswith(left[index:]):
+            return len(left) - index
+        index = left.find(head, index + 1)
+    return 0
+
+
+class _Segment:
+    """上下文中的一段文本（由同一来源、同一页的一个或多个相邻文本块合并而成）"""
+
+    __slots__ = ("key", "text", "metadata", "start", "end", "chunks")
+
+    def __init__(self, key: Tuple[Any, Any], doc: Document, text: str):
+        self.key = key
+        self.text = text
+        self.metadata = dict(doc.metadata or {})
+        self.start = self.metadata.get("start_index")
+        self.end = self.metadata.get("end_index")
+        self.chunks = 1
+
+    def to_document(self) -> Document:
+        metadata = dict(self.metadata)
+        if self.chunks > 1:
+            metadata["merged_chunks"] = self.chunks
+            if self.start is not None:
+                metadata["start_index"] = self.start
+            if self.end is not None:
+                metadata["end_index"] = self.end
+        return Document(page_content=self.text, metadata=metadata)
+
+
+class PackedContext:
+    """打包结果"""
+
+    def __init__(self, documents: List[Document], tokens: int, budget: int, candidates: int,
+                 dropped: int, truncated: int, merged: int):
+        """
+        参数：
+            documents: 放入上下文的文本段（相邻文本块已合并）
+            tokens: 上下文的 token 数
+            budget: token 预算，0 表示不限制
+            candidates: 检索到的文本块数量
+            dropped: 因预算不足丢弃的文本块数量
+            truncated: 被截断的文本块数量
+            merged: 合并到其他文本段（或与其完全重复）的文本块数量
+        """
+        self.documents = documents
+        self.tokens = tokens
+        self.budget = budget
+        self.candidates = candidates
+        self.dropped = dropped
+        self.truncated = truncated
+        self.merged = merged
+
+    @property
+    def text(self) -> str:
+        """与 "stuff" 问答链相同方式拼接的上下文"""
+        return CONTEXT_SEPARATOR.join(doc.page_content for doc in self.documents)
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            "context_tokens": self.tokens,
+            "budget": self.budget,
+            "candidates": self.candidates,
+            "segments": len(self.documents),
+            "dropped": self.dropped,
+            "truncated": self.truncated,
+            "merged": self.merged,
+        }
+
+
+class ContextPacker:
+    """按 token 预算打包检索结果"""
+
+    def __init__(
+        self,
+        token_budget: int = CONTEXT_TOKEN_BUDGET,
+        min_chunk_tokens: int = CONTEXT_MIN_CHUNK_TOKENS,
+        min_overlap_chars: int = CONTEXT_MIN_OVERLAP_CHARS,
+        merge_adjacent: bool = True,
+        token_counter: Optional[Callable[[str], int]] = None,
+    ):
+        """
+        参数：
+            token_budget: 上下文 token 预算，0 表示不限制（仍会合并相邻文本块）
+            min_chunk_tokens: 剩余预算不少于该值时截断放入放不下的文本块
+            min_overlap_chars: 判定文本块首尾重叠的最小字符数
+            merge_adjacent: 是否合并同一来源、同一页的相邻文本块
+            token_counter: token 计数函数，默认使用 tiktoken（不可用时粗略估计）
+        """
+        self.token_budget = max(0, token_budget)
+        self.min_chunk_tokens = min_chunk_tokens
+        self.min_overlap_chars = min_overlap_chars
+        self.merge_adjacent = merge_adjacent
+        self._token_counter = token_counter
+
+    def count_tokens(self, text: str) -> int:
+        if self._token_counter is None:
+            self._token_counter = get_token_counter()
+        return self._token_counter(text)
+
+    def pack(self, docs: Sequence[Document]) -> PackedContext:
+        """
+        打包检索结果
+        参数：
+            docs: 按相关性降序排列的文本块
+        返回：
+            PackedContext: 打包结果
+        """
+        with METRICS.span("pack"):
+            return self._pack(docs)
+
+    def _pack(self, docs: Sequence[Document]) -> PackedContext:
+        budget = self.token_budget
+        segments: List[_Segment] = []
+        by_key: Dict[Tuple[Any, Any], List[_Segment]] = {}
+        used = dropped = truncated = merged = 0
+
+        for doc in docs:
+            text = doc.page_content
+            if not text.strip():
+                continue
+            metadata = doc.metadata or {}
+            key = (metadata.get("source"), metadata.get("page"))
+            segment, addition, position = self._find_merge(by_key.get(key, ()), doc) if self.merge_adjacent \
+                else (None, text, None)
+            if segment is not None and not addition:
+                # 与已放入的文本完全重复
+                merged += 1
+                continue
+
+            cost = self.count_tokens(addition)
+            if budget and used + cost > budget:
+                remaining = budget - used
+                # 向前拼接的部分截断后不再与原文相邻，直接丢弃
+                if position == "before" or remaining < min(self.min_chunk_tokens, cost) or remaining <= 0:
+                    dropped += 1
+                    continue
+                addition = self._truncate(addition, remaining)
+                cost = self.count_tokens(addition)
+                truncated += 1
+
+            used += cost
+            if segment is None:
+                segment = _Segment(key, doc, addition)
+                segments.append(segment)
+                by_key.setdefault(key, []).append(segment)
+                continue
+            merged += 1
+            segment.chunks += 1
+            if position == "after":
+                segment.text += addition
+                segment.end = metadata.get("end_index", segment.end)
+            else:
+                segment.text = addition + segment.text
+                segment.start = metadata.get("start_index", segment.start)
+
+        documents = [segment.to_document() for segment in segments]
+        context = CONTEXT_SEPARATOR.join(doc.page_content for doc in documents)
+        tokens = self.count_tokens(context) if context else 0
+        # 分段计数与整体计数在边界处可能相差少量 token，超出时截断最后一段
+        if budget and tokens > budget and documents:
+            last = documents[-1]
+            excess = tokens - budget
+            last.page_content = self._truncate(last.page_content,
+                                               max(0, self.count_tokens(last.page_content) - excess))
+            context = CONTEXT_SEPARATOR.join(doc.page_content for doc in documents)
+            tokens = self.count_tokens(context)
+        return PackedContext(documents, tokens, budget, len(docs), dropped, truncated, merged)
+
+    def _find_merge(self, segments: Sequence[_Segment], doc: Document) -> Tuple[Optional[_Segment], str, Optional[str]]:
+        """
+        在同一来源、同一页的已有文本段中寻找可合并的位置
+        返回：
+            (文本段, 需要新增的文本, "after"/"before")，不能合并时返回 (None, 原文, None)
+        """
+        text = doc.page_content
+        start = doc.metadata.get("start_index") if doc.metadata else None
+        end = doc.metadata.get("end_index") if doc.metadata else None
+        for segment in segments:
+            if text in segment.text:
+                return segment, "", "after"
+            overlap = overlap_length(segment.text, text, self.min_overlap_chars)
+            if overlap or (start is not None and start == segment.end):
+                return segment, text[overlap:], "after"
+            overlap = overlap_length(text, segment.text, self.min_overlap_chars)
+            if overlap or (end is not None and end == segment.start):
+                return segment, text[:len(text) - overlap], "before"
+        return None, text, None
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        """保留不超过 max_tokens 个 token 的最长前缀"""
+        if max_tokens <= 0:
+            return ""
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count_tokens(text[:middle]) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        return text[:low]
+
+
+def prompt_usage(
+    docs: Sequence[Document],
+    question: str,
+    prompt: Any = None,
+    token_counter: Optional[Callable[[str], int]] = None,
+) -> Dict[str, int]:
+    """
+    统计 "stuff" 问答链实际发送的提示词 token 数
+    参数：
+        docs: 放入上下文的文本块
+        question: 用户问题
+        prompt: 提示词模板（需包含 context 和 question 变量），默认与 RetrievalQA 相同
+        token_counter: token 计数函数
+    返回：
+        {"context_tokens": 上下文 token 数, "prompt_tokens": 完整提示词 token 数}
+    """
+    if prompt is None:
+        from langchain.chains.retrieval_qa.prompt import PROMPT
+        prompt = PROMPT
+    counter = token_counter or get_token_counter()
+    context = CONTEXT_SEPARATOR.join(doc.page_content for doc in docs)
+    usage = {
+        "context_tokens": counter(context) if context else 0,
+        "prompt_tokens": counter(prompt.format(context=context, question=question)),
+    }
+    METRICS.increment("llm.prompt_tokens", usage["prompt_tokens"])
+    return usage
@@ -0,0 +1,212 @@
+"""
+文本块去重模块
+
+位于分块和嵌入之间：重复的页眉页脚、法律声明页和重复文档产生的文本块
+只保留一份进入向量库，从而减少嵌入调用次数和索引体积。
+
+- 完全重复：规范化文本（合并空白、转小写）后按 SHA-1 哈希判断
+- 近似重复：字符 shingle 的 MinHash 签名 + LSH 分桶找候选，
+  签名估计的 Jaccard 相似度不低于阈值时视为重复
+- 被去除的文本块不会丢失出处：其来源（source/page）会记录到保留的
+  文本块的 duplicate_sources 元数据中，回答时仍可引用所有原始来源
+"""
+
+import hashlib
+import re
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+
+from app.core.config import DEDUP_MODE, DEDUP_THRESHOLD, DEDUP_NUM_PERM, DEDUP_SHINGLE_SIZE
+
+# 去重模式
+DEDUP_MODES = ("off", "exact", "minhash")
+
+# 略大于 2^32 的素数，哈希参数 a、b 小于 2^31，保证 a*x+b 在 uint64 内不溢出
+_PRIME = np.uint64(4294967311)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本：合并连续空白并转为小写"""
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+
+def source_reference(chunk: Document) -> Dict:
+    """提取文本块的出处信息（来源文件和页码）"""
+    return {key: chunk.metadata[key] for key in ("source", "page") if key in chunk.metadata}
+
+
+def _choose_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """
+    选择 LSH 的分段数和每段行数
+
+    两个签名至少有一段完全相同才会成为候选，候选概率曲线的拐点约为
+    (1/bands)^(1/rows)。选取拐点不高于阈值且最接近阈值的组合，
+    宁可多验证几个候选，也不漏掉真正的近似重复。
+    """
+    best = (num_perm, 1)
+    best_gap = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        knee = (1.0 / bands) ** (1.0 / rows)
+        if knee > threshold:
+            continue
+        gap = threshold - knee
+        if best_gap is None or gap < best_gap:
+            best, best_gap = (bands, rows), gap
+    return best
+
+
+class DedupStats:
+    """去重统计信息"""
+
+    def __init__(self):
+        self.total = 0               # 输入的文本块数
+        self.exact_duplicates = 0    # 完全重复的文本块数
+        self.near_duplicates = 0     # 近似重复的文本块数
+
+    @property
+    def removed(self) -> int:
+        """被去除的文本块数（即节省的嵌入文本数）"""
+        return self.exact_duplicates + self.near_duplicates
+
+    @property
+    def kept(self) -> int:
+        """保留的文本块数"""
+        return self.total - self.removed
+
+
+class ChunkDeduplicator:
+    """
+    文本块去重器
+
+    按输入顺序处理文本块，第一次出现的文本块作为代表保留，之后与之重复的
+    文本块被去除。去重器是有状态的，流式摄入时所有批次共用同一个实例；
+    相同的输入顺序总是得到相同的结果，因此可以配合检查点恢复使用。
+    """
+
+    def __init__(
+        self,
+        mode: str = DEDUP_MODE,
+        threshold: float = DEDUP_THRESHOLD,
+        num_perm: int = DEDUP_NUM_PERM,
+        shingle_size: int = DEDUP_SHINGLE_SIZE,
+        seed: int = 1,
+    ):
+        """
+        参数：
+            mode: 去重模式，"off"、"exact" 或 "minhash"
+            threshold: 近似重复的 Jaccard 相似度阈值（0~1）
+            num_perm: MinHash 签名长度
+            shingle_size: 字符 shingle 长度
+            seed: 生成哈希函数的随机种子
+        """
+        if mode not in DEDUP_MODES:
+            raise ValueError(f"未知的去重模式: {mode}，可选值: {DEDUP_MODES}")
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError("threshold 必须在 (0, 1] 之间")
+        self.mode = mode
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = max(1, shingle_size)
+        self.bands, self.rows = _choose_bands(num_perm, threshold)
+        self.stats = DedupStats()
+
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 2 ** 31, size=(num_perm, 1)).astype(np.uint64)
+        self._b = rng.randint(0, 2 ** 31, size=(num_perm, 1)).astype(np.uint64)
+        self._exact: Dict[str, str] = {}
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._buckets: Dict[Tuple[int, bytes], List[str]] = {}
+
+    def _signature(self, normalized: str) -> np.ndarray:
+        """计算 MinHash 签名"""
+        k = self.shingle_size
+        if len(normalized) <= k:
+            shingles = {normalized}
+        else:
+            shingles = {normalized[i:i + k] for i in range(len(normalized) - k + 1)}
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+            dtype=np.uint64,
+            count=len(shingles),
+        )
+        return ((self._a * hashes + self._b) % _PRIME).min(axis=1)
+
+    def _band_keys(self, signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [
+            (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    def check(self, chunk: Document) -> Tuple[str, Optional[str]]:
+        """
+        判断文本块是否与已见过的文本块重复，并把新文本块加入索引
+
+        参数：
+            chunk: 文本块
+        返回：
+            (文本块键, 代表文本块的键)；不重复时第二项为 None
+        """
+        self.stats.total += 1
+        normalized = normalize_text(chunk.page_content)
+        key = hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+        if self.mode == "off":
+            return key, None
+
+        if key in self._exact:
+            self.stats.exact_duplicates += 1
+            return key, self._exact[key]
+        self._exact[key] = key
+        if self.mode == "exact":
+            return key, None
+
+        signature = self._signature(normalized)
+        band_keys = self._band_keys(signature)
+        checked = set()
+        for band_key in band_keys:
+            for candidate in self._buckets.get(band_key, ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                similarity = float(np.mean(self._signatures[candidate] == signature))
+                if similarity >= self.threshold:
+                    self.stats.near_duplicates += 1
+                    # 后续与该文本块完全相同的文本块直接归到同一个代表
+                    self._exact[key] = candidate
+                    return key, candidate
+
+        self._signatures[key] = signature
+        for band_key in band_keys:
+            self._buckets.setdefault(band_key, []).append(key)
+        return key, None
+
+    def deduplicate(self, chunks: List[Document]) -> Tuple[List[Document], Dict[str, List[Dict]]]:
+        """
+        对一组文本块去重
+
+        启用去重时，保留的文本块的 id 被设置为其文本块键，可作为向量库中的文档 ID。
+
+        参数：
+            chunks: 文本块列表
+        返回：
+            (保留的文本块列表, {代表文本块键: 被去除的重复文本块的出处列表})
+        """
+        unique: List[Document] = []
+        duplicate_sources: Dict[str, List[Dict]] = {}
+        for chunk in chunks:
+            key, canonical = self.check(chunk)
+            if canonical is None:
+                if self.mode != "off":
+                    chunk.id = key
+                unique.append(chunk)
+            else:
+                references = duplicate_sources.setdefault(canonical, [])
+                reference = source_reference(chunk)
+                if reference not in references:
+                    references.append(reference)
+        return unique, duplicate_sources
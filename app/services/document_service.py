@@ -1,9 +1,11 @@
-from typing import List, Type
+import hashlib
+from pathlib import Path
+from typing import Iterator, List, Type
 from langchain.docstore.document import Document
-from langchain_community.document_loaders import PyPDFDirectoryLoader
+from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import TextSplitter, RecursiveCharacterTextSplitter
 
-from app.core.config import DOCS_DIR
+from app.core.config import DOCS_DIR, CHUNKING_WORKERS, SUPPORTED_DOC_EXTENSIONS, TOKENIZER_ENCODING
 from app.services.chunking_strategies import (
     ChunkingStrategyFactory,
     split_documents_with_strategy
@@ -12,13 +14,71 @@ from app.services.chunking_strategies import (
 
 def load_documents() -> List[Document]:
     """
-    从配置的文档目录加载所有 PDF 文档。
+    从配置的文档目录加载所有 PDF 和 Markdown 文档。
 
     返回：
         List[Document]: 加载后的文档列表。
     """
-    loader = PyPDFDirectoryLoader(str(DOCS_DIR))
-    return loader.load()
+    return list(iter_documents())
+
+
+def list_document_files(docs_dir: Path = DOCS_DIR) -> List[Path]:
+    """
+    列出文档目录中所有待摄入的文件（按路径排序，保证顺序稳定）。
+
+    支持的扩展名见 SUPPORTED_DOC_EXTENSIONS，以 . 开头的隐藏文件会被忽略。
+
+    参数：
+        docs_dir (Path): 文档目录，默认为配置的 DOCS_DIR。
+    返回：
+        List[Path]: 文件路径列表。
+    """
+    return sorted(
+        p for p in Path(docs_dir).glob("**/[!.]*")
+        if p.is_file() and p.suffix.lower() in SUPPORTED_DOC_EXTENSIONS
+    )
+
+
+def iter_documents(docs_dir: Path = DOCS_DIR) -> Iterator[Document]:
+    """
+    逐文件惰性加载文档目录中的文档。
+
+    PDF 文件逐页产出；Markdown 文件整体作为一个文档产出，以便 Markdown
+    分块策略在整篇文档上识别标题层级。与一次性加载不同，该函数不会把所有
+    文档同时读入内存，适合作为流式摄入流水线的数据源。
+
+    参数：
+        docs_dir (Path): 文档目录，默认为配置的 DOCS_DIR。
+    返回：
+        Iterator[Document]: 按文件顺序依次产出的文档。
+    """
+    for path in list_document_files(docs_dir):
+        if path.suffix.lower() == ".pdf":
+            loader = PyPDFLoader(str(path))
+            for page in loader.lazy_load():
+                page.metadata["source"] = str(path)
+                yield page
+        else:
+            yield Document(
+                page_content=path.read_text(encoding="utf-8", errors="replace"),
+                metadata={"source": str(path)},
+            )
+
+
+def get_corpus_signature() -> str:
+    """
+    根据文档文件的路径、大小和修改时间计算语料签名。
+
+    签名用于判断摄入检查点是否仍然对应当前的文档目录。
+
+    返回：
+        str: 语料签名（十六进制摘要）。
+    """
+    digest = hashlib.sha1()
+    for path in list_document_files():
+        stat = path.stat()
+        digest.update(f"{path}|{stat.st_size}|{int(stat.st_mtime)}\n".encode("utf-8"))
+    return digest.hexdigest()
 
 
 def split_documents(
@@ -48,6 +108,9 @@ def split_documents_with_strategy_name(
     strategy_name: str,
     chunk_size: int = 500,
     chunk_overlap: int = 50,
+    n_workers: int = CHUNKING_WORKERS,
+    length_unit: str = "chars",
+    encoding_name: str = TOKENIZER_ENCODING,
 ) -> List[Document]:
     """
     使用指定的分块策略名称将文档切分为更小的块。
@@ -57,6 +120,9 @@ def split_documents_with_strategy_name(
         strategy_name (str): 分块策略名称。
         chunk_size (int): 每个块的大小。
         chunk_overlap (int): 块之间的重叠。
+        n_workers (int): 并行分块的工作进程数，1 表示串行。
+        length_unit (str): 长度单位，"chars" 按字符数、"tokens" 按 token 数。
+        encoding_name (str): 按 token 计长时使用的编码名称，应与嵌入模型的分词器一致。
 
     返回：
         List[Document]: 切分后的文档块列表。
@@ -64,8 +130,11 @@ def split_documents_with_strategy_name(
     return split_documents_with_strategy(
         documents=documents,
         strategy_name=strategy_name,
+        n_workers=n_workers,
         chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap
+        chunk_overlap=chunk_overlap,
+        length_unit=length_unit,
+        encoding_name=encoding_name,
     )
 
 
@@ -0,0 +1,526 @@
+"""
+流式摄入流水线模块
+
+将摄入过程拆分为四个阶段，阶段之间通过有界队列连接：
+
+    页面生成器 -> 分块器（含去重） -> 批量嵌入器 -> 索引写入器
+
+队列写满时上游阶段会阻塞（背压），因此内存占用只取决于队列容量、
+批大小和单个文件的页数，而与语料总规模无关。写入器定期把新提交的批次
+追加到检查点，摄入中断后可以从最近一次保存的批次继续，而不必从头开始。
+"""
+
+import json
+import os
+import pickle
+import queue
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from langchain.docstore.document import Document
+from langchain.embeddings.base import Embeddings
+
+from app.core.config import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_CHUNK_OVERLAP,
+    CHUNKING_WORKERS,
+    INGEST_BATCH_SIZE,
+    INGEST_QUEUE_SIZE,
+    INGEST_CHECKPOINT_EVERY,
+    INGEST_CHECKPOINT_DIR,
+    DEDUP_MODE,
+    DEDUP_THRESHOLD,
+    VECTOR_STORE_SHARDS,
+    VECTOR_STORE_SHARD_BY,
+    VECTOR_STORE_QUANTIZATION,
+    VECTOR_STORE_BINARY_INDEX,
+    FAISS_INDEX_PATH,
+    TOKENIZER_ENCODING,
+)
+from app.core.exceptions import ServiceError
+from app.services import vector_store_service
+from app.services.quantization import QUANTIZATION_TYPES, build_binary_index, quantize_vector_store
+from app.services.vector_store_service import VectorStore
+from app.services.chunking_strategies import ChunkingStrategyFactory, ParallelChunkingExecutor
+from app.services.dedup import ChunkDeduplicator, source_reference
+from app.services.sharded_vector_store import ShardedVectorStore
+
+# 阶段结束标记
+_SENTINEL = object()
+
+# 阻塞的队列操作检查取消信号的间隔（秒）
+_POLL_INTERVAL = 0.1
+
+
+class _PipelineCancelled(Exception):
+    """流水线被取消（通常是其他阶段出错）"""
+    pass
+
+
+class IngestStats:
+    """摄入统计信息"""
+
+    def __init__(self):
+        self.pages = 0              # 已读取的页面数
+        self.chunks = 0             # 本次写入索引的文本块数
+        self.batches = 0            # 本次写入索引的批次数
+        self.skipped_batches = 0    # 从检查点恢复时跳过的已提交批次数
+        self.checkpoints = 0        # 本次保存的检查点数
+        self.exact_duplicates = 0   # 去除的完全重复文本块数
+        self.near_duplicates = 0    # 去除的近似重复文本块数
+        self.embedded_chunks = 0    # 去重后需要嵌入的文本块数（含检查点中已提交的部分）
+        self.embedding_batches = 0  # 去重后的批次数（含检查点中已提交的部分）
+
+
+def _apply_batch(
+    vector_store: Optional[VectorStore],
+    batch: List[Document],
+    vectors: Sequence[Sequence[float]],
+    duplicates: Dict[str, List[Dict]],
+    embeddings: Embeddings,
+    batch_index: int,
+) -> Optional[VectorStore]:
+    """把一批文本块及其重复出处写入向量库（写入器和检查点恢复共用，保证两者结果一致）"""
+    if batch:
+        vector_store = vector_store_service.add_embedded_chunks(
+            vector_store, batch, vectors, embeddings, batch_index=batch_index
+        )
+    if duplicates and vector_store is not None:
+        vector_store_service.add_duplicate_sources(vector_store, duplicates)
+    return vector_store
+
+
+class IngestCheckpoint:
+    """
+    摄入检查点
+
+    检查点只追加写入：每次保存把自上次保存以来提交的批次（文本块、ID、向量和
+    重复出处）写成一个新的增量段文件，已写入的段不再改写，因此总写入量与语料
+    规模成线性关系。恢复时按顺序重放全部增量段，得到与中断前相同的部分索引。
+
+    状态文件记录已提交的批次数、增量段列表以及生成这些批次所用的参数指纹，
+    参数或语料发生变化时检查点自动失效。
+    """
+
+    STATE_FILE = "state.json"
+
+    def __init__(self, directory: Path, fingerprint: Dict[str, Any]):
+        self.directory = Path(directory)
+        self.fingerprint = fingerprint
+        self._segments: List[Dict[str, Any]] = []
+        self._pending: List[Tuple[List[Document], np.ndarray, Dict[str, List[Dict]]]] = []
+        self._saved_batches = 0
+
+    def load(self, vector_store: Optional[VectorStore], embeddings: Embeddings) -> Tuple[int, Optional[VectorStore]]:
+        """
+        读取检查点，把增量段中的批次依次写入 vector_store
+        返回：
+            (已提交批次数, 部分索引)；没有可用检查点时返回 (0, vector_store)
+        """
+        state_path = self.directory / self.STATE_FILE
+        if not state_path.exists():
+            return 0, vector_store
+        try:
+            state = json.loads(state_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return 0, vector_store
+        segments = state.get("segments")
+        if state.get("fingerprint") != self.fingerprint or not isinstance(segments, list):
+            return 0, vector_store
+
+        batches = []
+        try:
+            for segment in segments:
+                with open(self.directory / segment["file"], "rb") as f:
+                    batches.extend(pickle.load(f))
+        except (OSError, KeyError, pickle.UnpicklingError, EOFError):
+            return 0, vector_store
+        for batch_index, (batch, vectors, duplicates) in enumerate(batches):
+            vector_store = _apply_batch(vector_store, batch, vectors, duplicates, embeddings, batch_index)
+
+        self._segments = list(segments)
+        self._saved_batches = int(state["committed_batches"])
+        return self._saved_batches, vector_store
+
+    def record(self, batch: List[Document], vectors: Sequence[Sequence[float]],
+               duplicates: Dict[str, List[Dict]]) -> None:
+        """
+        记录一个已提交的批次，下次 save 时写入增量段
+
+        必须在批次写入向量库之前调用：向量库会直接修改文本块的元数据（如追加
+        duplicate_sources），这里保存的是写入前的副本，恢复时重放同样的修改。
+        """
+        snapshot = [Document(id=chunk.id, page_content=chunk.page_content, metadata=dict(chunk.metadata))
+                    for chunk in batch]
+        self._pending.append((snapshot, np.asarray(vectors, dtype=np.float32), duplicates))
+
+    def save(self, committed_batches: int) -> None:
+        """
+        保存检查点：先写入新的增量段，再原子替换状态文件，最后清理未被引用的文件。
+        任意一步中断都不会让状态文件指向不完整的增量段。
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if self._pending:
+            segment_name = f"segment_{self._saved_batches:08d}.pkl"
+            tmp_path = self.directory / (segment_name + ".tmp")
+            with open(tmp_path, "wb") as f:
+                pickle.dump(self._pending, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.directory / segment_name)
+            self._segments.append({"file": segment_name, "batches": len(self._pending)})
+            self._pending = []
+        self._saved_batches = committed_batches
+
+        state = {
+            "fingerprint": self.fingerprint,
+            "committed_batches": committed_batches,
+            "segments": self._segments,
+        }
+        tmp_path = self.directory / (self.STATE_FILE + ".tmp")
+        tmp_path.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, self.directory / self.STATE_FILE)
+
+        # 上次中断时写了一半的增量段、失效检查点留下的文件
+        keep = {self.STATE_FILE} | {segment["file"] for segment in self._segments}
+        for entry in self.directory.iterdir():
+            if entry.name not in keep:
+                if entry.is_dir():
+                    shutil.rmtree(entry, ignore_errors=True)
+                else:
+                    entry.unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        """删除检查点"""
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self._segments, self._pending, self._saved_batches = [], [], 0
+
+    @property
+    def saved_batches(self) -> int:
+        """已持久化到检查点中的批次数（含从检查点恢复的部分）"""
+        return self._saved_batches
+
+
+class StreamingIngestPipeline:
+    """
+    流式摄入流水线
+
+    页面读取、分块、嵌入分别运行在独立线程中，索引写入在调用线程中进行。
+    同一文件的页面会被合并后一起交给分块策略，以保留跨页的上下文；
+    n_workers > 1 时多个文件会在进程池中并行分块。
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        strategy_name: str,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+        length_unit: str = "chars",
+        encoding_name: str = TOKENIZER_ENCODING,
+        n_workers: int = CHUNKING_WORKERS,
+        batch_size: int = INGEST_BATCH_SIZE,
+        queue_size: int = INGEST_QUEUE_SIZE,
+        checkpoint_every: int = INGEST_CHECKPOINT_EVERY,
+        checkpoint_dir: Path = INGEST_CHECKPOINT_DIR,
+        resume: bool = True,
+        fingerprint_extra: Optional[Dict[str, Any]] = None,
+        on_batch: Optional[Callable[[IngestStats], None]] = None,
+        dedup_mode: str = DEDUP_MODE,
+        dedup_threshold: float = DEDUP_THRESHOLD,
+        tags: Optional[Dict[str, Any]] = None,
+        n_shards: int = VECTOR_STORE_SHARDS,
+        shard_by: str = VECTOR_STORE_SHARD_BY,
+        index_path: str = FAISS_INDEX_PATH,
+        quantization: str = VECTOR_STORE_QUANTIZATION,
+        binary_index: bool = VECTOR_STORE_BINARY_INDEX,
+    ):
+        """
+        初始化流水线
+
+        参数：
+            embeddings: 嵌入模型实例
+            strategy_name: 分块策略名称
+            chunk_size: 文本块大小
+            chunk_overlap: 文本块重叠大小
+            length_unit: 长度单位，"chars" 按字符数、"tokens" 按 token 数
+            encoding_name: 按 token 计长时使用的编码名称，应与嵌入模型的分词器一致（EmbeddingProvider.token_encoding）
+            n_workers: 分块工作进程数
+            batch_size: 每批嵌入的文本块数量
+            queue_size: 阶段间队列容量
+            checkpoint_every: 每提交多少批保存一次检查点
+            checkpoint_dir: 检查点目录
+            resume: 是否尝试从检查点恢复
+            fingerprint_extra: 额外的检查点指纹信息（如语料签名）
+            on_batch: 每提交一批后调用的回调，参数为当前统计信息
+            dedup_mode: 文本块去重模式，"off"、"exact" 或 "minhash"
+            dedup_threshold: 近似重复的 Jaccard 相似度阈值
+            tags: 写入每个文本块元数据的标签，检索时可按标签过滤
+            n_shards: 向量库分片数，1 表示单个 FAISS 索引
+            shard_by: 分片方式，"source" 按来源文件哈希，"batch" 按批次轮转
+            index_path: 最终索引的保存路径
+            quantization: 最终索引的量化方式（none/fp16/int8/pq），检查点始终保存 float32 索引
+            binary_index: 是否同时建立二值索引（供 binary 稠密检索方式使用）
+        """
+        if batch_size <= 0:
+            raise ValueError("batch_size 必须为正整数")
+        self.embeddings = embeddings
+        self.strategy_name = strategy_name
+        # 提前校验策略名称，避免启动线程后才发现错误
+        ChunkingStrategyFactory.get_strategy_class(strategy_name)
+        self.n_workers = max(1, n_workers)
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.length_unit = length_unit
+        self.encoding_name = encoding_name
+        self.batch_size = batch_size
+        self.queue_size = max(1, queue_size)
+        self.checkpoint_every = max(1, checkpoint_every)
+        self.checkpoint_dir = Path(checkpoint_dir)
+        self.resume = resume
+        self.fingerprint_extra = fingerprint_extra or {}
+        self.on_batch = on_batch
+        self.dedup_mode = dedup_mode
+        self.dedup_threshold = dedup_threshold
+        # 提前校验去重参数
+        ChunkDeduplicator(dedup_mode, dedup_threshold)
+        self.tags = dict(tags or {})
+        self.n_shards = max(1, n_shards)
+        self.shard_by = shard_by
+        self.index_path = index_path
+        if quantization not in QUANTIZATION_TYPES:
+            raise ValueError(f"未知量化方式: {quantization}，可选值: {', '.join(QUANTIZATION_TYPES)}")
+        self.quantization = quantization
+        self.binary_index = binary_index
+        self.stats = IngestStats()
+
+        self._stop = threading.Event()
+        self._errors: List[BaseException] = []
+
+    def _embeddings_signature(self) -> str:
+        """嵌入模型的类名和模型名"""
+        model = getattr(self.embeddings, "model_name", None) or getattr(self.embeddings, "model", None)
+        name = type(self.embeddings).__name__
+        return f"{name}:{model}" if isinstance(model, str) else name
+
+    def _fingerprint(self) -> Dict[str, Any]:
+        """影响批次划分的参数，任一变化都会使检查点失效"""
+        fingerprint = {
+            "strategy": self.strategy_name,
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "length_unit": self.length_unit,
+            "encoding_name": self.encoding_name,
+            "batch_size": self.batch_size,
+            "dedup_mode": self.dedup_mode,
+            "dedup_threshold": self.dedup_threshold,
+            "tags": self.tags,
+            "n_shards": self.n_shards,
+            "shard_by": self.shard_by,
+            # 不同嵌入模型的向量不能写入同一个索引
+            "embeddings": self._embeddings_signature(),
+        }
+        fingerprint.update(self.fingerprint_extra)
+        return fingerprint
+
+    def run(self, pages: Iterable[Document]) -> VectorStore:
+        """
+        运行流水线并把最终索引保存到 index_path（默认 FAISS_INDEX_PATH）
+
+        参数：
+            pages: 页面文档的可迭代对象（可以是生成器）
+        返回：
+            VectorStore: 构建完成的向量库（n_shards > 1 时为分片向量库）
+        """
+        checkpoint = IngestCheckpoint(self.checkpoint_dir, self._fingerprint())
+        vector_store = vector_store_service.create_empty_vector_store(
+            self.embeddings, self.n_shards, self.shard_by
+        )
+        if self.resume:
+            committed, vector_store = checkpoint.load(vector_store, self.embeddings)
+        else:
+            checkpoint.clear()
+            committed = 0
+        self.stats.skipped_batches = committed
+
+        page_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        chunk_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        vector_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+
+        stages = [
+            ("ingest-loader", self._load_pages, (pages, page_queue)),
+            ("ingest-chunker", self._chunk_pages, (page_queue, chunk_queue, committed)),
+            ("ingest-embedder", self._embed_batches, (chunk_queue, vector_queue)),
+        ]
+        threads = [
+            threading.Thread(target=self._guard, args=(target, *args), name=name, daemon=True)
+            for name, target, args in stages
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            vector_store = self._write_batches(vector_queue, vector_store, checkpoint, committed)
+        except _PipelineCancelled:
+            pass
+        except BaseException as e:
+            self._errors.append(e)
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+
+        if self._errors:
+            error = self._errors[0]
+            if checkpoint.saved_batches:
+                hint = f"前 {checkpoint.saved_batches} 个批次已保存在检查点中，重新运行 ingest 即可继续。"
+            else:
+                hint = "尚未保存任何检查点，重新运行 ingest 将从头开始。"
+            raise ServiceError(f"流式摄入失败：{error}\n{hint}") from error
+        if vector_store is None or (isinstance(vector_store, ShardedVectorStore) and vector_store.ntotal == 0):
+            raise ServiceError("没有生成任何文本块，请检查文档内容和分块参数。")
+
+        if self.quantization != "none":
+            quantize_vector_store(vector_store, self.quantization)
+        if self.binary_index:
+            build_binary_index(vector_store)
+        vector_store_service.save_vector_store(vector_store, self.index_path)
+        checkpoint.clear()
+        return vector_store
+
+    # --- 各阶段实现 ---
+
+    def _guard(self, target: Callable, *args) -> None:
+        """在线程中运行阶段函数，记录异常并通知其他阶段停止"""
+        try:
+            target(*args)
+        except _PipelineCancelled:
+            pass
+        except BaseException as e:
+            self._errors.append(e)
+            self._stop.set()
+
+    def _put(self, q: queue.Queue, item: Any) -> None:
+        """带取消检查的阻塞写入"""
+        while True:
+            if self._stop.is_set():
+                raise _PipelineCancelled()
+            try:
+                q.put(item, timeout=_POLL_INTERVAL)
+                return
+            except queue.Full:
+                continue
+
+    def _drain(self, q: queue.Queue) -> Iterator[Any]:
+        """带取消检查的逐项读取，遇到结束标记时停止"""
+        while True:
+            if self._stop.is_set():
+                raise _PipelineCancelled()
+            try:
+                item = q.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            if item is _SENTINEL:
+                return
+            yield item
+
+    def _load_pages(self, pages: Iterable[Document], page_queue: queue.Queue) -> None:
+        """阶段一：读取页面"""
+        for page in pages:
+            self._put(page_queue, page)
+            self.stats.pages += 1
+        self._put(page_queue, _SENTINEL)
+
+    def _group_by_source(self, pages: Iterable[Document]) -> Iterator[List[Document]]:
+        """把连续的、来源相同的页面合并为一组"""
+        group: List[Document] = []
+        current_source = None
+        for page in pages:
+            source = page.metadata.get("source")
+            if group and source != current_source:
+                yield group
+                group = []
+            group.append(page)
+            current_source = source
+        if group:
+            yield group
+
+    def _chunk_pages(self, page_queue: queue.Queue, chunk_queue: queue.Queue, skip_batches: int) -> None:
+        """
+        阶段二：分块、去重并按 batch_size 组批；恢复时跳过已提交的批次
+
+        每批附带自上一批以来发现的重复文本块出处。重复文本块的代表总是先于它
+        出现，因此写入器在写入本批之后更新代表的 duplicate_sources 即可。
+        去重器的状态在恢复时通过重新处理全部文本块确定性地重建。
+        """
+        deduplicator = None
+        if self.dedup_mode != "off":
+            deduplicator = ChunkDeduplicator(self.dedup_mode, self.dedup_threshold)
+        batch: List[Document] = []
+        duplicates: Dict[str, List[Dict]] = {}
+        seq = 0
+
+        def emit() -> None:
+            nonlocal batch, duplicates, seq
+            if seq >= skip_batches:
+                self._put(chunk_queue, (batch, duplicates))
+            seq += 1
+            self.stats.embedding_batches = seq
+            batch, duplicates = [], {}
+
+        with ParallelChunkingExecutor(self.strategy_name, n_workers=self.n_workers) as executor:
+            chunk_groups = executor.map_groups(
+                self._group_by_source(self._drain(page_queue)),
+                chunk_size=self.chunk_size,
+                chunk_overlap=self.chunk_overlap,
+                length_unit=self.length_unit,
+                encoding_name=self.encoding_name,
+            )
+            for chunks in chunk_groups:
+                for chunk in chunks:
+                    chunk.metadata.update(self.tags)
+                    if deduplicator is not None:
+                        key, canonical = deduplicator.check(chunk)
+                        self.stats.exact_duplicates = deduplicator.stats.exact_duplicates
+                        self.stats.near_duplicates = deduplicator.stats.near_duplicates
+                        if canonical is not None:
+                            duplicates.setdefault(canonical, []).append(source_reference(chunk))
+                            continue
+                        chunk.id = key
+                    batch.append(chunk)
+                    self.stats.embedded_chunks += 1
+                    if len(batch) >= self.batch_size:
+                        emit()
+        if batch or duplicates:
+            emit()
+        self._put(chunk_queue, _SENTINEL)
+
+    def _embed_batches(self, chunk_queue: queue.Queue, vector_queue: queue.Queue) -> None:
+        """阶段三：批量计算向量"""
+        for batch, duplicates in self._drain(chunk_queue):
+            vectors = self.embeddings.embed_documents([chunk.page_content for chunk in batch]) if batch else []
+            self._put(vector_queue, (batch, vectors, duplicates))
+        self._put(vector_queue, _SENTINEL)
+
+    def _write_batches(
+        self,
+        vector_queue: queue.Queue,
+        vector_store: Optional[VectorStore],
+        checkpoint: IngestCheckpoint,
+        committed: int,
+    ) -> Optional[VectorStore]:
+        """阶段四：写入索引并定期保存检查点"""
+        for batch, vectors, duplicates in self._drain(vector_queue):
+            checkpoint.record(batch, vectors, duplicates)
+            vector_store = _apply_batch(vector_store, batch, vectors, duplicates, self.embeddings, committed)
+            committed += 1
+            self.stats.batches += 1
+            self.stats.chunks += len(batch)
+            if committed % self.checkpoint_every == 0:
+                checkpoint.save(committed)
+                self.stats.checkpoints += 1
+            if self.on_batch is not None:
+                self.on_batch(self.stats)
+        return vector_store
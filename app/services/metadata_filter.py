@@ -0,0 +1,316 @@
+"""
+元数据过滤模块
+
+检索前按文本块元数据筛选候选集合（预过滤），而不是在 top-k 结果中再过滤：
+
+- 等值 / 集合：source 等于某个文件、属于若干文件之一
+- 范围：page 在某个区间内
+- 摄入时附加的任意标签（如 ingest --tag project=alpha）
+
+过滤条件的写法：
+    {"source": "docs/a.pdf"}                       等值
+    {"source": ["a.pdf", "docs/b.pdf"]}            属于其一
+    {"page": {"gte": 3, "lte": 7}}                 范围
+    {"project": {"ne": "alpha"}}                   不等于
+元数据值为列表时（如多值标签），等值条件表示列表包含该值。
+source 中保存的是文件的绝对路径，按路径末尾的若干段匹配：文件名（a.pdf）、相对路径（docs/a.pdf）
+和完整路径都能匹配。
+去重后一个文本块代表多个出处（其余出处记录在 duplicate_sources 中），source 和 page 的等值条件对
+这些出处同样成立：a.md 与 b.md 共有的段落只以 a.md 保存一次，按 source=b.md 过滤时也会命中。
+各字段分别匹配，范围条件只比较文本块自身的值。
+"""
+
+from pathlib import PurePath
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+# 支持的比较运算符
+FILTER_OPERATORS = ("eq", "ne", "in", "nin", "gt", "gte", "lt", "lte")
+
+# 值为文件路径的元数据字段，等值条件按路径末尾的若干段匹配
+PATH_METADATA_KEYS = ("source",)
+
+# 去重时记录被去除文本块出处的元数据字段，以及出处中包含的字段
+DUPLICATE_SOURCES_KEY = "duplicate_sources"
+REFERENCE_METADATA_KEYS = ("source", "page")
+
+_RANGE_OPERATORS = ("gt", "gte", "lt", "lte")
+_MISSING = object()
+
+
+def parse_value(text: str) -> Any:
+    """
+    命令行中的值：整数、浮点数或字符串
+
+    过滤表达式（query --filter）和摄入标签（ingest --tag）都用它解析，同一个值写入和查询时类型一致，
+    如 --tag year=2024 写入整数 2024，--filter year=2024 也按整数比较。
+    """
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            continue
+    return text
+
+
+def _equality_values(text: str) -> List[Any]:
+    """
+    等值/集合条件中一个命令行值对应的候选值：解析为数值时同时保留原字符串，
+    旧索引中按字符串写入的数值标签（如 "2024"）也能匹配
+    """
+    value = parse_value(text)
+    return [value] if value == text else [value, text]
+
+
+def _path_suffixes(path: str) -> List[str]:
+    """路径本身及其末尾的各段组合：/x/docs/a.pdf -> [/x/docs/a.pdf, x/docs/a.pdf, docs/a.pdf, a.pdf]"""
+    pure = PurePath(path)
+    parts = pure.parts
+    return [pure.as_posix()] + ["/".join(parts[i:]) for i in range(1, len(parts))]
+
+
+def _equality_candidates(metadata: Dict[str, Any], key: str) -> List[Any]:
+    """
+    文本块在某个字段上参与等值比较的全部值：自身的值（列表值展开，路径展开为各段后缀），
+    以及 duplicate_sources 中各出处的值；字段不存在时返回空列表
+    """
+    values = []
+    own = metadata.get(key, _MISSING)
+    if own is not _MISSING:
+        values.append(own)
+    if key in REFERENCE_METADATA_KEYS:
+        for reference in metadata.get(DUPLICATE_SOURCES_KEY) or ():
+            if isinstance(reference, dict) and key in reference:
+                values.append(reference[key])
+    candidates = []
+    for value in values:
+        if key in PATH_METADATA_KEYS and isinstance(value, str):
+            candidates.extend(_path_suffixes(value))
+        elif isinstance(value, (list, tuple, set)):
+            candidates.extend(value)
+        else:
+            candidates.append(value)
+    return candidates
+
+
+def _normalize_path_value(value: Any) -> Any:
+    return PurePath(value).as_posix() if isinstance(value, str) and value else value
+
+
+def _compare(op: str, actual: Any, expected: Any) -> bool:
+    """对单个元数据值求值（列表值按“包含”处理）"""
+    if op == "eq":
+        return expected in actual if isinstance(actual, (list, tuple, set)) else actual == expected
+    if op == "in":
+        return any(_compare("eq", actual, value) for value in expected)
+    try:
+        if op == "gt":
+            return actual > expected
+        if op == "gte":
+            return actual >= expected
+        if op == "lt":
+            return actual < expected
+        if op == "lte":
+            return actual <= expected
+    except TypeError:
+        return False
+    raise ValueError(f"未知的过滤运算符: {op}，可选值: {FILTER_OPERATORS}")
+
+
+class MetadataFilter:
+    """元数据过滤条件，各字段的条件之间为“与”关系"""
+
+    def __init__(self, conditions: Dict[str, Any]):
+        """
+        参数：
+            conditions: 过滤条件，写法见模块说明
+        """
+        self.conditions: Dict[str, List[Tuple[str, Any]]] = {}
+        for key, condition in conditions.items():
+            if isinstance(condition, dict):
+                ops = list(condition.items())
+            elif isinstance(condition, (list, tuple, set)):
+                ops = [("in", list(condition))]
+            else:
+                ops = [("eq", condition)]
+            normalized = []
+            for op, value in ops:
+                if op not in FILTER_OPERATORS:
+                    raise ValueError(f"未知的过滤运算符: {op}，可选值: {FILTER_OPERATORS}")
+                if op in ("in", "nin"):
+                    value = list(value) if isinstance(value, (list, tuple, set)) else [value]
+                if key in PATH_METADATA_KEYS:
+                    # ./docs/a.pdf 等写法统一为 docs/a.pdf
+                    value = ([_normalize_path_value(v) for v in value] if isinstance(value, list)
+                             else _normalize_path_value(value))
+                normalized.append((op, value))
+            self.conditions[key] = normalized
+
+    @classmethod
+    def coerce(cls, spec: Union["MetadataFilter", Dict[str, Any], None]) -> Optional["MetadataFilter"]:
+        """把字典形式的过滤条件转换为 MetadataFilter，None 或空条件返回 None"""
+        if spec is None or isinstance(spec, MetadataFilter):
+            return spec
+        return cls(spec) if spec else None
+
+    @classmethod
+    def from_expressions(cls, expressions: Iterable[str]) -> Optional["MetadataFilter"]:
+        """
+        解析命令行形式的过滤表达式
+
+        支持的写法：
+            key=value          等值
+            key=a,b,c          属于其一
+            key=lo..hi         闭区间（可省略一端，如 page=3..）
+            key!=value         不等于
+        """
+        conditions: Dict[str, Any] = {}
+        for expression in expressions:
+            if "!=" in expression:
+                key, _, raw = expression.partition("!=")
+                conditions.setdefault(key.strip(), {})["nin"] = [
+                    value for v in raw.split(",") for value in _equality_values(v.strip())
+                ]
+                continue
+            key, sep, raw = expression.partition("=")
+            key, raw = key.strip(), raw.strip()
+            if not sep or not key:
+                raise ValueError(f"无法解析过滤表达式: {expression}，应为 key=value 形式")
+            condition = conditions.setdefault(key, {})
+            if ".." in raw:
+                low, _, high = raw.partition("..")
+                if low.strip():
+                    condition["gte"] = parse_value(low.strip())
+                if high.strip():
+                    condition["lte"] = parse_value(high.strip())
+            else:
+                condition["in"] = [value for v in raw.split(",") for value in _equality_values(v.strip())]
+        return cls.coerce(conditions)
+
+    def matches(self, metadata: Dict[str, Any]) -> bool:
+        """判断一条元数据是否满足过滤条件"""
+        for key, ops in self.conditions.items():
+            actual = metadata.get(key, _MISSING)
+            candidates = _equality_candidates(metadata, key)
+            for op, expected in ops:
+                if op in ("ne", "nin"):
+                    positive = "eq" if op == "ne" else "in"
+                    if candidates and _compare(positive, candidates, expected):
+                        return False
+                elif op in ("eq", "in"):
+                    if not candidates or not _compare(op, candidates, expected):
+                        return False
+                elif actual is _MISSING or not _compare(op, actual, expected):
+                    return False
+        return True
+
+    def __repr__(self) -> str:
+        return f"MetadataFilter({self.conditions!r})"
+
+
+class MetadataIndex:
+    """
+    按位置组织的元数据索引，用于快速计算满足过滤条件的文本块位置
+
+    等值/集合条件使用按字段惰性构建的倒排表，范围条件使用按字段惰性构建的
+    数值列，两者都只在第一次用到该字段时构建一次。位置与向量库中的向量
+    序号（或 BM25 语料中的下标）一一对应。
+    """
+
+    def __init__(self, metadatas: Sequence[Dict[str, Any]]):
+        self.metadatas = metadatas
+        self.size = len(metadatas)
+        self._postings: Dict[str, Dict[Any, np.ndarray]] = {}
+        self._columns: Dict[str, np.ndarray] = {}
+        self._present: Dict[str, np.ndarray] = {}
+
+    def _postings_for(self, key: str) -> Dict[Any, np.ndarray]:
+        postings = self._postings.get(key)
+        if postings is None:
+            lists: Dict[Any, List[int]] = {}
+            for position, metadata in enumerate(self.metadatas):
+                # 去重后的代表文本块同时登记在 duplicate_sources 中各出处的值下
+                for item in _equality_candidates(metadata, key):
+                    try:
+                        positions = lists.setdefault(item, [])
+                        if not positions or positions[-1] != position:
+                            positions.append(position)
+                    except TypeError:
+                        continue  # 不可哈希的值不参与等值过滤
+            postings = {value: np.asarray(positions, dtype=np.int64) for value, positions in lists.items()}
+            self._postings[key] = postings
+        return postings
+
+    def _column_for(self, key: str) -> np.ndarray:
+        column = self._columns.get(key)
+        if column is None:
+            column = np.full(self.size, np.nan)
+            for position, metadata in enumerate(self.metadatas):
+                value = metadata.get(key)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    column[position] = value
+            self._columns[key] = column
+        return column
+
+    def _present_for(self, key: str) -> np.ndarray:
+        present = self._present.get(key)
+        if present is None:
+            present = np.fromiter((key in metadata for metadata in self.metadatas), dtype=bool, count=self.size)
+            self._present[key] = present
+        return present
+
+    def _values_mask(self, key: str, values: Iterable[Any]) -> np.ndarray:
+        mask = np.zeros(self.size, dtype=bool)
+        postings = self._postings_for(key)
+        for value in values:
+            try:
+                positions = postings.get(value)
+            except TypeError:
+                positions = None
+            if positions is not None:
+                mask[positions] = True
+        return mask
+
+    def mask(self, metadata_filter: MetadataFilter) -> np.ndarray:
+        """
+        计算满足过滤条件的位置掩码
+        返回：
+            np.ndarray: 长度为 size 的布尔数组
+        """
+        mask = np.ones(self.size, dtype=bool)
+        for key, ops in metadata_filter.conditions.items():
+            for op, expected in ops:
+                if op == "eq":
+                    mask &= self._values_mask(key, [expected])
+                elif op == "in":
+                    mask &= self._values_mask(key, expected)
+                elif op == "ne":
+                    mask &= ~self._values_mask(key, [expected])
+                elif op == "nin":
+                    mask &= ~self._values_mask(key, expected)
+                elif isinstance(expected, (int, float)) and not isinstance(expected, bool):
+                    column = self._column_for(key)
+                    with np.errstate(invalid="ignore"):
+                        if op == "gt":
+                            mask &= column > expected
+                        elif op == "gte":
+                            mask &= column >= expected
+                        elif op == "lt":
+                            mask &= column < expected
+                        else:
+                            mask &= column <= expected
+                else:
+                    # 非数值的范围条件（如字符串比较）逐条求值
+                    mask &= self._present_for(key) & np.fromiter(
+                        (_compare(op, metadata.get(key), expected) if key in metadata else False
+                         for metadata in self.metadatas),
+                        dtype=bool, count=self.size,
+                    )
+                if not mask.any():
+                    return mask
+        return mask
+
+    def positions(self, metadata_filter: MetadataFilter) -> np.ndarray:
+        """满足过滤条件的位置（升序）"""
+        return np.flatnonzero(self.mask(metadata_filter))
@@ -1,22 +1,29 @@
-"""问答服务模块"""
+"""问答服务模块
+
+问答链、嵌入模型、检索器和重排序模型（FlagEmbedding/transformers）依赖较重，
+只在真正用到的函数中导入，导入本模块本身很快。
+"""
+
+from __future__ import annotations
 
 import time
-from typing import Optional, Dict, Any, List
-from langchain.chains import RetrievalQA
-from langchain_ollama import OllamaEmbeddings
-from langchain_community.vectorstores.faiss import FAISS
-from langchain_core.language_models import BaseLLM
+from typing import TYPE_CHECKING, Optional, Dict, Any, List
 from dotenv import load_dotenv
 
-from app.core.config import EMBEDDING_MODEL_NAME, LLM_MODEL_NAME, LLM_PROVIDER, OLLAMA_BASE_URL
-from app.models import LLMProvider, LLMFactory
-from app.core.exceptions import ServiceError, ConfigurationError
-from app.services.retrievers.dense import DenseRetriever
-from app.services.retrievers.sparse import SparseRetriever
-from app.services.retrievers.hybrid import HybridRetriever
-from app.services.fusion import simple_fusion
-from app.services.document_service import load_documents
-from app.services.rerankers.local_bge_reranker import LocalBGEReranker
+from app.core.config import CONTEXT_COMPRESSION, DENSE_SEARCH_MODE, MMR_FETCH_K, MMR_LAMBDA
+from app.models import LLMProvider
+from app.core.exceptions import ServiceError
+from app.core.metrics import METRICS, summarize_spans
+from app.services.container import ServiceContainer, get_container
+from app.services.context_packing import ContextPacker, prompt_usage
+
+if TYPE_CHECKING:
+    from langchain.chains import RetrievalQA
+    from langchain_community.vectorstores.faiss import FAISS
+    from langchain_core.embeddings import Embeddings
+    from langchain_core.language_models import BaseLLM
+
+    from app.services.context_compression import ExtractiveCompressor
 
 load_dotenv()
 
@@ -24,7 +31,10 @@ load_dotenv()
 class QAService:
     """问答服务类"""
     
-    def __init__(self, llm_provider: LLMProvider = None, reranker: Any = None, use_rerank: bool = False):
+    def __init__(self, llm_provider: LLMProvider = None, reranker: Any = None, use_rerank: bool = False,
+                 container: Optional[ServiceContainer] = None, context_packer: Optional[ContextPacker] = None,
+                 compressor: Optional[ExtractiveCompressor] = None, mmr_lambda: float = MMR_LAMBDA,
+                 search_mode: str = DENSE_SEARCH_MODE):
         """
         初始化问答服务
         
@@ -32,113 +42,125 @@ class QAService:
             llm_provider: 大语言模型提供者，如果为 None 则使用配置文件中的默认设置
             reranker: 重排序器，如果为 None 则不使用重排序
             use_rerank: 是否使用重排序
+            container: 服务容器，为 None 时使用进程级容器（指定 llm_provider 时创建独立容器）
+            context_packer: 上下文打包器，为 None 时按配置的 token 预算创建
+            compressor: 抽取式上下文压缩器，为 None 时不压缩
+            mmr_lambda: MMR 多样化的 λ，0 表示不启用
+            search_mode: 稠密检索方式（flat/binary）
         """
-        self.llm_provider = llm_provider or self._create_default_provider()
-        self.embedding_model = None
+        if container is None:
+            container = ServiceContainer(llm_provider=llm_provider) if llm_provider else get_container()
+        self.container = container
         self.qa_chain = None
         self.max_retries = 1
         self.retry_delay = 2  # 秒
         self.reranker = reranker
         self.use_rerank = use_rerank
-    
-    def _create_default_provider(self) -> LLMProvider:
-        """创建默认的模型提供者"""
-        try:
-            return LLMFactory.create_provider(LLM_PROVIDER, model_name=LLM_MODEL_NAME)
-        except Exception as e:
-            raise ServiceError(
-                f"创建模型提供者失败：{e}\n"
-                f"请检查配置文件中的 LLM_PROVIDER 和 LLM_MODEL_NAME 设置。"
-            )
-    
-    def load_embedding_model(self) -> OllamaEmbeddings:
+        self.context_packer = context_packer or ContextPacker()
+        self.compressor = compressor
+        self.mmr_lambda = mmr_lambda
+        self.search_mode = search_mode
+
+    @property
+    def llm_provider(self) -> LLMProvider:
+        """大语言模型提供者"""
+        return self.container.llm_provider()
+
+    @property
+    def embedding_model(self) -> Optional[Embeddings]:
+        """已加载的嵌入模型（尚未加载时为 None）"""
+        return self.container._embeddings
+
+    def load_embedding_model(self) -> Embeddings:
         """
-        加载嵌入模型
+        加载嵌入模型（由服务容器缓存，进程内只创建和预热一次）
         返回：
-            OllamaEmbeddings: 加载的嵌入模型实例
+            Embeddings: 加载的嵌入模型实例（按 EMBEDDING_PROVIDER 创建）
         """
-        if self.embedding_model is None:
-            try:
-                print(f"正在从 Ollama 加载嵌入模型: {EMBEDDING_MODEL_NAME}")
-                self.embedding_model = OllamaEmbeddings(
-                    model=EMBEDDING_MODEL_NAME, 
-                    base_url=OLLAMA_BASE_URL
-                )
-                # 测试嵌入模型
-                test_embedding = self.embedding_model.embed_query("测试")
-            except Exception as e:
-                raise ServiceError(
-                    f"加载嵌入模型失败：{e}\n"
-                    f"请确保 Ollama 服务正在运行，"
-                    f"并且模型 {EMBEDDING_MODEL_NAME} 已安装。"
-                )
-        return self.embedding_model
+        return self.container.embeddings()
     
     def load_llm(self) -> BaseLLM:
         """
-        加载大语言模型
+        加载大语言模型（由服务容器缓存，进程内只创建一次）
         返回：
             BaseLLM: 加载的大语言模型实例
         """
-        try:
-            print(f"正在加载 {self.llm_provider.get_provider_name()} 模型...")
-            llm = self.llm_provider.create_llm()
-            
-            return llm
-        except Exception as e:
-            raise ServiceError(
-                f"加载大语言模型失败：{e}\n"
-                f"请检查API密钥配置和网络连接。"
-            )
+        return self.container.llm()
     
-    def create_retriever(self, vector_store: FAISS, retrieval_mode: str = 'dense', corpus: list = None):
+    def create_retriever(self, vector_store: FAISS, retrieval_mode: str = 'dense', corpus: list = None,
+                         metadata_filter: Optional[Dict[str, Any]] = None):
         """
         创建检索器，支持 dense/sparse/hybrid
         参数：
             vector_store: FAISS 向量库实例
             retrieval_mode: 检索模式（dense/sparse/hybrid）
-            corpus: 稀疏检索语料（list of Document）
+            corpus: 稀疏检索语料（list of Document），为 None 时使用向量库中保存的文本块，
+                BM25 索引由服务容器缓存
+            metadata_filter: 元数据过滤条件（检索前预过滤），None 表示不过滤
         返回：
-            检索器实例
+            检索器实例（启用 MMR 时为包装了底层检索器的 MMRRetriever）
         """
-        if retrieval_mode == 'dense':
-            return DenseRetriever(vector_store)
-        elif retrieval_mode == 'sparse':
-            if corpus is None:
-                documents = load_documents()
-                corpus = documents  # 直接传递 Document 对象
-            return SparseRetriever(corpus)
+        if corpus is None or retrieval_mode == 'dense':
+            return self.container.retriever(retrieval_mode, metadata_filter=metadata_filter,
+                                            vector_store=vector_store, mmr_lambda=self.mmr_lambda,
+                                            search_mode=self.search_mode)
+
+        from functools import partial
+        from app.services.fusion import simple_fusion
+        from app.services.retrievers.dense import DenseRetriever
+        from app.services.retrievers.hybrid import HybridRetriever
+        from app.services.retrievers.mmr import MMRRetriever
+        from app.services.retrievers.sparse import SparseRetriever
+
+        use_mmr = self.mmr_lambda > 0
+        if retrieval_mode == 'sparse':
+            retriever = SparseRetriever(corpus, metadata_filter=metadata_filter, k=MMR_FETCH_K if use_mmr else 5)
         elif retrieval_mode == 'hybrid':
-            if corpus is None:
-                documents = load_documents()
-                corpus = documents
-            dense = DenseRetriever(vector_store)
-            sparse = SparseRetriever(corpus)
-            return HybridRetriever(dense, sparse, simple_fusion)
+            if use_mmr:
+                dense = DenseRetriever(vector_store, k=MMR_FETCH_K, metadata_filter=metadata_filter,
+                                       search_mode=self.search_mode)
+                sparse = SparseRetriever(corpus, metadata_filter=metadata_filter, k=MMR_FETCH_K)
+                retriever = HybridRetriever(dense, sparse, partial(simple_fusion, top_k=MMR_FETCH_K))
+            else:
+                dense = DenseRetriever(vector_store, metadata_filter=metadata_filter, search_mode=self.search_mode)
+                sparse = SparseRetriever(corpus, metadata_filter=metadata_filter)
+                retriever = HybridRetriever(dense, sparse, simple_fusion)
         else:
             raise ValueError(f"未知检索模式: {retrieval_mode}")
+        return MMRRetriever(retriever, vector_store, lambda_mult=self.mmr_lambda) if use_mmr else retriever
 
-    def create_qa_chain(self, vector_store: FAISS, retrieval_mode: str = 'dense', corpus: list = None) -> RetrievalQA:
+    def create_qa_chain(self, vector_store: FAISS, retrieval_mode: str = 'dense', corpus: list = None,
+                        metadata_filter: Optional[Dict[str, Any]] = None) -> RetrievalQA:
         """
         创建问答链，支持混合检索
         参数：
             vector_store: FAISS 向量库实例
             retrieval_mode: 检索模式（dense/sparse/hybrid）
             corpus: 稀疏检索语料
+            metadata_filter: 元数据过滤条件
         返回：
             RetrievalQA: 创建的问答链
         """
         if self.qa_chain is None:
             try:
+                from langchain.chains import RetrievalQA
                 llm = self.load_llm()
-                retriever = self.create_retriever(vector_store, retrieval_mode, corpus)
+                retriever = self.create_retriever(vector_store, retrieval_mode, corpus, metadata_filter)
                 # 包装 retriever，支持 rerank
                 if self.use_rerank and self.reranker is not None:
                     orig_get_relevant_documents = retriever._get_relevant_documents
-                    def rerank_wrapper(query):
-                        docs = orig_get_relevant_documents(query)
+                    def rerank_wrapper(query, **kwargs):
+                        docs = orig_get_relevant_documents(query, **kwargs)
                         return self.reranker.rerank(query, docs)
                     retriever._get_relevant_documents = rerank_wrapper
+                # 包装 retriever，按需压缩（只保留相关句子），再按 token 预算打包上下文
+                packed_get_relevant_documents = retriever._get_relevant_documents
+                def packing_wrapper(query, **kwargs):
+                    docs = packed_get_relevant_documents(query, **kwargs)
+                    if self.compressor is not None:
+                        docs = self.compressor.compress(query, docs)
+                    return self.context_packer.pack(docs).documents
+                retriever._get_relevant_documents = packing_wrapper
                 self.qa_chain = RetrievalQA.from_chain_type(
                     llm=llm,
                     chain_type="stuff",
@@ -158,7 +180,7 @@ class QAService:
         参数：
             query: 用户输入的问题
         返回：
-            dict: 问答链的结果，包括答案和来源文档
+            dict: 问答链的结果，包括答案、来源文档、各阶段耗时 timings 和提示词 token 数 usage
         """
         if self.qa_chain is None:
             raise ServiceError("问答链尚未初始化，请先调用 create_qa_chain")
@@ -167,12 +189,17 @@ class QAService:
         
         for attempt in range(self.max_retries):
             try:
-                result = self.qa_chain.invoke({"query": query})
+                with METRICS.collect() as spans:
+                    with METRICS.span("qa"):
+                        result = self.qa_chain.invoke({"query": query})
                 
                 # 检查结果是否有效
                 if not result or not result.get("result"):
                     raise ServiceError("模型返回了空结果，请重试")
                 
+                result["timings"] = summarize_spans(spans)
+                result["usage"] = prompt_usage(result.get("source_documents") or [], query,
+                                               token_counter=self.context_packer.count_tokens)
                 return result
                 
             except Exception as e:
@@ -193,7 +220,7 @@ class QAService:
                 ]):
                     if attempt < self.max_retries - 1:
                         print(f"网络连接错误，正在重试 ({attempt + 1}/{self.max_retries})...")
-                        time.sleep(self.retry_delay * (attempt + 1))
+                        self._sleep_before_retry(attempt)
                         continue
                     else:
                         raise ServiceError(
@@ -212,7 +239,7 @@ class QAService:
                     # 其他未知错误
                     if attempt < self.max_retries - 1:
                         print(f"调用失败，正在重试 ({attempt + 1}/{self.max_retries})...")
-                        time.sleep(self.retry_delay * (attempt + 1))
+                        self._sleep_before_retry(attempt)
                         continue
                     else:
                         raise ServiceError(
@@ -223,21 +250,29 @@ class QAService:
         # 如果所有重试都失败了
         raise ServiceError(f"模型调用失败，已重试 {self.max_retries} 次：{last_error}")
 
+    def _sleep_before_retry(self, attempt: int) -> None:
+        """重试前等待，并记录重试次数和等待时间"""
+        delay = self.retry_delay * (attempt + 1)
+        METRICS.increment("qa.retries")
+        METRICS.increment("qa.retry_sleep_seconds", delay)
+        time.sleep(delay)
+
 
-# 为了保持向后兼容性，提供原有的函数接口
-def load_embedding_model() -> OllamaEmbeddings:
+# 为了保持向后兼容性，提供原有的函数接口；模型由进程级服务容器共享，多次调用不会重复创建
+def load_embedding_model() -> Embeddings:
     """加载嵌入模型（向后兼容接口）"""
-    service = QAService()
-    return service.load_embedding_model()
+    return get_container().embeddings()
 
 
 def load_llm() -> BaseLLM:
     """加载大语言模型（向后兼容接口）"""
-    service = QAService()
-    return service.load_llm()
+    return get_container().llm()
 
 
-def create_qa_chain(vector_store: FAISS, retrieval_mode: str = 'dense', corpus: list = None, use_rerank: bool = False) -> RetrievalQA:
+def create_qa_chain(vector_store: FAISS, retrieval_mode: str = 'dense', corpus: list = None, use_rerank: bool = False,
+                    metadata_filter: Optional[Dict[str, Any]] = None,
+                    compression: str = CONTEXT_COMPRESSION, mmr_lambda: float = MMR_LAMBDA,
+                    search_mode: str = DENSE_SEARCH_MODE) -> RetrievalQA:
     """
     创建问答链（向后兼容接口）
     
@@ -246,14 +281,26 @@ def create_qa_chain(vector_store: FAISS, retrieval_mode: str = 'dense', corpus:
         retrieval_mode: 检索模式（dense/sparse/hybrid）
         corpus: 稀疏检索语料
         use_rerank: 是否启用重排序
+        metadata_filter: 元数据过滤条件
+        compression: 上下文压缩方式（off/bm25/embedding）
+        mmr_lambda: MMR 多样化的 λ，0 表示不启用
+        search_mode: 稠密检索方式（flat/binary）
     返回：
         RetrievalQA: 创建的问答链
     """
-    reranker = LocalBGEReranker() if use_rerank else None
-    service = QAService(reranker=reranker, use_rerank=use_rerank)
-    return service.create_qa_chain(vector_store, retrieval_mode, corpus)
+    container = get_container()
+    reranker = container.reranker("bge") if use_rerank else None
+    service = QAService(reranker=reranker, use_rerank=use_rerank, container=container,
+                        compressor=container.compressor(compression), mmr_lambda=mmr_lambda,
+                        search_mode=search_mode)
+    return service.create_qa_chain(vector_store, retrieval_mode, corpus, metadata_filter)
 
 
 def ask_question(chain: RetrievalQA, query: str) -> Dict[str, Any]:
-    """使用问答链进行提问（向后兼容接口）"""
-    return chain.invoke({"query": query}) 
\ No newline at end of file
+    """使用问答链进行提问（向后兼容接口），结果中的 timings 为各阶段耗时，usage 为提示词 token 数"""
+    with METRICS.collect() as spans:
+        with METRICS.span("qa"):
+            result = chain.invoke({"query": query})
+    result["timings"] = summarize_spans(spans)
+    result["usage"] = prompt_usage(result.get("source_documents") or [], query)
+    return result 
\ No newline at end of file
@@ -0,0 +1,525 @@
+"""
+向量量化存储
+
+float32 向量每维 4 字节，768 维的嵌入每个文本块约 3 KB。量化后的 FAISS 索引只保存压缩编码：
+- fp16: 半精度（IndexScalarQuantizer QT_fp16），每维 2 字节，几乎无损
+- int8: 8 位标量量化（IndexScalarQuantizer QT_8bit），每维 1 字节，需要训练各维取值范围
+- pq: 乘积量化（IndexPQ），每个子向量 nbits 位，768 维、96 个子向量时每个文本块 96 字节
+
+另外可以在常规索引之外建立二值索引（IndexBinaryFlat）：向量按符号二值化为每维 1 位，比 float32 小 32 倍。
+二值检索先按汉明距离取出较大的候选集，再用 float 向量精确重算分数，作为平坦检索的廉价替代。
+二值化前先乘以固定的随机正交矩阵（由维度和种子确定，不需要保存）：旋转不改变距离，却让每一位都近似
+一次随机超平面划分，稀疏或各维分布不均的向量（大量 0 分量都会落到同一侧）也能用汉明距离近似角度。
+
+量化会损失一部分精度。可以另外把 float32 原始向量写入索引目录中的 vectors.f32，检索时按内存映射读取：
+先在量化索引中取 k × VECTOR_STORE_RESCORE_FACTOR 个候选，再只读取这些候选的原始向量精确重算分数。
+原始向量留在磁盘上，常驻内存的只有量化编码和被访问到的页。
+"""
+
+import json
+import weakref
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+from langchain_community.vectorstores.faiss import FAISS
+
+from app.core.config import (
+    BINARY_SHORTLIST_FACTOR,
+    VECTOR_STORE_PQ_M,
+    VECTOR_STORE_PQ_NBITS,
+    VECTOR_STORE_RESCORE_FACTOR,
+)
+
+# 支持的量化方式
+QUANTIZATION_TYPES = ("none", "fp16", "int8", "pq")
+
+# 索引目录中的量化说明和原始向量文件
+QUANTIZATION_FILE = "quantization.json"
+RAW_VECTORS_FILE = "vectors.f32"
+BINARY_INDEX_FILE = "index.binary"
+# 二值化旋转矩阵的随机种子（改变后须重建二值索引）
+BINARY_ROTATION_SEED = 20240601
+# 建立二值索引时每次读取和二值化的向量数
+_BINARY_BUILD_BATCH = 65536
+
+
+class QuantizationInfo:
+    """量化索引的附加信息"""
+
+    __slots__ = ("kind", "raw", "rescore_factor")
+
+    def __init__(self, kind: str, raw: Optional[np.ndarray], rescore_factor: int):
+        """
+        参数：
+            kind: 量化方式
+            raw: float32 原始向量（内存数组或内存映射），按向量序号排列；None 表示不重算分数
+            rescore_factor: 精确重算时的候选倍数
+        """
+        self.kind = kind
+        self.raw = raw
+        self.rescore_factor = rescore_factor
+
+
+# 量化的 FAISS 向量库 -> 附加信息（向量库被回收后自动移除）
+_quantized: "weakref.WeakKeyDictionary[FAISS, QuantizationInfo]" = weakref.WeakKeyDictionary()
+
+# FAISS 向量库 -> 二值索引（faiss.IndexBinaryFlat，与向量库的向量序号一一对应）
+_binary: "weakref.WeakKeyDictionary[FAISS, Any]" = weakref.WeakKeyDictionary()
+
+
+def auto_pq_m(dim: int) -> int:
+    """自动选择 PQ 子向量数：能整除维度、且每个子向量不少于 8 维的最大值"""
+    for m in range(max(1, dim // 8), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def build_index(vectors: np.ndarray, kind: str, metric: int, pq_m: int = VECTOR_STORE_PQ_M,
+                pq_nbits: int = VECTOR_STORE_PQ_NBITS) -> Any:
+    """
+    用 vectors 训练并填充量化索引
+    参数：
+        vectors: float32 向量矩阵 (n, d)
+        kind: 量化方式（none/fp16/int8/pq）
+        metric: FAISS 距离类型（与原索引一致）
+        pq_m: PQ 子向量数，0 表示自动选择
+        pq_nbits: PQ 每个子向量的编码位数
+    返回：
+        faiss.Index
+    """
+    import faiss
+
+    if kind not in QUANTIZATION_TYPES:
+        raise ValueError(f"未知量化方式: {kind}，可选值: {', '.join(QUANTIZATION_TYPES)}")
+    n, dim = vectors.shape
+    if kind == "none":
+        index = faiss.IndexFlatIP(dim) if metric == faiss.METRIC_INNER_PRODUCT else faiss.IndexFlatL2(dim)
+    elif kind in ("fp16", "int8"):
+        qtype = faiss.ScalarQuantizer.QT_fp16 if kind == "fp16" else faiss.ScalarQuantizer.QT_8bit
+        index = faiss.IndexScalarQuantizer(dim, qtype, metric)
+    else:
+        m = pq_m or auto_pq_m(dim)
+        if dim % m:
+            raise ValueError(f"PQ 子向量数 {m} 不能整除向量维度 {dim}")
+        # 每个子向量有 2^nbits 个聚类中心，训练向量不足时降低位数
+        nbits = max(1, min(pq_nbits, int(np.log2(max(n, 2)))))
+        index = faiss.IndexPQ(dim, m, nbits, metric)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def quantize_vector_store(store: Any, kind: str, rescore_factor: int = VECTOR_STORE_RESCORE_FACTOR,
+                          pq_m: int = VECTOR_STORE_PQ_M, pq_nbits: int = VECTOR_STORE_PQ_NBITS) -> Any:
+    """
+    把向量库的索引替换为量化索引（分片向量库逐个分片替换），文档和文档 ID 不变
+    参数：
+        store: FAISS 向量库或分片向量库
+        kind: 量化方式，none 时恢复为 float32 平坦索引（需要保留了原始向量）
+        rescore_factor: 精确重算时的候选倍数，0 表示不保留原始向量
+    返回：
+        同一个向量库
+    """
+    from app.services.sharded_vector_store import ShardedVectorStore
+
+    if isinstance(store, ShardedVectorStore):
+        for shard, shard_store in enumerate(store.shards):
+            if shard_store is not None:
+                store.replace_shard(shard, _quantize_faiss(shard_store, kind, rescore_factor, pq_m, pq_nbits))
+        return store
+    return _quantize_faiss(store, kind, rescore_factor, pq_m, pq_nbits)
+
+
+def _quantize_faiss(store: FAISS, kind: str, rescore_factor: int, pq_m: int, pq_nbits: int) -> FAISS:
+    vectors = raw_vectors(store)
+    if vectors is None:
+        if kind == "none" and store in _quantized:
+            raise ValueError("量化索引没有保留原始向量，无法恢复为 float32 索引")
+        vectors = store.index.reconstruct_n(0, store.index.ntotal)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    store.index = build_index(vectors, kind, store.index.metric_type, pq_m, pq_nbits)
+    if kind == "none":
+        _quantized.pop(store, None)
+    else:
+        _quantized[store] = QuantizationInfo(kind, vectors if rescore_factor > 0 else None, rescore_factor)
+    return store
+
+
+def quantized_copy(store: FAISS, kind: str, rescore_factor: int = VECTOR_STORE_RESCORE_FACTOR,
+                   pq_m: int = VECTOR_STORE_PQ_M, pq_nbits: int = VECTOR_STORE_PQ_NBITS) -> FAISS:
+    """创建与 store 共享文档的量化副本（原向量库不变），用于对比不同量化方式"""
+    copy = FAISS(
+        embedding_function=store.embedding_function,
+        index=store.index,
+        docstore=store.docstore,
+        index_to_docstore_id=store.index_to_docstore_id,
+        normalize_L2=store._normalize_L2,
+        distance_strategy=store.distance_strategy,
+    )
+    vectors = raw_vectors(store)
+    if vectors is not None:
+        _quantized[copy] = QuantizationInfo("copy", vectors, rescore_factor)
+    return _quantize_faiss(copy, kind, rescore_factor, pq_m, pq_nbits)
+
+
+# 索引类型 -> 是否支持 SearchParameters(sel=...)（IndexPQ 等会直接报 invalid search params）
+_selector_support: dict = {}
+
+
+def supports_id_selector(index: Any) -> bool:
+    """索引的 search 是否接受 IDSelector 参数（按索引类型探测一次并缓存）"""
+    import faiss
+
+    index_type = type(index)
+    if index_type not in _selector_support:
+        try:
+            selector = faiss.IDSelectorRange(0, 1)
+            index.search(np.zeros((1, index.d), dtype=np.float32), 1, params=faiss.SearchParameters(sel=selector))
+            _selector_support[index_type] = True
+        except RuntimeError:
+            _selector_support[index_type] = False
+    return _selector_support[index_type]
+
+
+def quantization_of(store: Any) -> Optional[QuantizationInfo]:
+    """FAISS 向量库的量化信息，未量化时返回 None"""
+    return _quantized.get(store) if isinstance(store, FAISS) else None
+
+
+def raw_vectors(store: FAISS) -> Optional[np.ndarray]:
+    """量化索引保留的 float32 原始向量；未保留或与索引不一致（量化后又追加了向量）时返回 None"""
+    info = quantization_of(store)
+    if info is None or info.raw is None or len(info.raw) != store.index.ntotal:
+        return None
+    return info.raw
+
+
+def stored_vectors(store: FAISS, positions: np.ndarray) -> np.ndarray:
+    """按向量序号取出向量：有原始向量时读取原始向量，否则从索引中解码（量化索引为近似值）"""
+    raw = raw_vectors(store)
+    if raw is None:
+        return store.index.reconstruct_batch(np.asarray(positions, dtype=np.int64))
+    return np.asarray(raw[np.asarray(positions, dtype=np.int64)], dtype=np.float32)
+
+
+def memory_per_vector(store: Any) -> float:
+    """索引序列化后每个向量占用的字节数（含码本等固定开销）"""
+    import faiss
+
+    from app.services.sharded_vector_store import ShardedVectorStore
+
+    shards = [s for s in store.shards if s is not None] if isinstance(store, ShardedVectorStore) else [store]
+    total = sum(len(faiss.serialize_index(shard.index)) for shard in shards)
+    ntotal = sum(shard.index.ntotal for shard in shards)
+    return total / ntotal if ntotal else 0.0
+
+
+def exact_scores(vectors: np.ndarray, query: np.ndarray, metric: int) -> np.ndarray:
+    """精确分数：内积（越大越好）或 L2 距离平方（越小越好），与 FAISS 索引的分数含义一致"""
+    import faiss
+
+    if metric == faiss.METRIC_INNER_PRODUCT:
+        return vectors @ query
+    return ((vectors - query) ** 2).sum(axis=1)
+
+
+def rescore(store: FAISS, query: np.ndarray, positions: Sequence[int], k: int) -> List[Tuple[int, float]]:
+    """
+    用原始向量精确重算候选的分数，返回前 k 个 (向量序号, 分数)
+    参数：
+        query: 查询向量（已按索引要求归一化）
+        positions: 候选向量序号
+    """
+    import faiss
+
+    positions = np.asarray(sorted(positions), dtype=np.int64)
+    if len(positions) == 0:
+        return []
+    # 按序号顺序读取，内存映射文件的访问尽量连续
+    scores = exact_scores(stored_vectors(store, positions), query, store.index.metric_type)
+    if store.index.metric_type == faiss.METRIC_INNER_PRODUCT:
+        order = np.argsort(-scores, kind="stable")[:k]
+    else:
+        order = np.argsort(scores, kind="stable")[:k]
+    return list(zip(positions[order].tolist(), scores[order].tolist()))
+
+
+def similarity_search_with_score_by_vector(store: FAISS, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+    """
+    向量检索：未量化或未保留原始向量时与 FAISS 相同；否则先取 k × rescore_factor 个候选再精确重算
+    """
+    import faiss
+
+    info = quantization_of(store)
+    if info is None or info.rescore_factor <= 0 or raw_vectors(store) is None:
+        return store.similarity_search_with_score_by_vector(embedding, k=k)
+    vector = np.asarray([embedding], dtype=np.float32)
+    if store._normalize_L2:
+        faiss.normalize_L2(vector)
+    fetch_k = min(store.index.ntotal, k * info.rescore_factor)
+    _, indices = store.index.search(vector, fetch_k)
+    hits = rescore(store, vector[0], [int(i) for i in indices[0] if i >= 0], k)
+    results = []
+    for position, score in hits:
+        doc = store.docstore.search(store.index_to_docstore_id[position])
+        if isinstance(doc, Document):
+            results.append((doc, score))
+    return results
+
+
+def similarity_search_by_vector(store: Any, embedding: List[float], k: int = 4) -> List[Document]:
+    """向量检索（单索引或分片向量库），量化索引按需精确重算分数"""
+    from app.services.sharded_vector_store import ShardedVectorStore
+
+    if isinstance(store, ShardedVectorStore):
+        results = store.map_shards(lambda _, shard: similarity_search_with_score_by_vector(shard, embedding, k))
+        return [doc for doc, _ in store.merge_results(results, k)]
+    return [doc for doc, _ in similarity_search_with_score_by_vector(store, embedding, k)]
+
+
+def _normalized(store: FAISS, vectors: np.ndarray) -> np.ndarray:
+    """查询向量矩阵（float32 副本），索引要求时做 L2 归一化"""
+    import faiss
+
+    vectors = np.array(vectors, dtype=np.float32, ndmin=2)
+    if store._normalize_L2:
+        faiss.normalize_L2(vectors)
+    return vectors
+
+
+def _documents_of(store: FAISS, hits: Sequence[Tuple[int, float]]) -> List[Tuple[Document, float]]:
+    results = []
+    for position, score in hits:
+        doc = store.docstore.search(store.index_to_docstore_id[position])
+        if isinstance(doc, Document):
+            results.append((doc, score))
+    return results
+
+
+def similarity_search_many_with_score(store: FAISS, vectors: np.ndarray, k: int = 4) -> List[List[Tuple[Document, float]]]:
+    """
+    批量向量检索：所有查询向量一次矩阵 search，量化索引逐个查询精确重算分数
+    参数：
+        vectors: 查询向量矩阵（每行一个查询）
+    返回：
+        每个查询的 (文档, 分数) 列表，与逐条调用 similarity_search_with_score_by_vector 的结果一致
+    """
+    vectors = _normalized(store, vectors)
+    if store.index.ntotal == 0:
+        return [[] for _ in range(len(vectors))]
+    info = quantization_of(store)
+    rescoring = info is not None and info.rescore_factor > 0 and raw_vectors(store) is not None
+    fetch_k = min(store.index.ntotal, k * info.rescore_factor) if rescoring else k
+    distances, indices = store.index.search(vectors, fetch_k)
+    results = []
+    for row, vector in enumerate(vectors):
+        if rescoring:
+            hits = rescore(store, vector, [int(i) for i in indices[row] if i >= 0], k)
+        else:
+            hits = [(int(i), float(d)) for i, d in zip(indices[row], distances[row]) if i >= 0]
+        results.append(_documents_of(store, hits))
+    return results
+
+
+def _search_many(store: Any, vectors: np.ndarray, k: int,
+                 search: Callable[[FAISS, np.ndarray], List[List[Tuple[Document, float]]]]) -> List[List[Document]]:
+    """单索引直接批量检索；分片向量库每个分片做一次批量检索，再逐个查询归并各分片结果"""
+    from app.services.sharded_vector_store import ShardedVectorStore
+
+    if isinstance(store, ShardedVectorStore):
+        shard_results = store.map_shards(lambda _, shard: search(shard, vectors))
+        if not shard_results:
+            return [[] for _ in range(len(vectors))]
+        return [
+            [doc for doc, _ in store.merge_results([results[row] for results in shard_results], k)]
+            for row in range(len(vectors))
+        ]
+    return [[doc for doc, _ in results] for results in search(store, vectors)]
+
+
+def similarity_search_many_by_vectors(store: Any, vectors: np.ndarray, k: int = 4) -> List[List[Document]]:
+    """批量向量检索（单索引或分片向量库），返回每个查询的文档列表"""
+    return _search_many(store, vectors, k, lambda shard, matrix: similarity_search_many_with_score(shard, matrix, k))
+
+
+@lru_cache(maxsize=8)
+def _rotation(dim: int) -> np.ndarray:
+    """二值化使用的 dim × dim 随机正交矩阵"""
+    gaussian = np.random.default_rng(BINARY_ROTATION_SEED).standard_normal((dim, dim))
+    return np.linalg.qr(gaussian)[0].astype(np.float32)
+
+
+def binarize(vectors: np.ndarray) -> np.ndarray:
+    """随机旋转后按符号二值化并按位打包：d 维向量占 ceil(d / 8) 字节"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return np.packbits(vectors @ _rotation(vectors.shape[1]) > 0, axis=1)
+
+
+def build_binary_index(store: Any) -> Any:
+    """
+    为向量库（分片向量库逐个分片）建立二值索引，向量取自索引本身（量化索引优先取原始向量）
+    返回：
+        同一个向量库
+    """
+    import faiss
+
+    from app.services.sharded_vector_store import ShardedVectorStore
+
+    if isinstance(store, ShardedVectorStore):
+        for shard, shard_store in enumerate(store.shards):
+            if shard_store is not None:
+                build_binary_index(shard_store)
+                store.replace_shard(shard, shard_store)
+        return store
+    index = faiss.IndexBinaryFlat((store.index.d + 7) // 8 * 8)
+    for start in range(0, store.index.ntotal, _BINARY_BUILD_BATCH):
+        positions = np.arange(start, min(start + _BINARY_BUILD_BATCH, store.index.ntotal))
+        index.add(binarize(stored_vectors(store, positions)))
+    _binary[store] = index
+    return store
+
+
+def binary_index_of(store: FAISS) -> Optional[Any]:
+    """FAISS 向量库的二值索引；没有建立或与向量库不一致（建立后又追加了向量）时返回 None"""
+    index = _binary.get(store) if isinstance(store, FAISS) else None
+    if index is None or index.ntotal != store.index.ntotal:
+        return None
+    return index
+
+
+def binary_search_with_score_by_vector(store: FAISS, embedding: List[float], k: int = 4,
+                                       shortlist_factor: int = BINARY_SHORTLIST_FACTOR) -> List[Tuple[Document, float]]:
+    """
+    二值检索：按汉明距离取 k × shortlist_factor 个候选，再用 float 向量精确重算分数取前 k 个；
+    没有二值索引时退回普通检索
+    """
+    import faiss
+
+    index = binary_index_of(store)
+    if index is None:
+        return similarity_search_with_score_by_vector(store, embedding, k)
+    vector = np.asarray([embedding], dtype=np.float32)
+    if store._normalize_L2:
+        faiss.normalize_L2(vector)
+    fetch_k = min(index.ntotal, max(k, k * shortlist_factor))
+    _, indices = index.search(binarize(vector), fetch_k)
+    hits = rescore(store, vector[0], [int(i) for i in indices[0] if i >= 0], k)
+    results = []
+    for position, score in hits:
+        doc = store.docstore.search(store.index_to_docstore_id[position])
+        if isinstance(doc, Document):
+            results.append((doc, score))
+    return results
+
+
+def binary_search_by_vector(store: Any, embedding: List[float], k: int = 4,
+                            shortlist_factor: int = BINARY_SHORTLIST_FACTOR) -> List[Document]:
+    """二值检索（单索引或分片向量库）"""
+    from app.services.sharded_vector_store import ShardedVectorStore
+
+    if isinstance(store, ShardedVectorStore):
+        results = store.map_shards(
+            lambda _, shard: binary_search_with_score_by_vector(shard, embedding, k, shortlist_factor)
+        )
+        return [doc for doc, _ in store.merge_results(results, k)]
+    return [doc for doc, _ in binary_search_with_score_by_vector(store, embedding, k, shortlist_factor)]
+
+
+def binary_search_many_with_score(store: FAISS, vectors: np.ndarray, k: int = 4,
+                                  shortlist_factor: int = BINARY_SHORTLIST_FACTOR) -> List[List[Tuple[Document, float]]]:
+    """批量二值检索：所有查询一次汉明距离 search，再逐个查询精确重算；没有二值索引时退回批量普通检索"""
+    index = binary_index_of(store)
+    if index is None:
+        return similarity_search_many_with_score(store, vectors, k)
+    vectors = _normalized(store, vectors)
+    if index.ntotal == 0:
+        return [[] for _ in range(len(vectors))]
+    fetch_k = min(index.ntotal, max(k, k * shortlist_factor))
+    _, indices = index.search(binarize(vectors), fetch_k)
+    return [
+        _documents_of(store, rescore(store, vector, [int(i) for i in indices[row] if i >= 0], k))
+        for row, vector in enumerate(vectors)
+    ]
+
+
+def binary_search_many_by_vectors(store: Any, vectors: np.ndarray, k: int = 4,
+                                  shortlist_factor: int = BINARY_SHORTLIST_FACTOR) -> List[List[Document]]:
+    """批量二值检索（单索引或分片向量库）"""
+    return _search_many(
+        store, vectors, k, lambda shard, matrix: binary_search_many_with_score(shard, matrix, k, shortlist_factor)
+    )
+
+
+def save_quantization(store: FAISS, folder: str) -> None:
+    """
+    在 FAISS 索引目录中写入二值索引、量化说明和原始向量（没有的删除旧文件）
+
+    原始向量在保存后改为内存映射，不再占用内存。
+    """
+    import faiss
+
+    path = Path(folder)
+    binary_path = path / BINARY_INDEX_FILE
+    if store in _binary:
+        # 建立二值索引后又追加了向量时重新建立
+        if binary_index_of(store) is None:
+            build_binary_index(store)
+        faiss.write_index_binary(_binary[store], str(binary_path))
+    else:
+        binary_path.unlink(missing_ok=True)
+
+    info = quantization_of(store)
+    raw_path = path / RAW_VECTORS_FILE
+    if info is None:
+        (path / QUANTIZATION_FILE).unlink(missing_ok=True)
+        raw_path.unlink(missing_ok=True)
+        return
+    raw = raw_vectors(store)
+    if raw is None:
+        if info.raw is not None:
+            print(f"量化后又追加了向量，{raw_path} 已与索引不一致，删除后不再精确重算分数")
+        raw_path.unlink(missing_ok=True)
+        info.raw = None
+    elif not (isinstance(raw, np.memmap) and Path(raw.filename).resolve() == raw_path.resolve()):
+        tmp_path = raw_path.with_suffix(".tmp")
+        np.ascontiguousarray(raw, dtype=np.float32).tofile(tmp_path)
+        tmp_path.replace(raw_path)
+        info.raw = np.memmap(raw_path, dtype=np.float32, mode="r", shape=raw.shape)
+    meta = {
+        "kind": info.kind,
+        "dim": store.index.d,
+        "ntotal": store.index.ntotal,
+        "rescore_factor": info.rescore_factor,
+        "raw_vectors": info.raw is not None,
+    }
+    (path / QUANTIZATION_FILE).write_text(json.dumps(meta), encoding="utf-8")
+
+
+def load_quantization(store: FAISS, folder: str, rescore_factor: Optional[int] = None) -> FAISS:
+    """
+    读取 FAISS 索引目录中的二值索引和量化说明，原始向量以只读内存映射方式打开
+    参数：
+        rescore_factor: 覆盖保存时的候选倍数，None 时使用 VECTOR_STORE_RESCORE_FACTOR
+    """
+    import faiss
+
+    path = Path(folder)
+    binary_path = path / BINARY_INDEX_FILE
+    if binary_path.exists():
+        _binary[store] = faiss.read_index_binary(str(binary_path))
+    meta_path = path / QUANTIZATION_FILE
+    if not meta_path.exists():
+        return store
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    raw = None
+    raw_path = path / RAW_VECTORS_FILE
+    if meta.get("raw_vectors") and raw_path.exists() and meta["ntotal"] == store.index.ntotal:
+        raw = np.memmap(raw_path, dtype=np.float32, mode="r", shape=(meta["ntotal"], meta["dim"]))
+    factor = VECTOR_STORE_RESCORE_FACTOR if rescore_factor is None else rescore_factor
+    _quantized[store] = QuantizationInfo(meta["kind"], raw, factor)
+    return store
@@ -0,0 +1,36 @@
+import re
+from typing import Any, List
+
+from app.core.metrics import METRICS
+from .base import BaseReranker
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+class KeywordReranker(BaseReranker):
+    """
+    关键词覆盖率重排序器（不依赖任何模型）。
+    按查询词在文档中出现的比例重排序，比例相同时保持召回顺序。
+    用于离线测试和基准，也可作为没有 GPU 时的轻量重排序。
+    """
+
+    def rerank(self, query: str, docs: List[Any], top_k: int = 5) -> List[Any]:
+        """
+        对召回的文档块进行重排序，返回查询词覆盖率最高的 top_k 个文档。
+        :param query: 用户查询
+        :param docs: 召回的文档列表（需有 page_content 属性）
+        :param top_k: 返回的文档数
+        :return: 重排序后的文档列表
+        """
+        if not docs:
+            return []
+        with METRICS.span("rerank"):
+            query_terms = set(_TOKEN_RE.findall(query.lower()))
+            if not query_terms:
+                return docs[:top_k]
+            scores = [
+                len(query_terms & set(_TOKEN_RE.findall(doc.page_content.lower()))) / len(query_terms)
+                for doc in docs
+            ]
+            sorted_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+            return [docs[i] for i in sorted_indices[:top_k]]
@@ -3,6 +3,8 @@ from typing import List, Any
 from FlagEmbedding import FlagReranker
 import transformers
 
+from app.core.metrics import METRICS
+
 transformers.logging.set_verbosity_error()
 
 class LocalBGEReranker(BaseReranker):
@@ -30,11 +32,12 @@ class LocalBGEReranker(BaseReranker):
         """
         if not docs:
             return []
-        # 构造 query-passage 输入对
-        input_pairs = [[query, doc.page_content] for doc in docs]
-        # 计算相关性分数
-        scores = self.reranker.compute_score(input_pairs, normalize=True)
-        # 按分数排序，返回 top_k
-        sorted_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+        with METRICS.span("rerank"):
+            # 构造 query-passage 输入对
+            input_pairs = [[query, doc.page_content] for doc in docs]
+            # 计算相关性分数
+            scores = self.reranker.compute_score(input_pairs, normalize=True)
+            # 按分数排序，返回 top_k
+            sorted_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
         reranking_docs = [docs[i] for i in sorted_indices[:top_k]]
         return reranking_docs 
\ No newline at end of file
@@ -1,20 +1,223 @@
 from langchain_core.retrievers import BaseRetriever
 from langchain_community.vectorstores.faiss import FAISS
-from typing import List, Any
+from typing import List, Any, Dict, Optional, Sequence, Tuple, Union
 from langchain.docstore.document import Document
 from pydantic import PrivateAttr
+import numpy as np
+
+from app.core.config import BINARY_SHORTLIST_FACTOR, DENSE_FILTER_DIRECT_SEARCH_MAX, DENSE_SEARCH_MODE
+from app.core.metrics import METRICS
+from app.services.metadata_filter import MetadataFilter, MetadataIndex
+from app.services.quantization import (
+    binary_search_by_vector,
+    binary_search_many_by_vectors,
+    quantization_of,
+    raw_vectors,
+    rescore,
+    similarity_search_by_vector,
+    similarity_search_many_by_vectors,
+    stored_vectors,
+    supports_id_selector,
+)
+from app.services.sharded_vector_store import ShardedVectorStore
+
+# 稠密检索方式
+DENSE_SEARCH_MODES = ("flat", "binary")
+
+# 直接精确计算候选时每次读取的候选向量数，候选很多时分块计算，内存占用与候选总数无关
+_EXACT_SEARCH_BLOCK = 65536
 
 class DenseRetriever(BaseRetriever):
-    _vector_store: FAISS = PrivateAttr()
+    _vector_store: Union[FAISS, ShardedVectorStore] = PrivateAttr()
+    _k: int = PrivateAttr()
+    _search_mode: str = PrivateAttr(default="flat")
+    _shortlist_factor: int = PrivateAttr(default=BINARY_SHORTLIST_FACTOR)
+    _metadata_filter: Optional[MetadataFilter] = PrivateAttr(default=None)
+    _metadata_indexes: Dict[int, MetadataIndex] = PrivateAttr(default_factory=dict)
 
-    def __init__(self, vector_store: FAISS):
+    def __init__(self, vector_store: Union[FAISS, ShardedVectorStore], k: int = 4,
+                 metadata_filter: Union[MetadataFilter, Dict[str, Any], None] = None,
+                 search_mode: str = DENSE_SEARCH_MODE, shortlist_factor: int = BINARY_SHORTLIST_FACTOR):
         super().__init__()
+        if search_mode not in DENSE_SEARCH_MODES:
+            raise ValueError(f"未知稠密检索方式: {search_mode}")
         self._vector_store = vector_store
+        self._k = k
+        # binary: 先在二值索引中按汉明距离取 k × shortlist_factor 个候选，再用 float 向量重算
+        self._search_mode = search_mode
+        self._shortlist_factor = shortlist_factor
+        # 默认过滤条件，调用时传入的 metadata_filter 优先
+        self._metadata_filter = MetadataFilter.coerce(metadata_filter)
 
-    def _get_relevant_documents(self, query: str) -> List[Document]:
+    def _get_relevant_documents(self, query: str, metadata_filter: Union[MetadataFilter, Dict[str, Any], None] = None) -> List[Document]:
         # 兼容 langchain 检索器接口
-        return self._vector_store.similarity_search(query)
+        metadata_filter = MetadataFilter.coerce(metadata_filter) or self._metadata_filter
+        with METRICS.span("dense"):
+            with METRICS.span("dense.embed"):
+                embedding = self._embed_query(query)
+            if metadata_filter is None:
+                if self._search_mode == "binary":
+                    with METRICS.span("dense.binary"):
+                        return binary_search_by_vector(self._vector_store, embedding, k=self._k,
+                                                       shortlist_factor=self._shortlist_factor)
+                with METRICS.span("dense.search"):
+                    # 量化索引保留了原始向量时，先多取候选再精确重算分数
+                    return similarity_search_by_vector(self._vector_store, embedding, k=self._k)
+            return self._filtered_search(embedding, metadata_filter)
 
-    async def aget_relevant_documents(self, query: str) -> List[Document]:
+    async def aget_relevant_documents(self, query: str, metadata_filter: Union[MetadataFilter, Dict[str, Any], None] = None) -> List[Document]:
         # 异步接口
-        return self._get_relevant_documents(query) 
\ No newline at end of file
+        return self._get_relevant_documents(query, metadata_filter=metadata_filter)
+
+    def retrieve_many(self, queries: Sequence[str], k: Optional[int] = None,
+                      metadata_filter: Union[MetadataFilter, Dict[str, Any], None] = None) -> List[List[Document]]:
+        """
+        批量检索：所有查询一次 embed_documents 向量化，再对查询矩阵做一次 FAISS 检索（分片向量库每个分片一次）
+        返回：
+            每个查询的文本块列表，与逐条检索的结果一致
+        """
+        if not queries:
+            return []
+        k = self._k if k is None else k
+        metadata_filter = MetadataFilter.coerce(metadata_filter) or self._metadata_filter
+        with METRICS.span("dense.batch"):
+            with METRICS.span("dense.batch.embed"):
+                vectors = np.asarray(self._embed_queries(list(queries)), dtype=np.float32)
+            with METRICS.span("dense.batch.search"):
+                if metadata_filter is not None:
+                    return self._filtered_search_many(vectors, metadata_filter, k)
+                if self._search_mode == "binary":
+                    return binary_search_many_by_vectors(self._vector_store, vectors, k=k,
+                                                         shortlist_factor=self._shortlist_factor)
+                return similarity_search_many_by_vectors(self._vector_store, vectors, k=k)
+
+    def _embed_query(self, query: str) -> List[float]:
+        store = self._vector_store
+        if isinstance(store, ShardedVectorStore):
+            return store.embeddings.embed_query(query)
+        return store._embed_query(query)
+
+    def _embed_queries(self, queries: List[str]) -> List[List[float]]:
+        store = self._vector_store
+        if isinstance(store, ShardedVectorStore):
+            return store.embeddings.embed_documents(queries)
+        return store._embed_documents(queries)
+
+    def _get_metadata_index(self, shard: int, store: FAISS) -> MetadataIndex:
+        """按向量序号组织的元数据索引（每个分片一份），向量库新增向量后重建"""
+        metadata_index = self._metadata_indexes.get(shard)
+        if metadata_index is None or metadata_index.size != store.index.ntotal:
+            metadatas = []
+            for position in range(store.index.ntotal):
+                doc = store.docstore.search(store.index_to_docstore_id[position])
+                metadatas.append(doc.metadata if isinstance(doc, Document) else {})
+            metadata_index = MetadataIndex(metadatas)
+            self._metadata_indexes[shard] = metadata_index
+        return metadata_index
+
+    def _filtered_search(self, embedding: List[float], metadata_filter: MetadataFilter) -> List[Document]:
+        """
+        预过滤检索：查询只向量化一次，每个分片各自在候选中取 top-k，再归并
+        """
+        return self._filtered_search_many(np.asarray([embedding], dtype=np.float32), metadata_filter, self._k)[0]
+
+    def _filtered_search_many(self, vectors: np.ndarray, metadata_filter: MetadataFilter,
+                              k: int) -> List[List[Document]]:
+        """预过滤检索（查询矩阵）：每个分片只计算一次候选集合，返回每个查询的文本块列表"""
+        store = self._vector_store
+        if isinstance(store, ShardedVectorStore):
+            results = store.map_shards(
+                lambda shard, shard_store: self._search_shard(shard, shard_store, vectors, metadata_filter, k)
+            )
+            if not results:
+                return [[] for _ in range(len(vectors))]
+            return [
+                [doc for doc, _ in store.merge_results([shard_hits[row] for shard_hits in results], k)]
+                for row in range(len(vectors))
+            ]
+        return [[doc for doc, _ in hits] for hits in self._search_shard(0, store, vectors, metadata_filter, k)]
+
+    def _search_shard(self, shard: int, store: FAISS, vectors: np.ndarray,
+                      metadata_filter: MetadataFilter, k: int) -> List[List[Tuple[Document, float]]]:
+        """在单个 FAISS 索引中做预过滤检索，返回每个查询按相似度排序的 (文档, 距离) 列表"""
+        with METRICS.span("dense.filter"):
+            mask = self._get_metadata_index(shard, store).mask(metadata_filter)
+            n_candidates = int(np.count_nonzero(mask))
+        if n_candidates == 0:
+            return [[] for _ in range(len(vectors))]
+        with METRICS.span("dense.search"):
+            return self._search_candidates(store, vectors, mask, n_candidates, k)
+
+    def _search_candidates(self, store: FAISS, vectors: np.ndarray, mask: np.ndarray,
+                           n_candidates: int, k: int) -> List[List[Tuple[Document, float]]]:
+        """
+        在 mask 选中的候选中为每个查询（vectors 的每一行）取 top-k
+
+        候选较少时直接取出候选向量精确计算相似度，耗时与候选数成正比；
+        候选较多时把候选集合编码为 IDSelectorBitmap 交给 FAISS 搜索。
+        索引不支持 IDSelector（如 IndexPQ）时无论候选多少都直接精确计算（按块读取候选向量）。
+        量化索引优先使用保存的原始向量，FAISS 搜索的结果也会用原始向量精确重算。
+        """
+        import faiss
+
+        if store._normalize_L2:
+            vectors = vectors.copy()
+            faiss.normalize_L2(vectors)
+        k = min(k, n_candidates)
+
+        if n_candidates <= DENSE_FILTER_DIRECT_SEARCH_MAX or not supports_id_selector(store.index):
+            all_hits = self._exact_top_k(store, vectors, np.flatnonzero(mask), k)
+        else:
+            bitmap = np.packbits(mask, bitorder="little")
+            selector = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bitmap))
+            info = quantization_of(store)
+            rescoring = info is not None and info.rescore_factor > 0 and raw_vectors(store) is not None
+            fetch_k = min(k * info.rescore_factor, n_candidates) if rescoring else k
+            distances, indices = store.index.search(vectors, fetch_k, params=faiss.SearchParameters(sel=selector))
+            all_hits = []
+            for row, vector in enumerate(vectors):
+                if rescoring:
+                    all_hits.append(rescore(store, vector, [int(i) for i in indices[row] if i >= 0], k))
+                else:
+                    all_hits.append([(int(i), float(d)) for i, d in zip(indices[row], distances[row]) if i >= 0])
+
+        results = []
+        for hits in all_hits:
+            docs = []
+            for position, score in hits:
+                doc = store.docstore.search(store.index_to_docstore_id[position])
+                if isinstance(doc, Document):
+                    docs.append((doc, score))
+            results.append(docs)
+        return results
+
+    @staticmethod
+    def _exact_top_k(store: FAISS, vectors: np.ndarray, positions: np.ndarray,
+                     k: int) -> List[List[Tuple[int, float]]]:
+        """
+        对 positions 中的候选向量精确计算分数，为每个查询返回前 k 个 (向量序号, 分数)（同分按序号）
+
+        候选按块读取（原始向量或从索引解码），每块的前 k 个与之前的结果合并，结果与一次性排序相同。
+        """
+        import faiss
+
+        higher_is_better = store.index.metric_type == faiss.METRIC_INNER_PRODUCT
+        best_positions: List[np.ndarray] = [np.empty(0, dtype=np.int64) for _ in range(len(vectors))]
+        best_scores: List[np.ndarray] = [np.empty(0, dtype=np.float32) for _ in range(len(vectors))]
+        for start in range(0, len(positions), _EXACT_SEARCH_BLOCK):
+            block = positions[start:start + _EXACT_SEARCH_BLOCK]
+            candidates = stored_vectors(store, block)
+            # 候选数 × 查询数的分数矩阵
+            score_matrix = candidates @ vectors.T if higher_is_better else None
+            for row, vector in enumerate(vectors):
+                if higher_is_better:
+                    scores = score_matrix[:, row]
+                else:
+                    scores = ((candidates - vector) ** 2).sum(axis=1)
+                # 之前块的结果序号更小，放在前面，稳定排序保持同分按序号
+                merged_positions = np.concatenate([best_positions[row], block])
+                merged_scores = np.concatenate([best_scores[row], scores])
+                order = np.argsort(-merged_scores if higher_is_better else merged_scores, kind="stable")[:k]
+                best_positions[row] = merged_positions[order]
+                best_scores[row] = merged_scores[order]
+        return [list(zip(p.tolist(), s.tolist())) for p, s in zip(best_positions, best_scores)]
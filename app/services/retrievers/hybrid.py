@@ -1,8 +1,11 @@
 from langchain_core.retrievers import BaseRetriever
-from typing import List, Any, Callable
+from typing import List, Any, Callable, Dict, Optional, Sequence, Union
 from langchain.docstore.document import Document
 from pydantic import PrivateAttr
 
+from app.core.metrics import METRICS
+from app.services.metadata_filter import MetadataFilter
+
 class HybridRetriever(BaseRetriever):
     _dense_retriever: BaseRetriever = PrivateAttr()
     _sparse_retriever: BaseRetriever = PrivateAttr()
@@ -14,10 +17,36 @@ class HybridRetriever(BaseRetriever):
         self._sparse_retriever = sparse_retriever
         self._fusion_strategy = fusion_strategy
 
-    def _get_relevant_documents(self, query: str) -> List[Document]:
-        dense_results = self._dense_retriever._get_relevant_documents(query)
-        sparse_results = self._sparse_retriever._get_relevant_documents(query)
-        return self._fusion_strategy(dense_results, sparse_results)
+    def _get_relevant_documents(self, query: str, metadata_filter: Union[MetadataFilter, Dict[str, Any], None] = None) -> List[Document]:
+        # 过滤条件同时下推到稠密和稀疏检索（未传入时各自使用默认过滤条件）
+        with METRICS.span("hybrid"):
+            dense_results = self._dense_retriever._get_relevant_documents(query, metadata_filter=metadata_filter)
+            sparse_results = self._sparse_retriever._get_relevant_documents(query, metadata_filter=metadata_filter)
+            with METRICS.span("hybrid.fusion"):
+                return self._fusion_strategy(dense_results, sparse_results)
+
+    def retrieve_many(self, queries: Sequence[str], k: Optional[int] = None,
+                      metadata_filter: Union[MetadataFilter, Dict[str, Any], None] = None) -> List[List[Document]]:
+        """
+        批量检索：稠密和稀疏检索各自批量执行（支持 retrieve_many 时），再逐个查询融合
+        参数：
+            k: 稠密和稀疏检索各自返回的数量，默认使用各检索器的设置；融合后的数量由融合策略决定
+        """
+        if not queries:
+            return []
+        with METRICS.span("hybrid.batch"):
+            dense_results = _retrieve_many(self._dense_retriever, queries, k, metadata_filter)
+            sparse_results = _retrieve_many(self._sparse_retriever, queries, k, metadata_filter)
+            with METRICS.span("hybrid.fusion"):
+                return [self._fusion_strategy(dense, sparse) for dense, sparse in zip(dense_results, sparse_results)]
+
+    async def aget_relevant_documents(self, query: str, metadata_filter: Union[MetadataFilter, Dict[str, Any], None] = None) -> List[Document]:
+        return self._get_relevant_documents(query, metadata_filter=metadata_filter)
+
 
-    async def aget_relevant_documents(self, query: str) -> List[Document]:
-        return self._get_relevant_documents(query) 
\ No newline at end of file
+def _retrieve_many(retriever: BaseRetriever, queries: Sequence[str], k: Optional[int],
+                   metadata_filter: Union[MetadataFilter, Dict[str, Any], None]) -> List[List[Document]]:
+    """检索器支持 retrieve_many 时批量检索，否则逐条检索"""
+    if hasattr(retriever, "retrieve_many"):
+        return retriever.retrieve_many(queries, k=k, metadata_filter=metadata_filter)
+    return [retriever._get_relevant_documents(query, metadata_filter=metadata_filter) for query in queries]
@@ -0,0 +1,131 @@
+from langchain_core.retrievers import BaseRetriever
+from langchain_community.vectorstores.faiss import FAISS
+from typing import List, Any, Dict, Optional, Sequence, Tuple, Union
+from langchain.docstore.document import Document
+from pydantic import PrivateAttr
+import numpy as np
+
+from app.core.metrics import METRICS
+from app.services.metadata_filter import MetadataFilter
+from app.services.quantization import stored_vectors
+from app.services.sharded_vector_store import ShardedVectorStore
+
+
+def mmr_select(vectors: np.ndarray, relevance: np.ndarray, k: int, lambda_mult: float) -> List[int]:
+    """
+    最大边际相关性选择
+
+    每一步选择 λ·相关性 − (1−λ)·与已选文本块的最大相似度 最高的候选。与已选集合的最大相似度
+    增量更新，每选一个只需一次矩阵-向量乘法，总开销 O(n·k·d)。
+    参数：
+        vectors: 候选向量矩阵 (n, d)，已按行归一化
+        relevance: 候选的相关性分数 (n,)
+        k: 选择数量
+        lambda_mult: λ，1 只看相关性，0 只看多样性
+    返回：
+        List[int]: 按选择顺序排列的候选下标
+    """
+    n = len(vectors)
+    k = min(k, n)
+    if k <= 0:
+        return []
+    first = int(np.argmax(relevance))
+    selected = [first]
+    available = np.ones(n, dtype=bool)
+    available[first] = False
+    max_similarity = vectors @ vectors[first]
+    for _ in range(k - 1):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        index = int(np.argmax(scores))
+        selected.append(index)
+        available[index] = False
+        np.maximum(max_similarity, vectors @ vectors[index], out=max_similarity)
+    return selected
+
+
+class MMRRetriever(BaseRetriever):
+    """
+    在任意检索器（dense/sparse/hybrid）的候选上做 MMR 多样化
+
+    候选向量直接从 FAISS 索引中取出（量化索引优先读取保存的原始向量），不重新计算嵌入；相关性取底层检索器
+    的排序（第 1 名为 1，线性递减），因此 BM25、融合等排序信息得以保留，也不需要再次向量化查询。
+    """
+    _base_retriever: BaseRetriever = PrivateAttr()
+    _vector_store: Union[FAISS, ShardedVectorStore] = PrivateAttr()
+    _k: int = PrivateAttr()
+    _lambda_mult: float = PrivateAttr()
+    _positions: Dict[int, Tuple[int, Dict[str, int]]] = PrivateAttr(default_factory=dict)
+
+    def __init__(self, base_retriever: BaseRetriever, vector_store: Union[FAISS, ShardedVectorStore],
+                 k: int = 4, lambda_mult: float = 0.5):
+        super().__init__()
+        if not 0 <= lambda_mult <= 1:
+            raise ValueError(f"MMR 的 lambda 应在 [0, 1] 之间: {lambda_mult}")
+        self._base_retriever = base_retriever
+        self._vector_store = vector_store
+        self._k = k
+        self._lambda_mult = lambda_mult
+
+    def _get_relevant_documents(self, query: str, metadata_filter: Union[MetadataFilter, Dict[str, Any], None] = None) -> List[Document]:
+        docs = self._base_retriever._get_relevant_documents(query, metadata_filter=metadata_filter)
+        if len(docs) <= 1:
+            return docs[:self._k]
+        with METRICS.span("mmr"):
+            with METRICS.span("mmr.vectors"):
+                vectors = self._candidate_vectors(docs)
+            relevance = 1.0 - np.arange(len(docs), dtype=np.float32) / len(docs)
+            order = mmr_select(vectors, relevance, self._k, self._lambda_mult)
+            return [docs[i] for i in order]
+
+    async def aget_relevant_documents(self, query: str, metadata_filter: Union[MetadataFilter, Dict[str, Any], None] = None) -> List[Document]:
+        return self._get_relevant_documents(query, metadata_filter=metadata_filter)
+
+    def _shards(self) -> List[Tuple[int, FAISS]]:
+        store = self._vector_store
+        if isinstance(store, ShardedVectorStore):
+            return [(i, shard) for i, shard in enumerate(store.shards) if shard is not None]
+        return [(0, store)]
+
+    def _get_positions(self, shard: int, store: FAISS) -> Dict[str, int]:
+        """文档 ID 到向量序号的映射（每个分片一份），向量库新增向量后重建"""
+        cached = self._positions.get(shard)
+        if cached is None or cached[0] != store.index.ntotal:
+            positions = {doc_id: position for position, doc_id in store.index_to_docstore_id.items()}
+            cached = (store.index.ntotal, positions)
+            self._positions[shard] = cached
+        return cached[1]
+
+    def _candidate_vectors(self, docs: Sequence[Document]) -> np.ndarray:
+        """
+        候选文本块的归一化向量：在索引中的直接取出，找不到的（如没有文档 ID）才重新计算嵌入
+        """
+        vectors: List[Optional[np.ndarray]] = [None] * len(docs)
+        pending = [i for i, doc in enumerate(docs) if doc.id]
+        for shard, store in self._shards():
+            if not pending:
+                break
+            positions = self._get_positions(shard, store)
+            found = [(i, positions[docs[i].id]) for i in pending if docs[i].id in positions]
+            if not found:
+                continue
+            stored = stored_vectors(store, np.asarray([position for _, position in found], dtype=np.int64))
+            for (i, _), vector in zip(found, stored):
+                vectors[i] = vector
+            pending = [i for i in pending if vectors[i] is None]
+
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            METRICS.increment("mmr.embedded", len(missing))
+            store = self._vector_store
+            texts = [docs[i].page_content for i in missing]
+            if isinstance(store, ShardedVectorStore):
+                embedded = store.embeddings.embed_documents(texts)
+            else:
+                embedded = store._embed_documents(texts)
+            for i, vector in zip(missing, embedded):
+                vectors[i] = np.asarray(vector, dtype=np.float32)
+
+        matrix = np.vstack(vectors).astype(np.float32, copy=False)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms > 0, norms, 1.0)
@@ -1,16 +1,28 @@
 from langchain_core.retrievers import BaseRetriever
 from rank_bm25 import BM25Okapi
-from typing import List, Any, Union
+from typing import List, Any, Dict, Iterable, Optional, Sequence, Tuple, Union
 from langchain.docstore.document import Document
 from pydantic import PrivateAttr
+import numpy as np
+
+from app.core.metrics import METRICS
+from app.services.metadata_filter import MetadataFilter, MetadataIndex
 
 class SparseRetriever(BaseRetriever):
     _corpus: List[Document] = PrivateAttr()
     _tokenized_corpus: List[List[str]] = PrivateAttr()
     _bm25: BM25Okapi = PrivateAttr()
+    _doc_len: np.ndarray = PrivateAttr()
+    _metadata_filter: Optional[MetadataFilter] = PrivateAttr(default=None)
+    _metadata_index: Optional[MetadataIndex] = PrivateAttr(default=None)
+    # 倒排表：词 -> (文档序号, 词频)，批量检索时按需建立，with_metadata_filter 派生的检索器共享同一份
+    _postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = PrivateAttr(default_factory=dict)
+    _k: int = PrivateAttr(default=5)
 
-    def __init__(self, corpus: List[Union[Document, str]]):
+    def __init__(self, corpus: List[Union[Document, str]],
+                 metadata_filter: Union[MetadataFilter, Dict[str, Any], None] = None, k: int = 5):
         super().__init__()
+        self._k = k
         # 支持传入 Document 或 str
         if isinstance(corpus[0], Document):
             self._corpus = corpus
@@ -19,19 +31,154 @@ class SparseRetriever(BaseRetriever):
             self._corpus = [Document(page_content=text, metadata={}) for text in corpus]
             self._tokenized_corpus = [text.split() for text in corpus]
         self._bm25 = BM25Okapi(self._tokenized_corpus)
+        self._doc_len = np.asarray(self._bm25.doc_len, dtype=np.float64)
+        # 默认过滤条件，调用时传入的 metadata_filter 优先
+        self._metadata_filter = MetadataFilter.coerce(metadata_filter)
 
-    def _get_relevant_documents(self, query: str) -> List[Document]:
-        tokenized_query = query.split()
-        scores = self._bm25.get_scores(tokenized_query)
-        top_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:5]
-        # 返回原始 Document，保留 metadata 并补充 bm25_score
+    def with_metadata_filter(self, metadata_filter: Union[MetadataFilter, Dict[str, Any], None],
+                             k: Optional[int] = None) -> "SparseRetriever":
+        """返回使用另一默认过滤条件（和返回数量 k）的检索器，共享已建好的 BM25 索引和元数据索引"""
+        metadata_filter = MetadataFilter.coerce(metadata_filter)
+        if metadata_filter is not None and self._metadata_index is None:
+            self._metadata_index = MetadataIndex([doc.metadata or {} for doc in self._corpus])
+        retriever = SparseRetriever.__new__(SparseRetriever)
+        BaseRetriever.__init__(retriever)
+        retriever._corpus = self._corpus
+        retriever._tokenized_corpus = self._tokenized_corpus
+        retriever._bm25 = self._bm25
+        retriever._doc_len = self._doc_len
+        retriever._metadata_index = self._metadata_index
+        retriever._postings = self._postings
+        retriever._k = self._k if k is None else k
+        retriever._metadata_filter = metadata_filter
+        return retriever
+
+    def _get_relevant_documents(self, query: str, metadata_filter: Union[MetadataFilter, Dict[str, Any], None] = None) -> List[Document]:
+        with METRICS.span("sparse"):
+            return self._search(query, MetadataFilter.coerce(metadata_filter) or self._metadata_filter)
+
+    def retrieve_many(self, queries: Sequence[str], k: Optional[int] = None,
+                      metadata_filter: Union[MetadataFilter, Dict[str, Any], None] = None) -> List[List[Document]]:
+        """
+        批量检索：所有查询共用倒排表，每个不同的查询词只计算一次它在各文档上的 BM25 分量，
+        每个查询只累加包含查询词的文档
+        返回：
+            每个查询的文本块列表，与逐条检索的结果一致
+        """
+        if not queries:
+            return []
+        k = self._k if k is None else k
+        metadata_filter = MetadataFilter.coerce(metadata_filter) or self._metadata_filter
+        with METRICS.span("sparse.batch"):
+            candidates = None
+            if metadata_filter is not None:
+                with METRICS.span("sparse.filter"):
+                    if self._metadata_index is None:
+                        self._metadata_index = MetadataIndex([doc.metadata or {} for doc in self._corpus])
+                    candidates = self._metadata_index.positions(metadata_filter)
+            with METRICS.span("sparse.batch.score"):
+                tokenized_queries = [query.split() for query in queries]
+                term_scores = self._term_scores({q for tokens in tokenized_queries for q in tokens})
+                results = []
+                for tokens in tokenized_queries:
+                    scores = np.zeros(len(self._corpus))
+                    # 按查询词顺序累加，浮点结果与 BM25Okapi.get_scores 一致
+                    for q in tokens:
+                        if q in term_scores:
+                            positions, values = term_scores[q]
+                            scores[positions] += values
+                    results.append(self._top_k(scores, k, candidates))
+        return [self._to_documents(top_indices, scores) for top_indices, scores in results]
+
+    def _get_postings(self) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """倒排表（首次调用时由 BM25 索引的词频表建立）"""
+        if not self._postings:
+            positions: Dict[str, List[int]] = {}
+            freqs: Dict[str, List[int]] = {}
+            for i, doc_freqs in enumerate(self._bm25.doc_freqs):
+                for term, freq in doc_freqs.items():
+                    positions.setdefault(term, []).append(i)
+                    freqs.setdefault(term, []).append(freq)
+            self._postings.update({
+                term: (np.asarray(positions[term], dtype=np.int64), np.asarray(freqs[term], dtype=np.float64))
+                for term in positions
+            })
+        return self._postings
+
+    def _term_scores(self, terms: Iterable[str]) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """每个词在包含它的文档上的 BM25 分量：词 -> (文档序号, 分量)，不在语料中的词省略"""
+        bm25 = self._bm25
+        postings = self._get_postings()
+        norm = bm25.k1 * (1 - bm25.b + bm25.b * self._doc_len / bm25.avgdl)
+        term_scores = {}
+        for q in terms:
+            if q not in postings:
+                continue
+            positions, q_freq = postings[q]
+            term_scores[q] = (positions, (bm25.idf.get(q) or 0) * (q_freq * (bm25.k1 + 1) / (q_freq + norm[positions])))
+        return term_scores
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int, candidates: Optional[np.ndarray]) -> Tuple[List[int], Dict[int, float]]:
+        """
+        取分数最高的 k 个文档（同分按文档序号），返回 (文档序号列表, 序号 -> 分数)
+        candidates 不为 None 时只在候选中选取
+        """
+        if candidates is not None:
+            candidate_scores = scores[candidates]
+            order = np.argsort(-candidate_scores, kind="stable")[:k]
+            top_indices = candidates[order].tolist()
+        elif k < len(scores):
+            # 先用 argpartition 找到第 k 大的分数，只对不低于它的文档做稳定排序
+            threshold = scores[np.argpartition(-scores, k - 1)[k - 1]] if k > 0 else np.inf
+            selected = np.flatnonzero(scores >= threshold)
+            top_indices = selected[np.argsort(-scores[selected], kind="stable")[:k]].tolist()
+        else:
+            top_indices = np.argsort(-scores, kind="stable").tolist()
+        return top_indices, {i: float(scores[i]) for i in top_indices}
+
+    def _to_documents(self, top_indices: List[int], scores: Any) -> List[Document]:
+        """返回原始 Document，保留文档 ID 和 metadata 并补充 bm25_score"""
         results = []
         for i in top_indices:
             doc = self._corpus[i]
             meta = dict(doc.metadata) if doc.metadata else {}
             meta["bm25_score"] = scores[i]
-            results.append(Document(page_content=doc.page_content, metadata=meta))
+            results.append(Document(id=doc.id, page_content=doc.page_content, metadata=meta))
         return results
 
-    async def aget_relevant_documents(self, query: str) -> List[Document]:
-        return self._get_relevant_documents(query) 
\ No newline at end of file
+    def _search(self, query: str, metadata_filter: Optional[MetadataFilter]) -> List[Document]:
+        tokenized_query = query.split()
+        if metadata_filter is None:
+            with METRICS.span("sparse.score"):
+                scores = self._bm25.get_scores(tokenized_query)
+                top_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:self._k]
+        else:
+            # 预过滤：只为候选文档计算 BM25 分数
+            with METRICS.span("sparse.filter"):
+                if self._metadata_index is None:
+                    self._metadata_index = MetadataIndex([doc.metadata or {} for doc in self._corpus])
+                candidates = self._metadata_index.positions(metadata_filter)
+            with METRICS.span("sparse.score"):
+                candidate_scores = self._candidate_scores(tokenized_query, candidates)
+                order = np.argsort(-candidate_scores, kind="stable")[:self._k]
+                scores = dict(zip(candidates[order].tolist(), candidate_scores[order].tolist()))
+                top_indices = list(scores)
+        return self._to_documents(top_indices, scores)
+
+    def _candidate_scores(self, tokenized_query: List[str], candidates: np.ndarray) -> np.ndarray:
+        """计算候选文档的 BM25 分数（与 BM25Okapi.get_scores 的公式一致）"""
+        bm25 = self._bm25
+        scores = np.zeros(len(candidates))
+        if len(candidates) == 0:
+            return scores
+        doc_len = self._doc_len[candidates]
+        norm = bm25.k1 * (1 - bm25.b + bm25.b * doc_len / bm25.avgdl)
+        doc_freqs = [bm25.doc_freqs[i] for i in candidates]
+        for q in tokenized_query:
+            q_freq = np.array([freqs.get(q) or 0 for freqs in doc_freqs], dtype=np.float64)
+            scores += (bm25.idf.get(q) or 0) * (q_freq * (bm25.k1 + 1) / (q_freq + norm))
+        return scores
+
+    async def aget_relevant_documents(self, query: str, metadata_filter: Union[MetadataFilter, Dict[str, Any], None] = None) -> List[Document]:
+        return self._get_relevant_documents(query, metadata_filter=metadata_filter)
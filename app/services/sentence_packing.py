@@ -0,0 +1,249 @@
+"""
+句子打包模块
+
+语义分块策略共用的打包引擎：输入页面文本和句子的字符区间，
+输出文本块在原文中的字符区间。整个过程只操作偏移量数组，不做字符串拼接，
+时间复杂度与句子数量成线性关系。
+
+- 长度可以按字符数或 token 数计算（length_unit）
+- 支持按长度或按句子数的重叠（chunk_overlap）
+- 超过 chunk_size 的单个句子会被硬切分
+- 文本块元数据中记录 start_index/end_index，便于后续在原文中高亮来源
+"""
+
+import re
+from typing import List, Sequence, Tuple
+
+from langchain.docstore.document import Document
+
+from app.core.config import TOKENIZER_ENCODING
+from app.services.tokenization import LENGTH_UNITS, count_tokens_batch, token_windows_batch
+
+# 重叠单位：按字符数或按句子数
+OVERLAP_UNITS = ("chars", "sentences")
+
+Span = Tuple[int, int]
+
+# 句末标点：中文句号/叹号/问号/省略号、英文叹号/问号，以及后接空白或文末的英文句点；
+# 句末标点后的右引号、右括号归入当前句子；连续空行也视为句子边界
+_SENTENCE_END = re.compile(
+    r"(?:[。！？!?…]+|\.+(?=[\s”’\"')）」』\]]|$))[”’\"')）」』\]]*|\n\s*\n"
+)
+
+
+def locate_sentences(text: str, sentences: Sequence[str]) -> List[Span]:
+    """
+    根据句子切分器返回的句子文本，在原文中顺序定位其字符区间
+
+    参数：
+        text: 原文
+        sentences: 按顺序排列的句子（需为原文的子串，允许首尾空白不同）
+    返回：
+        句子区间列表；无法定位的句子会被跳过
+    """
+    spans = []
+    position = 0
+    for sentence in sentences:
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        start = text.find(sentence, position)
+        if start < 0:
+            continue
+        end = start + len(sentence)
+        spans.append((start, end))
+        position = end
+    return spans
+
+
+def regex_sentence_spans(text: str) -> List[Span]:
+    """
+    内置的正则句子切分器，无需下载任何资源
+
+    按中英文句末标点和空行切分，适合作为 NLTK/spaCy 不可用时的后备方案。
+
+    参数：
+        text: 原文
+    返回：
+        句子区间列表（可能包含首尾空白，打包时会被去除）
+    """
+    spans = []
+    position = 0
+    for match in _SENTENCE_END.finditer(text):
+        end = match.end()
+        if end > position:
+            spans.append((position, end))
+            position = end
+    if position < len(text):
+        spans.append((position, len(text)))
+    return spans
+
+
+def strip_spans(text: str, spans: Sequence[Span]) -> List[Span]:
+    """去掉句子首尾空白并丢弃空句子"""
+    stripped = []
+    for start, end in spans:
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start < end:
+            stripped.append((start, end))
+    return stripped
+
+
+def _split_by_chars(spans: List[Span], chunk_size: int) -> Tuple[List[int], List[int]]:
+    """把超过 chunk_size 个字符的句子硬切分"""
+    starts: List[int] = []
+    ends: List[int] = []
+    for start, end in spans:
+        while end - start > chunk_size:
+            starts.append(start)
+            ends.append(start + chunk_size)
+            start += chunk_size
+        starts.append(start)
+        ends.append(end)
+    return starts, ends
+
+
+def _split_by_tokens(text: str, spans: List[Span], chunk_size: int,
+                     encoding_name: str = TOKENIZER_ENCODING) -> Tuple[List[int], List[int], List[int]]:
+    """计算每个句子的 token 数，并把超过 chunk_size 个 token 的句子按 token 边界硬切分"""
+    sentences = [text[start:end] for start, end in spans]
+    weights = count_tokens_batch(sentences, encoding_name)
+    oversize = [i for i, weight in enumerate(weights) if weight > chunk_size]
+    pieces = dict(zip(oversize, token_windows_batch([sentences[i] for i in oversize], chunk_size,
+                                                    encoding_name=encoding_name)))
+
+    starts: List[int] = []
+    ends: List[int] = []
+    piece_weights: List[int] = []
+    for i, (start, end) in enumerate(spans):
+        if i not in pieces:
+            starts.append(start)
+            ends.append(end)
+            piece_weights.append(weights[i])
+            continue
+        windows = pieces[i]
+        for piece_start, piece_end in windows:
+            starts.append(start + piece_start)
+            ends.append(start + piece_end)
+        # 每个窗口不超过 chunk_size 个 token，最后一个窗口取余数
+        piece_weights.extend([chunk_size] * (len(windows) - 1))
+        piece_weights.append(weights[i] - chunk_size * (len(windows) - 1))
+    return starts, ends, piece_weights
+
+
+def pack_sentences(
+    text: str,
+    spans: Sequence[Span],
+    chunk_size: int,
+    chunk_overlap: int = 0,
+    overlap_unit: str = "chars",
+    length_unit: str = "chars",
+    encoding_name: str = TOKENIZER_ENCODING,
+) -> List[Span]:
+    """
+    将句子贪心地打包为长度不超过 chunk_size 的文本块
+
+    length_unit="chars" 时，文本块长度按其在原文中覆盖的区间计算（包含句子之间的空白）；
+    length_unit="tokens" 时，按所含句子的 token 数之和计算（句子 token 数批量编码一次得到）。
+    相邻文本块之间的重叠由若干完整句子构成：
+    - overlap_unit="chars"：重叠句子的总长度不超过 chunk_overlap（单位与 chunk_size 相同）
+    - overlap_unit="sentences"：重叠 chunk_overlap 个句子
+
+    参数：
+        text: 原文
+        spans: 句子区间列表（按顺序排列）
+        chunk_size: 文本块最大长度
+        chunk_overlap: 重叠大小
+        overlap_unit: 重叠单位，"chars" 或 "sentences"
+        length_unit: 长度单位，"chars" 或 "tokens"
+        encoding_name: 按 token 计长时使用的编码名称
+    返回：
+        文本块区间列表
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size 必须为正整数")
+    if overlap_unit not in OVERLAP_UNITS:
+        raise ValueError(f"未知的重叠单位: {overlap_unit}，可选值: {OVERLAP_UNITS}")
+    if length_unit not in LENGTH_UNITS:
+        raise ValueError(f"未知的长度单位: {length_unit}，可选值: {LENGTH_UNITS}")
+
+    spans = strip_spans(text, spans)
+    if length_unit == "tokens":
+        starts, ends, weights = _split_by_tokens(text, spans, chunk_size, encoding_name)
+        prefix = [0]
+        for weight in weights:
+            prefix.append(prefix[-1] + weight)
+
+        def measure(i: int, j: int) -> int:
+            return prefix[j] - prefix[i]
+    else:
+        starts, ends = _split_by_chars(spans, chunk_size)
+
+        def measure(i: int, j: int) -> int:
+            return ends[j - 1] - starts[i]
+
+    n = len(starts)
+    chunks: List[Span] = []
+    i = 0
+    j = 0
+    while i < n:
+        # 扩展右边界：[i, j) 为当前文本块包含的句子
+        j = max(j, i + 1)
+        while j < n and measure(i, j + 1) <= chunk_size:
+            j += 1
+        chunks.append((starts[i], ends[j - 1]))
+        if j >= n:
+            break
+
+        # 确定下一个文本块的起点 k（i < k <= j），[k, j) 为重叠句子
+        if overlap_unit == "sentences":
+            k = max(i + 1, j - max(0, chunk_overlap))
+        else:
+            k = i + 1
+            while k < j and measure(k, j) > chunk_overlap:
+                k += 1
+        # 重叠部分加上下一个句子必须能放进一个文本块，否则缩小重叠
+        while k < j and measure(k, j + 1) > chunk_size:
+            k += 1
+        i = k
+    return chunks
+
+
+def pack_document(
+    doc: Document,
+    spans: Sequence[Span],
+    chunk_size: int,
+    chunk_overlap: int = 0,
+    overlap_unit: str = "chars",
+    length_unit: str = "chars",
+    encoding_name: str = TOKENIZER_ENCODING,
+) -> List[Document]:
+    """
+    将一个文档按句子区间打包为文本块文档
+
+    每个文本块的元数据复制自原文档，并额外记录 start_index/end_index
+    （文本块在原文中的字符区间）。
+
+    参数：
+        doc: 原文档
+        spans: 句子区间列表
+        chunk_size: 文本块最大长度
+        chunk_overlap: 重叠大小
+        overlap_unit: 重叠单位，"chars" 或 "sentences"
+        length_unit: 长度单位，"chars" 或 "tokens"
+        encoding_name: 按 token 计长时使用的编码名称
+    返回：
+        文本块文档列表
+    """
+    text = doc.page_content
+    chunks = []
+    for start, end in pack_sentences(text, spans, chunk_size, chunk_overlap, overlap_unit, length_unit,
+                                     encoding_name):
+        metadata = dict(doc.metadata)
+        metadata["start_index"] = start
+        metadata["end_index"] = end
+        chunks.append(Document(page_content=text[start:end], metadata=metadata))
+    return chunks
@@ -0,0 +1,335 @@
+"""
+分片向量库模块
+
+把向量库拆分为 N 个独立的 FAISS 分片：
+
+- 分片方式：按来源文件哈希（同一文件的文本块总在同一分片）或按摄入批次轮转
+- 构建：各分片可在线程池中并行嵌入和建索引
+- 更新：分片单独保存，只有发生变化的分片会被重写
+- 检索：查询向量同时发往所有分片（FAISS 搜索会释放 GIL），
+  各分片的有序结果再做 k 路归并
+
+磁盘布局：
+    <path>/shards.json        分片清单
+    <path>/shard_000/         每个分片是一个标准的 FAISS.save_local 目录（量化索引另有原始向量文件）
+    ...
+只有一个分片时沿用原来的单索引布局，见 vector_store_service。
+"""
+
+import heapq
+import itertools
+import json
+import os
+import shutil
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain.docstore.document import Document
+from langchain.embeddings.base import Embeddings
+from langchain_community.vectorstores.faiss import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+
+from app.core.config import VECTOR_STORE_SHARD_BY, VECTOR_STORE_SEARCH_THREADS
+from app.services.quantization import load_quantization, save_quantization
+
+# 分片方式
+SHARD_BY_OPTIONS = ("source", "batch")
+
+MANIFEST_FILE = "shards.json"
+
+
+def is_sharded_path(path: str) -> bool:
+    """判断目录中保存的是否为分片向量库"""
+    return (Path(path) / MANIFEST_FILE).exists()
+
+
+def _shard_dir(path: Path, shard: int) -> Path:
+    return path / f"shard_{shard:03d}"
+
+
+class ShardedVectorStore:
+    """
+    分片向量库
+
+    对外提供与 FAISS 向量库相同的常用检索接口（similarity_search 等），
+    检索器和问答链无需区分单索引和分片索引。
+    """
+
+    def __init__(
+        self,
+        shards: Sequence[Optional[FAISS]],
+        embeddings: Embeddings,
+        shard_by: str = VECTOR_STORE_SHARD_BY,
+        search_threads: int = VECTOR_STORE_SEARCH_THREADS,
+    ):
+        """
+        参数：
+            shards: 各分片的 FAISS 向量库，尚无数据的分片为 None
+            embeddings: 嵌入模型实例（用于查询时向量化）
+            shard_by: 分片方式，"source" 按来源文件哈希，"batch" 按摄入批次轮转
+            search_threads: 检索线程数，0 表示与分片数相同
+        """
+        if not shards:
+            raise ValueError("分片数必须为正整数")
+        if shard_by not in SHARD_BY_OPTIONS:
+            raise ValueError(f"未知的分片方式: {shard_by}，可选值: {SHARD_BY_OPTIONS}")
+        self.shards: List[Optional[FAISS]] = list(shards)
+        self.embeddings = embeddings
+        self.shard_by = shard_by
+        self.search_threads = search_threads or len(self.shards)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._dirty = set(range(len(self.shards)))
+        self._saved_path: Optional[Path] = None
+
+    @classmethod
+    def empty(cls, n_shards: int, embeddings: Embeddings, shard_by: str = VECTOR_STORE_SHARD_BY) -> "ShardedVectorStore":
+        """创建没有数据的分片向量库"""
+        return cls([None] * n_shards, embeddings, shard_by)
+
+    @property
+    def n_shards(self) -> int:
+        return len(self.shards)
+
+    @property
+    def embedding_function(self) -> Embeddings:
+        return self.embeddings
+
+    @property
+    def ntotal(self) -> int:
+        """所有分片的向量总数"""
+        return sum(shard.index.ntotal for shard in self.shards if shard is not None)
+
+    # --- 分片分配 ---
+
+    def shard_for(self, chunk: Document, batch_index: Optional[int] = None) -> int:
+        """
+        计算文本块所属的分片
+
+        按来源分片时使用来源路径的 CRC32（跨进程稳定）；按批次分片时使用批次序号，
+        未提供批次序号时退回按来源分片。
+        """
+        if self.shard_by == "batch" and batch_index is not None:
+            return batch_index % self.n_shards
+        source = str(chunk.metadata.get("source", ""))
+        return zlib.crc32(source.encode("utf-8")) % self.n_shards
+
+    def _partition(self, chunks: Sequence[Document], batch_index: Optional[int] = None) -> Dict[int, List[int]]:
+        """把文本块下标按分片分组"""
+        groups: Dict[int, List[int]] = {}
+        for i, chunk in enumerate(chunks):
+            groups.setdefault(self.shard_for(chunk, batch_index), []).append(i)
+        return groups
+
+    # --- 构建与更新 ---
+
+    def _add_to_shard(self, shard: int, chunks: Sequence[Document], vectors: Sequence[Sequence[float]]) -> None:
+        text_embeddings = [(chunk.page_content, list(vector)) for chunk, vector in zip(chunks, vectors)]
+        metadatas = [chunk.metadata for chunk in chunks]
+        ids = [chunk.id for chunk in chunks] if all(chunk.id for chunk in chunks) else None
+        if self.shards[shard] is None:
+            self.shards[shard] = FAISS.from_embeddings(text_embeddings, self.embeddings, metadatas=metadatas, ids=ids)
+        else:
+            self.shards[shard].add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        self._dirty.add(shard)
+
+    def add_embedded_chunks(
+        self,
+        chunks: Sequence[Document],
+        vectors: Sequence[Sequence[float]],
+        batch_index: Optional[int] = None,
+    ) -> None:
+        """
+        追加已计算好向量的文本块，各分片的写入并行进行
+
+        参数：
+            chunks: 文本块列表
+            vectors: 与 chunks 一一对应的向量
+            batch_index: 摄入批次序号（按批次分片时使用）
+        """
+        groups = self._partition(chunks, batch_index)
+        self.map_shards(
+            lambda shard, _: self._add_to_shard(
+                shard, [chunks[i] for i in groups[shard]], [vectors[i] for i in groups[shard]]
+            ),
+            shards=list(groups),
+        )
+
+    def add_documents(self, chunks: Sequence[Document], batch_index: Optional[int] = None) -> None:
+        """嵌入并追加文本块，各分片并行调用嵌入模型"""
+        groups = self._partition(chunks, batch_index)
+
+        def build(shard: int, _) -> None:
+            shard_chunks = [chunks[i] for i in groups[shard]]
+            vectors = self.embeddings.embed_documents([chunk.page_content for chunk in shard_chunks])
+            self._add_to_shard(shard, shard_chunks, vectors)
+
+        self.map_shards(build, shards=list(groups))
+
+    @classmethod
+    def from_documents(
+        cls,
+        chunks: Sequence[Document],
+        embeddings: Embeddings,
+        n_shards: int,
+        shard_by: str = VECTOR_STORE_SHARD_BY,
+    ) -> "ShardedVectorStore":
+        """并行构建分片向量库（每个分片在独立线程中嵌入和建索引）"""
+        store = cls.empty(n_shards, embeddings, shard_by)
+        store.add_documents(chunks)
+        return store
+
+    def replace_shard(self, shard: int, vector_store: Optional[FAISS]) -> None:
+        """替换单个分片（如单独重建某个分片），下次保存时只重写该分片"""
+        self.shards[shard] = vector_store
+        self._dirty.add(shard)
+
+    def search_document(self, doc_id: str) -> Optional[Document]:
+        """按文档 ID 在所有分片中查找文本块"""
+        for shard in self.shards:
+            if shard is None:
+                continue
+            doc = shard.docstore.search(doc_id)
+            if isinstance(doc, Document):
+                return doc
+        return None
+
+    def iter_documents(self) -> Iterator[Document]:
+        """按分片顺序遍历所有文本块"""
+        for shard in self.shards:
+            if shard is None:
+                continue
+            for position in range(shard.index.ntotal):
+                doc = shard.docstore.search(shard.index_to_docstore_id[position])
+                if isinstance(doc, Document):
+                    yield doc
+
+    # --- 检索 ---
+
+    def map_shards(self, func: Callable[[int, FAISS], Any], shards: Optional[Sequence[int]] = None) -> List[Any]:
+        """
+        在线程池中对多个分片并发执行 func(分片序号, 分片)，按分片顺序返回结果
+
+        参数：
+            func: 分片函数
+            shards: 分片序号列表，默认为所有非空分片
+        """
+        if shards is None:
+            shards = [i for i, shard in enumerate(self.shards) if shard is not None]
+        if len(shards) <= 1:
+            return [func(i, self.shards[i]) for i in shards]
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.search_threads, thread_name_prefix="vector-shard"
+                )
+        futures = [self._executor.submit(func, i, self.shards[i]) for i in shards]
+        return [future.result() for future in futures]
+
+    def _higher_is_better(self) -> bool:
+        for shard in self.shards:
+            if shard is not None:
+                return shard.distance_strategy in (DistanceStrategy.MAX_INNER_PRODUCT, DistanceStrategy.JACCARD)
+        return False
+
+    def merge_results(self, results: Sequence[Sequence[Tuple[Any, float]]], k: int) -> List[Tuple[Any, float]]:
+        """
+        k 路归并各分片的有序结果
+
+        参数：
+            results: 各分片的 (结果, 分数) 列表，已按相似度从高到低排序
+            k: 返回的结果数
+        """
+        higher_is_better = self._higher_is_better()
+        merged = heapq.merge(*results, key=lambda item: item[1], reverse=higher_is_better)
+        return list(itertools.islice(merged, k))
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        """scatter-gather：每个分片各取 top-k，再归并为全局 top-k"""
+        results = self.map_shards(
+            lambda _, shard: shard.similarity_search_with_score_by_vector(embedding, k=k, **kwargs)
+        )
+        return self.merge_results(results, k)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k=k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        embedding = self.embeddings.embed_query(query)
+        return self.similarity_search_with_score_by_vector(embedding, k=k, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, **kwargs)]
+
+    # --- 持久化 ---
+
+    def save_local(self, folder_path: str) -> None:
+        """
+        保存到目录；再次保存到同一目录时只重写发生变化的分片
+
+        写入顺序为：分片目录 -> 清单文件，清单通过临时文件原子替换。
+        """
+        path = Path(folder_path)
+        path.mkdir(parents=True, exist_ok=True)
+        incremental = self._saved_path == path.resolve()
+        to_write = sorted(self._dirty) if incremental else range(self.n_shards)
+        for shard in to_write:
+            shard_dir = _shard_dir(path, shard)
+            if self.shards[shard] is None:
+                shutil.rmtree(shard_dir, ignore_errors=True)
+            else:
+                self.shards[shard].save_local(str(shard_dir))
+                save_quantization(self.shards[shard], str(shard_dir))
+
+        manifest = {
+            "n_shards": self.n_shards,
+            "shard_by": self.shard_by,
+            "shards": [shard is not None for shard in self.shards],
+        }
+        tmp_path = path / (MANIFEST_FILE + ".tmp")
+        tmp_path.write_text(json.dumps(manifest), encoding="utf-8")
+        os.replace(tmp_path, path / MANIFEST_FILE)
+
+        # 清理单索引布局留下的旧文件，以及分片数减少后多余的分片目录
+        for name in ("index.faiss", "index.pkl"):
+            (path / name).unlink(missing_ok=True)
+        for entry in path.glob("shard_*"):
+            suffix = entry.name[len("shard_"):]
+            if entry.is_dir() and suffix.isdigit() and int(suffix) >= self.n_shards:
+                shutil.rmtree(entry, ignore_errors=True)
+        self._dirty.clear()
+        self._saved_path = path.resolve()
+
+    @classmethod
+    def load_local(cls, folder_path: str, embeddings: Embeddings) -> "ShardedVectorStore":
+        """从目录加载分片向量库，各分片并行加载"""
+        path = Path(folder_path)
+        manifest = json.loads((path / MANIFEST_FILE).read_text(encoding="utf-8"))
+        present = manifest["shards"]
+
+        def load(shard: int) -> Optional[FAISS]:
+            if not present[shard]:
+                return None
+            shard_dir = str(_shard_dir(path, shard))
+            return load_quantization(
+                FAISS.load_local(shard_dir, embeddings, allow_dangerous_deserialization=True), shard_dir
+            )
+
+        n_shards = manifest["n_shards"]
+        with ThreadPoolExecutor(max_workers=n_shards) as executor:
+            shards = list(executor.map(load, range(n_shards)))
+        store = cls(shards, embeddings, manifest.get("shard_by", VECTOR_STORE_SHARD_BY))
+        store._dirty.clear()
+        store._saved_path = path.resolve()
+        return store
+
+    def close(self) -> None:
+        """关闭检索线程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -0,0 +1,276 @@
+"""
+Token 计数模块
+
+提供进程内共享的分词器和基于 token 的长度函数，供各分块策略按 token 预算
+切分文本，使文本块能够准确地放入嵌入模型的上下文窗口。
+
+编码名称（encoding_name）有两种写法：
+- tiktoken 编码名，如 cl100k_base（默认，TOKENIZER_ENCODING）
+- hf:<模型名或本地路径>，使用该 HuggingFace 模型的分词器（需要 transformers），
+  如 hf:BAAI/bge-small-zh-v1.5；嵌入模型提供者通过 EmbeddingProvider.token_encoding
+  给出与自身一致的编码名称
+
+- 分词器按名称缓存，每个进程只加载一次；HuggingFace 分词器加载失败时退回 TOKENIZER_ENCODING 并记录警告
+- 批量接口使用 tiktoken 的多线程 encode_ordinary_batch（HuggingFace 快速分词器自身并行）
+- 离线环境可通过环境变量 TIKTOKEN_CACHE_DIR 指定预先下载的编码文件目录；
+  只需估算 token 数的场景（如上下文预算）可用 get_token_counter，编码不可用时退回粗略估计
+"""
+
+import functools
+import logging
+import math
+import re
+from typing import Any, Callable, List, Sequence, Tuple
+
+from app.core.config import TOKENIZER_ENCODING
+
+logger = logging.getLogger(__name__)
+
+# 长度单位：按字符数或按 token 数
+LENGTH_UNITS = ("chars", "tokens")
+
+# HuggingFace 分词器的编码名称前缀
+HF_TOKENIZER_PREFIX = "hf:"
+
+# CJK 统一表意文字、CJK 标点和全角字符
+_CJK_RE = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+
+
+class _TiktokenTokenizer:
+    """tiktoken 编码器"""
+
+    def __init__(self, encoding: Any):
+        self.encoding = encoding
+
+    def count(self, text: str) -> int:
+        return len(self.encoding.encode_ordinary(text))
+
+    def count_batch(self, texts: List[str], num_threads: int) -> List[int]:
+        return [len(ids) for ids in self.encoding.encode_ordinary_batch(texts, num_threads=num_threads)]
+
+    def offsets_batch(self, texts: List[str], num_threads: int) -> List[List[int]]:
+        encoded = self.encoding.encode_ordinary_batch(texts, num_threads=num_threads)
+        return [self.encoding.decode_with_offsets(ids)[1] if ids else [] for ids in encoded]
+
+
+class _HuggingFaceTokenizer:
+    """HuggingFace 快速分词器，不计特殊 token（[CLS]、[SEP] 等）"""
+
+    def __init__(self, tokenizer: Any):
+        self.tokenizer = tokenizer
+
+    def count(self, text: str) -> int:
+        return len(self.tokenizer.encode(text, add_special_tokens=False, verbose=False))
+
+    def count_batch(self, texts: List[str], num_threads: int) -> List[int]:
+        encoded = self.tokenizer(texts, add_special_tokens=False, verbose=False)["input_ids"]
+        return [len(ids) for ids in encoded]
+
+    def offsets_batch(self, texts: List[str], num_threads: int) -> List[List[int]]:
+        encoded = self.tokenizer(texts, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+        return [[start for start, _ in offsets] for offsets in encoded["offset_mapping"]]
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(encoding_name: str = TOKENIZER_ENCODING):
+    """
+    获取 tiktoken 编码器（进程内缓存）
+
+    参数：
+        encoding_name: 编码名称，如 cl100k_base
+    返回：
+        tiktoken.Encoding: 编码器实例
+    """
+    import tiktoken
+    return tiktoken.get_encoding(encoding_name)
+
+
+@functools.lru_cache(maxsize=None)
+def get_tokenizer(encoding_name: str = TOKENIZER_ENCODING):
+    """
+    获取分词器（进程内缓存）
+
+    hf: 开头的编码名称加载对应的 HuggingFace 分词器，加载失败（未安装 transformers、
+    离线且模型未下载等）时记录警告并退回 TOKENIZER_ENCODING。
+
+    参数：
+        encoding_name: 编码名称，tiktoken 编码名或 hf:<模型名>
+    返回：
+        分词器，提供 count、count_batch 和 offsets_batch（每个 token 在原文中的起始字符位置）
+    """
+    if encoding_name.startswith(HF_TOKENIZER_PREFIX):
+        model_name = encoding_name[len(HF_TOKENIZER_PREFIX):]
+        try:
+            from transformers import AutoTokenizer
+            return _HuggingFaceTokenizer(AutoTokenizer.from_pretrained(model_name, use_fast=True))
+        except Exception as e:
+            logger.warning("无法加载分词器 %s（%s），token 数改用 %s 计算，与嵌入模型的实际 token 数会有偏差",
+                           model_name, type(e).__name__, TOKENIZER_ENCODING)
+            encoding_name = TOKENIZER_ENCODING
+    return _TiktokenTokenizer(get_encoding(encoding_name))
+
+
+def count_tokens(text: str, encoding_name: str = TOKENIZER_ENCODING) -> int:
+    """
+    计算文本的 token 数
+
+    参数：
+        text: 文本
+        encoding_name: 编码名称
+    返回：
+        int: token 数
+    """
+    return get_tokenizer(encoding_name).count(text)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    不依赖编码文件的 token 数粗略估计
+
+    每个汉字（及其他 CJK 字符）计 1 个 token，其余字符按每 4 个字符 1 个 token 计，
+    与 cl100k_base 在中英文混合文本上的结果大致相当。
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+@functools.lru_cache(maxsize=None)
+def get_token_counter(encoding_name: str = TOKENIZER_ENCODING) -> Callable[[str], int]:
+    """
+    获取 token 计数函数（进程内缓存）
+
+    优先使用分词器精确计数；编码文件不可用时（如离线且未设置
+    TIKTOKEN_CACHE_DIR）退回 estimate_tokens，每个进程只记录一次警告日志（不写标准输出）。
+    """
+    try:
+        get_tokenizer(encoding_name)
+    except Exception as e:
+        logger.warning("无法加载编码 %s（%s），token 数改用字符数估算", encoding_name, type(e).__name__)
+        return estimate_tokens
+    return functools.partial(count_tokens, encoding_name=encoding_name)
+
+
+def count_tokens_batch(
+    texts: Sequence[str],
+    encoding_name: str = TOKENIZER_ENCODING,
+    num_threads: int = 8,
+) -> List[int]:
+    """
+    批量计算文本的 token 数（多线程编码）
+
+    参数：
+        texts: 文本列表
+        encoding_name: 编码名称
+        num_threads: 编码线程数
+    返回：
+        List[int]: 与 texts 一一对应的 token 数
+    """
+    if not texts:
+        return []
+    return get_tokenizer(encoding_name).count_batch(list(texts), num_threads)
+
+
+def get_length_function(length_unit: str = "chars", encoding_name: str = TOKENIZER_ENCODING) -> Callable[[str], int]:
+    """
+    获取文本长度函数，可直接作为 LangChain 文本分割器的 length_function
+
+    参数：
+        length_unit: 长度单位，"chars" 或 "tokens"
+        encoding_name: 编码名称（仅 tokens 模式使用）
+    返回：
+        Callable[[str], int]: 长度函数
+    """
+    if length_unit == "chars":
+        return len
+    if length_unit == "tokens":
+        return functools.partial(count_tokens, encoding_name=encoding_name)
+    raise ValueError(f"未知的长度单位: {length_unit}，可选值: {LENGTH_UNITS}")
+
+
+def token_windows(
+    text: str,
+    window_size: int,
+    window_overlap: int = 0,
+    encoding_name: str = TOKENIZER_ENCODING,
+) -> List[Tuple[int, int]]:
+    """
+    按 token 滑动窗口切分文本，返回每个窗口在原文中的字符区间
+
+    窗口边界由 token 的字符偏移换算而来，因此切出的文本是原文的精确子串，
+    不会像逐段解码那样在多字节字符中间截断。
+
+    参数：
+        text: 原文
+        window_size: 每个窗口的 token 数
+        window_overlap: 相邻窗口重叠的 token 数
+        encoding_name: 编码名称
+    返回：
+        List[Tuple[int, int]]: 字符区间列表
+    """
+    return token_windows_batch([text], window_size, window_overlap, encoding_name, num_threads=1)[0]
+
+
+def token_windows_batch(
+    texts: Sequence[str],
+    window_size: int,
+    window_overlap: int = 0,
+    encoding_name: str = TOKENIZER_ENCODING,
+    num_threads: int = 8,
+) -> List[List[Tuple[int, int]]]:
+    """
+    token_windows 的批量版本，所有文本一次性多线程编码
+
+    返回：
+        与 texts 一一对应的字符区间列表
+    """
+    if window_size <= 0:
+        raise ValueError("window_size 必须为正整数")
+    if not texts:
+        return []
+    all_offsets = get_tokenizer(encoding_name).offsets_batch(list(texts), num_threads)
+    return [
+        _windows_from_offsets(text, offsets, window_size, window_overlap)
+        for text, offsets in zip(texts, all_offsets)
+    ]
+
+
+def _windows_from_offsets(text: str, offsets: List[int], window_size: int, window_overlap: int) -> List[Tuple[int, int]]:
+    """
+    根据每个 token 的起始字符位置计算滑动窗口的字符区间
+
+    一个字符可能被编码为多个 token（如字节级 BPE 中的中文字符），窗口边界会
+    对齐到字符边界：右边界向前收缩，保证窗口内 token 数不超过 window_size；
+    左边界向后移动，只会缩小与前一窗口的重叠部分，不会丢失内容。
+    """
+    n = len(offsets)
+    if n == 0:
+        return []
+    # boundary[i] 表示第 i 个 token 是某个字符的第一个 token
+    boundary = [i == 0 or offsets[i] != offsets[i - 1] for i in range(n)]
+    window_overlap = max(0, min(window_overlap, window_size - 1))
+
+    windows = []
+    start = 0
+    while start < n:
+        end = min(start + window_size, n)
+        back = end
+        while start < back < n and not boundary[back]:
+            back -= 1
+        if back > start:
+            end = back
+        else:
+            # 单个字符的 token 数超过窗口大小，只能向后扩展到字符边界
+            while end < n and not boundary[end]:
+                end += 1
+        char_start = offsets[start]
+        char_end = offsets[end] if end < n else len(text)
+        if char_end > char_start:
+            windows.append((char_start, char_end))
+        if end >= n:
+            break
+        start = max(start + 1, end - window_overlap)
+        while start < end and not boundary[start]:
+            start += 1
+    return windows
@@ -1,11 +1,18 @@
 import os
-from typing import List, Optional
+import shutil
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Union
 
 from langchain.docstore.document import Document
 from langchain.embeddings.base import Embeddings
 from langchain_community.vectorstores.faiss import FAISS
 
-from app.core.config import FAISS_INDEX_PATH
+from app.core.config import FAISS_INDEX_PATH, VECTOR_STORE_SHARDS, VECTOR_STORE_SHARD_BY
+from app.services.quantization import load_quantization, save_quantization
+from app.services.sharded_vector_store import MANIFEST_FILE, ShardedVectorStore, is_sharded_path
+
+# 向量库：单个 FAISS 索引或分片向量库，两者提供相同的检索接口
+VectorStore = Union[FAISS, ShardedVectorStore]
 
 
 def create_and_save_vector_store(chunks: List[Document], embeddings: Embeddings) -> FAISS:
@@ -24,21 +31,153 @@ def create_and_save_vector_store(chunks: List[Document], embeddings: Embeddings)
     return vector_store
 
 
-def load_vector_store(embeddings: Embeddings) -> Optional[FAISS]:
+def create_empty_vector_store(
+    embeddings: Embeddings,
+    n_shards: int = VECTOR_STORE_SHARDS,
+    shard_by: str = VECTOR_STORE_SHARD_BY,
+) -> Optional[VectorStore]:
+    """
+    创建空向量库。
+    参数：
+        embeddings (Embeddings): 使用的嵌入模型实例。
+        n_shards (int): 分片数，为 1 时返回 None（第一次写入时再创建单个 FAISS 索引）。
+        shard_by (str): 分片方式，"source" 或 "batch"。
+    返回：
+        Optional[VectorStore]: 分片向量库，或 None。
+    """
+    if n_shards <= 1:
+        return None
+    return ShardedVectorStore.empty(n_shards, embeddings, shard_by)
+
+
+def add_embedded_chunks(
+    vector_store: Optional[VectorStore],
+    chunks: List[Document],
+    vectors: Sequence[List[float]],
+    embeddings: Embeddings,
+    batch_index: Optional[int] = None,
+) -> VectorStore:
+    """
+    将已经计算好向量的文档块追加到向量库。
+    参数：
+        vector_store (Optional[VectorStore]): 现有向量库，为 None 时新建单个 FAISS 索引。
+        chunks (List[Document]): 文档块列表。
+        vectors (Sequence[List[float]]): 与 chunks 一一对应的向量。
+        embeddings (Embeddings): 使用的嵌入模型实例（用于查询时向量化）。
+        batch_index (Optional[int]): 摄入批次序号，分片向量库按批次分片时使用。
+    返回：
+        VectorStore: 追加后的向量库实例。
+    """
+    if isinstance(vector_store, ShardedVectorStore):
+        vector_store.add_embedded_chunks(chunks, vectors, batch_index)
+        return vector_store
+    text_embeddings = [(chunk.page_content, list(vector)) for chunk, vector in zip(chunks, vectors)]
+    metadatas = [chunk.metadata for chunk in chunks]
+    # 文本块带有 id（如去重后的文本块键）时用作向量库中的文档 ID
+    ids = [chunk.id for chunk in chunks] if all(chunk.id for chunk in chunks) else None
+    if vector_store is None:
+        return FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas, ids=ids)
+    vector_store.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+    return vector_store
+
+
+def find_document(vector_store: VectorStore, doc_id: str) -> Optional[Document]:
+    """
+    按文档 ID 查找向量库中的文本块。
+    参数：
+        vector_store (VectorStore): 向量库。
+        doc_id (str): 文档 ID。
+    返回：
+        Optional[Document]: 文本块，未找到时为 None。
+    """
+    if isinstance(vector_store, ShardedVectorStore):
+        return vector_store.search_document(doc_id)
+    doc = vector_store.docstore.search(doc_id)
+    return doc if isinstance(doc, Document) else None
+
+
+def iter_stored_documents(vector_store: VectorStore) -> Iterator[Document]:
+    """
+    遍历向量库中保存的所有文本块（按向量序号顺序，分片向量库按分片顺序）。
+    可直接作为稀疏检索的语料，无需重新读取和切分原始文档。
+    参数：
+        vector_store (VectorStore): 向量库。
+    返回：
+        Iterator[Document]: 文本块迭代器。
+    """
+    if isinstance(vector_store, ShardedVectorStore):
+        yield from vector_store.iter_documents()
+        return
+    for position in range(vector_store.index.ntotal):
+        doc = vector_store.docstore.search(vector_store.index_to_docstore_id[position])
+        if isinstance(doc, Document):
+            yield doc
+
+
+def add_duplicate_sources(vector_store: VectorStore, duplicate_sources: Dict[str, List[Dict]]) -> None:
+    """
+    把被去重的文本块的出处追加到向量库中代表文本块的 duplicate_sources 元数据。
+    参数：
+        vector_store (VectorStore): 向量库。
+        duplicate_sources (Dict[str, List[Dict]]): {代表文本块的文档 ID: 出处列表}。
+    """
+    for doc_id, references in duplicate_sources.items():
+        doc = find_document(vector_store, doc_id)
+        if doc is None:
+            continue
+        own = {key: doc.metadata[key] for key in ("source", "page") if key in doc.metadata}
+        existing = doc.metadata.setdefault("duplicate_sources", [])
+        for reference in references:
+            if reference != own and reference not in existing:
+                existing.append(reference)
+
+
+def save_vector_store(vector_store: VectorStore, path: str = FAISS_INDEX_PATH) -> None:
+    """
+    将向量库保存到磁盘。单个 FAISS 索引沿用原来的布局，分片向量库写入分片清单和各分片目录。
+    量化索引同时写入量化说明和 float32 原始向量（见 quantization 模块）。
+    参数：
+        vector_store (VectorStore): 要保存的向量库。
+        path (str): 保存目录，默认为 FAISS_INDEX_PATH。
+    """
+    if isinstance(vector_store, ShardedVectorStore):
+        vector_store.save_local(path)
+        return
+    vector_store.save_local(path)
+    save_quantization(vector_store, path)
+    # 清理之前保存的分片向量库，避免加载时读到旧的分片清单
+    directory = Path(path)
+    if (directory / MANIFEST_FILE).exists():
+        (directory / MANIFEST_FILE).unlink()
+        for entry in directory.glob("shard_*"):
+            shutil.rmtree(entry, ignore_errors=True)
+
+
+def load_vector_store_from(path: str, embeddings: Embeddings) -> VectorStore:
+    """
+    从指定目录加载向量库，自动识别单索引和分片布局。
+    参数：
+        path (str): 向量库目录。
+        embeddings (Embeddings): 使用的嵌入模型实例。
+    返回：
+        VectorStore: 加载的向量库实例。
+    """
+    if is_sharded_path(path):
+        return ShardedVectorStore.load_local(path, embeddings)
+    return load_quantization(FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True), path)
+
+
+def load_vector_store(embeddings: Embeddings) -> Optional[VectorStore]:
     """
-    从磁盘加载 FAISS 向量库。
+    从磁盘加载向量库。
     参数：
         embeddings (Embeddings): 使用的嵌入模型实例。
     返回：
-        Optional[FAISS]: 加载的 FAISS 向量库实例，如果未找到则为 None。
+        Optional[VectorStore]: 加载的向量库实例（单个 FAISS 索引或分片向量库），如果未找到则为 None。
     """
     if os.path.exists(FAISS_INDEX_PATH):
         print(f"正在从 {FAISS_INDEX_PATH} 加载向量库")
-        return FAISS.load_local(
-            FAISS_INDEX_PATH, 
-            embeddings, 
-            allow_dangerous_deserialization=True
-        )
+        return load_vector_store_from(FAISS_INDEX_PATH, embeddings)
     else:
         print("未找到向量库。")
         return None 
\ No newline at end of file
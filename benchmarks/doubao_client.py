@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+豆包客户端基准与联调检查（本地桩服务器，无需方舟 API 密钥）
+
+桩服务器实现 OpenAI 兼容的 /chat/completions（非流式和 SSE 流式），按请求中的 model 字段模拟不同情况：
+- stub：正常响应，首个 token 前固定延迟，之后每个 token 额外延迟
+- stub-429：前 N 个请求返回 429 RateLimitExceeded，之后正常
+- stub-500：每个请求都返回 500 InternalServiceError
+- stub-401：返回 401 AuthenticationError
+- stub-slow：响应时间超过客户端超时
+
+检查项（失败时以非零状态退出）：
+- RobustLLMWrapper + 豆包错误模式：429 重试后成功，401 不重试，500 重试次数用尽后报错，超时归类为网络错误
+- 同步/异步流式输出拼接结果与非流式一致，token 用量从最后一个 SSE 片段中取得
+吞吐量对比：并发异步请求，共享连接池 vs 每个请求新建 httpx.AsyncClient。
+
+用法：
+    python benchmarks/doubao_client.py --requests 200 --concurrency 32 --latency-ms 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.core.exceptions import ServiceError
+from app.core.metrics import METRICS
+from app.models.doubao_client import DoubaoLLM
+from app.models.providers.doubao import DoubaoProvider
+from app.models.wrappers import create_robust_wrapper
+
+WORDS = ["桩", "服务器", "的", "回答"]
+
+
+class StubState:
+    """桩服务器的计数器和模拟参数"""
+
+    def __init__(self, latency: float, per_token: float, fail_times: int, slow: float):
+        self.latency = latency
+        self.per_token = per_token
+        self.fail_times = fail_times
+        self.slow = slow
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.connections = 0
+            self.requests = 0
+            self.rate_limited = 0
+
+
+class StubServer(ThreadingHTTPServer):
+    # 不使用连接池时并发建立大量连接，默认的监听队列（5）会溢出
+    request_queue_size = 256
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # 客户端超时后断开连接，桩服务器写响应时的 BrokenPipe 属于预期情况
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+def make_handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            super().setup()
+            with state.lock:
+                state.connections += 1
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, body: dict):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _error(self, status: int, code: str, message: str):
+            self._send(status, {"error": {"code": code, "message": message, "type": "BadRequest"}})
+
+        def _write_chunk(self, data: bytes):
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def do_POST(self):
+            if self.path != "/chat/completions":
+                self.send_error(404)
+                return
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if self.headers.get("Authorization") != "Bearer stub-key":
+                self._error(401, "AuthenticationError", "The API key in the request is missing or invalid.")
+                return
+            model = payload.get("model")
+            with state.lock:
+                state.requests += 1
+                rate_limited = model == "stub-429" and state.rate_limited < state.fail_times
+                if rate_limited:
+                    state.rate_limited += 1
+            if rate_limited:
+                self._error(429, "RateLimitExceeded", "Request rate limit exceeded, please try again later.")
+                return
+            if model == "stub-500":
+                self._error(500, "InternalServiceError", "The service encountered an unexpected internal error.")
+                return
+            if model == "stub-401":
+                self._error(401, "AuthenticationError", "The API key in the request is missing or invalid.")
+                return
+            time.sleep(state.slow if model == "stub-slow" else state.latency)
+
+            usage = {"prompt_tokens": 12, "completion_tokens": len(WORDS), "total_tokens": 12 + len(WORDS)}
+            if not payload.get("stream"):
+                time.sleep(state.per_token * len(WORDS))
+                self._send(200, {
+                    "id": "stub", "object": "chat.completion", "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(WORDS)},
+                                 "finish_reason": "stop"}],
+                    "usage": usage,
+                })
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            events = [{"choices": [{"index": 0, "delta": {"role": "assistant", "content": word},
+                                    "finish_reason": None}]} for word in WORDS]
+            events.append({"choices": [{"index": 0, "delta": {"content": ""}, "finish_reason": "stop"}]})
+            if (payload.get("stream_options") or {}).get("include_usage"):
+                events.append({"choices": [], "usage": usage})
+            for event in events:
+                time.sleep(state.per_token)
+                self._write_chunk(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode())
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+
+    return Handler
+
+
+def wrapped(model: str, base_url: str, request_timeout: float = 5.0):
+    """与 DoubaoProvider.create_llm 相同的包装，重试间隔缩短为 0.05 秒"""
+    llm = DoubaoLLM(model_name=model, api_key="stub-key", base_url=base_url, request_timeout=request_timeout)
+    patterns = DoubaoProvider(model_name=model, base_url=base_url)._get_doubao_error_patterns()
+    return create_robust_wrapper(llm, provider_name="豆包", max_retries=3, retry_delay=0.05,
+                                 custom_error_patterns=patterns)
+
+
+def run_checks(state: StubState, base_url: str, fail_times: int):
+    failures = []
+
+    def check(name, condition, detail=""):
+        print(f"  [{'通过' if condition else '失败'}] {name}{'：' + detail if detail else ''}")
+        if not condition:
+            failures.append(name)
+
+    def expect_error(llm):
+        try:
+            llm.invoke("你好")
+        except ServiceError as e:
+            return str(e)
+        return None
+
+    expected = "".join(WORDS)
+    print("联调检查：")
+
+    state.reset()
+    METRICS.reset()
+    answer = wrapped("stub-429", base_url).invoke("你好")
+    check("429 限流后重试成功", answer == expected and state.requests == fail_times + 1,
+          f"请求 {state.requests} 次，llm.retries={METRICS.counters().get('llm.retries', 0)}")
+
+    state.reset()
+    error = expect_error(wrapped("stub-401", base_url))
+    check("401 认证错误不重试", error is not None and "认证" in error and state.requests == 1,
+          f"请求 {state.requests} 次")
+
+    state.reset()
+    error = expect_error(wrapped("stub-500", base_url))
+    check("500 服务错误重试 3 次后报错", error is not None and state.requests == 3, f"请求 {state.requests} 次")
+
+    state.reset()
+    error = expect_error(wrapped("stub-slow", base_url, request_timeout=state.slow / 4))
+    check("请求超时归类为网络错误", error is not None and "网络连接失败" in error)
+
+    METRICS.reset()
+    llm = wrapped("stub", base_url)
+    streamed = "".join(llm.stream("你好"))
+    usage = METRICS.counters()
+    check("同步流式输出", streamed == expected, streamed)
+    check("流式 token 用量", usage.get("llm.usage.completion_tokens") == len(WORDS)
+          and usage.get("llm.usage.prompt_tokens") == 12, str({k: v for k, v in usage.items() if "usage" in k}))
+
+    async def astream():
+        return "".join([chunk async for chunk in llm.astream("你好")])
+
+    check("异步流式输出", asyncio.run(astream()) == expected)
+
+    state.reset()
+    streamed = "".join(wrapped("stub-429", base_url).stream("你好"))
+    check("流式请求在首个片段前遇到 429 时重试", streamed == expected and state.requests == fail_times + 1)
+
+    base = DoubaoLLM(model_name="stub", api_key="stub-key", base_url=base_url)
+    result = base.generate(["你好"])
+    check("非流式 token 用量", result.llm_output["token_usage"].get("total_tokens") == 12 + len(WORDS),
+          str(result.llm_output["token_usage"]))
+    return failures
+
+
+async def pooled_requests(base_url: str, n: int, concurrency: int):
+    llm = DoubaoLLM(model_name="stub", api_key="stub-key", base_url=base_url)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            return await llm.ainvoke("你好")
+
+    await asyncio.gather(*(one() for _ in range(n)))
+    await llm.client.aclose()
+
+
+async def unpooled_requests(base_url: str, n: int, concurrency: int):
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency)
+    payload = {"model": "stub", "messages": [{"role": "user", "content": "你好"}]}
+
+    async def one():
+        async with semaphore:
+            async with httpx.AsyncClient(base_url=base_url, headers={"Authorization": "Bearer stub-key"}) as http:
+                (await http.post("/chat/completions", json=payload)).raise_for_status()
+
+    await asyncio.gather(*(one() for _ in range(n)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="豆包客户端基准（本地桩服务器）")
+    parser.add_argument("--requests", type=int, default=200, help="吞吐量测试的请求数")
+    parser.add_argument("--concurrency", type=int, default=32, help="并发请求数")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="首个 token 前的延迟（毫秒）")
+    parser.add_argument("--per-token-ms", type=float, default=2.0, help="每个 token 的延迟（毫秒）")
+    parser.add_argument("--fail-times", type=int, default=2, help="stub-429 模型返回 429 的次数")
+    args = parser.parse_args()
+
+    # DoubaoProvider 读取环境变量中的密钥，这里只用于取得错误模式
+    os.environ.setdefault("DOUBAO_API_KEY", "stub-key")
+    state = StubState(args.latency_ms / 1000, args.per_token_ms / 1000, args.fail_times, slow=1.0)
+    server = StubServer(("127.0.0.1", 0), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    print(f"桩服务器 {base_url}：首 token 前 {args.latency_ms} ms，每 token {args.per_token_ms} ms\n")
+
+    failures = run_checks(state, base_url, args.fail_times)
+
+    print(f"\n{'并发异步请求（' + str(args.requests) + ' 个）':<30}{'次/秒':>10}{'耗时 s':>9}{'连接':>6}")
+    for name, func in (("每个请求新建客户端", unpooled_requests), ("DoubaoLLM（共享连接池）", pooled_requests)):
+        state.reset()
+        start = time.perf_counter()
+        asyncio.run(func(base_url, args.requests, args.concurrency))
+        elapsed = time.perf_counter() - start
+        print(f"{name:<30}{args.requests / elapsed:>10.1f}{elapsed:>9.2f}{state.connections:>8}")
+
+    server.shutdown()
+    if failures:
+        print(f"\n{len(failures)} 项检查失败：{', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
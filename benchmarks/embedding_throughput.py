@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+嵌入模型吞吐量基准
+
+对比各嵌入模型提供者（EmbeddingFactory）在同一批文本块上的：
+- 摄入吞吐量：按 INGEST_BATCH_SIZE 分批调用 embed_documents，统计文本块/秒
+- 查询延迟：逐条调用 embed_query 的 p50/p95
+默认对比 Ollama HTTP 调用与进程内模型（torch、torch + int8 动态量化、onnx），
+不可用的提供者（Ollama 未运行、未安装 sentence-transformers 等）只打印原因并跳过。
+int8 变体额外报告与 float 向量的平均余弦相似度。
+
+用法：
+    python benchmarks/embedding_throughput.py --chunks 512 --queries 50
+    python benchmarks/embedding_throughput.py --variants local,local-int8 --threads 4
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import numpy as np
+
+from app.core.config import INGEST_BATCH_SIZE
+from app.models.factory import EmbeddingFactory
+
+# 变体名 -> (提供者名称, 提供者参数)
+VARIANTS = {
+    "ollama": ("ollama", {}),
+    "local": ("local", {"backend": "torch", "quantize": False}),
+    "local-int8": ("local", {"backend": "torch", "quantize": True}),
+    "local-onnx": ("local", {"backend": "onnx", "quantize": False}),
+    "fake": ("fake", {}),
+}
+
+
+def make_texts(n: int, seed: int = 42):
+    """生成长度不一的中英文混合文本块（20~500 字符）"""
+    rng = random.Random(seed)
+    words = ["检索", "增强", "生成", "向量", "文本块", "重排序", "retrieval", "chunk", "token", "embedding",
+             "量化", "索引", "模型", "吞吐", "latency"]
+    texts = []
+    for _ in range(n):
+        size = rng.randint(20, 500)
+        parts = []
+        while sum(len(part) for part in parts) < size:
+            parts.append(rng.choice(words) + rng.choice(["", " ", "，", "。"]))
+        texts.append("".join(parts))
+    return texts
+
+
+def run_variant(name, texts, queries, batch_size, threads):
+    provider_name, kwargs = VARIANTS[name]
+    if provider_name == "local" and threads:
+        kwargs = dict(kwargs, threads=threads)
+    provider = EmbeddingFactory.create_provider(provider_name, **kwargs)
+    embeddings = provider.create_embeddings()
+    # 预热：加载模型权重、建立连接
+    embeddings.embed_query("预热")
+
+    start = time.perf_counter()
+    vectors = []
+    for i in range(0, len(texts), batch_size):
+        vectors.extend(embeddings.embed_documents(texts[i:i + batch_size]))
+    ingest_seconds = time.perf_counter() - start
+
+    latencies = []
+    for query in queries:
+        query_start = time.perf_counter()
+        embeddings.embed_query(query)
+        latencies.append((time.perf_counter() - query_start) * 1000)
+    return np.asarray(vectors, dtype=np.float32), ingest_seconds, latencies
+
+
+def mean_cosine(a: np.ndarray, b: np.ndarray) -> float:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return float(np.mean(np.sum(a * b, axis=1)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="嵌入模型吞吐量基准")
+    parser.add_argument("--chunks", type=int, default=512, help="摄入的文本块数量")
+    parser.add_argument("--queries", type=int, default=50, help="逐条嵌入的查询数量")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE, help="每次 embed_documents 的文本块数")
+    parser.add_argument("--threads", type=int, default=0, help="进程内模型的推理线程数，0 表示使用配置")
+    parser.add_argument("--variants", default="ollama,local,local-int8,local-onnx",
+                        help=f"逗号分隔的变体，可选值: {', '.join(VARIANTS)}")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.variants.split(",") if name.strip()]
+    unknown = set(names) - set(VARIANTS)
+    if unknown:
+        parser.error(f"未知变体: {', '.join(sorted(unknown))}")
+
+    texts = make_texts(args.chunks)
+    queries = make_texts(args.queries, seed=7)
+    print(f"共 {len(texts)} 个文本块（{sum(len(t) for t in texts):,} 字符），每批 {args.batch_size} 个，"
+          f"{len(queries)} 条查询")
+    print(f"{'变体':<12}{'块/秒':>10}{'摄入 s':>10}{'查询 p50 ms':>14}{'查询 p95 ms':>14}")
+
+    results = {}
+    for name in names:
+        try:
+            vectors, seconds, latencies = run_variant(name, texts, queries, args.batch_size, args.threads)
+        except Exception as e:
+            print(f"{name:<12}跳过：{str(e).splitlines()[0][:100]}")
+            continue
+        results[name] = vectors
+        print(f"{name:<12}{len(texts) / seconds:>10.1f}{seconds:>10.2f}"
+              f"{np.percentile(latencies, 50):>14.2f}{np.percentile(latencies, 95):>14.2f}")
+
+    if "local" in results and "local-int8" in results:
+        print(f"\nint8 动态量化与 float 向量的平均余弦相似度: {mean_cosine(results['local'], results['local-int8']):.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+导入耗时回归检查
+
+在子进程中用 `python -X importtime` 导入 CLI 入口，检查：
+- 导入 main 的累计耗时不超过预算（取多次运行中最快的一次，减少抖动）
+- 导入 main 及各服务模块时不会加载重型依赖（FlagEmbedding、transformers、torch、
+  spaCy、NLTK、dashscope、FAISS 等），这些依赖只应在真正用到的代码路径中导入
+
+用法：
+    python benchmarks/import_time.py --budget-ms 300
+任一检查失败时以非零状态退出，可直接用于 CI。
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+project_root = Path(__file__).parent.parent
+
+# 启动时不应加载的重型模块（顶层包名）
+HEAVY_MODULES = (
+    "FlagEmbedding",
+    "transformers",
+    "torch",
+    "sentence_transformers",
+    "onnxruntime",
+    "optimum",
+    "spacy",
+    "nltk",
+    "dashscope",
+    "faiss",
+    "langchain_ollama",
+    "langchain_text_splitters",
+    "questionary",
+    "aiohttp",
+    "httpx",
+)
+
+# 需要检查的模块：CLI 入口以及导入后仍不应加载重型依赖的服务模块
+CHECKED_MODULES = ("main", "app.services.qa_service", "app.models", "app.cli.serve", "app.cli.bench")
+
+
+def _run(code: str, importtime: bool = False) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONPATH=str(project_root))
+    args = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    result = subprocess.run(args, cwd=project_root, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"执行失败: {code}\n{result.stderr[-2000:]}")
+    return result
+
+
+def parse_importtime(stderr: str) -> Dict[str, Tuple[int, int]]:
+    """解析 -X importtime 输出，返回 {模块: (自身微秒, 累计微秒)}"""
+    timings = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def import_time_ms(module: str, repeat: int) -> Tuple[float, Dict[str, Tuple[int, int]]]:
+    """导入模块的累计耗时（毫秒，取最快一次）及该次的逐模块耗时"""
+    best, best_timings = float("inf"), {}
+    for _ in range(repeat):
+        timings = parse_importtime(_run(f"import {module}", importtime=True).stderr)
+        cumulative = timings[module][1] / 1000
+        if cumulative < best:
+            best, best_timings = cumulative, timings
+    return best, best_timings
+
+
+def loaded_heavy_modules(module: str) -> List[str]:
+    """导入模块后 sys.modules 中出现的重型依赖"""
+    code = (
+        "import sys\n"
+        f"import {module}\n"
+        f"heavy = {HEAVY_MODULES!r}\n"
+        "print('\\n'.join(sorted(h for h in heavy if h in sys.modules)))\n"
+    )
+    return [line for line in _run(code).stdout.splitlines() if line]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导入耗时回归检查")
+    parser.add_argument("--budget-ms", type=float, default=300.0, help="导入 main 的耗时预算（毫秒）")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数，取最快一次")
+    parser.add_argument("--top", type=int, default=10, help="打印累计耗时最多的模块数")
+    args = parser.parse_args()
+
+    failures = []
+    elapsed, timings = import_time_ms("main", args.repeat)
+    print(f"import main: {elapsed:.1f} ms（预算 {args.budget_ms:.0f} ms）")
+    for name, (_, cumulative) in sorted(timings.items(), key=lambda item: -item[1][1])[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+    if elapsed > args.budget_ms:
+        failures.append(f"import main 耗时 {elapsed:.1f} ms 超出预算 {args.budget_ms:.0f} ms")
+
+    for module in CHECKED_MODULES:
+        heavy = loaded_heavy_modules(module)
+        print(f"import {module}: {'加载了 ' + ', '.join(heavy) if heavy else '未加载重型依赖'}")
+        if heavy:
+            failures.append(f"import {module} 加载了重型依赖: {', '.join(heavy)}")
+
+    if failures:
+        print("\n失败：")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+    print("\n通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Markdown 分块吞吐量基准
+
+在生成的多 MB Markdown 文档上对比：
+- 原始方式：每次调用新建 MarkdownHeaderTextSplitter 和 RecursiveCharacterTextSplitter，
+  先按标题拆成章节文档，再逐章节递归分割
+- 新方式：Markdown分块策略单遍扫描标题，复用缓存的递归分割器
+
+用法：
+    python benchmarks/markdown_chunking.py --sections 20000 --repeat 3
+"""
+
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from langchain.docstore.document import Document
+from langchain.text_splitter import MarkdownHeaderTextSplitter, RecursiveCharacterTextSplitter
+
+from app.services.chunking_strategies import ChunkingStrategyFactory, RECURSIVE_SEPARATORS
+
+
+def make_markdown(n_sections: int, seed: int = 42) -> str:
+    """生成带多级标题、列表和代码块的 Markdown 文本"""
+    rng = random.Random(seed)
+    sentences = ["检索增强生成需要高质量的文本块。", "向量库保存了所有文本块的嵌入。",
+                 "重排序可以提升答案的相关性。", "Dense and sparse retrieval complement each other. ",
+                 "Sentence boundaries keep chunks coherent. "]
+    lines = []
+    for i in range(n_sections):
+        level = rng.choice([1, 2, 2, 3, 3, 3, 4])
+        lines.append(f"{'#' * level} 章节 {i}\n")
+        for _ in range(rng.randint(1, 4)):
+            lines.append("".join(rng.choice(sentences) for _ in range(rng.randint(2, 12))) + "\n\n")
+        if rng.random() < 0.2:
+            lines.append("- 列表项一\n- 列表项二\n\n")
+        if rng.random() < 0.1:
+            lines.append("```python\n# 这不是标题\nprint('hello')\n```\n\n")
+    return "".join(lines)
+
+
+def original_markdown_chunking(documents, chunk_size, chunk_overlap):
+    """原始实现：每次调用新建分割器，章节再逐个递归分割"""
+    markdown_splitter = MarkdownHeaderTextSplitter(
+        headers_to_split_on=[("#", "标题1"), ("##", "标题2"), ("###", "标题3"), ("####", "标题4")]
+    )
+    recursive_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, separators=RECURSIVE_SEPARATORS
+    )
+    all_chunks = []
+    for doc in documents:
+        for split in markdown_splitter.split_text(doc.page_content):
+            for chunk in recursive_splitter.split_text(split.page_content):
+                all_chunks.append(Document(page_content=chunk, metadata=doc.metadata))
+    return all_chunks
+
+
+def measure(name, func, total_chars, repeat):
+    best = None
+    chunks = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<10} 文本块={len(chunks):<7} 耗时={best:.2f}s "
+          f"吞吐={total_chars / best / 1e6:.2f} MB字符/秒 峰值内存={peak / 2**20:.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Markdown 分块吞吐量基准")
+    parser.add_argument("--sections", type=int, default=20000, help="章节数量")
+    parser.add_argument("--chunk-size", type=int, default=500, help="文本块大小")
+    parser.add_argument("--chunk-overlap", type=int, default=50, help="文本块重叠大小")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数（取最快一次）")
+    args = parser.parse_args()
+
+    text = make_markdown(args.sections)
+    documents = [Document(page_content=text, metadata={"source": "bench.md"})]
+    print(f"Markdown 文档大小：{len(text):,} 字符")
+
+    strategy = ChunkingStrategyFactory.get_strategy("Markdown分块")
+    measure("原始方式", lambda: original_markdown_chunking(
+        documents, args.chunk_size, args.chunk_overlap), len(text), args.repeat)
+    measure("单遍扫描", lambda: strategy.split_documents(
+        documents, chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap), len(text), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+元数据预过滤基准
+
+在合成语料上对比：
+- 稠密检索：不过滤、预过滤（候选较少时直接精确计算 / IDSelectorBitmap）、
+  以及“多取 top-k 再后过滤”的做法（LangChain FAISS 的 filter 参数）
+- 稀疏检索：不过滤与预过滤（只为候选文档计算 BM25 分数）
+并检查预过滤结果与暴力计算的结果一致；另外在 fp16、int8、pq 量化索引上强制走 IDSelectorBitmap 分支
+（IndexPQ 不支持 IDSelector，应退回直接精确计算），检查结果满足过滤条件；并用流式摄入（完全重复去重）
+处理两个共有一个段落的文件，检查按任一文件过滤时稠密/稀疏检索都能返回共有段落。失败时以非零状态退出。
+
+用法：
+    python benchmarks/metadata_filter.py --chunks 50000 --sources 500
+"""
+
+import argparse
+import hashlib
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import numpy as np
+from langchain.docstore.document import Document
+from langchain.embeddings.base import Embeddings
+from langchain_community.vectorstores.faiss import FAISS
+
+import app.services.retrievers.dense as dense_module
+from app.services.ingest_pipeline import StreamingIngestPipeline
+from app.services.metadata_filter import MetadataFilter
+from app.services.vector_store_service import iter_stored_documents
+from app.services.quantization import quantized_copy
+from app.services.retrievers.dense import DenseRetriever
+from app.services.retrievers.sparse import SparseRetriever
+
+
+class HashEmbeddings(Embeddings):
+    """基于哈希的确定性伪嵌入，无需加载任何模型"""
+
+    def __init__(self, dim: int = 128):
+        self.dim = dim
+
+    def _embed(self, text: str):
+        seed = int.from_bytes(hashlib.md5(text.encode("utf-8")).digest()[:4], "little")
+        return np.random.RandomState(seed).standard_normal(self.dim).astype(np.float32).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def make_corpus(n_chunks: int, n_sources: int, seed: int = 42):
+    rng = random.Random(seed)
+    words = [f"词{i}" for i in range(2000)]
+    docs = []
+    for i in range(n_chunks):
+        metadata = {"source": f"docs/file{i % n_sources}.pdf", "page": (i // n_sources) % 50,
+                    "project": rng.choice(["alpha", "beta", "gamma"])}
+        docs.append(Document(page_content=" ".join(rng.choices(words, k=40)), metadata=metadata))
+    return docs
+
+
+def timed(name, func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"{name:<30} {elapsed * 1000:8.2f} ms/查询  命中={len(result)}")
+    return result
+
+
+def check_quantized_filtering(store, docs, vectors, query_vector, spec, k=5) -> bool:
+    """在各量化索引上强制走 IDSelectorBitmap 分支做预过滤检索，检查不报错、结果满足过滤条件，并报告与暴力计算的重合度"""
+    selected = [i for i, doc in enumerate(docs)
+                if all(doc.metadata[key] in (v if isinstance(v, list) else [v]) for key, v in spec.items())]
+    distances = ((vectors[selected] - query_vector) ** 2).sum(axis=1)
+    expected = {docs[selected[i]].page_content for i in np.argsort(distances)[:k]}
+    direct_max = dense_module.DENSE_FILTER_DIRECT_SEARCH_MAX
+    dense_module.DENSE_FILTER_DIRECT_SEARCH_MAX = 0
+    passed = True
+    try:
+        for kind in ("fp16", "int8", "pq"):
+            retriever = DenseRetriever(quantized_copy(store, kind), k=k)
+            try:
+                got = retriever._filtered_search(query_vector.tolist(), MetadataFilter.coerce(spec))
+            except Exception as e:
+                print(f"量化索引 {kind} 预过滤（IDSelectorBitmap 分支）失败：{e}")
+                passed = False
+                continue
+            matches = all(all(doc.metadata[key] in (v if isinstance(v, list) else [v]) for key, v in spec.items())
+                          for doc in got)
+            overlap = len(expected & {doc.page_content for doc in got})
+            ok = matches and len(got) == k
+            passed = passed and ok
+            print(f"量化索引 {kind} 预过滤（IDSelectorBitmap 分支）：结果满足过滤条件 {matches}，"
+                  f"与暴力计算重合 {overlap}/{k}{'' if ok else '  失败'}")
+    finally:
+        dense_module.DENSE_FILTER_DIRECT_SEARCH_MAX = direct_max
+    return passed
+
+
+def check_duplicate_source_filtering(embeddings) -> bool:
+    """
+    两个文件共有一个段落，完全重复去重后该段落只以 a.md 保存一次、b.md 记录在 duplicate_sources 中；
+    检查按 source=b.md 过滤时稠密检索（单条与批量）和稀疏检索都能返回该段落
+    """
+    shared = "共享段落 两个文件都包含的安装说明 " * 3
+    pages = [
+        Document(page_content=f"a 独有段落 部署步骤 {'甲' * 40}\n\n{shared}", metadata={"source": "/data/notes/a.md"}),
+        Document(page_content=f"b 独有段落 配置说明 {'乙' * 40}\n\n{shared}", metadata={"source": "/data/notes/b.md"}),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        pipeline = StreamingIngestPipeline(
+            embeddings, "递归分块", chunk_size=80, chunk_overlap=0, n_workers=1, batch_size=4,
+            checkpoint_dir=Path(tmp) / "checkpoint", resume=False, dedup_mode="exact", n_shards=1,
+            index_path=str(Path(tmp) / "index"), quantization="none", binary_index=False,
+        )
+        store = pipeline.run(pages)
+    chunks = list(iter_stored_documents(store))
+    dense = DenseRetriever(store, k=len(chunks))
+    sparse = SparseRetriever(chunks, k=len(chunks))
+    passed = pipeline.stats.exact_duplicates == 1
+    for source in ("b.md", "notes/a.md"):
+        spec = {"source": source}
+        for name, docs in (("稠密", dense.invoke(shared, metadata_filter=spec)),
+                           ("稠密批量", dense.retrieve_many([shared], metadata_filter=spec)[0]),
+                           ("稀疏", sparse.invoke(shared, metadata_filter=spec))):
+            found = any(doc.page_content.strip() == shared.strip() for doc in docs)
+            passed = passed and found
+            print(f"去重后按 source={source} 过滤（{name}）：返回共有段落 {found}，命中 {len(docs)}")
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="元数据预过滤基准")
+    parser.add_argument("--chunks", type=int, default=50000, help="文本块数量")
+    parser.add_argument("--sources", type=int, default=500, help="来源文件数量")
+    parser.add_argument("--dim", type=int, default=128, help="向量维度")
+    parser.add_argument("--repeat", type=int, default=20, help="每种方式的查询次数")
+    args = parser.parse_args()
+
+    embeddings = HashEmbeddings(args.dim)
+    docs = make_corpus(args.chunks, args.sources)
+    rng = np.random.RandomState(0)
+    vectors = rng.standard_normal((len(docs), args.dim)).astype(np.float32)
+    store = FAISS.from_embeddings(
+        [(doc.page_content, vector.tolist()) for doc, vector in zip(docs, vectors)],
+        embeddings, metadatas=[doc.metadata for doc in docs],
+    )
+    print(f"共 {len(docs)} 个文本块，{args.sources} 个来源文件")
+
+    query = docs[123].page_content
+    source = docs[123].metadata["source"]
+    small = {"source": source}
+    large = {"project": ["alpha", "beta"]}
+
+    dense = DenseRetriever(store, k=5)
+    timed("稠密：不过滤", lambda: dense.invoke(query), args.repeat)
+    dense.invoke(query, metadata_filter=small)  # 预热元数据索引
+    hits = timed("稠密：预过滤(单个文件)", lambda: dense.invoke(query, metadata_filter=small), args.repeat)
+    timed("稠密：后过滤(单个文件)",
+          lambda: store.similarity_search(query, k=5, filter=small, fetch_k=args.chunks // args.sources * 20),
+          args.repeat)
+    large_hits = timed("稠密：预过滤(约2/3语料)", lambda: dense.invoke(query, metadata_filter=large), args.repeat)
+
+    query_vector = np.asarray(embeddings.embed_query(query), dtype=np.float32)
+    for name, spec, got in (("单个文件", small, hits), ("约2/3语料", large, large_hits)):
+        selected = [i for i, doc in enumerate(docs)
+                    if all(doc.metadata[k] in (v if isinstance(v, list) else [v]) for k, v in spec.items())]
+        distances = ((vectors[selected] - query_vector) ** 2).sum(axis=1)
+        expected = [docs[selected[i]].page_content for i in np.argsort(distances)[:5]]
+        print(f"稠密预过滤({name})结果与暴力计算一致：{[doc.page_content for doc in got] == expected}")
+
+    sparse = SparseRetriever(docs)
+    tokens = " ".join(query.split()[:5])
+    timed("稀疏：不过滤", lambda: sparse.invoke(tokens), max(1, args.repeat // 4))
+    sparse.invoke(tokens, metadata_filter=small)
+    timed("稀疏：预过滤(单个文件)", lambda: sparse.invoke(tokens, metadata_filter=small), args.repeat)
+
+    passed = check_quantized_filtering(store, docs, vectors, query_vector, large)
+    passed = check_duplicate_source_filtering(embeddings) and passed
+    if not passed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
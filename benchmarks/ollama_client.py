@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Ollama 客户端基准（本地桩服务器，无需安装 Ollama）
+
+桩服务器实现 /api/embed 和 /api/generate，每个请求固定延迟，每个文本额外延迟；模型在请求没有带
+keep_alive（或 keep_alive 为 0）时于响应后"卸载"，下一次请求需要额外的模型加载时间。
+对比以下几种调用方式的吞吐量、建立的连接数和请求数：
+- 逐条请求：每个文本一次 HTTP 请求，每次新建连接，不带 keep_alive
+- langchain_ollama.OllamaEmbeddings / langchain_community Ollama（默认参数，未安装时跳过）
+- OllamaClient：共享连接池、批量 /api/embed、每个请求带 keep_alive
+
+用法：
+    python benchmarks/ollama_client.py --chunks 1024 --latency-ms 5 --load-ms 200
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+import warnings
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.models.ollama_client import OllamaClient, OllamaClientEmbeddings, OllamaClientLLM, close_ollama_clients
+
+
+class StubState:
+    """桩服务器的计数器和模拟参数"""
+
+    def __init__(self, latency: float, per_text: float, load: float, dim: int = 64):
+        self.latency = latency
+        self.per_text = per_text
+        self.load = load
+        self.dim = dim
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.connections = 0
+            self.requests = 0
+            self.loads = 0
+            self.loaded = False
+
+    def begin(self, payload):
+        """模拟模型加载，返回本次请求之后是否卸载模型"""
+        with self.lock:
+            self.requests += 1
+            needs_load = not self.loaded
+            self.loaded = True
+            if needs_load:
+                self.loads += 1
+        if needs_load:
+            time.sleep(self.load)
+        keep_alive = payload.get("keep_alive")
+        return keep_alive is None or keep_alive in (0, "0", "0s")
+
+    def end(self, unload: bool):
+        if unload:
+            with self.lock:
+                self.loaded = False
+
+
+def make_handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # 头部和正文分两次写入，不关闭 Nagle 时 keep-alive 连接上会多出约 40 ms 的延迟确认等待
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            super().setup()
+            with state.lock:
+                state.connections += 1
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, body: bytes, content_type: str = "application/json"):
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            unload = state.begin(payload)
+            try:
+                if self.path in ("/api/embed", "/api/embeddings"):
+                    texts = payload.get("input", payload.get("prompt", ""))
+                    texts = [texts] if isinstance(texts, str) else texts
+                    time.sleep(state.latency + state.per_text * len(texts))
+                    vectors = [[(len(text) + i) % 7 / 7.0 for i in range(state.dim)] for text in texts]
+                    body = {"embeddings": vectors} if self.path == "/api/embed" else {"embedding": vectors[0]}
+                    self._send(json.dumps(body).encode())
+                elif self.path == "/api/generate":
+                    time.sleep(state.latency)
+                    words = ["桩", "服务器", "回答"]
+                    if payload.get("stream", True):
+                        lines = [json.dumps({"response": word, "done": False}) for word in words]
+                        lines.append(json.dumps({"response": "", "done": True, "prompt_eval_count": 10,
+                                                 "eval_count": len(words)}))
+                        self._send(("\n".join(lines) + "\n").encode(), "application/x-ndjson")
+                    else:
+                        self._send(json.dumps({"response": "".join(words), "done": True,
+                                               "prompt_eval_count": 10, "eval_count": len(words)}).encode())
+                else:
+                    self.send_error(404)
+            finally:
+                state.end(unload)
+
+    return Handler
+
+
+def measure(name, state, func, n_items):
+    state.reset()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<34}{n_items / elapsed:>10.1f}{elapsed:>9.2f}{state.requests:>8}{state.connections:>8}{state.loads:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ollama 客户端基准（本地桩服务器）")
+    parser.add_argument("--chunks", type=int, default=512, help="嵌入的文本块数量")
+    parser.add_argument("--batch-size", type=int, default=64, help="每次 embed_documents 的文本块数")
+    parser.add_argument("--generations", type=int, default=20, help="生成调用次数")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="每个请求的固定延迟（毫秒）")
+    parser.add_argument("--per-text-ms", type=float, default=0.2, help="每个文本的额外延迟（毫秒）")
+    parser.add_argument("--load-ms", type=float, default=200.0, help="模型被卸载后重新加载的延迟（毫秒）")
+    args = parser.parse_args()
+
+    state = StubState(args.latency_ms / 1000, args.per_text_ms / 1000, args.load_ms / 1000)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    texts = [f"文本块 {i} " * (1 + i % 20) for i in range(args.chunks)]
+    batches = [texts[i:i + args.batch_size] for i in range(0, len(texts), args.batch_size)]
+
+    print(f"桩服务器 {base_url}：每请求 {args.latency_ms} ms，每文本 {args.per_text_ms} ms，模型加载 {args.load_ms} ms")
+    print(f"\n{'嵌入（' + str(args.chunks) + ' 个文本块）':<30}{'块/秒':>10}{'耗时 s':>9}{'请求':>6}{'连接':>6}{'加载':>6}")
+
+    def per_text_requests():
+        import httpx
+        for text in texts:
+            with httpx.Client(base_url=base_url) as http:
+                http.post("/api/embeddings", json={"model": "stub", "prompt": text}).raise_for_status()
+
+    measure("逐条请求（无连接复用）", state, per_text_requests, len(texts))
+
+    try:
+        from langchain_ollama import OllamaEmbeddings
+        langchain_embeddings = OllamaEmbeddings(model="stub", base_url=base_url)
+        measure("langchain_ollama 默认参数", state,
+                lambda: [langchain_embeddings.embed_documents(batch) for batch in batches], len(texts))
+    except ImportError:
+        print(f"{'langchain_ollama 默认参数':<34}跳过：未安装 langchain_ollama")
+
+    client = OllamaClient(base_url, embed_batch_size=args.batch_size)
+    embeddings = OllamaClientEmbeddings("stub", client=client)
+    measure("OllamaClient（连接池 + 批量）", state,
+            lambda: [embeddings.embed_documents(batch) for batch in batches], len(texts))
+    client.close()
+
+    print(f"\n{'生成（' + str(args.generations) + ' 次）':<30}{'次/秒':>10}{'耗时 s':>9}{'请求':>6}{'连接':>6}{'加载':>6}")
+    try:
+        from langchain_community.llms import Ollama
+        warnings.filterwarnings("ignore", message=".*Ollama.*deprecated")
+        langchain_llm = Ollama(model="stub", base_url=base_url)
+        measure("langchain_community Ollama", state,
+                lambda: [langchain_llm.invoke("你好") for _ in range(args.generations)], args.generations)
+    except ImportError:
+        print(f"{'langchain_community Ollama':<34}跳过：未安装 langchain_community")
+
+    llm = OllamaClientLLM(model="stub", base_url=base_url)
+    measure("OllamaClientLLM", state, lambda: [llm.invoke("你好") for _ in range(args.generations)],
+            args.generations)
+    measure("OllamaClientLLM（流式）", state,
+            lambda: [list(llm.stream("你好")) for _ in range(args.generations)], args.generations)
+    close_ollama_clients()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+批量检索（retrieve_many）基准
+
+在合成语料上对比逐条检索（每条查询一次 embed_query、一次单向量 FAISS 检索、一次 BM25 全量打分）
+与 retrieve_many（每批查询一次 embed_documents、一次矩阵 FAISS 检索、共享倒排表的 BM25 打分）的
+每秒查询数，并检查两者每条查询返回的文本块完全一致（不一致时以非零状态退出）。
+嵌入模型使用伪嵌入；--embed-latency-ms 为每次嵌入调用增加固定延迟，模拟 Ollama 等远程嵌入服务的往返开销。
+
+用法：
+    python benchmarks/retrieve_many.py --docs 500 --queries 512 --batch-size 64
+    python benchmarks/retrieve_many.py --shards 4 --embed-latency-ms 0
+"""
+
+import argparse
+import sys
+import time
+from functools import partial
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from langchain.docstore.document import Document
+from langchain.embeddings.base import Embeddings
+from langchain_community.vectorstores.faiss import FAISS
+
+from app.bench.corpus import SyntheticCorpus
+from app.models.fake_embeddings import HashingEmbeddings
+from app.services.fusion import simple_fusion
+from app.services.quantization import build_binary_index
+from app.services.retrievers.dense import DenseRetriever
+from app.services.retrievers.hybrid import HybridRetriever
+from app.services.retrievers.sparse import SparseRetriever
+from app.services.sharded_vector_store import ShardedVectorStore
+
+
+class LatencyEmbeddings(Embeddings):
+    """伪嵌入模型，每次调用（无论文本数）固定 sleep 以模拟远程嵌入服务的往返延迟"""
+
+    def __init__(self, latency: float):
+        self.inner = HashingEmbeddings()
+        self.latency = latency
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        time.sleep(self.latency)
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text):
+        self.calls += 1
+        time.sleep(self.latency)
+        return self.inner.embed_query(text)
+
+
+def make_chunks(corpus: SyntheticCorpus):
+    """按段落切分合成文档"""
+    chunks = []
+    for doc in corpus.documents:
+        for i, paragraph in enumerate(doc.page_content.split("\n\n")):
+            if paragraph.strip():
+                chunks.append(Document(id=f"{doc.metadata['source']}#{i}", page_content=paragraph,
+                                       metadata=dict(doc.metadata, paragraph=i)))
+    return chunks
+
+
+def ids_of(results):
+    return [[doc.id or doc.page_content for doc in docs] for docs in results]
+
+
+def compare(name, retriever, queries, batch_size, embeddings, metadata_filter=None):
+    """返回 (逐条 q/s, 批量 q/s, 结果是否一致)"""
+    embeddings.calls = 0
+    start = time.perf_counter()
+    looped = [retriever._get_relevant_documents(query, metadata_filter=metadata_filter) for query in queries]
+    looped_seconds = time.perf_counter() - start
+    looped_calls = embeddings.calls
+
+    embeddings.calls = 0
+    start = time.perf_counter()
+    batched = []
+    for i in range(0, len(queries), batch_size):
+        batched.extend(retriever.retrieve_many(queries[i:i + batch_size], metadata_filter=metadata_filter))
+    batched_seconds = time.perf_counter() - start
+
+    same = ids_of(looped) == ids_of(batched)
+    looped_qps = len(queries) / looped_seconds
+    batched_qps = len(queries) / batched_seconds
+    print(f"{name:<20}{looped_qps:>10.1f}{batched_qps:>12.1f}{batched_qps / looped_qps:>8.1f}x"
+          f"{looped_calls:>8}{embeddings.calls:>8}  {'一致' if same else '不一致'}")
+    return same
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量检索（retrieve_many）基准")
+    parser.add_argument("--docs", type=int, default=500, help="合成文档数量")
+    parser.add_argument("--queries", type=int, default=512, help="查询数量")
+    parser.add_argument("--batch-size", type=int, default=64, help="每次 retrieve_many 的查询数")
+    parser.add_argument("-k", type=int, default=10, help="每条查询返回的文本块数")
+    parser.add_argument("--shards", type=int, default=1, help="向量库分片数，1 表示单个 FAISS 索引")
+    parser.add_argument("--embed-latency-ms", type=float, default=2.0, help="每次嵌入调用的模拟往返延迟（毫秒）")
+    args = parser.parse_args()
+
+    corpus = SyntheticCorpus(n_docs=args.docs)
+    chunks = make_chunks(corpus)
+    queries = [query.text for query in corpus.queries(args.queries)]
+    embeddings = LatencyEmbeddings(args.embed_latency_ms / 1000)
+
+    # 建索引时不计延迟
+    latency, embeddings.latency = embeddings.latency, 0.0
+    if args.shards > 1:
+        vector_store = ShardedVectorStore.from_documents(chunks, embeddings, n_shards=args.shards)
+    else:
+        vector_store = FAISS.from_documents(chunks, embeddings)
+    binary_store = build_binary_index(FAISS.from_documents(chunks, embeddings)) if args.shards <= 1 else None
+    embeddings.latency = latency
+
+    sparse = SparseRetriever(chunks, k=args.k)
+    dense = DenseRetriever(vector_store, k=args.k)
+    hybrid = HybridRetriever(dense, sparse, partial(simple_fusion, top_k=args.k))
+    metadata_filter = {"topic": "t0"}
+
+    print(f"共 {len(chunks)} 个文本块，{len(queries)} 条查询，每批 {args.batch_size} 条，k={args.k}，"
+          f"分片 {args.shards}，嵌入延迟 {args.embed_latency_ms} ms")
+    print(f"{'模式':<18}{'逐条 q/s':>10}{'批量 q/s':>12}{'加速':>9}{'嵌入调用':>6}{'批量':>6}")
+    checks = [
+        compare("dense", dense, queries, args.batch_size, embeddings),
+        compare("dense + 过滤", dense, queries, args.batch_size, embeddings, metadata_filter),
+        compare("sparse", sparse, queries, args.batch_size, embeddings),
+        compare("sparse + 过滤", sparse, queries, args.batch_size, embeddings, metadata_filter),
+        compare("hybrid", hybrid, queries, args.batch_size, embeddings),
+    ]
+    if binary_store is not None:
+        binary = DenseRetriever(binary_store, k=args.k, search_mode="binary")
+        checks.append(compare("dense（二值）", binary, queries, args.batch_size, embeddings))
+
+    if not all(checks):
+        print("\n批量检索与逐条检索的结果不一致")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
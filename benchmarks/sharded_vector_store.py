@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+分片向量库扩展性基准
+
+对比不同分片数下的：
+- 构建耗时：各分片在独立线程中调用嵌入模型并建索引。伪嵌入模型每次调用
+  sleep 一段时间，模拟 Ollama 等远程嵌入服务的网络和推理延迟
+- 检索耗时：单条查询的 scatter-gather 延迟，以及多线程并发查询的吞吐量
+并检查分片检索与单索引检索的结果一致。检索加速取决于 CPU 核数。
+
+用法：
+    python benchmarks/sharded_vector_store.py --chunks 200000 --shards 1 2 4 8
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import numpy as np
+from langchain.docstore.document import Document
+from langchain.embeddings.base import Embeddings
+
+from app.services.sharded_vector_store import ShardedVectorStore
+
+
+class LatencyEmbeddings(Embeddings):
+    """按文本下标返回预先生成的向量，每次调用固定 sleep 以模拟远程嵌入服务"""
+
+    def __init__(self, vectors: np.ndarray, latency: float):
+        self.vectors = vectors
+        self.latency = latency
+
+    def embed_documents(self, texts):
+        time.sleep(self.latency)
+        return [self.vectors[int(text.split(":", 1)[0])].tolist() for text in texts]
+
+    def embed_query(self, text):
+        return self.vectors[0].tolist()
+
+
+def build_shards(docs, vectors, n_shards, batch_size, latency):
+    """按批调用嵌入模型构建分片向量库，每批内各分片并行"""
+    store = ShardedVectorStore.empty(n_shards, LatencyEmbeddings(vectors, latency), shard_by="source")
+    start = time.perf_counter()
+    for i in range(0, len(docs), batch_size * n_shards):
+        store.add_documents(docs[i:i + batch_size * n_shards])
+    return store, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分片向量库扩展性基准")
+    parser.add_argument("--chunks", type=int, default=200000, help="向量数量")
+    parser.add_argument("--dim", type=int, default=256, help="向量维度")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8], help="要测试的分片数")
+    parser.add_argument("--queries", type=int, default=200, help="检索查询数")
+    parser.add_argument("--clients", type=int, default=8, help="并发查询线程数")
+    parser.add_argument("--batch-size", type=int, default=256, help="每次嵌入调用的文本数")
+    parser.add_argument("--latency", type=float, default=0.05, help="伪嵌入模型每次调用的延迟（秒）")
+    parser.add_argument("--build-chunks", type=int, default=20000, help="构建基准使用的向量数量")
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    vectors = rng.standard_normal((args.chunks, args.dim)).astype(np.float32)
+    docs = [Document(page_content=f"{i}:文本块", metadata={"source": f"docs/file{i % 997}.pdf"})
+            for i in range(args.chunks)]
+    queries = rng.standard_normal((args.queries, args.dim)).astype(np.float32).tolist()
+    print(f"CPU 核数={os.cpu_count()} 向量数={args.chunks} 维度={args.dim}")
+
+    print("\n构建（伪嵌入延迟 {:.0f}ms/次）".format(args.latency * 1000))
+    for n_shards in args.shards:
+        _, elapsed = build_shards(docs[:args.build_chunks], vectors, n_shards, args.batch_size, args.latency)
+        print(f"  分片数={n_shards:<3} 耗时={elapsed:6.2f}s 吞吐={args.build_chunks / elapsed:10,.0f} 文本块/秒")
+
+    print("\n检索（top-10）")
+    embeddings = LatencyEmbeddings(vectors, 0.0)
+    reference = None
+    for n_shards in args.shards:
+        store = ShardedVectorStore.empty(n_shards, embeddings)
+        store.add_embedded_chunks(docs, vectors)
+        search = lambda q: store.similarity_search_with_score_by_vector(q, k=10)
+
+        start = time.perf_counter()
+        results = [search(q) for q in queries]
+        latency = (time.perf_counter() - start) / len(queries)
+
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            start = time.perf_counter()
+            list(pool.map(search, queries))
+            qps = len(queries) / (time.perf_counter() - start)
+
+        contents = [[doc.page_content for doc, _ in result] for result in results]
+        if reference is None:
+            reference = contents
+        print(f"  分片数={n_shards:<3} 单查询延迟={latency * 1000:7.2f}ms "
+              f"并发吞吐={qps:8.1f} QPS 结果一致={contents == reference}")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -132,7 +132,7 @@ if [[ $install_nltk =~ ^[Yy]$ ]]; then
 import nltk
 try:
     nltk.download('punkt')
-    nltk.download('averaged_perceptron_tagger')
+    nltk.download('punkt_tab')
     print('✅ NLTK 数据下载成功')
 except Exception as e:
     print(f'⚠️ NLTK 数据下载失败: {e}')
@@ -2,6 +2,9 @@ import click
 
 from app.cli.ingest import ingest
 from app.cli.query import query
+from app.cli.quantize import quantize
+from app.cli.serve import serve
+from app.cli.bench import bench, bench_chunking
 
 
 @click.group()
@@ -12,6 +15,10 @@ def cli():
 
 cli.add_command(ingest)
 cli.add_command(query)
+cli.add_command(quantize)
+cli.add_command(serve)
+cli.add_command(bench)
+cli.add_command(bench_chunking)
 
 
 if __name__ == "__main__":